@@ -0,0 +1,13 @@
+"""Microbenchmarks for bloop's hot paths.
+
+Run from the repository root::
+
+    python -m benchmarks                          # run everything
+    python -m benchmarks -k engine.load           # run matching cases
+    python -m benchmarks --save baseline.json     # store a baseline
+    python -m benchmarks --compare baseline.json  # exits 1 on a regression
+
+Each case reports operations per second, the peak bytes allocated by one operation, and the bytes still
+held afterwards.  Boto3 clients are replaced with canned responses from :mod:`benchmarks.clients`, so only
+bloop's own work is measured.  Baselines are specific to the machine and Python version that recorded them.
+"""
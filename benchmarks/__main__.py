@@ -0,0 +1,40 @@
+import argparse
+import sys
+
+from . import runner
+from .cases import CASES
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Microbenchmarks for bloop's hot paths.")
+    parser.add_argument("-k", dest="pattern", help="only run cases whose name contains this substring")
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds spent timing each case (default 0.2)")
+    parser.add_argument("--repeat", type=int, default=5, help="timing runs per case; the best is kept (default 5)")
+    parser.add_argument("--save", metavar="PATH", help="write the results to a baseline json file")
+    parser.add_argument("--compare", metavar="PATH", help="compare the results against a baseline json file")
+    parser.add_argument(
+        "--threshold", type=float, default=0.1,
+        help="fractional slowdown or allocation growth that counts as a regression (default 0.1)")
+    parser.add_argument("--list", action="store_true", help="list the cases and exit")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for case in CASES:
+            print(case.name, " ".join(filter(None, case.variants)))
+        return 0
+
+    # Print as results arrive, unless they'll be printed next to the baseline at the end.
+    out = None if args.compare else sys.stdout
+    results = runner.run(CASES, pattern=args.pattern, min_time=args.min_time, repeat=args.repeat, out=out)
+    if args.save:
+        runner.save(results, args.save)
+    if args.compare:
+        regressed = runner.compare(results, runner.load(args.compare), threshold=args.threshold, out=sys.stdout)
+        if regressed:
+            print("\n{} regressed: {}".format(len(regressed), ", ".join(regressed)))
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
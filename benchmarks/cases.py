@@ -0,0 +1,205 @@
+"""Benchmark cases for bloop's hot paths.
+
+Each case is a factory that takes a variant name, builds its fixtures once, and returns a zero-argument
+callable.  One call to that callable is one operation in the report.
+"""
+import collections
+
+from bloop import Engine
+from bloop.conditions import render
+from bloop.models import unpack_from_dynamodb
+from bloop.session import SessionWrapper
+from bloop.stream.buffer import RecordBuffer, ShardBuffer
+from bloop.stream.coordinator import Coordinator
+from bloop.stream.shard import Shard, reformat_record
+from bloop.stream.stream import Stream
+from bloop.util import default_context, dump_item, dump_key
+
+from .clients import FakeDynamoDB, FakeStreams, record
+from .models import MODELS, Streamed, make
+
+
+Case = collections.namedtuple("Case", ["name", "variants", "factory"])
+
+#: Registered cases, in report order
+CASES = []
+
+#: Objects per Engine.load call
+LOAD_BATCH = 100
+
+#: Records pushed and popped per RecordBuffer operation
+BUFFER_RECORDS = 1000
+
+STREAM_ARN = "arn:aws:dynamodb:us-east-1:000000000000:table/Narrow/stream/2020-01-01T00:00:00.000"
+
+
+def case(name, variants=("",)):
+    def register(factory):
+        CASES.append(Case(name, tuple(variants), factory))
+        return factory
+    return register
+
+
+def model_engine(model):
+    engine = Engine(dynamodb=FakeDynamoDB(), dynamodbstreams=FakeStreams())
+    engine.bind(model, skip_table_setup=True)
+    return engine
+
+
+# ================================================
+# Conditions and types
+# ================================================
+
+@case("conditions.render.save", variants=MODELS)
+def render_save(variant):
+    """Render the full update expression and a condition for a save."""
+    model = MODELS[variant]
+    engine = model_engine(model)
+    obj = make(model, 0)
+    hash_key = model.Meta.hash_key
+    condition = (hash_key == None) | (hash_key == getattr(obj, hash_key.name))  # noqa: E711
+    return lambda: render(engine, obj=obj, condition=condition, update=True)
+
+
+@case("types.dump", variants=MODELS)
+def types_dump(variant):
+    """Type._dump every column of one object."""
+    model = MODELS[variant]
+    engine = model_engine(model)
+    obj = make(model, 0)
+    return lambda: dump_item(engine, obj)
+
+
+@case("types.load", variants=MODELS)
+def types_load(variant):
+    """Type._load every attribute of one wire-format item."""
+    model = MODELS[variant]
+    engine = model_engine(model)
+    item = dump_item(engine, make(model, 0))
+    context = default_context(engine)
+    columns = model.Meta.columns
+
+    def load():
+        for column in columns:
+            # noinspection PyProtectedMember
+            column.typedef._load(item.get(column.dynamo_name), context=context)
+    return load
+
+
+@case("models.unpack_from_dynamodb", variants=MODELS)
+def unpack(variant):
+    """Build a new object from one wire-format item."""
+    model = MODELS[variant]
+    engine = model_engine(model)
+    item = dump_item(engine, make(model, 0))
+    expected = model.Meta.columns
+    return lambda: unpack_from_dynamodb(attrs=item, expected=expected, model=model, engine=engine)
+
+
+@case("util.dump_key", variants=MODELS)
+def key(variant):
+    model = MODELS[variant]
+    engine = model_engine(model)
+    obj = make(model, 0)
+    return lambda: dump_key(engine, obj)
+
+
+# ================================================
+# Engine
+# ================================================
+
+@case("engine.load[{}]".format(LOAD_BATCH), variants=MODELS)
+def load(variant):
+    """Key indexing, the BatchGetItem round trip, and unpacking for a batch of objects."""
+    model = MODELS[variant]
+    engine = model_engine(model)
+    client = engine.session.dynamodb_client
+    table_name = engine._compute_table_name(model)
+    objs = []
+    for i in range(LOAD_BATCH):
+        obj = make(model, i)
+        client.put(table_name, dump_key(engine, obj), dump_item(engine, obj))
+        # Only the key is set on the objects being loaded
+        blank = model()
+        for column in model.Meta.keys:
+            setattr(blank, column.name, getattr(obj, column.name))
+        objs.append(blank)
+    return lambda: engine.load(*objs)
+
+
+# ================================================
+# Streams
+# ================================================
+
+@case("stream.RecordBuffer[{}]".format(BUFFER_RECORDS), variants=("push", "push_all"))
+def buffer(variant):
+    """Fill the buffer from 4 shards and drain it in order."""
+    return fill_and_drain(RecordBuffer, variant)
+
+
+@case("stream.ShardBuffer[{}]".format(BUFFER_RECORDS), variants=("push", "push_all"))
+def shard_buffer(variant):
+    """Fill the buffer from 4 shards and drain it in per-shard order."""
+    return fill_and_drain(ShardBuffer, variant)
+
+
+def fill_and_drain(buffer_cls, variant):
+    shards = [Shard(stream_arn=STREAM_ARN, shard_id=str(i)) for i in range(4)]
+    pairs = [
+        (reformat_record(record(i % 4, i)), shards[i % 4])
+        for i in range(BUFFER_RECORDS)
+    ]
+
+    def fill_and_drain():
+        buffer = buffer_cls()
+        if variant == "push":
+            for pair in pairs:
+                buffer.push(*pair)
+        else:
+            buffer.push_all(pairs)
+        while buffer:
+            buffer.pop()
+    return fill_and_drain
+
+
+@case("stream.Coordinator[4x100]", variants=("total", "shard"))
+def coordinator(ordering):
+    """Consume one full poll of 4 shards with 100 records each, in total or per-shard order."""
+    session = SessionWrapper(dynamodb=FakeDynamoDB(), dynamodbstreams=FakeStreams(shards=4, records=100))
+    coordinator = Coordinator(session=session, stream_arn=STREAM_ARN, ordering=ordering)
+    coordinator.move_to("trim_horizon")
+    per_poll = 4 * 100
+
+    def poll():
+        for _ in range(per_poll):
+            next(coordinator)
+    return poll
+
+
+@case("stream.Coordinator.token[256]")
+def coordinator_token(_):
+    """Build the token for a stream with 256 shards that have each consumed a record."""
+    session = SessionWrapper(dynamodb=FakeDynamoDB(), dynamodbstreams=FakeStreams(shards=256, records=1))
+    coordinator = Coordinator(session=session, stream_arn=STREAM_ARN)
+    coordinator.move_to("trim_horizon")
+    coordinator.next_batch(256)
+    return lambda: coordinator.token
+
+
+@case("stream.Stream[4x100]", variants=("next", "next_batch"))
+def stream(variant):
+    """Consume and unpack one full poll of 4 shards with 100 records each, one at a time or as a batch."""
+    engine = Engine(dynamodb=FakeDynamoDB(), dynamodbstreams=FakeStreams(shards=4, records=100))
+    engine.bind(Streamed, skip_table_setup=True)
+    stream = Stream(model=Streamed, engine=engine)
+    stream.move_to("trim_horizon")
+    per_poll = 4 * 100
+
+    if variant == "next":
+        def poll():
+            for _ in range(per_poll):
+                next(stream)
+    else:
+        def poll():
+            stream.next_batch(per_poll)
+    return poll
@@ -0,0 +1,79 @@
+"""Minimal stand-ins for the boto3 clients that answer instantly from canned data.
+
+These keep the network (and any backend emulation) out of the measurements, so each benchmark only
+times bloop's own work on either side of the client call.
+"""
+from bloop.util import index_for
+
+
+class FakeDynamoDB:
+    """Answers ``batch_get_item`` from a dict of items, and acknowledges every write."""
+    def __init__(self):
+        # table name -> index_for(key) -> item
+        self.items = {}
+
+    def put(self, table_name, key, item):
+        self.items.setdefault(table_name, {})[index_for(key)] = item
+
+    def batch_get_item(self, RequestItems, **_):
+        responses = {}
+        for table_name, request in RequestItems.items():
+            table = self.items.get(table_name, {})
+            found = responses.setdefault(table_name, [])
+            for key in request["Keys"]:
+                item = table.get(index_for(key))
+                if item is not None:
+                    found.append(item)
+        return {"Responses": responses, "UnprocessedKeys": {}}
+
+    def update_item(self, **_):
+        return {}
+
+    def delete_item(self, **_):
+        return {}
+
+
+class FakeStreams:
+    """Every ``get_records`` call returns the same page of records and an iterator that never closes.
+
+    :param int shards: Number of open shards in the stream.
+    :param int records: Records returned by each ``get_records`` call.
+    """
+    def __init__(self, *, shards=1, records=100):
+        self.shard_ids = ["shardId-{:020d}-{:08d}".format(0, i) for i in range(shards)]
+        self.pages = {
+            shard_id: [record(i, j) for j in range(records)]
+            for i, shard_id in enumerate(self.shard_ids)
+        }
+
+    def describe_stream(self, StreamArn, **_):
+        return {"StreamDescription": {
+            "StreamArn": StreamArn,
+            "Shards": [
+                {"ShardId": shard_id, "SequenceNumberRange": {"StartingSequenceNumber": "1"}}
+                for shard_id in self.shard_ids
+            ],
+        }}
+
+    def get_shard_iterator(self, ShardId, **_):
+        return {"ShardIterator": ShardId}
+
+    def get_records(self, ShardIterator):
+        return {"Records": self.pages[ShardIterator], "NextShardIterator": ShardIterator}
+
+
+def record(shard, i):
+    """A MODIFY record in the wire format, ordered first by second and then by sequence number."""
+    sequence_number = "{:021d}".format(shard * 10 ** 9 + i)
+    return {
+        "eventID": "{}-{}".format(shard, i),
+        "eventName": "MODIFY",
+        "eventVersion": "1.1",
+        "dynamodb": {
+            "ApproximateCreationDateTime": 1577836800 + i // 10,
+            "Keys": {"id": {"S": "user-{}".format(i)}},
+            "NewImage": {"id": {"S": "user-{}".format(i)}, "name": {"S": "new"}},
+            "OldImage": {"id": {"S": "user-{}".format(i)}, "name": {"S": "old"}},
+            "SequenceNumber": sequence_number,
+        },
+    }
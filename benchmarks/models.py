@@ -0,0 +1,149 @@
+import decimal
+import random
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from bloop import (
+    UUID,
+    BaseModel,
+    Binary,
+    Boolean,
+    Column,
+    DateTime,
+    Integer,
+    List,
+    Map,
+    Number,
+    Set,
+    String,
+)
+
+
+# ================================================
+# Representative models
+# ================================================
+
+class Narrow(BaseModel):
+    """A handful of scalar columns with a hash and range key: the common case."""
+    id = Column(String, hash_key=True)
+    version = Column(Integer, range_key=True)
+    name = Column(String)
+    active = Column(Boolean)
+
+
+# 32 scalar and set columns, cycling through the built-in types
+WIDE_TYPES = [String, Integer, Number, Boolean, DateTime, Set(String), List(Integer), Binary]
+WIDE_COLUMNS = 32
+
+
+def _wide_model():
+    attrs = {"id": Column(String, hash_key=True)}
+    for i in range(WIDE_COLUMNS):
+        attrs["field_{:02d}".format(i)] = Column(WIDE_TYPES[i % len(WIDE_TYPES)])
+    return type("Wide", (BaseModel,), attrs)
+
+
+Wide = _wide_model()
+
+Review = Map(**{
+    "Author": String,
+    "Stars": Integer,
+    "Body": String,
+})
+
+Product = Map(**{
+    "Name": String,
+    "Rating": Number,
+    "Updated": DateTime,
+    "Description": Map(**{
+        "Title": String,
+        "Body": String,
+    }),
+    "Sellers": Set(Integer),
+    "Reviews": List(Review),
+})
+
+
+class Nested(BaseModel):
+    """Deeply nested documents, where most of the cost is in recursive Map/List dumps and loads."""
+    id = Column(UUID, hash_key=True)
+    product = Column(Product)
+    history = Column(List(Product))
+
+
+class Streamed(BaseModel):
+    """Matches the records from :func:`benchmarks.clients.record`."""
+    class Meta:
+        stream = {
+            "include": {"new", "old"},
+            "arn": "arn:aws:dynamodb:us-east-1:000000000000:table/Streamed/stream/2020-01-01T00:00:00.000",
+        }
+    id = Column(String, hash_key=True)
+    name = Column(String)
+
+
+MODELS = {
+    "narrow": Narrow,
+    "wide": Wide,
+    "nested": Nested,
+}
+
+
+# ================================================
+# Deterministic instances
+# ================================================
+
+EPOCH = datetime(2020, 1, 1, tzinfo=timezone.utc)
+
+
+def _text(rng, length=16):
+    return "".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(length))
+
+
+def _wide_value(typedef, rng):
+    if isinstance(typedef, Set):
+        return {_text(rng, 8) for _ in range(4)}
+    if isinstance(typedef, List):
+        return [rng.randint(0, 1000) for _ in range(8)]
+    return {
+        String: lambda: _text(rng),
+        Integer: lambda: rng.randint(0, 10 ** 6),
+        Number: lambda: decimal.Decimal(rng.randint(0, 10 ** 6)) / 100,
+        Boolean: lambda: rng.random() > 0.5,
+        DateTime: lambda: EPOCH + timedelta(seconds=rng.randint(0, 10 ** 7)),
+        Binary: lambda: bytes(rng.getrandbits(8) for _ in range(32)),
+    }[typedef.__class__]()
+
+
+def _product(rng):
+    return {
+        "Name": _text(rng),
+        "Rating": decimal.Decimal(rng.randint(0, 50)) / 10,
+        "Updated": EPOCH + timedelta(seconds=rng.randint(0, 10 ** 7)),
+        "Description": {"Title": _text(rng, 24), "Body": _text(rng, 200)},
+        "Sellers": {rng.randint(0, 10 ** 6) for _ in range(5)},
+        "Reviews": [
+            {"Author": _text(rng, 8), "Stars": rng.randint(1, 5), "Body": _text(rng, 64)}
+            for _ in range(3)
+        ],
+    }
+
+
+def make(model, i, seed=0):
+    """Build the ``i``-th deterministic instance of one of the benchmark models."""
+    rng = random.Random("{}:{}:{}".format(model.__name__, i, seed))
+    if model is Narrow:
+        return Narrow(id="user-{}".format(i), version=i % 7, name=_text(rng), active=bool(i % 2))
+    if model is Wide:
+        obj = Wide(id="wide-{}".format(i))
+        for column in Wide.Meta.columns:
+            if not column.hash_key:
+                setattr(obj, column.name, _wide_value(column.typedef, rng))
+        return obj
+    if model is Nested:
+        return Nested(
+            id=uuid.UUID(int=rng.getrandbits(128)),
+            product=_product(rng),
+            history=[_product(rng) for _ in range(3)],
+        )
+    raise ValueError("unknown benchmark model {!r}".format(model))
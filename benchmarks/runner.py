@@ -0,0 +1,148 @@
+import gc
+import json
+import platform
+import time
+import tracemalloc
+
+
+class Result:
+    """Throughput and allocation numbers for a single case and variant.
+
+    :param str name: Case name, including the variant in brackets when there is one.
+    :param float ops_per_sec: Best observed throughput across all repeats.
+    :param int alloc_bytes: Peak bytes allocated during one operation, as traced by :mod:`tracemalloc`.
+    :param int retained_bytes: Bytes still allocated after one operation; steady growth indicates caching or a leak.
+    """
+    def __init__(self, name, ops_per_sec, alloc_bytes, retained_bytes):
+        self.name = name
+        self.ops_per_sec = ops_per_sec
+        self.alloc_bytes = alloc_bytes
+        self.retained_bytes = retained_bytes
+
+    def __repr__(self):
+        return "<{}[{}: {:.1f} ops/s]>".format(self.__class__.__name__, self.name, self.ops_per_sec)
+
+    def to_dict(self):
+        return {
+            "ops_per_sec": self.ops_per_sec,
+            "alloc_bytes": self.alloc_bytes,
+            "retained_bytes": self.retained_bytes,
+        }
+
+
+def timed_loops(op, loops):
+    start = time.perf_counter()
+    for _ in range(loops):
+        op()
+    return time.perf_counter() - start
+
+
+def measure_speed(op, *, min_time, repeat):
+    """Best ops/sec over ``repeat`` runs, each at least ``min_time`` seconds long.
+
+    The garbage collector is disabled while timing, the same as :mod:`timeit`.
+    """
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        # Warm up caches, then double the loop count until one run takes long enough.
+        op()
+        loops = 1
+        while timed_loops(op, loops) < min_time:
+            loops *= 2
+        best = min(timed_loops(op, loops) for _ in range(repeat))
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return loops / best
+
+
+def measure_allocations(op, *, samples):
+    """(peak bytes, retained bytes) for a single operation, averaged over ``samples`` operations."""
+    op()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        peak, retained = 0, 0
+        for _ in range(samples):
+            before, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            op()
+            after, sample_peak = tracemalloc.get_traced_memory()
+            peak += sample_peak - before
+            retained += after - before
+    finally:
+        tracemalloc.stop()
+    return peak // samples, max(0, retained // samples)
+
+
+def run(cases, *, pattern=None, min_time=0.2, repeat=5, samples=20, out=None):
+    """Run every case variant whose name contains ``pattern``, writing one line per result to ``out``.
+
+    :return: List of :class:`Result` in case order.
+    """
+    results = []
+    for case in cases:
+        for variant in case.variants:
+            name = "{}[{}]".format(case.name, variant) if variant else case.name
+            if pattern and pattern not in name:
+                continue
+            op = case.factory(variant)
+            result = Result(
+                name,
+                measure_speed(op, min_time=min_time / repeat, repeat=repeat),
+                *measure_allocations(op, samples=samples))
+            results.append(result)
+            if out is not None:
+                print(format_result(result), file=out, flush=True)
+    return results
+
+
+def format_result(result, baseline=None):
+    line = "{:<48} {:>14,.1f} ops/s {:>12,d} B/op {:>8,d} B retained".format(
+        result.name, result.ops_per_sec, result.alloc_bytes, result.retained_bytes)
+    if baseline is not None:
+        line += "  {:>+7.1%} speed {:>+7.1%} alloc".format(
+            change(baseline["ops_per_sec"], result.ops_per_sec),
+            change(baseline["alloc_bytes"], result.alloc_bytes))
+    return line
+
+
+def change(old, new):
+    return (new - old) / old if old else 0.0
+
+
+def save(results, path):
+    """Store results as a baseline json file."""
+    with open(path, "w") as file:
+        json.dump({
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "machine": platform.machine(),
+            "results": {result.name: result.to_dict() for result in results},
+        }, file, indent=2, sort_keys=True)
+
+
+def load(path):
+    with open(path) as file:
+        return json.load(file)
+
+
+def compare(results, baseline, *, threshold, out):
+    """Print each result against the baseline and return the names that regressed.
+
+    A case regresses when its throughput drops, or its peak allocation grows, by more than ``threshold``.
+    Cases missing from the baseline are reported but never regress.
+    """
+    regressed = []
+    known = baseline["results"]
+    for result in results:
+        previous = known.get(result.name)
+        print(format_result(result, previous), file=out)
+        if previous is None:
+            continue
+        slower = change(previous["ops_per_sec"], result.ops_per_sec) < -threshold
+        larger = change(previous["alloc_bytes"], result.alloc_bytes) > threshold
+        if slower or larger:
+            regressed.append(result.name)
+    return regressed
@@ -6,13 +6,16 @@ from .exceptions import (
     MissingObjects,
     RecordsExpired,
     ShardIteratorExpired,
+    StaleReplica,
     TableMismatch,
+    ThroughputExceeded,
     TransactionCanceled,
 )
 from .models import BaseModel, Column, GlobalSecondaryIndex, LocalSecondaryIndex
 from .search import QueryIterator, ScanIterator
 from .signals import (
     before_create_table,
+    capacity_consumed,
     model_bound,
     model_created,
     model_validated,
@@ -48,10 +51,11 @@ __all__ = [
 
     # Exceptions
     "BloopException", "ConstraintViolation", "MissingObjects",
-    "RecordsExpired", "ShardIteratorExpired", "TableMismatch", "TransactionCanceled",
+    "RecordsExpired", "ShardIteratorExpired", "StaleReplica", "TableMismatch", "ThroughputExceeded",
+    "TransactionCanceled",
 
     # Signals
-    "before_create_table", "model_bound", "model_created", "model_validated",
+    "before_create_table", "capacity_consumed", "model_bound", "model_created", "model_validated",
     "object_deleted", "object_loaded", "object_modified", "object_saved",
 
     # Types
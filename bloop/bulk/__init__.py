@@ -0,0 +1,5 @@
+from .migrate import Migration
+from .scan import ScanJob
+
+
+__all__ = ["Migration", "ScanJob"]
@@ -0,0 +1,146 @@
+import concurrent.futures
+import gzip
+import json
+import logging
+import os
+import pathlib
+import threading
+
+from ..checkpoints import write_json_atomic
+from ..models import Index
+from ..search import Search
+from .formats import dump_line, dump_wire, load_wire, validate_format
+
+
+__all__ = ["MANIFEST_NAME", "export_table"]
+
+logger = logging.getLogger("bloop.bulk")
+
+MANIFEST_NAME = "manifest.json"
+
+
+def part_name(segment, compress):
+    return "part-{:05d}.jsonl{}".format(segment, ".gz" if compress else "")
+
+
+def new_manifest(table_name, index, format, compress, segments):
+    return {
+        "table": table_name,
+        "index": index.dynamo_name if index is not None else None,
+        "format": format,
+        "compressed": compress,
+        "segments": segments,
+        "count": 0,
+        "exhausted": False,
+        "parts": [
+            {
+                "segment": segment,
+                "file": part_name(segment, compress),
+                "count": 0,
+                "offset": 0,
+                "token": None,
+                "exhausted": False,
+            }
+            for segment in range(segments)
+        ]
+    }
+
+
+def validate_resume(manifest, expected):
+    for field in ("table", "index", "format", "compressed", "segments"):
+        if manifest.get(field) != expected[field]:
+            raise ValueError("Can't resume export: manifest has {}={!r} but expected {!r}".format(
+                field, manifest.get(field), expected[field]))
+
+
+def export_table(
+        engine, model_or_index, path, *, segments=1, format="dynamodb", compress=True,
+        filter=None, projection="all", consistent=False, resume=True, max_workers=None):
+    """Stream a parallel scan into one json lines file per segment.  See :func:`Engine.export`."""
+    validate_format(format)
+    if segments < 1:
+        raise ValueError("segments must be at least 1 but was {}".format(segments))
+    if isinstance(model_or_index, Index):
+        model, index = model_or_index.model, model_or_index
+    else:
+        model, index = model_or_index, None
+    # noinspection PyProtectedMember
+    table_name = engine._compute_table_name(model)
+
+    path = pathlib.Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    manifest_path = path / MANIFEST_NAME
+    manifest = new_manifest(table_name, index, format, compress, segments)
+    if resume and manifest_path.exists():
+        existing = json.loads(manifest_path.read_text())
+        validate_resume(existing, manifest)
+        manifest = existing
+        logger.info("resuming export of {} with {} items already written".format(table_name, manifest["count"]))
+
+    # Pages are rendered from the wire and written immediately, so memory stays at
+    # about one page per worker no matter how large the table is.
+    base_request = Search(
+        mode="scan", engine=engine, model=model, index=index, filter=filter,
+        projection=projection, consistent=consistent).prepare()._request
+    lock = threading.Lock()
+
+    def save_manifest(part=None, **changes):
+        # Parts are only updated under the lock, so every manifest on disk is consistent
+        with lock:
+            if part is not None:
+                part.update(changes)
+            manifest["count"] = sum(p["count"] for p in manifest["parts"])
+            write_json_atomic(manifest_path, manifest)
+
+    def export_segment(part):
+        if part["exhausted"]:
+            return
+        request = dict(base_request)
+        if segments > 1:
+            request["Segment"], request["TotalSegments"] = part["segment"], segments
+        if part["token"] is not None:
+            request["ExclusiveStartKey"] = load_wire(part["token"])
+
+        file_path = path / part["file"]
+        # Drop anything written after the last checkpoint; it will be scanned again
+        with open(str(file_path), "r+b" if file_path.exists() else "wb") as file:
+            file.truncate(part["offset"])
+            file.seek(part["offset"])
+            while True:
+                response = engine.session.search_items("scan", request)
+                items = response.get("Items", [])
+                if items:
+                    write_page(file, items, format, compress)
+                token = response.get("LastEvaluatedKey")
+                save_manifest(
+                    part, count=part["count"] + len(items), offset=file.tell(),
+                    token=dump_wire(token), exhausted=not token)
+                if not token:
+                    break
+                request["ExclusiveStartKey"] = token
+        logger.debug("exported {} items from segment {} of {}".format(part["count"], part["segment"], table_name))
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers or segments) as executor:
+        for future in [executor.submit(export_segment, part) for part in manifest["parts"]]:
+            future.result()
+
+    manifest["exhausted"] = True
+    save_manifest()
+    logger.info("exported {} items from {} to {}".format(manifest["count"], table_name, path))
+    return manifest
+
+
+def write_page(file, items, format, compress):
+    """Append one page of items to an open part file, then flush it to disk.
+
+    Each compressed page is a complete gzip member, so the file is valid after every page and can be
+    truncated back to any page boundary.
+    """
+    data = b"".join(dump_line(item, format) for item in items)
+    if compress:
+        with gzip.GzipFile(fileobj=file, mode="wb") as member:
+            member.write(data)
+    else:
+        file.write(data)
+    file.flush()
+    os.fsync(file.fileno())
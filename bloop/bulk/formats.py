@@ -0,0 +1,107 @@
+import base64
+import decimal
+import json
+
+
+__all__ = ["FORMATS", "dump_line", "dump_wire", "load_wire", "wire_to_plain"]
+
+#: "dynamodb" is DynamoDB JSON, the same ``{"Item": {...}}`` lines that DynamoDB's S3 export writes.
+#: "json" is plain json with one object per line; numbers and sets are not preserved exactly.
+FORMATS = {"dynamodb", "json"}
+
+
+def dump_wire(attrs):
+    """Make a dict of DynamoDB wire values json-friendly by base64 encoding binary values.
+
+    .. code-block:: python
+
+        >>> dump_wire({"id": {"B": b"\\x00"}, "tags": {"SS": ["a"]}})
+        {'id': {'B': 'AA=='}, 'tags': {'SS': ['a']}}
+    """
+    if attrs is None:
+        return None
+    return {name: _map_value(value, _encode_binary) for name, value in attrs.items()}
+
+
+def load_wire(attrs):
+    """Inverse of :func:`~bloop.bulk.formats.dump_wire`"""
+    if attrs is None:
+        return None
+    return {name: _map_value(value, base64.b64decode) for name, value in attrs.items()}
+
+
+def wire_to_plain(attrs):
+    """Convert a dict of DynamoDB wire values into plain json values.
+
+    Numbers become int or float, binary values become base64 strings, and sets become sorted lists.
+    """
+    return {name: _plain(value) for name, value in attrs.items()}
+
+
+def dump_line(attrs, format):
+    """Render a single item as one line of the given format, including the trailing newline.
+
+    :param dict attrs: An item in DynamoDB's wire format.
+    :param str format: One of :data:`~bloop.bulk.formats.FORMATS`.
+    :rtype: bytes
+    """
+    if format == "dynamodb":
+        line = {"Item": dump_wire(attrs)}
+    else:
+        line = wire_to_plain(attrs)
+    return (json.dumps(line, separators=(",", ":"), sort_keys=True) + "\n").encode("utf-8")
+
+
+def validate_format(format):
+    if format not in FORMATS:
+        raise ValueError("Unknown format {!r}, must be one of {}".format(format, sorted(FORMATS)))
+
+
+def _encode_binary(value):
+    # Keys rendered by bloop hold binary values as str, while boto3 responses hold bytes
+    if isinstance(value, str):
+        value = value.encode("utf-8")
+    return base64.b64encode(value).decode("ascii")
+
+
+def _map_value(value, convert):
+    (type_, inner), = value.items()
+    if type_ == "B":
+        inner = convert(inner)
+    elif type_ == "BS":
+        inner = [convert(x) for x in inner]
+    elif type_ == "M":
+        inner = {k: _map_value(v, convert) for k, v in inner.items()}
+    elif type_ == "L":
+        inner = [_map_value(v, convert) for v in inner]
+    return {type_: inner}
+
+
+def _number(value):
+    value = decimal.Decimal(value)
+    if value == value.to_integral_value():
+        return int(value)
+    return float(value)
+
+
+def _plain(value):
+    (type_, inner), = value.items()
+    if type_ == "S" or type_ == "BOOL":
+        return inner
+    elif type_ == "N":
+        return _number(inner)
+    elif type_ == "B":
+        return _encode_binary(inner)
+    elif type_ == "NULL":
+        return None
+    elif type_ == "SS":
+        return sorted(inner)
+    elif type_ == "NS":
+        return sorted(_number(x) for x in inner)
+    elif type_ == "BS":
+        return sorted(_encode_binary(x) for x in inner)
+    elif type_ == "M":
+        return {k: _plain(v) for k, v in inner.items()}
+    elif type_ == "L":
+        return [_plain(v) for v in inner]
+    raise ValueError("Unknown DynamoDB type {!r}".format(type_))
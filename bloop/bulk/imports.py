@@ -0,0 +1,186 @@
+import base64
+import decimal
+import gzip
+import json
+import logging
+import pathlib
+import queue
+import threading
+import time
+
+from .export import MANIFEST_NAME
+from .formats import load_wire, validate_format
+from .writes import BatchWriter, chunk_items
+
+
+__all__ = ["import_table", "plain_to_wire", "read_records", "validate_record"]
+
+logger = logging.getLogger("bloop.bulk")
+
+# Sent by the reader to tell each writer there's no more work
+done = object()
+
+
+def source_files(path):
+    """A single file, or every part file in an export directory in segment order.
+
+    :return: ``(files, format)`` where format is None unless the directory has a manifest.
+    """
+    path = pathlib.Path(path)
+    if not path.is_dir():
+        return [path], None
+    manifest = path / MANIFEST_NAME
+    if manifest.exists():
+        manifest = json.loads(manifest.read_text())
+        return [path / part["file"] for part in manifest["parts"]], manifest["format"]
+    return sorted(p for p in path.iterdir() if p.name.endswith((".jsonl", ".jsonl.gz"))), None
+
+
+def read_records(files):
+    """Yield ``(file, line number, record)`` for every non-empty line, decompressing .gz files."""
+    for file in files:
+        opener = gzip.open if file.name.endswith(".gz") else open
+        with opener(str(file), "rt", encoding="utf-8") as f:
+            for lineno, line in enumerate(f, start=1):
+                if line.strip():
+                    yield file, lineno, json.loads(line, parse_float=decimal.Decimal)
+
+
+def plain_to_wire(value, typedef=None):
+    """Convert a plain json value into DynamoDB's wire format, guided by the column's type when possible.
+
+    Without a typedef (or for dynamic types) the wire type is inferred from the python type.
+    """
+    if value is None:
+        return {"NULL": True}
+    backing_type = getattr(typedef, "backing_type", None)
+    if backing_type is None:
+        if isinstance(value, bool):
+            backing_type = "BOOL"
+        elif isinstance(value, str):
+            backing_type = "S"
+        elif isinstance(value, (int, float, decimal.Decimal)):
+            backing_type = "N"
+        elif isinstance(value, dict):
+            backing_type = "M"
+        else:
+            backing_type = "L"
+
+    if backing_type == "N":
+        return {"N": str(value)}
+    elif backing_type == "B":
+        return {"B": base64.b64decode(value)}
+    elif backing_type == "NS":
+        return {"NS": [str(x) for x in value]}
+    elif backing_type == "BS":
+        return {"BS": [base64.b64decode(x) for x in value]}
+    elif backing_type == "M":
+        types = getattr(typedef, "types", {})
+        return {"M": {k: plain_to_wire(v, types.get(k)) for k, v in value.items()}}
+    elif backing_type == "L":
+        inner = getattr(typedef, "inner_typedef", None)
+        return {"L": [plain_to_wire(v, inner) for v in value]}
+    # S, SS, BOOL
+    return {backing_type: value}
+
+
+def to_wire(record, format, model):
+    if format == "dynamodb":
+        return load_wire(record["Item"])
+    columns = model.Meta.columns_by_dynamo_name
+    return {
+        name: plain_to_wire(value, getattr(columns.get(name), "typedef", None))
+        for name, value in record.items()
+    }
+
+
+def validate_record(attrs, model):
+    """Raise ValueError if an item is missing a key or has a value whose type doesn't match its column.
+
+    Attributes that aren't columns of the model are passed through unchecked.
+    """
+    for column in model.Meta.keys:
+        if column.dynamo_name not in attrs:
+            raise ValueError("missing key column {!r}".format(column.dynamo_name))
+    for name, value in attrs.items():
+        column = model.Meta.columns_by_dynamo_name.get(name)
+        backing_type = getattr(getattr(column, "typedef", None), "backing_type", None)
+        if backing_type is None:
+            continue
+        (actual, _), = value.items()
+        if actual != backing_type:
+            raise ValueError("column {!r} expects {} but was {}".format(name, backing_type, actual))
+
+
+def import_table(
+        engine, model, path, *, format=None, workers=4, write_units_per_second=None,
+        skip_invalid=False, max_attempts=10, backoff=0.05, max_backoff=5.0):
+    """Stream items from json lines files into BatchWriteItem calls.  See :func:`Engine.import_`."""
+    files, manifest_format = source_files(path)
+    format = format or manifest_format or "dynamodb"
+    validate_format(format)
+    if workers < 1:
+        raise ValueError("workers must be at least 1 but was {}".format(workers))
+    writer = BatchWriter(
+        engine, model, write_units_per_second=write_units_per_second,
+        max_attempts=max_attempts, backoff=backoff, max_backoff=max_backoff)
+    invalid = 0
+    # Bounded so the reader never gets more than a couple of batches ahead of each writer
+    batches = queue.Queue(maxsize=workers * 2)
+    errors = []
+
+    def write_batches():
+        while True:
+            batch = batches.get()
+            if batch is done:
+                return
+            if errors:
+                # Keep draining so the reader doesn't block forever
+                continue
+            try:
+                writer.write(batch)
+            except Exception as error:
+                errors.append(error)
+
+    def valid_items():
+        nonlocal invalid
+        for file, lineno, record in read_records(files):
+            if errors:
+                return
+            try:
+                attrs = to_wire(record, format, model)
+                validate_record(attrs, model)
+            except (KeyError, ValueError, TypeError) as error:
+                if not skip_invalid:
+                    raise ValueError("Invalid record at {}:{}: {}".format(file, lineno, error)) from error
+                logger.debug("skipping invalid record at {}:{}: {}".format(file, lineno, error))
+                invalid += 1
+                continue
+            yield attrs
+
+    threads = [
+        threading.Thread(target=write_batches, name="bloop-import-{}".format(i), daemon=True)
+        for i in range(workers)]
+    for thread in threads:
+        thread.start()
+
+    start = time.monotonic()
+    try:
+        for batch in chunk_items(valid_items(), writer.key_shape):
+            if errors:
+                break
+            batches.put(batch)
+    finally:
+        for _ in threads:
+            batches.put(done)
+        for thread in threads:
+            thread.join()
+    if errors:
+        raise errors[0]
+
+    elapsed = time.monotonic() - start
+    report = dict(writer.stats, invalid=invalid, elapsed=elapsed)
+    report["items_per_second"] = report["count"] / elapsed if elapsed else 0.0
+    logger.info("imported {} items into {} in {:.2f}s ({:.0f} items/s)".format(
+        report["count"], writer.table_name, elapsed, report["items_per_second"]))
+    return report
@@ -0,0 +1,94 @@
+import threading
+import time
+
+
+__all__ = ["RateLimiter", "item_size", "read_units", "write_units"]
+
+
+class RateLimiter:
+    """Token bucket shared between threads, refilled at ``rate`` units per second.
+
+    The bucket holds at most one second of units, so a burst after an idle period can't exceed ``rate``.
+    A request larger than the bucket is taken one bucket at a time, so it waits for all of its units.
+    Callers sleep without holding the lock, and check the bucket again when they wake.
+
+    :param float rate: Units per second.  If None, :func:`~bloop.bulk.limits.RateLimiter.acquire` never blocks.
+    """
+    def __init__(self, rate=None, *, clock=time.monotonic, sleep=time.sleep):
+        if rate is not None and rate <= 0:
+            raise ValueError("rate must be positive but was {}".format(rate))
+        self.rate = rate
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._available = rate or 0
+        self._last = clock()
+
+    def __repr__(self):
+        return "<{}[{}/s]>".format(self.__class__.__name__, self.rate)
+
+    def acquire(self, units=1):
+        """Block until ``units`` are available, then consume them.
+
+        :return: Seconds spent waiting.
+        :rtype: float
+        """
+        if self.rate is None:
+            return 0.0
+        waited = 0.0
+        remaining = units
+        while remaining > 0:
+            with self._lock:
+                now = self._clock()
+                self._available = min(self.rate, self._available + (now - self._last) * self.rate)
+                self._last = now
+                needed = min(remaining, self.rate)
+                if self._available >= needed:
+                    self._available -= needed
+                    remaining -= needed
+                    continue
+                delay = (needed - self._available) / self.rate
+            self._sleep(delay)
+            waited += delay
+        return waited
+
+
+def item_size(attrs):
+    """Approximate size in bytes of an item in DynamoDB's wire format.
+
+    Follows the rules in the `DynamoDB item size`__ docs closely enough for capacity planning.
+
+    __ https://docs.aws.amazon.com/amazondynamodb/latest/developerguide/CapacityUnitCalculations.html
+    """
+    return sum(len(name.encode("utf-8")) + _value_size(value) for name, value in attrs.items())
+
+
+def read_units(attrs, consistent=False):
+    """Read capacity units consumed by scanning ``attrs``: one per 4KB, or half that for eventually consistent reads.
+
+    Scans round up once per page rather than once per item, so this is not rounded.
+    """
+    units = item_size(attrs) / 4096
+    return units if consistent else units / 2
+
+
+def write_units(attrs):
+    """Write capacity units consumed by a single put of ``attrs``: one per started 1KB."""
+    return max(1, -(-item_size(attrs) // 1024))
+
+
+def _value_size(value):
+    (type_, inner), = value.items()
+    if type_ == "S":
+        return len(inner.encode("utf-8"))
+    elif type_ == "N":
+        return len(inner) // 2 + 1
+    elif type_ == "B":
+        return len(inner)
+    elif type_ in ("BOOL", "NULL"):
+        return 1
+    elif type_ in ("SS", "NS", "BS"):
+        return sum(_value_size({type_[0]: x}) for x in inner)
+    elif type_ == "M":
+        return 3 + sum(len(k.encode("utf-8")) + 1 + _value_size(v) for k, v in inner.items())
+    return 3 + sum(1 + _value_size(v) for v in inner)
@@ -0,0 +1,202 @@
+import concurrent.futures
+import logging
+import threading
+import time
+
+from ..checkpoints import MemoryCheckpointStore
+from ..session import BATCH_WRITE_ITEM_CHUNK_SIZE
+from ..util import dump_item
+from .limits import RateLimiter, read_units, write_units
+from .scan import ScanJob
+from .writes import BatchWriter, chunk_items
+
+
+__all__ = ["Migration"]
+
+logger = logging.getLogger("bloop.bulk")
+
+
+def migration_name(engine, source, target_engine, target, segments):
+    """Default checkpoint name for a migration: "migrate:<source table>:<target table>:<segments>"
+
+    The segment count is part of the name because tokens from one split can't resume another.
+    """
+    # noinspection PyProtectedMember
+    return "migrate:{}:{}:{}".format(
+        engine._compute_table_name(source), target_engine._compute_table_name(target), segments)
+
+
+class Migration:
+    """Copies every object in one model's table into another, passing each through a transform.
+
+    The source table is read with a :class:`~bloop.bulk.ScanJob`; each segment collects up to 25 objects,
+    transforms them, and writes the results to the target with a single BatchWriteItem before moving on.
+    A segment's checkpoint is only saved once every object before it has been written, so a migration that
+    is interrupted resumes without skipping any objects.
+
+    .. code-block:: python
+
+        def rekey(user):
+            return UserByEmail(email=user.email, id=user.id, name=user.name)
+
+        migration = Migration(engine, User, rekey, target=UserByEmail, segments=8, write_units=200)
+        migration.run(dry_run=True)
+        # {"scanned": 1302, "written": 1302, "skipped": 0, ...}
+        migration.run()
+
+    Objects are written at least once: anything written after the last checkpoint is written again on resume.
+
+    :param engine: The :class:`~bloop.engine.Engine` to scan the source through.
+    :param source: The model to copy from.
+    :param transform: *(Optional)* Called with each source object; returns an instance of ``target``, or None to
+        skip the object.  Must be picklable when ``processes`` is set.  Default copies each object unchanged.
+    :param target: *(Optional)* The model to write to.  Default is ``source``.
+    :param target_engine: *(Optional)* The :class:`~bloop.engine.Engine` to write through, for example one
+        with a different ``table_name_template``.  Default is ``engine``.
+    :param str name: *(Optional)* Checkpoint name.  Defaults to the source and target tables and segment count.
+    :param int segments: *(Optional)* Number of parallel scan segments.  Default is 1.
+    :param filter: *(Optional)* Filter condition.  Only matching objects are migrated.
+    :param bool consistent: *(Optional)* Use strongly consistent reads if True.  Default is False.
+    :param store: *(Optional)* Where segment checkpoints are persisted.
+        Defaults to a :class:`~bloop.checkpoints.MemoryCheckpointStore`.
+    :type store: :class:`~bloop.checkpoints.CheckpointStore`
+    :param int checkpoint_every: *(Optional)* Checkpoint after this many objects in a segment.  Default is 1000.
+    :param float read_units: *(Optional)* Maximum read units to consume per second, estimated from the size of
+        each scanned item.  Default is no limit.
+    :param float write_units: *(Optional)* Maximum write units to consume per second.  Default is no limit.
+    :param int processes: *(Optional)* Run ``transform`` in a pool of this many processes.
+        Default is None (transform in each segment's thread).
+    """
+    def __init__(
+            self, engine, source, transform=None, *, target=None, target_engine=None, name=None, segments=1,
+            filter=None, consistent=False, store=None, checkpoint_every=1000, read_units=None, write_units=None,
+            processes=None):
+        if processes is not None and processes < 1:
+            raise ValueError("processes must be at least 1 but was {}".format(processes))
+        self.engine = engine
+        self.source = source
+        self.transform = transform
+        self.target = target or source
+        self.target_engine = target_engine or engine
+        self.segments = segments
+        self.name = name or migration_name(engine, source, self.target_engine, self.target, segments)
+        self.filter = filter
+        self.consistent = consistent
+        self.store = store or MemoryCheckpointStore()
+        self.checkpoint_every = checkpoint_every
+        self.read_units = read_units
+        self.write_units = write_units
+        self.processes = processes
+        # validates segments and checkpoint_every
+        self.job(self.store)
+
+    def __repr__(self):
+        return "<{}[{}]>".format(self.__class__.__name__, self.name)
+
+    def job(self, store):
+        """The :class:`~bloop.bulk.ScanJob` over the source table, checkpointing to ``store``"""
+        return ScanJob(
+            self.engine, self.source, name=self.name, segments=self.segments, filter=self.filter,
+            consistent=self.consistent, store=store, checkpoint_every=self.checkpoint_every)
+
+    @property
+    def done(self):
+        """True when every segment has been migrated."""
+        return self.job(self.store).done
+
+    def reset(self):
+        """Delete all checkpoints so the next run starts from the beginning of the source table."""
+        self.job(self.store).reset()
+
+    def run(self, dry_run=False, max_workers=None):
+        """Migrate every segment concurrently, resuming each from its last checkpoint.
+
+        If any segment fails, the remaining segments stop at their next batch and the exception is re-raised.
+
+        :param bool dry_run: Scan the whole source table and transform each object, but report what would be
+            written instead of writing it.  Checkpoints are neither used nor saved.  Default is False.
+        :param int max_workers: *(Optional)* Number of threads.  Defaults to one per segment.
+        :return: A report with "scanned", "written", "skipped", "batches", "retries", "throttled", "read_units",
+            "write_units", "elapsed", and "dry_run".  Unit counts for a dry run are estimates.
+        :rtype: dict
+        """
+        # A dry run always covers the whole table and never touches the real checkpoints
+        job = self.job(MemoryCheckpointStore() if dry_run else self.store)
+        writer = BatchWriter(self.target_engine, self.target, write_units_per_second=self.write_units)
+        read_limiter = RateLimiter(self.read_units)
+        stats = {"scanned": 0, "skipped": 0, "read_units": 0.0, "written": 0, "batches": 0, "write_units": 0}
+        lock = threading.Lock()
+        failed = False
+
+        def count(name, amount):
+            with lock:
+                stats[name] += amount
+
+        def migrate(objs, pool):
+            if self.transform is None:
+                transformed = objs
+            elif pool is not None:
+                transformed = list(pool.map(self.transform, objs))
+            else:
+                transformed = [self.transform(obj) for obj in objs]
+            items = []
+            for obj in transformed:
+                if obj is None:
+                    continue
+                if not isinstance(obj, self.target):
+                    raise ValueError("transform must return an instance of {} or None but returned {!r}".format(
+                        self.target.__name__, obj))
+                items.append(dump_item(self.target_engine, obj))
+            count("skipped", len(objs) - len(items))
+            if dry_run:
+                count("written", len(items))
+                count("batches", sum(1 for _ in chunk_items(items, writer.key_shape)))
+                count("write_units", sum(write_units(attrs) for attrs in items))
+            else:
+                writer.write_all(items)
+
+        def consume(segment, pool):
+            pending = []
+
+            def flush():
+                if pending:
+                    migrate(pending, pool)
+                    pending.clear()
+
+            for obj, attrs in job.segment(segment, before_checkpoint=flush, with_attrs=True):
+                if failed:
+                    break
+                units = read_units(attrs, self.consistent)
+                read_limiter.acquire(units)
+                count("read_units", units)
+                count("scanned", 1)
+                pending.append(obj)
+                if len(pending) >= BATCH_WRITE_ITEM_CHUNK_SIZE:
+                    flush()
+
+        start = time.monotonic()
+        pool = concurrent.futures.ProcessPoolExecutor(self.processes) if self.processes and self.transform else None
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers or self.segments) as executor:
+                futures = [executor.submit(consume, segment, pool) for segment in range(self.segments)]
+                try:
+                    for future in concurrent.futures.as_completed(futures):
+                        future.result()
+                except BaseException:
+                    failed = True
+                    raise
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        elapsed = time.monotonic() - start
+        if not dry_run:
+            for name in ("batches", "write_units"):
+                stats[name] = writer.stats[name]
+            stats["written"] = writer.stats["count"]
+        report = dict(
+            stats, retries=writer.stats["retries"], throttled=writer.stats["throttled"],
+            elapsed=elapsed, dry_run=dry_run)
+        logger.info("{} {} {} of {} objects in {:.2f}s".format(
+            self, "would write" if dry_run else "wrote", report["written"], report["scanned"], elapsed))
+        return report
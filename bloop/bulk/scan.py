@@ -0,0 +1,211 @@
+import concurrent.futures
+import logging
+import time
+
+from ..checkpoints import MemoryCheckpointStore
+from ..models import Index
+from .formats import dump_wire, load_wire
+
+
+__all__ = ["ScanJob"]
+
+logger = logging.getLogger("bloop.bulk")
+
+
+def job_name(engine, model_or_index, segments):
+    """Default checkpoint name for a job: "scan:<table>[.<index>]:<segments>"
+
+    The segment count is part of the name because tokens from one split can't resume another.
+    """
+    if isinstance(model_or_index, Index):
+        model, index = model_or_index.model, model_or_index
+    else:
+        model, index = model_or_index, None
+    # noinspection PyProtectedMember
+    name = "scan:" + engine._compute_table_name(model)
+    if index is not None:
+        name += "." + index.dynamo_name
+    return "{}:{}".format(name, segments)
+
+
+def dump_token(token):
+    """json-friendly copy of a :attr:`SearchIterator.token <bloop.search.SearchIterator.token>`"""
+    return {"ExclusiveStartKey": dump_wire(token["ExclusiveStartKey"])}
+
+
+def load_token(token):
+    """Inverse of :func:`~bloop.bulk.scan.dump_token`"""
+    return {"ExclusiveStartKey": load_wire(token["ExclusiveStartKey"])}
+
+
+class ScanJob:
+    """A full-table scan that periodically checkpoints its progress and resumes from the last checkpoint.
+
+    Each of the job's ``segments`` is a :class:`~bloop.search.ScanIterator` over one segment of a
+    `parallel scan`__.  After an object is consumed the segment's
+    :attr:`ScanIterator.token <bloop.search.SearchIterator.token>` is saved to the ``store`` every
+    ``checkpoint_every`` objects or ``checkpoint_interval`` seconds, whichever comes first.  When a new job
+    with the same name is created, each segment starts from its last checkpoint and finished segments are skipped.
+
+    .. code-block:: python
+
+        store = SQLiteCheckpointStore("scans.db")
+        job = ScanJob(engine, User, segments=8, store=store)
+
+        # Process all segments in parallel; safe to re-run after a crash
+        job.run(send_welcome_email)
+
+    Objects are consumed at least once: anything processed after the last checkpoint is scanned again on resume.
+
+    :param engine: The :class:`~bloop.engine.Engine` to scan through.
+    :param model_or_index: A model or index to scan.  For example, ``User`` or ``User.by_email``.
+    :param str name: *(Optional)* Checkpoint name for this job.  Defaults to the table, index, and segment count.
+    :param int segments: *(Optional)* Number of parallel scan segments.  Default is 1.
+    :param filter: *(Optional)* Filter condition.  Only matching objects will be included in the results.
+    :param projection: *(Optional)* "all", a set of column names, or a set of :class:`~bloop.models.Column`.
+        Default is "all".
+    :param bool consistent: *(Optional)* Use strongly consistent reads if True.  Default is False.
+    :param store: *(Optional)* Where segment checkpoints are persisted.
+        Defaults to a :class:`~bloop.checkpoints.MemoryCheckpointStore`.
+    :type store: :class:`~bloop.checkpoints.CheckpointStore`
+    :param int checkpoint_every: *(Optional)* Checkpoint after this many objects in a segment.  Default is 1000.
+    :param float checkpoint_interval: *(Optional)* Checkpoint after this many seconds in a segment.
+        Default is None (only checkpoint by count).
+
+    __ http://docs.aws.amazon.com/amazondynamodb/latest/developerguide/QueryAndScan.html#QueryAndScanParallelScan
+    """
+    def __init__(
+            self, engine, model_or_index, *, name=None, segments=1, filter=None, projection="all",
+            consistent=False, store=None, checkpoint_every=1000, checkpoint_interval=None):
+        if segments < 1:
+            raise ValueError("segments must be at least 1 but was {}".format(segments))
+        if checkpoint_every < 1:
+            raise ValueError("checkpoint_every must be at least 1 but was {}".format(checkpoint_every))
+        self.engine = engine
+        self.model_or_index = model_or_index
+        self.segments = segments
+        self.name = name or job_name(engine, model_or_index, segments)
+        self.filter = filter
+        self.projection = projection
+        self.consistent = consistent
+        self.store = store or MemoryCheckpointStore()
+        self.checkpoint_every = checkpoint_every
+        self.checkpoint_interval = checkpoint_interval
+
+    def __repr__(self):
+        return "<{}[{}]>".format(self.__class__.__name__, self.name)
+
+    def __iter__(self):
+        """Yield every object from each segment in turn, checkpointing along the way."""
+        for segment in range(self.segments):
+            yield from self.segment(segment)
+
+    @property
+    def done(self):
+        """True when every segment has been scanned to the end."""
+        return all(state["exhausted"] for state in self.status().values())
+
+    def status(self):
+        """Current checkpoint for each segment.
+
+        :return: Dict of segment number to ``{"token": ..., "count": int, "exhausted": bool}``
+        :rtype: dict
+        """
+        return {segment: self._load(segment) for segment in range(self.segments)}
+
+    def reset(self):
+        """Delete all checkpoints so the next run starts from the beginning of the table."""
+        for segment in range(self.segments):
+            self.store.delete(self._checkpoint_name(segment))
+
+    def segment(self, segment, before_checkpoint=None, with_attrs=False):
+        """Generator over the objects in a single segment, resuming from and saving to its checkpoint.
+
+        The checkpoint is saved *after* the consumer asks for the next object, so an object is only
+        considered consumed once the consumer is done with it.
+
+        :param int segment: Which segment to scan, from 0 to ``segments - 1``.
+        :param before_checkpoint: *(Optional)* Called with no arguments right before each checkpoint is saved.
+            Consumers that buffer objects can use this to finish with them before they're checkpointed.
+        :param bool with_attrs: *(Optional)* Yield ``(obj, attrs)`` pairs with the item each object was loaded
+            from, as DynamoDB returned it.  Default is False.
+        """
+        if not 0 <= segment < self.segments:
+            raise ValueError("segment must be in [0, {}) but was {}".format(self.segments, segment))
+        name = self._checkpoint_name(segment)
+        state = self._load(segment)
+        if state["exhausted"]:
+            logger.debug("{} already finished segment {}".format(self, segment))
+            return
+
+        iterator = self.engine.scan(
+            self.model_or_index, filter=self.filter, projection=self.projection, consistent=self.consistent,
+            parallel=(segment, self.segments) if self.segments > 1 else None)
+        if state["token"] is not None:
+            logger.debug("{} resuming segment {} after {} objects".format(self, segment, state["count"]))
+            iterator.move_to(load_token(state["token"]))
+
+        pending, last_checkpoint = 0, time.monotonic()
+        for obj in iterator:
+            if with_attrs:
+                # noinspection PyProtectedMember
+                yield obj, iterator._last_yielded
+            else:
+                yield obj
+            state["count"] += 1
+            pending += 1
+            if pending >= self.checkpoint_every or self._interval_elapsed(last_checkpoint):
+                if before_checkpoint is not None:
+                    before_checkpoint()
+                state["token"] = dump_token(iterator.token)
+                self.store.save(name, state)
+                pending, last_checkpoint = 0, time.monotonic()
+
+        if before_checkpoint is not None:
+            before_checkpoint()
+        state["token"] = dump_token(iterator.token)
+        state["exhausted"] = True
+        self.store.save(name, state)
+        logger.info("{} finished segment {} with {} objects".format(self, segment, state["count"]))
+
+    def run(self, func, max_workers=None):
+        """Call ``func(obj)`` for every object, scanning segments concurrently.
+
+        If ``func`` raises, the remaining segments stop at their next object and the exception is re-raised.
+        Work done before the failure is preserved in each segment's checkpoint.
+
+        :param func: Called once with each object.
+        :param int max_workers: *(Optional)* Number of threads.  Defaults to one per segment.
+        :return: Number of objects processed by this call.
+        :rtype: int
+        """
+        failed = False
+
+        def consume(segment):
+            processed = 0
+            for obj in self.segment(segment):
+                if failed:
+                    break
+                func(obj)
+                processed += 1
+            return processed
+
+        total = 0
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers or self.segments) as executor:
+            futures = [executor.submit(consume, segment) for segment in range(self.segments)]
+            try:
+                for future in concurrent.futures.as_completed(futures):
+                    total += future.result()
+            except BaseException:
+                failed = True
+                raise
+        return total
+
+    def _checkpoint_name(self, segment):
+        return "{}/{}".format(self.name, segment)
+
+    def _load(self, segment):
+        return self.store.load(self._checkpoint_name(segment)) or {"token": None, "count": 0, "exhausted": False}
+
+    def _interval_elapsed(self, since):
+        return self.checkpoint_interval is not None and time.monotonic() - since >= self.checkpoint_interval
@@ -0,0 +1,114 @@
+import contextlib
+import threading
+import time
+
+from ..exceptions import ThroughputExceeded
+from ..metrics import timed_phase
+from ..session import BATCH_WRITE_ITEM_CHUNK_SIZE
+from ..tracing import span
+from ..util import extract_key, index_for
+from .limits import RateLimiter, write_units
+
+
+__all__ = ["BatchWriter", "chunk_items"]
+
+
+def chunk_items(items, key_shape, size=BATCH_WRITE_ITEM_CHUNK_SIZE):
+    """Group items into lists of at most ``size``, starting a new list early instead of repeating a key.
+
+    BatchWriteItem rejects a request with two operations on the same key.
+
+    :param items: Iterable of items in DynamoDB's wire format.
+    :param key_shape: The dynamo names of the table's key columns.
+    """
+    chunk, keys = [], set()
+    for attrs in items:
+        key = index_for(extract_key(key_shape, attrs))
+        if key in keys or len(chunk) == size:
+            yield chunk
+            chunk, keys = [], set()
+        chunk.append(attrs)
+        keys.add(key)
+    if chunk:
+        yield chunk
+
+
+class BatchWriter:
+    """Puts batches of items into one table, retrying unprocessed items and throttled requests with backoff.
+
+    Safe to share between threads: the rate limit and :attr:`stats` are shared by every caller.
+
+    :param engine: The :class:`~bloop.engine.Engine` whose session sends each BatchWriteItem.
+    :param model: The model whose table the items are written to.
+    :param float write_units_per_second: *(Optional)* Maximum write units to consume per second.  Default is no limit.
+    :param int max_attempts: *(Optional)* Calls per batch before giving up.  Default is 10.
+    :param float backoff: *(Optional)* Seconds to wait before the first retry, doubled after each retry.
+    :param float max_backoff: *(Optional)* Longest wait between retries.
+    """
+    def __init__(
+            self, engine, model, *, write_units_per_second=None,
+            max_attempts=10, backoff=0.05, max_backoff=5.0):
+        self.engine = engine
+        # noinspection PyProtectedMember
+        self.table_name = engine._compute_table_name(model)
+        self.key_shape = sorted(column.dynamo_name for column in model.Meta.keys)
+        self.limiter = RateLimiter(write_units_per_second)
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        #: Running totals of "count", "batches", "retries", "throttled", and "write_units"
+        self.stats = {"count": 0, "batches": 0, "retries": 0, "throttled": 0, "write_units": 0}
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "<{}[{}]>".format(self.__class__.__name__, self.table_name)
+
+    def write(self, batch):
+        """Put at most 25 items with distinct keys, blocking until every item is processed.
+
+        :raises bloop.exceptions.ThroughputExceeded: if items are still unprocessed after ``max_attempts`` calls.
+        """
+        units = sum(write_units(attrs) for attrs in batch)
+        requests = {self.table_name: [{"PutRequest": {"Item": attrs}} for attrs in batch]}
+        attributes = {"bloop.items": len(batch), "bloop.write_units": units}
+        with span("bloop.bulk.batch_write", request={"TableName": self.table_name}, attributes=attributes) as outer:
+            self.limiter.acquire(units)
+            attempt, delay, throttled = 0, self.backoff, 0
+            try:
+                while requests:
+                    attempt += 1
+                    with span("bloop.bulk.batch_write.attempt", attributes={"bloop.attempt": attempt}) as scope:
+                        try:
+                            # Backoff sleeps and resubmissions are both timed as "retries"
+                            with timed_phase("retries", "batch_write") if attempt > 1 else contextlib.nullcontext():
+                                requests = self.engine.session.write_items(requests)
+                        except ThroughputExceeded:
+                            scope.set_attribute("bloop.throttled", True)
+                            throttled += 1
+                            self._count("throttled", 1)
+                            if attempt >= self.max_attempts:
+                                raise
+                        else:
+                            if not requests:
+                                break
+                            if attempt >= self.max_attempts:
+                                raise ThroughputExceeded("{} items unprocessed after {} attempts".format(
+                                    len(requests[self.table_name]), attempt))
+                            self._count("retries", 1)
+                    with timed_phase("retries", "batch_write"):
+                        time.sleep(delay)
+                    delay = min(self.max_backoff, delay * 2)
+            finally:
+                outer.set_attribute("bloop.attempts", attempt)
+                outer.set_attribute("bloop.throttled", throttled)
+        self._count("count", len(batch), "batches", 1, "write_units", units)
+
+    def write_all(self, items):
+        """Put any number of items, splitting them into batches with :func:`~bloop.bulk.writes.chunk_items`."""
+        for batch in chunk_items(items, self.key_shape):
+            self.write(batch)
+
+    def _count(self, *pairs):
+        with self._lock:
+            for name, amount in zip(pairs[::2], pairs[1::2]):
+                self.stats[name] += amount
@@ -0,0 +1,239 @@
+import functools
+import json
+import os
+import pathlib
+import sqlite3
+import tempfile
+import threading
+from typing import Dict, Optional
+
+from .exceptions import MissingObjects
+from .models import BaseModel, Column
+from .types import String
+
+
+__all__ = [
+    "CheckpointStore", "DynamoDBCheckpointStore",
+    "FileCheckpointStore", "MemoryCheckpointStore", "SQLiteCheckpointStore",
+]
+
+
+class CheckpointStore:
+    """Persists json-friendly checkpoints by name.
+
+    Subclasses must implement :func:`~bloop.checkpoints.CheckpointStore.load`,
+    :func:`~bloop.checkpoints.CheckpointStore.save`, and :func:`~bloop.checkpoints.CheckpointStore.delete`.
+    Implementations must be safe to call from multiple threads.
+
+    .. code-block:: python
+
+        class RedisCheckpointStore(CheckpointStore):
+            def __init__(self, client):
+                self.client = client
+
+            def load(self, name):
+                value = self.client.get(name)
+                return json.loads(value) if value else None
+
+            def save(self, name, value):
+                self.client.set(name, json.dumps(value))
+
+            def delete(self, name):
+                self.client.delete(name)
+    """
+    def load(self, name: str) -> Optional[dict]:
+        """Return the last value saved for ``name``, or None if there isn't one.
+
+        :param str name: Unique name for the checkpoint.
+        """
+        raise NotImplementedError
+
+    def save(self, name: str, value: dict) -> None:
+        """Persist ``value`` under ``name``, replacing any existing value.
+
+        :param str name: Unique name for the checkpoint.
+        :param dict value: A json-friendly dict.
+        """
+        raise NotImplementedError
+
+    def delete(self, name: str) -> None:
+        """Remove the checkpoint for ``name``.  Does not raise if there isn't one.
+
+        :param str name: Unique name for the checkpoint.
+        """
+        raise NotImplementedError
+
+
+class MemoryCheckpointStore(CheckpointStore):
+    """Keeps checkpoints in a dict.  Checkpoints are lost when the process exits.
+
+    Values are round-tripped through json so that a checkpoint which works here will also work with
+    the persistent stores.
+    """
+    def __init__(self):
+        self.checkpoints: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def load(self, name):
+        with self._lock:
+            value = self.checkpoints.get(name)
+        return None if value is None else json.loads(value)
+
+    def save(self, name, value):
+        value = json.dumps(value)
+        with self._lock:
+            self.checkpoints[name] = value
+
+    def delete(self, name):
+        with self._lock:
+            self.checkpoints.pop(name, None)
+
+
+class FileCheckpointStore(CheckpointStore):
+    """Keeps all checkpoints in a single json file.
+
+    The file is rewritten on every save by writing to a temporary file in the same directory and then
+    replacing the original, so a crash mid-write never leaves a partial file behind.
+
+    :param path: Location of the json file.  Created on the first save.
+    """
+    def __init__(self, path):
+        self.path = pathlib.Path(path)
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "<{}[{}]>".format(self.__class__.__name__, self.path)
+
+    def load(self, name):
+        with self._lock:
+            return self._read().get(name)
+
+    def save(self, name, value):
+        with self._lock:
+            checkpoints = self._read()
+            checkpoints[name] = value
+            self._write(checkpoints)
+
+    def delete(self, name):
+        with self._lock:
+            checkpoints = self._read()
+            if checkpoints.pop(name, None) is not None:
+                self._write(checkpoints)
+
+    def _read(self):
+        try:
+            return json.loads(self.path.read_text())
+        except FileNotFoundError:
+            return {}
+
+    def _write(self, checkpoints):
+        write_json_atomic(self.path, checkpoints)
+
+
+def write_json_atomic(path, value):
+    """Write ``value`` as json to a temporary file next to ``path`` and then replace ``path`` with it."""
+    path = pathlib.Path(path)
+    fd, tmp = tempfile.mkstemp(dir=str(path.parent), prefix=path.name, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(value, f)
+        os.replace(tmp, str(path))
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+class SQLiteCheckpointStore(CheckpointStore):
+    """Keeps checkpoints in a SQLite table.
+
+    Unlike :class:`~bloop.checkpoints.FileCheckpointStore` each save only writes a single row, which is
+    a better fit for frequent checkpoints across many names.
+
+    :param path: Location of the database file, or ":memory:".
+    :param str table: *(Optional)* Table to store checkpoints in.  Default is "bloop_checkpoints".
+    """
+    def __init__(self, path, table="bloop_checkpoints"):
+        self.path = str(path)
+        self.table = table
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS {} (name TEXT PRIMARY KEY, value TEXT NOT NULL)".format(table))
+
+    def __repr__(self):
+        return "<{}[{}]>".format(self.__class__.__name__, self.path)
+
+    def load(self, name):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM {} WHERE name = ?".format(self.table), (name,)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def save(self, name, value):
+        value = json.dumps(value)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO {} (name, value) VALUES (?, ?)".format(self.table), (name, value))
+
+    def delete(self, name):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM {} WHERE name = ?".format(self.table), (name,))
+
+    def close(self):
+        """Close the underlying connection."""
+        with self._lock:
+            self._conn.close()
+
+
+@functools.lru_cache(maxsize=None)
+def default_checkpoint_model():
+    """The model used by :class:`~bloop.checkpoints.DynamoDBCheckpointStore` when none is provided.
+
+    Created on first use so that ``engine.bind(BaseModel)`` doesn't pick it up for applications that never use it.
+    """
+    class Checkpoint(BaseModel):
+        class Meta:
+            table_name = "bloop-checkpoints"
+            billing = {"mode": "on_demand"}
+        name = Column(String, hash_key=True)
+        value = Column(String)
+    return Checkpoint
+
+
+class DynamoDBCheckpointStore(CheckpointStore):
+    """Keeps checkpoints in a DynamoDB table, so consumers on different hosts can share them.
+
+    Each checkpoint is one item, with the value stored as a json string.
+
+    .. code-block:: python
+
+        store = DynamoDBCheckpointStore(engine)
+        stream = engine.stream(User, "trim_horizon", checkpoint=StreamCheckpointer(store, "user-stream"))
+
+    :param engine: Engine used to load and save checkpoints.  The model is bound to it immediately.
+    :type engine: :class:`~bloop.engine.Engine`
+    :param model: *(Optional)* Model with a ``name`` String hash key and a ``value`` String column.
+        Default is a model for an on-demand table named "bloop-checkpoints", which is created if it doesn't exist.
+    """
+    def __init__(self, engine, model=None):
+        self.engine = engine
+        self.model = model or default_checkpoint_model()
+        engine.bind(self.model)
+
+    def __repr__(self):
+        return "<{}[{}]>".format(self.__class__.__name__, self.model.__name__)
+
+    def load(self, name):
+        obj = self.model(name=name)
+        try:
+            self.engine.load(obj, consistent=True)
+        except MissingObjects:
+            return None
+        return None if obj.value is None else json.loads(obj.value)
+
+    def save(self, name, value):
+        self.engine.save(self.model(name=name, value=json.dumps(value)))
+
+    def delete(self, name):
+        self.engine.delete(self.model(name=name))
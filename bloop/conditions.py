@@ -7,6 +7,7 @@ from typing import Any
 
 from .actions import ActionType
 from .exceptions import InvalidCondition
+from .metrics import timed
 from .signals import object_modified
 from .util import default_context, missing
 
@@ -207,6 +208,7 @@ class ReferenceTracker:
                     del self.name_attr_index[path_segment]
 
 
+@timed("render")
 def render(engine, obj=None, filter=None, projection=None, key=None, condition=None, update=None):
     renderer = ConditionRenderer(engine)
     renderer.render(
@@ -1,6 +1,9 @@
+import functools
 import logging
 from typing import Any, Callable, Union
 
+from .bulk.export import export_table
+from .bulk.imports import import_table
 from .conditions import render
 from .exceptions import (
     InvalidModel,
@@ -8,6 +11,7 @@ from .exceptions import (
     InvalidTemplate,
     MissingObjects,
 )
+from .metrics import CapacityRegistry, timed_operation
 from .models import BaseModel, Index, subclassof, unpack_from_dynamodb
 from .search import Search
 from .session import SessionWrapper
@@ -20,6 +24,7 @@ from .signals import (
     object_saved,
 )
 from .stream import Stream
+from .tracing import get_tracer, span
 from .transactions import ReadTransaction, WriteTransaction
 from .util import dump_key, extract_key, index_for, walk_subclasses
 
@@ -41,6 +46,25 @@ _sync_values = {
 }
 
 
+def traced(operation):
+    """Open a ``bloop.engine.<operation>`` span around an engine method that takes ``*objs``"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(engine, *objs, **kwargs):
+            if get_tracer() is None:
+                return func(engine, *objs, **kwargs)
+            # noinspection PyProtectedMember
+            attributes = {
+                "db.system": "dynamodb",
+                "aws.dynamodb.table_names": sorted({engine._compute_table_name(obj.__class__) for obj in objs}),
+                "bloop.items": len(objs),
+            }
+            with span("bloop.engine." + operation, attributes=attributes):
+                return func(engine, *objs, **kwargs)
+        return wrapper
+    return decorator
+
+
 def validate_not_abstract(*objs):
     for obj in objs:
         if obj.Meta.abstract:
@@ -100,13 +124,20 @@ class Engine:
     :param table_name_template: Customize the table name of each model bound to the engine.  If a string
         is provided, string.format(table_name=model.Meta.table_name) will be called.  If a function is provided, the
         function will be called with the model as its sole argument.  Defaults to "{table_name}".
+    :param capacity: Track the capacity consumed by each request.  If True, a new
+        :class:`~bloop.metrics.CapacityRegistry` is created; pass an existing registry to share totals between
+        engines.  The registry is available as ``engine.capacity``.  Defaults to False.
     """
     def __init__(
             self, *,
             dynamodb=None, dynamodbstreams=None,
-            table_name_template: Union[str, TableNameFormatter] = "{table_name}"):
+            table_name_template: Union[str, TableNameFormatter] = "{table_name}",
+            capacity: Union[bool, CapacityRegistry] = False):
         self._compute_table_name = create_get_table_name_func(table_name_template)
-        self.session = SessionWrapper(dynamodb=dynamodb, dynamodbstreams=dynamodbstreams)
+        if capacity is True:
+            capacity = CapacityRegistry()
+        self.capacity = capacity or None
+        self.session = SessionWrapper(dynamodb=dynamodb, dynamodbstreams=dynamodbstreams, capacity=self.capacity)
 
     def bind(self, model, *, skip_table_setup=False):
         """Create backing tables for a model and its non-abstract subclasses.
@@ -160,6 +191,8 @@ class Engine:
 
         logger.info("successfully bound {} models to the engine".format(len(concrete)))
 
+    @timed_operation("delete")
+    @traced("delete")
     def delete(self, *objs, condition=None, sync=None):
         """Delete one or more objects.
 
@@ -185,6 +218,85 @@ class Engine:
             object_deleted.send(self, engine=self, obj=obj)
         logger.info("successfully deleted {} objects".format(len(objs)))
 
+    def export(
+            self, model_or_index, path, *, segments=1, format="dynamodb", compress=True,
+            filter=None, projection="all", consistent=False, resume=True, max_workers=None):
+        """Export a table or index to json lines files, one per parallel scan segment.
+
+        Each page of a scan is written straight from the wire format to its segment's part file, so memory use
+        stays at a few pages regardless of table size.  After every page the directory's ``manifest.json``
+        records each part's item count and scan token.  If an export is interrupted, calling export again with
+        the same arguments continues each segment from its last page.
+
+        .. code-block:: pycon
+
+            >>> manifest = engine.export(User, "exports/users", segments=4)
+            >>> manifest["count"]
+            1302
+            >>> [part["file"] for part in manifest["parts"]]
+            ['part-00000.jsonl.gz', 'part-00001.jsonl.gz', 'part-00002.jsonl.gz', 'part-00003.jsonl.gz']
+
+        :param model_or_index: A model or index to export.  For example, ``User`` or ``User.by_email``.
+        :param path: Directory to write the part files and manifest to.  Created if it doesn't exist.
+        :param int segments: Number of parallel scan segments, and part files.  Default is 1.
+        :param str format: "dynamodb" for DynamoDB JSON lines (``{"Item": {...}}``) or "json" for plain json
+            objects.  Plain json doesn't preserve sets or exact numbers.  Default is "dynamodb".
+        :param bool compress: Write gzip compressed part files.  Default is True.
+        :param filter: Filter condition.  Only matching objects will be exported.
+        :param projection: "all", a set of column names, or a set of :class:`~bloop.models.Column`.  Default is "all".
+        :param bool consistent: Use `strongly consistent reads`__ if True.  Default is False.
+        :param bool resume: Continue from an existing manifest in ``path``.  Default is True.
+        :param int max_workers: *(Optional)* Number of threads scanning segments.  Defaults to one per segment.
+        :return: The export's manifest.
+        :rtype: dict
+
+        __ http://docs.aws.amazon.com/amazondynamodb/latest/developerguide/HowItWorks.ReadConsistency.html
+        """
+        if isinstance(model_or_index, Index):
+            validate_not_abstract(model_or_index.model)
+        else:
+            validate_not_abstract(model_or_index)
+        return export_table(
+            self, model_or_index, path, segments=segments, format=format, compress=compress,
+            filter=filter, projection=projection, consistent=consistent, resume=resume, max_workers=max_workers)
+
+    def import_(self, model, path, *, format=None, workers=4, write_units=None, skip_invalid=False):
+        """Write every item from json lines files into a table with parallel BatchWriteItem calls.
+
+        Files are read one line at a time and packed into batches of 25 items, which a pool of worker threads
+        writes concurrently.  Unprocessed items and throttled batches are retried with exponential backoff.
+        Items are written exactly as they appear in the file: they are never loaded into model instances, and
+        no object_saved signals are sent.
+
+        .. code-block:: pycon
+
+            >>> report = engine.import_(User, "exports/users", workers=8, write_units=500)
+            >>> report["count"], report["invalid"]
+            (1302, 0)
+
+        :param model: The model whose table the items are written to.
+        :param path: A single ``.jsonl`` or ``.jsonl.gz`` file, or a directory written by
+            :func:`~bloop.engine.Engine.export`.  Directories without a ``manifest.json`` import every json lines
+            file in name order.
+        :param str format: "dynamodb" for DynamoDB JSON lines (``{"Item": {...}}``) or "json" for plain json
+            objects, which are converted using each column's type.  Default is the manifest's format, or "dynamodb".
+        :param int workers: Number of threads writing batches concurrently.  Default is 4.
+        :param float write_units: Maximum write capacity units to consume per second.  Default is no limit.
+        :param bool skip_invalid: Count and skip items that are missing a key or have a value of the wrong type
+            instead of raising.  Default is False.
+        :return: A report with "count", "invalid", "batches", "retries", "throttled", "write_units", "elapsed"
+            and "items_per_second".
+        :rtype: dict
+        :raises ValueError: if an item is invalid and ``skip_invalid`` is False.
+        :raises bloop.exceptions.ThroughputExceeded: if a batch is still throttled after repeated retries.
+        """
+        validate_not_abstract(model)
+        return import_table(
+            self, model, path, format=format, workers=workers, write_units_per_second=write_units,
+            skip_invalid=skip_invalid)
+
+    @timed_operation("load")
+    @traced("load")
     def load(self, *objs, consistent=False):
         """Populate objects from DynamoDB.
 
@@ -269,6 +381,8 @@ class Engine:
             projection=projection, consistent=consistent, forward=forward)
         return iter(q.prepare())
 
+    @timed_operation("save")
+    @traced("save")
     def save(self, *objs, condition=None, sync=None):
         """Save one or more objects.
 
@@ -320,7 +434,8 @@ class Engine:
             projection=projection, consistent=consistent, parallel=parallel)
         return iter(s.prepare())
 
-    def stream(self, model, position):
+    def stream(self, model, position, *, max_workers=None, seek_index=None, checkpoint=None, polling=None,
+               leases=None, filter=None, dispatch=None, maintenance=None, ordering="total"):
         # noinspection PyUnresolvedReferences
         """Create a :class:`~bloop.stream.Stream` that provides approximate chronological ordering.
 
@@ -351,6 +466,37 @@ class Engine:
 
         :param model: The model to stream records from.
         :param position: "trim_horizon", "latest", a stream token, or a :class:`datetime.datetime`.
+        :param int max_workers: *(Optional)* Poll up to this many shards at once from a thread pool.  Call
+            :meth:`Stream.close <bloop.stream.Stream.close>` when finished to stop the threads.
+            Default is None, which polls shards one at a time.
+        :param seek_index: *(Optional)* Records where each shard was at past times while consuming, and uses
+            those marks to move to a :class:`datetime.datetime` quickly.  Default is None.
+        :type seek_index: :class:`~bloop.stream.SeekIndex`
+        :param checkpoint: *(Optional)* Saves the stream's token as records are consumed.  When the checkpointer
+            has a saved token for this model's stream, the stream resumes from it instead of ``position``.
+            Default is None.
+        :type checkpoint: :class:`~bloop.stream.StreamCheckpointer`
+        :param polling: *(Optional)* Backs off polling shards that have caught up, and sets how long
+            :func:`Stream.next(timeout=...) <bloop.stream.Stream.next>` sleeps between polls.  Default is None,
+            which polls every shard each time.
+        :type polling: :class:`~bloop.stream.PollingPolicy`
+        :param leases: *(Optional)* Shares the stream's shards between every worker in the lease group, so only
+            the shards this worker holds a lease on are read.  Each shard resumes from its lease's checkpoint, so
+            don't combine this with ``checkpoint``.  Default is None.
+        :type leases: :class:`~bloop.stream.LeaseCoordinator`
+        :param filter: *(Optional)* Skips records by event type, key, or a condition on their new or old images
+            before they're unpacked into model instances.  Default is None.
+        :type filter: :class:`~bloop.stream.StreamFilter`
+        :param dispatch: *(Optional)* Unpacks each record as one of several models stored in ``model``'s table,
+            for single-table designs.  Default is None, which unpacks every record as ``model``.
+        :type dispatch: :class:`~bloop.stream.StreamDispatcher`
+        :param maintenance: *(Optional)* Refreshes shard iterators before they expire and finds child shards
+            before their parents close, from a background thread.  Call
+            :meth:`Stream.close <bloop.stream.Stream.close>` when finished to stop it.  Default is None.
+        :type maintenance: :class:`~bloop.stream.StreamMaintenance`
+        :param str ordering: *(Optional)* "total" returns records from all shards in the order they were created.
+            "shard" only keeps records in order within each shard, which is enough to see every change to an item
+            in order, and skips sorting records across shards.  Default is "total".
         :return: An iterator for records in all shards.
         :rtype: :class:`~bloop.stream.Stream`
         :raises bloop.exceptions.InvalidStream: if the model does not have a stream.
@@ -358,7 +504,21 @@ class Engine:
         validate_not_abstract(model)
         if not model.Meta.stream or not model.Meta.stream.get("arn"):
             raise InvalidStream("{!r} does not have a stream arn".format(model))
-        stream = Stream(model=model, engine=self)
+        if dispatch is not None:
+            for dispatched in dispatch.all_models:
+                validate_not_abstract(dispatched)
+        stream = Stream(
+            model=model, engine=self, max_workers=max_workers, seek_index=seek_index, checkpoint=checkpoint,
+            polling=polling, leases=leases, filter=filter, dispatch=dispatch,
+            maintenance=maintenance, ordering=ordering)
+        if checkpoint is not None:
+            token = checkpoint.load()
+            if token is not None:
+                if token.get("stream_arn") == model.Meta.stream["arn"]:
+                    position = token
+                else:
+                    logger.info("ignoring checkpoint {!r} from a different stream: {}".format(
+                        checkpoint.name, token.get("stream_arn")))
         stream.move_to(position=position)
         return stream
 
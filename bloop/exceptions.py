@@ -47,6 +47,14 @@ class MissingObjects(BloopException):
         self.objects = list(objects) if objects else []
 
 
+class ThroughputExceeded(BloopException):
+    """The request was throttled because it exceeded the table's provisioned or on-demand throughput."""
+
+
+class StaleReplica(BloopException):
+    """The local replica hasn't caught up with its table recently enough to serve reads."""
+
+
 class TableMismatch(BloopException):
     """The expected and actual tables for this Model do not match."""
 
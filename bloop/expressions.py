@@ -0,0 +1,629 @@
+"""Parses and evaluates DynamoDB expressions against items in DynamoDB's wire format.
+
+Conditions, key conditions and filters share one grammar; update and projection expressions have their own.
+Every parser resolves "#name" and ":value" placeholders as it goes and records which ones it used, so a
+request can reject placeholders that no expression referenced, just like DynamoDB does.
+
+Used by the in-memory backend, and to match stream records and replicated items against rendered conditions.
+Binary values may be str, as bloop renders them, or bytes, as botocore returns them in responses.  botocore
+sends a str as its utf-8 bytes, so both are compared as bytes.
+"""
+import decimal
+import re
+
+
+__all__ = [
+    "ExpressionParser", "ValidationError",
+    "apply_update", "evaluate", "project", "resolve", "values_equal",
+]
+
+# DynamoDB numbers have up to 38 significant digits
+NUMBER_CONTEXT = decimal.Context(prec=38)
+COMPARATORS = {"=", "<>", "<", "<=", ">", ">="}
+CONDITION_FUNCTIONS = {"attribute_exists", "attribute_not_exists", "attribute_type", "begins_with", "contains"}
+UPDATE_CLAUSES = {"SET", "REMOVE", "ADD", "DELETE"}
+SET_TYPES = {"SS": "S", "NS": "N", "BS": "B"}
+ORDERED_TYPES = {"S", "N", "B"}
+
+_tokens = re.compile(r"""
+    \s*(?:
+        (?P<name>\#[A-Za-z0-9_]+)
+      | (?P<value>:[A-Za-z0-9_]+)
+      | (?P<word>[A-Za-z_][A-Za-z0-9_]*)
+      | (?P<index>[0-9]+)
+      | (?P<op><>|<=|>=|=|<|>|[(),.\[\]+\-])
+    )""", re.VERBOSE)
+
+
+class ValidationError(ValueError):
+    """The request can't be processed, reported by the client as a "ValidationException"."""
+
+
+class ExpressionParser:
+    """Parses the expressions of a single request, sharing its placeholders.
+
+    :param dict names: The request's "ExpressionAttributeNames", if any.
+    :param dict values: The request's "ExpressionAttributeValues", if any.
+    """
+    def __init__(self, names=None, values=None):
+        self.names = names or {}
+        self.values = values or {}
+        self.used_names = set()
+        self.used_values = set()
+        self._tokens = []
+        self._position = 0
+
+    def check_unused(self):
+        """Raise if any placeholder wasn't referenced by an expression that this parser parsed."""
+        for field, unused in (
+                ("ExpressionAttributeNames", set(self.names) - self.used_names),
+                ("ExpressionAttributeValues", set(self.values) - self.used_values)):
+            if unused:
+                raise ValidationError("Value provided in {} unused in expressions: keys: {{{}}}".format(
+                    field, ", ".join(sorted(unused))))
+
+    def condition(self, expression):
+        """Parse a condition, filter, or key condition expression."""
+        self._start(expression)
+        node = self._or()
+        self._finish(expression)
+        return node
+
+    def projection(self, expression):
+        """Parse a projection expression into a list of paths."""
+        self._start(expression)
+        paths = [self._path()]
+        while self._accept(","):
+            paths.append(self._path())
+        self._finish(expression)
+        check_overlap(paths)
+        return paths
+
+    def update(self, expression):
+        """Parse an update expression into a list of ``(action, path, operand)``."""
+        self._start(expression)
+        actions, seen = [], set()
+        while self._peek() is not None:
+            kind, clause = self._next()
+            clause = clause.upper()
+            if kind != "word" or clause not in UPDATE_CLAUSES:
+                raise ValidationError("Invalid UpdateExpression: Syntax error; token: {!r}".format(clause))
+            if clause in seen:
+                raise ValidationError(
+                    "Invalid UpdateExpression: The \"{}\" section can only be used once".format(clause))
+            seen.add(clause)
+            while True:
+                path = self._path()
+                if clause == "SET":
+                    self._expect("=")
+                    actions.append(("SET", path, self._set_value()))
+                elif clause == "REMOVE":
+                    actions.append(("REMOVE", path, None))
+                else:
+                    actions.append((clause, path, self._operand()))
+                if not self._accept(","):
+                    break
+        if not actions:
+            raise ValidationError("Invalid UpdateExpression: The expression can not be empty")
+        check_overlap([path for _, path, _ in actions])
+        return actions
+
+    # TOKENS ============================================================================================== TOKENS
+
+    def _start(self, expression):
+        if not expression or not expression.strip():
+            raise ValidationError("Invalid expression: The expression can not be empty")
+        tokens, position = [], 0
+        expression = expression.rstrip()
+        while position < len(expression):
+            match = _tokens.match(expression, position)
+            if match is None:
+                raise ValidationError("Invalid expression: Syntax error at {!r}".format(expression[position:]))
+            tokens.append((match.lastgroup, match.group(match.lastgroup)))
+            position = match.end()
+        self._tokens, self._position = tokens, 0
+
+    def _finish(self, expression):
+        if self._peek() is not None:
+            raise ValidationError("Invalid expression: Syntax error; token: {!r} in {!r}".format(
+                self._peek()[1], expression))
+
+    def _peek(self, offset=0):
+        position = self._position + offset
+        return self._tokens[position] if position < len(self._tokens) else None
+
+    def _next(self):
+        token = self._peek()
+        if token is None:
+            raise ValidationError("Invalid expression: Syntax error; unexpected end of expression")
+        self._position += 1
+        return token
+
+    def _accept(self, symbol):
+        token = self._peek()
+        if token is not None and token[0] == "op" and token[1] == symbol:
+            self._position += 1
+            return True
+        return False
+
+    def _expect(self, symbol):
+        if not self._accept(symbol):
+            token = self._peek()
+            raise ValidationError("Invalid expression: Syntax error; expected {!r} but found {!r}".format(
+                symbol, token[1] if token else "<end>"))
+
+    def _keyword(self, word):
+        token = self._peek()
+        if token is not None and token[0] == "word" and token[1].upper() == word:
+            self._position += 1
+            return True
+        return False
+
+    def _function(self, names):
+        token, following = self._peek(), self._peek(1)
+        if token and token[0] == "word" and token[1] in names and following == ("op", "("):
+            self._position += 2
+            return token[1]
+        return None
+
+    # CONDITIONS ====================================================================================== CONDITIONS
+
+    def _or(self):
+        node = self._and()
+        while self._keyword("OR"):
+            node = ("or", node, self._and())
+        return node
+
+    def _and(self):
+        node = self._not()
+        while self._keyword("AND"):
+            node = ("and", node, self._not())
+        return node
+
+    def _not(self):
+        if self._keyword("NOT"):
+            return ("not", self._not())
+        return self._comparison()
+
+    def _comparison(self):
+        if self._accept("("):
+            node = self._or()
+            self._expect(")")
+            return node
+        function = self._function(CONDITION_FUNCTIONS)
+        if function is not None:
+            args = [self._path()]
+            if function in {"attribute_type", "begins_with", "contains"}:
+                self._expect(",")
+                args.append(self._operand())
+            self._expect(")")
+            return ("function", function, args)
+        left = self._operand()
+        token = self._peek()
+        if token is not None and token[0] == "op" and token[1] in COMPARATORS:
+            self._position += 1
+            return ("compare", token[1], left, self._operand())
+        if self._keyword("BETWEEN"):
+            low = self._operand()
+            if not self._keyword("AND"):
+                raise ValidationError("Invalid expression: BETWEEN requires AND")
+            return ("between", left, low, self._operand())
+        if self._keyword("IN"):
+            self._expect("(")
+            options = [self._operand()]
+            while self._accept(","):
+                options.append(self._operand())
+            self._expect(")")
+            return ("in", left, options)
+        raise ValidationError("Invalid expression: Syntax error; expected a comparison")
+
+    # OPERANDS ========================================================================================== OPERANDS
+
+    def _operand(self):
+        if self._function({"size"}):
+            path = self._path()
+            self._expect(")")
+            return ("size", path)
+        token = self._peek()
+        if token is not None and token[0] == "value":
+            self._position += 1
+            return ("value", self._value(token[1]))
+        return ("path", self._path())
+
+    def _set_value(self):
+        left = self._set_operand()
+        for symbol in ("+", "-"):
+            if self._accept(symbol):
+                return ("arithmetic", symbol, left, self._set_operand())
+        return left
+
+    def _set_operand(self):
+        function = self._function({"if_not_exists", "list_append"})
+        if function == "if_not_exists":
+            path = self._path()
+            self._expect(",")
+            node = ("if_not_exists", path, self._set_operand())
+        elif function == "list_append":
+            first = self._set_operand()
+            self._expect(",")
+            node = ("list_append", first, self._set_operand())
+        else:
+            return self._operand()
+        self._expect(")")
+        return node
+
+    def _path(self):
+        path = [self._name()]
+        while True:
+            if self._accept("."):
+                path.append(self._name())
+            elif self._accept("["):
+                kind, index = self._next()
+                if kind != "index":
+                    raise ValidationError("Invalid expression: list index must be an integer")
+                self._expect("]")
+                path.append(int(index))
+            else:
+                return tuple(path)
+
+    def _name(self):
+        kind, token = self._next()
+        if kind == "name":
+            if token not in self.names:
+                raise ValidationError(
+                    "Invalid expression: An expression attribute name used in the document path is not defined; "
+                    "attribute name: {}".format(token))
+            self.used_names.add(token)
+            return self.names[token]
+        if kind == "word":
+            return token
+        raise ValidationError("Invalid expression: Syntax error; token: {!r}".format(token))
+
+    def _value(self, token):
+        if token not in self.values:
+            raise ValidationError(
+                "Invalid expression: An expression attribute value used in expression is not defined; "
+                "attribute value: {}".format(token))
+        self.used_values.add(token)
+        return self.values[token]
+
+
+def check_overlap(paths):
+    """Raise if one path is a prefix of another, which DynamoDB rejects within an update or projection."""
+    ordered = sorted(paths, key=lambda path: (len(path), [str(segment) for segment in path]))
+    for i, path in enumerate(ordered):
+        for other in ordered[i + 1:]:
+            if other[:len(path)] == path:
+                raise ValidationError("Invalid expression: Two document paths overlap with each other")
+
+
+# EVALUATION ========================================================================================== EVALUATION
+
+
+def resolve(item, path):
+    """The typed value at ``path`` in ``item``, or None if any part of the path is missing."""
+    value = item.get(path[0])
+    for segment in path[1:]:
+        if value is None:
+            return None
+        if isinstance(segment, int):
+            inner = value.get("L")
+            value = inner[segment] if inner is not None and segment < len(inner) else None
+        else:
+            inner = value.get("M")
+            value = inner.get(segment) if inner is not None else None
+    return value
+
+
+def operand_value(item, node):
+    kind = node[0]
+    if kind == "value":
+        return node[1]
+    if kind == "path":
+        return resolve(item, node[1])
+    if kind == "size":
+        return size_of(resolve(item, node[1]))
+    if kind == "if_not_exists":
+        existing = resolve(item, node[1])
+        return existing if existing is not None else operand_value(item, node[2])
+    if kind == "list_append":
+        first, second = operand_value(item, node[1]), operand_value(item, node[2])
+        if first is None or second is None or "L" not in first or "L" not in second:
+            raise ValidationError("Invalid UpdateExpression: Incorrect operand type for operator or function; "
+                                  "operator or function: list_append")
+        return {"L": first["L"] + second["L"]}
+    if kind == "arithmetic":
+        left, right = operand_value(item, node[2]), operand_value(item, node[3])
+        if left is None or right is None:
+            raise ValidationError("The provided expression refers to an attribute that does not exist in the item")
+        if "N" not in left or "N" not in right:
+            raise ValidationError("An operand in the update expression has an incorrect data type")
+        operation = NUMBER_CONTEXT.add if node[1] == "+" else NUMBER_CONTEXT.subtract
+        return {"N": format_number(operation(decimal.Decimal(left["N"]), decimal.Decimal(right["N"])))}
+    raise ValidationError("Invalid expression: unknown operand {!r}".format(kind))  # pragma: no cover
+
+
+def size_of(value):
+    if value is None:
+        return None
+    (type_, inner), = value.items()
+    if type_ == "S":
+        return {"N": str(len(inner))}
+    if type_ == "B":
+        return {"N": str(len(to_bytes(inner)))}
+    if type_ in {"SS", "NS", "BS", "L", "M"}:
+        return {"N": str(len(inner))}
+    raise ValidationError("Invalid expression: Incorrect operand type for operator or function; "
+                          "operator or function: size, operand type: {}".format(type_))
+
+
+def format_number(number):
+    text = format(number.normalize(NUMBER_CONTEXT), "f")
+    return "0" if text in {"-0", "0"} else text
+
+
+def to_bytes(inner):
+    """A binary value as the bytes botocore would send for it."""
+    if isinstance(inner, str):
+        return inner.encode("utf-8")
+    return bytes(inner)
+
+
+def _typed(value):
+    (type_, inner), = value.items()
+    if type_ == "N":
+        return type_, decimal.Decimal(inner)
+    if type_ == "B":
+        return type_, to_bytes(inner)
+    if type_ in SET_TYPES:
+        if type_ == "NS":
+            return type_, frozenset(decimal.Decimal(number) for number in inner)
+        if type_ == "BS":
+            return type_, frozenset(to_bytes(element) for element in inner)
+        return type_, frozenset(inner)
+    return type_, inner
+
+
+def values_equal(left, right):
+    """True if two typed values are equal: numbers by value, sets without order, lists and maps deeply."""
+    if left is None or right is None:
+        return False
+    (left_type, left_inner), = left.items()
+    (right_type, right_inner), = right.items()
+    if left_type != right_type:
+        return False
+    if left_type == "L":
+        return len(left_inner) == len(right_inner) and all(map(values_equal, left_inner, right_inner))
+    if left_type == "M":
+        return left_inner.keys() == right_inner.keys() and all(
+            values_equal(value, right_inner[key]) for key, value in left_inner.items())
+    return _typed(left) == _typed(right)
+
+
+def _compare(operator, left, right):
+    if operator == "=":
+        return values_equal(left, right)
+    if operator == "<>":
+        return not values_equal(left, right)
+    if left is None or right is None:
+        return False
+    left_type, left_value = _typed(left)
+    right_type, right_value = _typed(right)
+    if left_type != right_type or left_type not in ORDERED_TYPES:
+        return False
+    if operator == "<":
+        return left_value < right_value
+    if operator == "<=":
+        return left_value <= right_value
+    if operator == ">":
+        return left_value > right_value
+    return left_value >= right_value
+
+
+def _function(name, item, args):
+    value = resolve(item, args[0])
+    if name == "attribute_exists":
+        return value is not None
+    if name == "attribute_not_exists":
+        return value is None
+    argument = operand_value(item, args[1])
+    if value is None or argument is None:
+        return False
+    (type_, inner), = value.items()
+    if name == "attribute_type":
+        return type_ == argument.get("S")
+    if name == "begins_with":
+        (argument_type, prefix), = argument.items()
+        if type_ == "B" and argument_type == "B":
+            return to_bytes(inner).startswith(to_bytes(prefix))
+        return type_ == "S" and argument_type == "S" and inner.startswith(prefix)
+    # contains
+    (argument_type, argument_inner), = argument.items()
+    if type_ == "S":
+        return argument_type == "S" and argument_inner in inner
+    if type_ in SET_TYPES:
+        return SET_TYPES[type_] == argument_type and _typed(argument)[1] in _typed(value)[1]
+    if type_ == "L":
+        return any(values_equal(element, argument) for element in inner)
+    return False
+
+
+def evaluate(node, item):
+    """True if ``item`` matches the parsed condition ``node``."""
+    kind = node[0]
+    if kind == "and":
+        return evaluate(node[1], item) and evaluate(node[2], item)
+    if kind == "or":
+        return evaluate(node[1], item) or evaluate(node[2], item)
+    if kind == "not":
+        return not evaluate(node[1], item)
+    if kind == "compare":
+        return _compare(node[1], operand_value(item, node[2]), operand_value(item, node[3]))
+    if kind == "between":
+        value = operand_value(item, node[1])
+        return _compare(">=", value, operand_value(item, node[2])) and \
+            _compare("<=", value, operand_value(item, node[3]))
+    if kind == "in":
+        value = operand_value(item, node[1])
+        return any(values_equal(value, operand_value(item, option)) for option in node[2])
+    if kind == "function":
+        return _function(node[1], item, node[2])
+    raise ValidationError("Invalid expression: unknown condition {!r}".format(kind))  # pragma: no cover
+
+
+# UPDATES ================================================================================================ UPDATES
+
+
+def apply_update(actions, item):
+    """Return a copy of ``item`` with the parsed update ``actions`` applied.
+
+    Every operand is read from the original item, so ``SET a = b, b = a`` swaps two attributes.
+    """
+    computed = []
+    for action, path, operand in actions:
+        if action == "SET":
+            value = operand_value(item, operand)
+            if value is None:
+                raise ValidationError(
+                    "The provided expression refers to an attribute that does not exist in the item")
+            computed.append((action, path, value))
+        elif action == "REMOVE":
+            computed.append((action, path, None))
+        else:
+            computed.append((action, path, _add_or_delete(action, resolve(item, path), operand_value(item, operand))))
+
+    updated = copy_item(item)
+    # Remove list elements from the highest index down so earlier removals don't shift later ones
+    removals = sorted(
+        (path for action, path, value in computed if action == "REMOVE" or value is None),
+        key=lambda path: [(0, segment) if isinstance(segment, int) else (1, segment) for segment in path],
+        reverse=True)
+    for action, path, value in computed:
+        if action != "REMOVE" and value is not None:
+            _assign(updated, path, value)
+    for path in removals:
+        _remove(updated, path)
+    return updated
+
+
+def _add_or_delete(action, existing, value):
+    (type_, inner), = value.items()
+    if action == "ADD":
+        if type_ != "N" and type_ not in SET_TYPES:
+            raise ValidationError("Invalid UpdateExpression: Incorrect operand type for operator or function; "
+                                  "operator: ADD, operand type: {}".format(type_))
+        if existing is None:
+            return value
+        if type_ == "N" and "N" in existing:
+            return {"N": format_number(NUMBER_CONTEXT.add(
+                decimal.Decimal(existing["N"]), decimal.Decimal(inner)))}
+        if type_ in existing:
+            return {type_: _merge_set(existing[type_], inner, type_)}
+    else:
+        if type_ not in SET_TYPES:
+            raise ValidationError("Invalid UpdateExpression: Incorrect operand type for operator or function; "
+                                  "operator: DELETE, operand type: {}".format(type_))
+        if existing is None:
+            return None
+        if type_ in existing:
+            removed = _typed(value)[1]
+            remaining = [
+                element for element in existing[type_]
+                if (decimal.Decimal(element) if type_ == "NS" else element) not in removed]
+            return {type_: remaining} if remaining else None
+    raise ValidationError("An operand in the update expression has an incorrect data type")
+
+
+def _merge_set(existing, added, type_):
+    merged = list(existing)
+    seen = {decimal.Decimal(element) if type_ == "NS" else element for element in existing}
+    for element in added:
+        key = decimal.Decimal(element) if type_ == "NS" else element
+        if key not in seen:
+            seen.add(key)
+            merged.append(element)
+    return merged
+
+
+def _container(item, path):
+    """The dict or list that holds the last segment of ``path``, or None if it doesn't exist."""
+    if len(path) == 1:
+        return item
+    parent = resolve(item, path[:-1])
+    if parent is None:
+        return None
+    segment = path[-1]
+    if isinstance(segment, int):
+        return parent.get("L")
+    return parent.get("M")
+
+
+def _assign(item, path, value):
+    container = _container(item, path)
+    segment = path[-1]
+    if container is None or isinstance(container, list) != isinstance(segment, int):
+        raise ValidationError("The document path provided in the update expression is invalid for update")
+    if isinstance(container, list):
+        if segment < len(container):
+            container[segment] = value
+        else:
+            container.append(value)
+    else:
+        container[segment] = value
+
+
+def _remove(item, path):
+    container = _container(item, path)
+    segment = path[-1]
+    if container is None or isinstance(container, list) != isinstance(segment, int):
+        return
+    if isinstance(container, list):
+        if segment < len(container):
+            del container[segment]
+    else:
+        container.pop(segment, None)
+
+
+# PROJECTIONS ======================================================================================== PROJECTIONS
+
+
+def project(item, paths):
+    """Copy only the attributes at ``paths``.  Selected list elements keep their relative order."""
+    tree = _Branch()
+    for path in paths:
+        value = resolve(item, path)
+        if value is None:
+            continue
+        node = tree
+        for segment in path[:-1]:
+            node = node.setdefault(segment, _Branch())
+        node[path[-1]] = copy_value(value)
+    return {name: _build(value) for name, value in tree.items()}
+
+
+class _Branch(dict):
+    """Part of a projected document that only some of the selected paths pass through"""
+
+
+def _build(node):
+    if not isinstance(node, _Branch):
+        return node
+    if all(isinstance(key, int) for key in node):
+        return {"L": [_build(node[key]) for key in sorted(node)]}
+    return {"M": {key: _build(value) for key, value in node.items()}}
+
+
+def copy_value(value):
+    (type_, inner), = value.items()
+    if type_ == "M":
+        return {"M": {key: copy_value(element) for key, element in inner.items()}}
+    if type_ == "L":
+        return {"L": [copy_value(element) for element in inner]}
+    if type_ in SET_TYPES:
+        return {type_: list(inner)}
+    return {type_: inner}
+
+
+def copy_item(item):
+    """Deep copy of an item, faster than :func:`copy.deepcopy` for DynamoDB's wire format."""
+    return {name: copy_value(value) for name, value in item.items()}
@@ -0,0 +1,4 @@
+from .client import MemoryDynamoDB, MemoryDynamoDBStreams
+
+
+__all__ = ["MemoryDynamoDB", "MemoryDynamoDBStreams"]
@@ -0,0 +1,791 @@
+import bisect
+import itertools
+import math
+import threading
+import time
+import uuid
+
+import botocore.exceptions
+
+from ..bulk.limits import item_size
+from ..expressions import (
+    ExpressionParser,
+    ValidationError,
+    apply_update,
+    copy_item,
+    evaluate,
+    project,
+)
+from .tables import TOP, Table, segment_bounds, sortable
+
+
+__all__ = ["MemoryDynamoDB", "MemoryDynamoDBStreams"]
+
+# https://docs.aws.amazon.com/amazondynamodb/latest/developerguide/ServiceQuotas.html
+BATCH_GET_LIMIT = 100
+BATCH_WRITE_LIMIT = 25
+TRANSACTION_LIMIT = 100
+PAGE_SIZE_LIMIT = 1024 * 1024
+CLIENT_TOKEN_LIFETIME = 600.0
+RETURN_VALUES = {"NONE", "ALL_OLD", "UPDATED_OLD", "ALL_NEW", "UPDATED_NEW"}
+SELECT_VALUES = {"ALL_ATTRIBUTES", "ALL_PROJECTED_ATTRIBUTES", "SPECIFIC_ATTRIBUTES", "COUNT"}
+RANGE_COMPARATORS = {"=", "<", "<=", ">", ">="}
+
+
+def client_error(code, message, operation):
+    """A :class:`botocore.exceptions.ClientError` shaped like the one boto3 raises for ``code``"""
+    return botocore.exceptions.ClientError(
+        {"Error": {"Code": code, "Message": message}, "ResponseMetadata": {"HTTPStatusCode": 400}},
+        operation)
+
+
+class MemoryDynamoDB:
+    """A pure-Python stand-in for ``boto3.client("dynamodb")`` that keeps every table in memory.
+
+    Pass it to an :class:`~bloop.engine.Engine` (or a :class:`~bloop.session.SessionWrapper`) in place of the
+    boto3 clients to test or load test code that uses bloop without DynamoDB Local or AWS:
+
+    .. code-block:: python
+
+        from bloop.memory import MemoryDynamoDB
+
+        dynamodb = MemoryDynamoDB()
+        engine = Engine(dynamodb=dynamodb, dynamodbstreams=dynamodb.streams)
+        engine.bind(BaseModel)
+
+    Supports the table, item, batch, query, scan, and transaction calls that bloop makes, including condition,
+    update, filter, key condition, and projection expressions, pagination, parallel scan segments, and
+    consumed capacity.  Each query only visits the range of its partition that the key condition selects.
+    Errors are raised as :class:`botocore.exceptions.ClientError` with DynamoDB's error codes.
+
+    Every call holds a single lock, so calls are atomic and the client is safe to share between threads.
+
+    :param throttle: *(Optional)* Called with the operation name and request before each call.  When it returns
+        True the call raises "ProvisionedThroughputExceededException" without doing anything.  For example,
+        ``throttle=lambda operation, request: random.random() < 0.05``.
+    :param int batch_limit: *(Optional)* Most keys or items a BatchGetItem or BatchWriteItem processes per call.
+        The rest are returned as unprocessed, like a partially throttled batch.  Default is no limit.
+    """
+    def __init__(self, *, throttle=None, batch_limit=None):
+        if batch_limit is not None and batch_limit < 1:
+            raise ValueError("batch_limit must be at least 1 but was {}".format(batch_limit))
+        self.throttle = throttle
+        self.batch_limit = batch_limit
+        self.tables = {}
+        self._lock = threading.RLock()
+        self._sequence = itertools.count(1)
+        self._client_tokens = {}
+        self.streams = MemoryDynamoDBStreams(self)
+
+    def __repr__(self):
+        return "<{}[{} tables]>".format(self.__class__.__name__, len(self.tables))
+
+    # TABLES ============================================================================================== TABLES
+
+    def create_table(self, **request):
+        return self._call("CreateTable", self._create_table, request)
+
+    def describe_table(self, **request):
+        return self._call("DescribeTable", lambda r: {"Table": self._table(r).describe()}, request)
+
+    def delete_table(self, **request):
+        return self._call("DeleteTable", self._delete_table, request)
+
+    def list_tables(self, **request):
+        return self._call("ListTables", lambda r: {"TableNames": sorted(self.tables)}, request)
+
+    def update_time_to_live(self, **request):
+        return self._call("UpdateTimeToLive", self._update_time_to_live, request)
+
+    def describe_time_to_live(self, **request):
+        return self._call(
+            "DescribeTimeToLive", lambda r: {"TimeToLiveDescription": dict(self._table(r).ttl)}, request)
+
+    def update_continuous_backups(self, **request):
+        return self._call("UpdateContinuousBackups", self._update_continuous_backups, request)
+
+    def describe_continuous_backups(self, **request):
+        return self._call("DescribeContinuousBackups", self._describe_continuous_backups, request)
+
+    # ITEMS ================================================================================================ ITEMS
+
+    def get_item(self, **request):
+        return self._call("GetItem", self._get_item, request)
+
+    def put_item(self, **request):
+        return self._call("PutItem", self._write_item, request, "put")
+
+    def update_item(self, **request):
+        return self._call("UpdateItem", self._write_item, request, "update")
+
+    def delete_item(self, **request):
+        return self._call("DeleteItem", self._write_item, request, "delete")
+
+    def batch_get_item(self, **request):
+        return self._call("BatchGetItem", self._batch_get_item, request)
+
+    def batch_write_item(self, **request):
+        return self._call("BatchWriteItem", self._batch_write_item, request)
+
+    def query(self, **request):
+        return self._call("Query", self._search, request, "query")
+
+    def scan(self, **request):
+        return self._call("Scan", self._search, request, "scan")
+
+    def transact_get_items(self, **request):
+        return self._call("TransactGetItems", self._transact_get_items, request)
+
+    def transact_write_items(self, **request):
+        return self._call("TransactWriteItems", self._transact_write_items, request)
+
+    # IMPLEMENTATION ============================================================================== IMPLEMENTATION
+
+    def _call(self, operation, method, request, *args):
+        if self.throttle is not None and self.throttle(operation, request):
+            raise client_error(
+                "ProvisionedThroughputExceededException",
+                "The level of configured provisioned throughput for the table was exceeded.", operation)
+        with self._lock:
+            try:
+                return method(request, *args)
+            except ValidationError as error:
+                raise client_error("ValidationException", str(error), operation) from None
+            except _ClientError as error:
+                raise client_error(error.code, str(error), operation) from None
+
+    def _table(self, request, name=None):
+        name = name or request.get("TableName")
+        table = self.tables.get(name)
+        if table is None:
+            raise ValidationError("Cannot do operations on a non-existent table") if name is None else \
+                _NotFound("Requested resource not found: Table: {} not found".format(name))
+        return table
+
+    def _create_table(self, request):
+        name = request["TableName"]
+        if name in self.tables:
+            raise _InUse("Table already exists: {}".format(name))
+        table = self.tables[name] = Table(request, self._sequence)
+        description = table.describe()
+        description["TableStatus"] = "CREATING"
+        return {"TableDescription": description}
+
+    def _delete_table(self, request):
+        table = self._table(request)
+        del self.tables[table.name]
+        description = table.describe()
+        description["TableStatus"] = "DELETING"
+        return {"TableDescription": description}
+
+    def _update_time_to_live(self, request):
+        table = self._table(request)
+        spec = request["TimeToLiveSpecification"]
+        if spec["Enabled"]:
+            table.ttl = {"AttributeName": spec["AttributeName"], "TimeToLiveStatus": "ENABLED"}
+        else:
+            table.ttl = {"TimeToLiveStatus": "DISABLED"}
+        return {"TimeToLiveSpecification": spec}
+
+    def _update_continuous_backups(self, request):
+        table = self._table(request)
+        enabled = request["PointInTimeRecoverySpecification"]["PointInTimeRecoveryEnabled"]
+        table.backups = "ENABLED" if enabled else "DISABLED"
+        return self._describe_continuous_backups(request)
+
+    def _describe_continuous_backups(self, request):
+        table = self._table(request)
+        return {"ContinuousBackupsDescription": {
+            "ContinuousBackupsStatus": table.backups,
+            "PointInTimeRecoveryDescription": {"PointInTimeRecoveryStatus": table.backups},
+        }}
+
+    def _get_item(self, request):
+        table = self._table(request)
+        parser = ExpressionParser(request.get("ExpressionAttributeNames"))
+        paths = _projection(parser, request)
+        parser.check_unused()
+        item = table.get(table.primary_key(request["Key"]))
+        response = {}
+        if item is not None:
+            response["Item"] = project(item, paths) if paths else copy_item(item)
+        _add_capacity(response, request, table, read=_read_units(item, request.get("ConsistentRead")))
+        return response
+
+    def _write_item(self, request, action):
+        table, primary_key, old, new, touched = self._prepare_write(request, action)
+        return_values = request.get("ReturnValues", "NONE")
+        if return_values not in RETURN_VALUES or (action != "update" and return_values not in {"NONE", "ALL_OLD"}):
+            raise ValidationError("Return values set to invalid value")
+        units = self._commit(table, primary_key, old, new)
+        response = {}
+        attributes = None
+        if return_values == "ALL_OLD":
+            attributes = old
+        elif return_values == "ALL_NEW":
+            attributes = new
+        elif return_values == "UPDATED_OLD" and old is not None:
+            attributes = {name: value for name, value in old.items() if name in touched}
+        elif return_values == "UPDATED_NEW":
+            attributes = {name: value for name, value in new.items() if name in touched}
+        if attributes:
+            response["Attributes"] = copy_item(attributes)
+        _add_capacity(response, request, table, write=units)
+        return response
+
+    def _prepare_write(self, request, action):
+        """Validate a put, update, delete, or condition check and compute the new item without storing it.
+
+        :return: ``(table, primary key, old item, new item, updated attribute names)``
+        """
+        table = self._table(request)
+        parser = ExpressionParser(request.get("ExpressionAttributeNames"), request.get("ExpressionAttributeValues"))
+        condition = parser.condition(request["ConditionExpression"]) if "ConditionExpression" in request else None
+        actions = None
+        if action == "update" and request.get("UpdateExpression"):
+            actions = parser.update(request["UpdateExpression"])
+        elif action == "check" and condition is None:
+            raise ValidationError("The ConditionExpression can not be empty")
+        parser.check_unused()
+
+        if action == "put":
+            item = request["Item"]
+            table.check_item(item)
+            primary_key = table.primary_key(table.key_of(item))
+        else:
+            primary_key = table.primary_key(request["Key"])
+        old = table.get(primary_key)
+        if condition is not None and not evaluate(condition, old or {}):
+            raise _ConditionFailed(old)
+
+        touched = set()
+        if action == "put":
+            new = copy_item(request["Item"])
+            touched = set(new)
+        elif action == "update":
+            new = copy_item(old) if old is not None else copy_item(request["Key"])
+            if actions is not None:
+                touched = {path[0] for _, path, _ in actions}
+                for name in touched & table.key_names:
+                    raise ValidationError("One or more parameter values were invalid: Cannot update attribute {}. "
+                                          "This attribute is part of the key".format(name))
+                new = apply_update(actions, new)
+            table.check_item(new)
+        elif action == "delete":
+            new = None
+        else:
+            new = old
+        return table, primary_key, old, new, touched
+
+    def _commit(self, table, primary_key, old, new):
+        """Store a prepared write and return the write units it consumed, by index name (None for the table)"""
+        table.store(primary_key, old, new)
+        units = {None: _write_units(old, new)}
+        for name, index in table.indexes.items():
+            old_entry = None if old is None else index.project(old) if index.contains(old) else None
+            new_entry = None if new is None else index.project(new) if index.contains(new) else None
+            if old_entry is not None or new_entry is not None:
+                units[name] = _write_units(old_entry, new_entry)
+        return units
+
+    def _batch_get_item(self, request):
+        requests = request["RequestItems"]
+        total = sum(len(table_request["Keys"]) for table_request in requests.values())
+        if not total:
+            raise ValidationError("The requestItems parameter is required for BatchGetItem")
+        if total > BATCH_GET_LIMIT:
+            raise ValidationError("Too many items requested for the BatchGetItem call")
+        budget = self.batch_limit or total
+        responses, unprocessed, capacity = {}, {}, []
+        for table_name, table_request in requests.items():
+            table = self._table(request, table_name)
+            parser = ExpressionParser(table_request.get("ExpressionAttributeNames"))
+            paths = _projection(parser, table_request)
+            parser.check_unused()
+            primary_keys = [table.primary_key(key) for key in table_request["Keys"]]
+            if len(set(primary_keys)) != len(primary_keys):
+                raise ValidationError("Provided list of item keys contains duplicates")
+            processed, remaining = primary_keys[:budget], table_request["Keys"][budget:]
+            budget -= len(processed)
+            items, units = [], 0.0
+            for primary_key in processed:
+                item = table.get(primary_key)
+                units += _read_units(item, table_request.get("ConsistentRead"))
+                if item is not None:
+                    items.append(project(item, paths) if paths else copy_item(item))
+            responses[table_name] = items
+            if remaining:
+                unprocessed[table_name] = dict(table_request, Keys=remaining)
+            entry = _capacity(request, table, read=units)
+            if entry is not None:
+                capacity.append(entry)
+        response = {"Responses": responses, "UnprocessedKeys": unprocessed}
+        if capacity:
+            response["ConsumedCapacity"] = capacity
+        return response
+
+    def _batch_write_item(self, request):
+        requests = request["RequestItems"]
+        total = sum(len(writes) for writes in requests.values())
+        if not total:
+            raise ValidationError("The requestItems parameter is required for BatchWriteItem")
+        if total > BATCH_WRITE_LIMIT:
+            raise ValidationError("Too many items requested for the BatchWriteItem call")
+        prepared = {}
+        for table_name, writes in requests.items():
+            table = self._table(request, table_name)
+            seen = set()
+            for write in writes:
+                if "PutRequest" in write:
+                    item = write["PutRequest"]["Item"]
+                    table.check_item(item)
+                    primary_key = table.primary_key(table.key_of(item))
+                    new = copy_item(item)
+                else:
+                    primary_key = table.primary_key(write["DeleteRequest"]["Key"])
+                    new = None
+                if primary_key in seen:
+                    raise ValidationError("Provided list of item keys contains duplicates")
+                seen.add(primary_key)
+                prepared.setdefault(table_name, []).append((write, primary_key, new))
+
+        budget = self.batch_limit or total
+        unprocessed, capacity = {}, []
+        for table_name, writes in prepared.items():
+            table = self.tables[table_name]
+            units = {}
+            for write, primary_key, new in writes[:budget]:
+                for name, amount in self._commit(table, primary_key, table.get(primary_key), new).items():
+                    units[name] = units.get(name, 0) + amount
+            if writes[budget:]:
+                unprocessed[table_name] = [write for write, _, _ in writes[budget:]]
+            budget = max(0, budget - len(writes))
+            entry = _capacity(request, table, write=units or {None: 0})
+            if entry is not None:
+                capacity.append(entry)
+        response = {"UnprocessedItems": unprocessed}
+        if capacity:
+            response["ConsumedCapacity"] = capacity
+        return response
+
+    def _search(self, request, mode):
+        table = self._table(request)
+        index = table.index(request.get("IndexName"))
+        if request.get("ConsistentRead") and index.is_global:
+            raise ValidationError("Consistent reads are not supported on global secondary indexes")
+        parser = ExpressionParser(request.get("ExpressionAttributeNames"), request.get("ExpressionAttributeValues"))
+        if mode == "query":
+            if "KeyConditionExpression" not in request:
+                raise ValidationError("Either the KeyConditions or KeyConditionExpression parameter must be specified")
+            key_condition = parser.condition(request["KeyConditionExpression"])
+        filter_ = parser.condition(request["FilterExpression"]) if "FilterExpression" in request else None
+        paths = _projection(parser, request)
+        parser.check_unused()
+        select = _select(request, index, paths)
+        limit = request.get("Limit")
+        if limit is not None and limit < 1:
+            raise ValidationError("Limit must be greater than or equal to 1")
+
+        if mode == "query":
+            entries = self._query_entries(table, index, key_condition, request)
+        else:
+            entries = self._scan_entries(table, index, request)
+
+        items, count, scanned, size, last = [], 0, 0, 0, None
+        for primary_key in entries:
+            if (limit is not None and scanned >= limit) or size >= PAGE_SIZE_LIMIT:
+                last = index.last_key(table.items[last])
+                break
+            item = table.items[primary_key]
+            visible = item if select == "ALL_ATTRIBUTES" else index.project(item)
+            scanned += 1
+            size += item_size(visible)
+            last = primary_key
+            if filter_ is not None and not evaluate(filter_, visible):
+                continue
+            count += 1
+            if select != "COUNT":
+                items.append(project(visible, paths) if paths else copy_item(visible))
+        else:
+            last = None
+
+        response = {"Count": count, "ScannedCount": scanned}
+        if select != "COUNT":
+            response["Items"] = items
+        if last is not None:
+            response["LastEvaluatedKey"] = last
+        consistent = request.get("ConsistentRead")
+        units = max(1, math.ceil(size / 4096)) * (1.0 if consistent else 0.5)
+        _add_capacity(response, request, table, read=units, index=index.name)
+        return response
+
+    def _query_entries(self, table, index, node, request):
+        hash_value, range_condition = _key_condition(index, node)
+        table.check_key_value(index.hash_key, hash_value, index=index.name)
+        if range_condition is not None:
+            for value in range_condition[1:]:
+                table.check_key_value(index.range_key, value, index=index.name)
+        partition = index.partitions.get(sortable(hash_value), [])
+        low, high = 0, len(partition)
+        if range_condition is not None:
+            low, high = _range_bounds(partition, *range_condition)
+        forward = request.get("ScanIndexForward", True)
+        start = request.get("ExclusiveStartKey")
+        if start is not None:
+            position = index.position(start, table.primary_key(table.key_of(start)))
+            if position is None:
+                raise ValidationError("The provided starting key is invalid")
+            if forward:
+                low = max(low, bisect.bisect_right(partition, position[1]))
+            else:
+                high = min(high, bisect.bisect_left(partition, position[1]))
+        selected = range(low, high) if forward else range(high - 1, low - 1, -1)
+        # The client's lock is held until the page is built, so the partition can't change underneath this
+        return (partition[i][1] for i in selected)
+
+    def _scan_entries(self, table, index, request):
+        segment, total_segments = request.get("Segment"), request.get("TotalSegments")
+        if (segment is None) != (total_segments is None):
+            raise ValidationError("The Segment parameter is required but was not present in the request when "
+                                  "parameter TotalSegments is present" if segment is None else
+                                  "The TotalSegments parameter is required but was not present in the request "
+                                  "when Segment parameter is present")
+        ordered = index.ordered
+        low, high = 0, len(ordered)
+        if segment is not None:
+            if not 1 <= total_segments <= 1000000 or not 0 <= segment < total_segments:
+                raise ValidationError("The Segment parameter is zero-based and must be less than parameter "
+                                      "TotalSegments: Segment: {} is not less than TotalSegments: {}".format(
+                                          segment, total_segments))
+            lower, upper = segment_bounds(segment, total_segments)
+            low, high = bisect.bisect_left(ordered, (lower,)), bisect.bisect_left(ordered, (upper,))
+        start = request.get("ExclusiveStartKey")
+        if start is not None:
+            primary_key = table.primary_key(table.key_of(start))
+            if index.position(start, primary_key) is None:
+                raise ValidationError("The provided starting key is invalid")
+            low = max(low, bisect.bisect_right(ordered, index.scan_entry(start, primary_key)))
+        return (ordered[i][3] for i in range(low, high))
+
+    def _transact_get_items(self, request):
+        actions = request["TransactItems"]
+        if not 1 <= len(actions) <= TRANSACTION_LIMIT:
+            raise ValidationError("Member must have length less than or equal to 100")
+        responses, units = [], {}
+        for action in actions:
+            get = action["Get"]
+            table = self._table(get)
+            parser = ExpressionParser(get.get("ExpressionAttributeNames"))
+            paths = _projection(parser, get)
+            parser.check_unused()
+            item = table.get(table.primary_key(get["Key"]))
+            units[table.name] = units.get(table.name, 0.0) + 2 * _read_units(item, True)
+            if item is None:
+                responses.append({})
+            else:
+                responses.append({"Item": project(item, paths) if paths else copy_item(item)})
+        response = {"Responses": responses}
+        capacity = [_capacity(request, self.tables[name], read=amount) for name, amount in units.items()]
+        if capacity[0] is not None:
+            response["ConsumedCapacity"] = capacity
+        return response
+
+    def _transact_write_items(self, request):
+        actions = request["TransactItems"]
+        if not 1 <= len(actions) <= TRANSACTION_LIMIT:
+            raise ValidationError("Member must have length less than or equal to 100")
+        now = time.monotonic()
+        self._client_tokens = {
+            token: seen for token, seen in self._client_tokens.items() if now - seen < CLIENT_TOKEN_LIFETIME}
+        token = request.get("ClientRequestToken")
+        if token is not None and token in self._client_tokens:
+            return {}
+
+        prepared, reasons, failed, targets = [], [], False, set()
+        kinds = {"Put": "put", "Update": "update", "Delete": "delete", "ConditionCheck": "check"}
+        for action in actions:
+            (kind, inner), = action.items()
+            if kind not in kinds:
+                raise ValidationError("TransactItems can only contain one of Check, Put, Update or Delete")
+            try:
+                table, primary_key, old, new, _ = self._prepare_write(inner, kinds[kind])
+            except _ConditionFailed as error:
+                failed = True
+                reason = {"Code": "ConditionalCheckFailed", "Message": "The conditional request failed"}
+                if inner.get("ReturnValuesOnConditionCheckFailure") == "ALL_OLD" and error.item is not None:
+                    reason["Item"] = copy_item(error.item)
+                reasons.append(reason)
+                continue
+            if (table.name, primary_key) in targets:
+                raise ValidationError("Transaction request cannot include multiple operations on one item")
+            targets.add((table.name, primary_key))
+            reasons.append({"Code": "None"})
+            prepared.append((kind, table, primary_key, old, new))
+        if failed:
+            error = client_error(
+                "TransactionCanceledException",
+                "Transaction cancelled, please refer cancellation reasons for specific reasons [{}]".format(
+                    ", ".join(reason["Code"] for reason in reasons)),
+                "TransactWriteItems")
+            error.response["CancellationReasons"] = reasons
+            raise error
+
+        units = {}
+        for kind, table, primary_key, old, new in prepared:
+            if kind == "ConditionCheck":
+                amount = {None: _write_units(old, None)}
+            else:
+                amount = self._commit(table, primary_key, old, new)
+            table_units = units.setdefault(table.name, {})
+            for name, value in amount.items():
+                table_units[name] = table_units.get(name, 0) + 2 * value
+        if token is not None:
+            self._client_tokens[token] = now
+        response = {}
+        capacity = [_capacity(request, self.tables[name], write=amount) for name, amount in units.items()]
+        if capacity and capacity[0] is not None:
+            response["ConsumedCapacity"] = capacity
+        return response
+
+
+class MemoryDynamoDBStreams:
+    """A stand-in for ``boto3.client("dynamodbstreams")`` that reads the streams of a :class:`MemoryDynamoDB`.
+
+    Each stream has a single shard that never closes.  Shard iterators don't expire.
+
+    :param dynamodb: The :class:`MemoryDynamoDB` whose tables are streamed.
+    """
+    def __init__(self, dynamodb):
+        self.dynamodb = dynamodb
+        self._iterators = {}
+
+    def __repr__(self):
+        return "<{}[{!r}]>".format(self.__class__.__name__, self.dynamodb)
+
+    def describe_stream(self, **request):
+        return self.dynamodb._call("DescribeStream", self._describe_stream, request)
+
+    def get_shard_iterator(self, **request):
+        return self.dynamodb._call("GetShardIterator", self._get_shard_iterator, request)
+
+    def get_records(self, **request):
+        return self.dynamodb._call("GetRecords", self._get_records, request)
+
+    def list_streams(self, **request):
+        return self.dynamodb._call("ListStreams", self._list_streams, request)
+
+    def _stream(self, arn):
+        for table in self.dynamodb.tables.values():
+            if table.stream is not None and table.stream.arn == arn:
+                return table, table.stream
+        raise _NotFound("Requested resource not found: Stream: {} not found".format(arn))
+
+    def _describe_stream(self, request):
+        table, stream = self._stream(request["StreamArn"])
+        after = request.get("ExclusiveStartShardId")
+        return {"StreamDescription": {
+            "StreamArn": stream.arn,
+            "StreamLabel": stream.label,
+            "StreamStatus": "ENABLED",
+            "StreamViewType": stream.view_type,
+            "TableName": table.name,
+            "KeySchema": table.key_schema,
+            "CreationRequestDateTime": table.created_at,
+            "Shards": [] if after == stream.shard_id else [stream.describe()],
+        }}
+
+    def _get_shard_iterator(self, request):
+        _, stream = self._stream(request["StreamArn"])
+        if request["ShardId"] != stream.shard_id:
+            raise _NotFound("Requested resource not found: Shard: {} in Stream: {} not found".format(
+                request["ShardId"], stream.arn))
+        iterator_type = request["ShardIteratorType"]
+        if iterator_type == "TRIM_HORIZON":
+            position = 0
+        elif iterator_type == "LATEST":
+            position = len(stream.records)
+        elif iterator_type in {"AT_SEQUENCE_NUMBER", "AFTER_SEQUENCE_NUMBER"}:
+            if "SequenceNumber" not in request:
+                raise ValidationError("SequenceNumber is required for {}".format(iterator_type))
+            position = stream.find(request["SequenceNumber"])
+            found = position < len(stream.records) and \
+                stream.sequence_numbers[position] == int(request["SequenceNumber"])
+            if iterator_type == "AFTER_SEQUENCE_NUMBER" and found:
+                position += 1
+        else:
+            raise ValidationError("Invalid ShardIteratorType: {}".format(iterator_type))
+        return {"ShardIterator": self._iterator(stream, position)}
+
+    def _get_records(self, request):
+        try:
+            stream, position = self._iterators[request["ShardIterator"]]
+        except KeyError:
+            raise _Expired("Iterator expired") from None
+        limit = request.get("Limit", 1000)
+        records = stream.records[position:position + limit]
+        return {
+            "Records": [dict(record, dynamodb=dict(record["dynamodb"])) for record in records],
+            "NextShardIterator": self._iterator(stream, position + len(records)),
+        }
+
+    def _list_streams(self, request):
+        return {"Streams": [
+            {"StreamArn": table.stream.arn, "StreamLabel": table.stream.label, "TableName": table.name}
+            for table in self.dynamodb.tables.values()
+            if table.stream is not None and request.get("TableName", table.name) == table.name
+        ]}
+
+    def _iterator(self, stream, position):
+        iterator_id = "{}|{}".format(stream.shard_id, uuid.uuid4().hex)
+        self._iterators[iterator_id] = stream, position
+        return iterator_id
+
+
+class _ClientError(Exception):
+    code = None
+
+
+class _ConditionFailed(_ClientError):
+    code = "ConditionalCheckFailedException"
+
+    def __init__(self, item=None):
+        super().__init__("The conditional request failed")
+        self.item = item
+
+
+class _NotFound(_ClientError):
+    code = "ResourceNotFoundException"
+
+
+class _InUse(_ClientError):
+    code = "ResourceInUseException"
+
+
+class _Expired(_ClientError):
+    code = "ExpiredIteratorException"
+
+
+def _projection(parser, request):
+    if "ProjectionExpression" not in request:
+        return None
+    return parser.projection(request["ProjectionExpression"])
+
+
+def _select(request, index, paths):
+    select = request.get("Select")
+    if select is None:
+        if paths:
+            return "SPECIFIC_ATTRIBUTES"
+        return "ALL_ATTRIBUTES" if index.name is None else "ALL_PROJECTED_ATTRIBUTES"
+    if select not in SELECT_VALUES:
+        raise ValidationError("1 validation error detected: Value '{}' at 'select' failed to satisfy constraint"
+                              .format(select))
+    if paths and select != "SPECIFIC_ATTRIBUTES":
+        raise ValidationError("Cannot specify the ProjectionExpression when choosing to get {}".format(select))
+    if select == "ALL_ATTRIBUTES" and index.is_global and index.projected is not None:
+        raise ValidationError("One or more parameter values were invalid: Select type ALL_ATTRIBUTES is not "
+                              "supported for global secondary index {} because its projection type is not ALL"
+                              .format(index.name))
+    if select == "ALL_PROJECTED_ATTRIBUTES" and index.name is None:
+        raise ValidationError("ALL_PROJECTED_ATTRIBUTES can be used only when Querying using an IndexName")
+    if select == "SPECIFIC_ATTRIBUTES" and index.is_global is False and index.name is not None:
+        # local indexes fetch unprojected attributes from the table
+        return "ALL_ATTRIBUTES"
+    return select
+
+
+def _conjuncts(node):
+    if node[0] == "and":
+        return _conjuncts(node[1]) + _conjuncts(node[2])
+    return [node]
+
+
+def _key_condition(index, node):
+    """Split a key condition into the hash key's value and ``(operator, values)`` for the range key."""
+    hash_value, range_condition = None, None
+    for part in _conjuncts(node):
+        kind = part[0]
+        if kind == "compare" and part[1] == "=" and part[2] == ("path", (index.hash_key,)) \
+                and part[3][0] == "value" and hash_value is None:
+            hash_value = part[3][1]
+            continue
+        if range_condition is None and index.range_key is not None:
+            target = ("path", (index.range_key,))
+            if kind == "compare" and part[1] in RANGE_COMPARATORS and part[2] == target and part[3][0] == "value":
+                range_condition = (part[1], part[3][1])
+                continue
+            if kind == "between" and part[1] == target and part[2][0] == part[3][0] == "value":
+                range_condition = ("between", part[2][1], part[3][1])
+                continue
+            if kind == "function" and part[1] == "begins_with" and part[2][0] == (index.range_key,) \
+                    and part[2][1][0] == "value":
+                range_condition = ("begins_with", part[2][1][1])
+                continue
+        raise ValidationError("Query key condition not supported")
+    if hash_value is None:
+        raise ValidationError("Query condition missed key schema element: {}".format(index.hash_key))
+    return hash_value, range_condition
+
+
+def _range_bounds(partition, operator, value, upper=None):
+    """``[low, high)`` indexes of the entries in a sorted partition that match a range key condition"""
+    value = sortable(value)
+    first, after = bisect.bisect_left(partition, (value,)), bisect.bisect_right(partition, (value, TOP))
+    if operator == "=":
+        return first, after
+    if operator == "<":
+        return 0, first
+    if operator == "<=":
+        return 0, after
+    if operator == ">":
+        return after, len(partition)
+    if operator == ">=":
+        return first, len(partition)
+    if operator == "between":
+        return first, bisect.bisect_right(partition, (sortable(upper), TOP))
+    # begins_with
+    high = first
+    while high < len(partition) and partition[high][0].startswith(value):
+        high += 1
+    return first, high
+
+
+def _read_units(item, consistent):
+    size = item_size(item) if item is not None else 0
+    return max(1, math.ceil(size / 4096)) * (1.0 if consistent else 0.5)
+
+
+def _write_units(old, new):
+    size = max(item_size(old) if old is not None else 0, item_size(new) if new is not None else 0)
+    return max(1, math.ceil(size / 1024))
+
+
+def _capacity(request, table, *, read=None, write=None, index=None):
+    """A "ConsumedCapacity" entry, or None if the request didn't ask for one.
+
+    :param read: Read units consumed on ``index``, or on the table if ``index`` is None.
+    :param dict write: Write units consumed, by index name (None for the table).
+    """
+    mode = request.get("ReturnConsumedCapacity", "NONE")
+    if mode == "NONE":
+        return None
+    if write is not None:
+        units = {name: {"CapacityUnits": float(amount), "WriteCapacityUnits": float(amount)}
+                 for name, amount in write.items()}
+    else:
+        units = {index: {"CapacityUnits": float(read), "ReadCapacityUnits": float(read)}}
+    entry = {"TableName": table.name, "CapacityUnits": sum(value["CapacityUnits"] for value in units.values())}
+    if mode == "INDEXES":
+        if None in units:
+            entry["Table"] = units[None]
+        for name, value in units.items():
+            if name is not None:
+                key = "GlobalSecondaryIndexes" if table.indexes[name].is_global else "LocalSecondaryIndexes"
+                entry.setdefault(key, {})[name] = value
+    return entry
+
+
+def _add_capacity(response, request, table, **units):
+    entry = _capacity(request, table, **units)
+    if entry is not None:
+        response["ConsumedCapacity"] = entry
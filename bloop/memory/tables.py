@@ -0,0 +1,391 @@
+import bisect
+import decimal
+import uuid
+import zlib
+from datetime import datetime, timezone
+
+from ..bulk.limits import item_size
+from ..expressions import SET_TYPES, ValidationError, copy_item, format_number
+
+
+__all__ = ["Index", "Stream", "Table"]
+
+# Scans walk the table in hash order, split into equal ranges per segment like DynamoDB's partitions
+HASH_SPACE = 2 ** 32
+
+
+class _Top:
+    """Sorts after every value, to find the end of a run of equal sort keys"""
+    def __lt__(self, other):
+        return False
+
+    def __gt__(self, other):
+        return True
+
+
+TOP = _Top()
+
+
+def sortable(value):
+    """A comparable, hashable form of a key attribute's typed value"""
+    (type_, inner), = value.items()
+    if type_ == "N":
+        return decimal.Decimal(inner)
+    return inner
+
+
+def hash_position(value):
+    """Position of a hash key in the scan order.  Equal numbers hash the same regardless of format."""
+    (type_, inner), = value.items()
+    if type_ == "N":
+        inner = format_number(decimal.Decimal(inner))
+    elif isinstance(inner, (bytes, bytearray)):
+        inner = inner.hex()
+    return zlib.crc32("{}:{}".format(type_, inner).encode("utf-8"))
+
+
+def segment_bounds(segment, total_segments):
+    """The half-open range of hash positions that a parallel scan segment covers"""
+    return segment * HASH_SPACE // total_segments, (segment + 1) * HASH_SPACE // total_segments
+
+
+class Index:
+    """Sorted entries for the table itself or one of its secondary indexes.
+
+    Each partition is a list of ``(range value, primary key)`` kept in order with :mod:`bisect`, so a query
+    only touches the items its key condition selects.  A second list ordered by hash position serves scans
+    and their parallel segments.
+
+    :param str name: The index name, or None for the table.
+    :param str hash_key: Name of the hash key attribute.
+    :param str range_key: Name of the range key attribute, or None.
+    :param table_keys: Names of the table's key attributes.
+    :param dict projection: The index's "Projection", or None for the table.
+    :param bool is_global: True for a global secondary index.
+    """
+    def __init__(self, name, hash_key, range_key, table_keys, projection=None, is_global=False):
+        self.name = name
+        self.hash_key = hash_key
+        self.range_key = range_key
+        self.is_global = is_global
+        self.key_names = {hash_key, range_key, *table_keys} - {None}
+        projection = projection or {"ProjectionType": "ALL"}
+        self.projection_type = projection["ProjectionType"]
+        if self.projection_type == "ALL":
+            self.projected = None
+        else:
+            self.projected = self.key_names | set(projection.get("NonKeyAttributes", []))
+        self.partitions = {}
+        self.ordered = []
+
+    def __repr__(self):
+        return "<{}[{}]>".format(self.__class__.__name__, self.name or "table")
+
+    def __len__(self):
+        return len(self.ordered)
+
+    def position(self, item, primary_key):
+        """``(hash value, entry)`` for an item, or None if the item is missing one of this index's keys."""
+        hash_value = item.get(self.hash_key)
+        if hash_value is None:
+            return None
+        range_value = None
+        if self.range_key is not None:
+            range_value = item.get(self.range_key)
+            if range_value is None:
+                return None
+            range_value = sortable(range_value)
+        return sortable(hash_value), (range_value, primary_key)
+
+    def scan_entry(self, item, primary_key):
+        hash_value, (range_value, primary_key) = self.position(item, primary_key)
+        return hash_position(item[self.hash_key]), hash_value, range_value, primary_key
+
+    def add(self, item, primary_key):
+        position = self.position(item, primary_key)
+        if position is None:
+            return
+        hash_value, entry = position
+        bisect.insort(self.partitions.setdefault(hash_value, []), entry)
+        bisect.insort(self.ordered, self.scan_entry(item, primary_key))
+
+    def remove(self, item, primary_key):
+        position = self.position(item, primary_key)
+        if position is None:
+            return
+        hash_value, entry = position
+        partition = self.partitions[hash_value]
+        del partition[bisect.bisect_left(partition, entry)]
+        if not partition:
+            del self.partitions[hash_value]
+        scan_entry = self.scan_entry(item, primary_key)
+        del self.ordered[bisect.bisect_left(self.ordered, scan_entry)]
+
+    def contains(self, item):
+        return all(item.get(name) is not None for name in (self.hash_key, self.range_key) if name is not None)
+
+    def project(self, item):
+        """The attributes of ``item`` that this index stores."""
+        if self.projected is None:
+            return item
+        return {name: value for name, value in item.items() if name in self.projected}
+
+    def last_key(self, item):
+        """The "LastEvaluatedKey" for a page that ended on ``item``."""
+        return {name: item[name] for name in self.key_names}
+
+
+class Stream:
+    """Records for a table's stream, in a single shard that never closes.
+
+    :param str arn: The stream's arn.
+    :param str view_type: The "StreamViewType" from the table's "StreamSpecification".
+    :param sequence: Shared counter for sequence numbers across every stream of a client.
+    """
+    shard_id = "shardId-00000000000000000000-00000001"
+
+    def __init__(self, arn, view_type, sequence):
+        self.arn = arn
+        self.label = arn.rsplit("/", 1)[-1]
+        self.view_type = view_type
+        self.sequence = sequence
+        self.records = []
+        self.sequence_numbers = []
+
+    def __repr__(self):
+        return "<{}[{}]>".format(self.__class__.__name__, self.arn)
+
+    def append(self, keys, old, new):
+        if old is None:
+            event = "INSERT"
+        elif new is None:
+            event = "REMOVE"
+        else:
+            event = "MODIFY"
+        sequence_number = "{:021d}".format(next(self.sequence))
+        record = {
+            "Keys": copy_item(keys),
+            "SequenceNumber": sequence_number,
+            "ApproximateCreationDateTime": datetime.now(timezone.utc),
+            "StreamViewType": self.view_type,
+        }
+        if new is not None and self.view_type in {"NEW_IMAGE", "NEW_AND_OLD_IMAGES"}:
+            record["NewImage"] = copy_item(new)
+        if old is not None and self.view_type in {"OLD_IMAGE", "NEW_AND_OLD_IMAGES"}:
+            record["OldImage"] = copy_item(old)
+        record["SizeBytes"] = sum(item_size(record[key]) for key in ("Keys", "NewImage", "OldImage") if key in record)
+        self.records.append({
+            "eventID": uuid.uuid4().hex,
+            "eventName": event,
+            "eventVersion": "1.1",
+            "eventSource": "aws:dynamodb",
+            "awsRegion": "local",
+            "dynamodb": record,
+        })
+        self.sequence_numbers.append(int(sequence_number))
+
+    def find(self, sequence_number):
+        """Index of the record with ``sequence_number``, or of the first record after it if it doesn't exist."""
+        return bisect.bisect_left(self.sequence_numbers, int(sequence_number))
+
+    def describe(self):
+        return {
+            "ShardId": self.shard_id,
+            "SequenceNumberRange": {"StartingSequenceNumber": "{:021d}".format(0)},
+        }
+
+
+class Table:
+    """One table's items, indexes, and settings, built from a CreateTable request.
+
+    :param dict request: The kwargs passed to CreateTable.
+    :param sequence: Shared counter for stream sequence numbers.
+    """
+    def __init__(self, request, sequence):
+        self.name = request["TableName"]
+        self.key_schema = request["KeySchema"]
+        self.attribute_definitions = request["AttributeDefinitions"]
+        self.attribute_types = {
+            definition["AttributeName"]: definition["AttributeType"] for definition in self.attribute_definitions}
+        self.hash_key, self.range_key = key_names(self.key_schema)
+        self.key_names = {self.hash_key, self.range_key} - {None}
+        for name in self.key_names:
+            if name not in self.attribute_types:
+                raise ValidationError("One or more parameter values were invalid: "
+                                      "Some index key attributes are not defined in AttributeDefinitions")
+        self.billing_mode = request.get("BillingMode", "PROVISIONED")
+        self.throughput = request.get("ProvisionedThroughput", {"ReadCapacityUnits": 0, "WriteCapacityUnits": 0})
+        self.created_at = datetime.now(timezone.utc)
+        self.arn = "arn:aws:dynamodb:local:000000000000:table/{}".format(self.name)
+
+        self.items = {}
+        self.primary = Index(None, self.hash_key, self.range_key, self.key_names)
+        self.indexes = {}
+        self.index_requests = {"GlobalSecondaryIndexes": [], "LocalSecondaryIndexes": []}
+        for kind in ("GlobalSecondaryIndexes", "LocalSecondaryIndexes"):
+            for index in request.get(kind, []):
+                hash_key, range_key = key_names(index["KeySchema"])
+                for name in (hash_key, range_key):
+                    if name is not None and name not in self.attribute_types:
+                        raise ValidationError("One or more parameter values were invalid: "
+                                              "Some index key attributes are not defined in AttributeDefinitions")
+                if index["IndexName"] in self.indexes:
+                    raise ValidationError("One or more parameter values were invalid: "
+                                          "Duplicate index name: {}".format(index["IndexName"]))
+                self.indexes[index["IndexName"]] = Index(
+                    index["IndexName"], hash_key, range_key, self.key_names,
+                    projection=index["Projection"], is_global=kind == "GlobalSecondaryIndexes")
+                self.index_requests[kind].append(index)
+
+        self.stream = None
+        stream_spec = request.get("StreamSpecification") or {}
+        self.stream_spec = stream_spec
+        if stream_spec.get("StreamEnabled"):
+            label = self.created_at.strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3]
+            self.stream = Stream("{}/stream/{}".format(self.arn, label), stream_spec["StreamViewType"], sequence)
+        self.sse_enabled = bool((request.get("SSESpecification") or {}).get("Enabled"))
+        self.ttl = {"TimeToLiveStatus": "DISABLED"}
+        self.backups = "DISABLED"
+
+    def __repr__(self):
+        return "<{}[{}]>".format(self.__class__.__name__, self.name)
+
+    def index(self, name):
+        """The table's own index when ``name`` is None, otherwise the named secondary index"""
+        if name is None:
+            return self.primary
+        try:
+            return self.indexes[name]
+        except KeyError:
+            raise ValidationError("The table does not have the specified index: {}".format(name)) from None
+
+    def primary_key(self, key):
+        """Validate a request's "Key" and return the primary key used to store the item."""
+        if set(key) != self.key_names:
+            raise ValidationError("The provided key element does not match the schema")
+        for name, value in key.items():
+            self.check_key_value(name, value)
+        hash_value = sortable(key[self.hash_key])
+        range_value = sortable(key[self.range_key]) if self.range_key is not None else None
+        return hash_value, range_value
+
+    def check_key_value(self, name, value, index=None):
+        """Raise if a key attribute's value has the wrong type, or is an empty string or binary."""
+        (type_, inner), = value.items()
+        if type_ != self.attribute_types[name]:
+            if index is None:
+                raise ValidationError("The provided key element does not match the schema")
+            raise ValidationError("One or more parameter values were invalid: Type mismatch for Index Key "
+                                  "{} Expected: {} Actual: {} IndexName: {}".format(
+                                      name, self.attribute_types[name], type_, index))
+        if type_ in {"S", "B"} and not inner:
+            raise ValidationError("One or more parameter values are not valid. The AttributeValue for a key "
+                                  "attribute cannot contain an empty {} value. Key: {}".format(
+                                      "string" if type_ == "S" else "binary", name))
+
+    def check_item(self, item):
+        """Validate an item about to be stored: key and index key types, and no empty sets."""
+        missing = [name for name in self.key_names if name not in item]
+        if missing:
+            raise ValidationError("One or more parameter values were invalid: "
+                                  "Missing the key {} in the item".format(missing[0]))
+        for name in self.key_names:
+            self.check_key_value(name, item[name])
+        for index in self.indexes.values():
+            for name in (index.hash_key, index.range_key):
+                if name is not None and name not in self.key_names and name in item:
+                    self.check_key_value(name, item[name], index=index.name)
+        for value in item.values():
+            check_value(value)
+
+    def key_of(self, item):
+        return {name: item[name] for name in self.key_names}
+
+    def get(self, primary_key):
+        return self.items.get(primary_key)
+
+    def store(self, primary_key, old, new):
+        """Replace ``old`` with ``new`` in every index.  Either may be None."""
+        if old is not None:
+            self.primary.remove(old, primary_key)
+            for index in self.indexes.values():
+                index.remove(old, primary_key)
+            del self.items[primary_key]
+        if new is not None:
+            self.items[primary_key] = new
+            self.primary.add(new, primary_key)
+            for index in self.indexes.values():
+                index.add(new, primary_key)
+        if self.stream is not None and (old is not None or new is not None):
+            self.stream.append(self.key_of(new if new is not None else old), old, new)
+
+    def describe(self):
+        description = {
+            "TableName": self.name,
+            "TableArn": self.arn,
+            "TableStatus": "ACTIVE",
+            "CreationDateTime": self.created_at,
+            "KeySchema": self.key_schema,
+            "AttributeDefinitions": self.attribute_definitions,
+            "BillingModeSummary": {"BillingMode": self.billing_mode},
+            "ProvisionedThroughput": self.throughput,
+            "ItemCount": len(self.items),
+            "TableSizeBytes": sum(item_size(item) for item in self.items.values()),
+            "SSEDescription": {"Status": "ENABLED" if self.sse_enabled else "DISABLED"},
+        }
+        if self.index_requests["GlobalSecondaryIndexes"]:
+            description["GlobalSecondaryIndexes"] = [
+                {
+                    "IndexName": index["IndexName"],
+                    "KeySchema": index["KeySchema"],
+                    "Projection": index["Projection"],
+                    "IndexStatus": "ACTIVE",
+                    "ProvisionedThroughput": index.get(
+                        "ProvisionedThroughput", {"ReadCapacityUnits": 0, "WriteCapacityUnits": 0}),
+                    "ItemCount": len(self.indexes[index["IndexName"]]),
+                }
+                for index in self.index_requests["GlobalSecondaryIndexes"]
+            ]
+        if self.index_requests["LocalSecondaryIndexes"]:
+            description["LocalSecondaryIndexes"] = [
+                {
+                    "IndexName": index["IndexName"],
+                    "KeySchema": index["KeySchema"],
+                    "Projection": index["Projection"],
+                    "ItemCount": len(self.indexes[index["IndexName"]]),
+                }
+                for index in self.index_requests["LocalSecondaryIndexes"]
+            ]
+        if self.stream_spec:
+            description["StreamSpecification"] = self.stream_spec
+        if self.stream is not None:
+            description["LatestStreamArn"] = self.stream.arn
+            description["LatestStreamLabel"] = self.stream.label
+        return description
+
+
+def key_names(key_schema):
+    hash_key = range_key = None
+    for key in key_schema:
+        if key["KeyType"] == "HASH":
+            hash_key = key["AttributeName"]
+        else:
+            range_key = key["AttributeName"]
+    return hash_key, range_key
+
+
+def check_value(value):
+    (type_, inner), = value.items()
+    if type_ in SET_TYPES:
+        if not inner:
+            raise ValidationError("One or more parameter values were invalid: An number set  may not be empty"
+                                  if type_ == "NS" else
+                                  "One or more parameter values were invalid: An string set  may not be empty")
+        if len(set(inner)) != len(inner):
+            raise ValidationError("One or more parameter values were invalid: Input collection contains duplicates")
+    elif type_ == "L":
+        for element in inner:
+            check_value(element)
+    elif type_ == "M":
+        for element in inner.values():
+            check_value(element)
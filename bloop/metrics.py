@@ -0,0 +1,387 @@
+import contextlib
+import contextvars
+import functools
+import threading
+import time
+
+
+__all__ = [
+    "CapacityRegistry", "Histogram", "LatencyRegistry",
+    "disable_timing", "enable_timing", "tagged",
+]
+
+_tag = contextvars.ContextVar("bloop_capacity_tag", default=None)
+_operation = contextvars.ContextVar("bloop_operation", default=None)
+# The active timing sink, or None when timing is disabled.  Checked before any clock is read.
+_timings = None
+_noop = contextlib.nullcontext()
+
+#: Operation names used as keys in a :class:`~bloop.metrics.CapacityRegistry`, by DynamoDB client method
+OPERATIONS = {
+    "batch_get_item": "batch_get",
+    "batch_write_item": "batch_write",
+    "delete_item": "delete",
+    "get_item": "get",
+    "query": "query",
+    "scan": "scan",
+    "transact_get_items": "transact",
+    "transact_write_items": "transact",
+    "update_item": "update",
+}
+
+
+@contextlib.contextmanager
+def tagged(tag):
+    """Attribute capacity consumed by calls within the block to ``tag``.
+
+    Tags nest; the innermost tag wins.  The tag is stored in a :mod:`contextvars` variable, so it follows
+    the current thread or asyncio task but not new threads.
+
+    .. code-block:: python
+
+        with tagged("nightly-report"):
+            for user in engine.scan(User):
+                ...
+
+    :param str tag: Caller-supplied label for the block.
+    """
+    token = _tag.set(tag)
+    try:
+        yield
+    finally:
+        _tag.reset(token)
+
+
+def current_tag():
+    """The innermost :func:`~bloop.metrics.tagged` tag, or None."""
+    return _tag.get()
+
+
+class CapacityRegistry:
+    """Thread-safe totals of consumed capacity, keyed by table, index, operation, and tag.
+
+    Each "ConsumedCapacity" entry from a response is split into one record for the table itself (index None)
+    and one for each global or local secondary index that the request consumed capacity on.
+
+    .. code-block:: python
+
+        engine = Engine(capacity=True)
+        ...
+        for row in engine.capacity.snapshot()[:5]:
+            print(row["table"], row["index"], row["operation"], row["tag"], row["capacity_units"])
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = {}
+
+    def __repr__(self):
+        return "<{}[{} keys]>".format(self.__class__.__name__, len(self._totals))
+
+    def record(self, operation, consumed, tag=None):
+        """Add the "ConsumedCapacity" from a single response.
+
+        :param str operation: One of the values in :data:`~bloop.metrics.OPERATIONS`.
+        :param consumed: A single "ConsumedCapacity" dict or a list of them, as returned by DynamoDB.
+        :param str tag: *(Optional)* Caller-supplied tag for the request.
+        """
+        if isinstance(consumed, dict):
+            consumed = [consumed]
+        with self._lock:
+            for entry in consumed:
+                table = entry["TableName"]
+                self._add((table, None, operation, tag), entry.get("Table", entry))
+                for key in ("GlobalSecondaryIndexes", "LocalSecondaryIndexes"):
+                    for index, capacity in entry.get(key, {}).items():
+                        self._add((table, index, operation, tag), capacity)
+
+    def snapshot(self, reset=False):
+        """Copy of the current totals, most expensive first.
+
+        :param bool reset: Clear the totals after copying them.  Default is False.
+        :return: List of dicts with "table", "index", "operation", "tag", "requests", "capacity_units",
+            "read_units", and "write_units".
+        :rtype: list
+        """
+        with self._lock:
+            totals = self._totals
+            if reset:
+                self._totals = {}
+            rows = [
+                {"table": table, "index": index, "operation": operation, "tag": tag, **values}
+                for (table, index, operation, tag), values in totals.items()
+            ]
+        rows.sort(key=lambda row: row["capacity_units"], reverse=True)
+        return rows
+
+    def reset(self):
+        """Clear all totals."""
+        with self._lock:
+            self._totals = {}
+
+    def _add(self, key, capacity):
+        totals = self._totals.get(key)
+        if totals is None:
+            totals = self._totals[key] = {"requests": 0, "capacity_units": 0.0, "read_units": 0.0, "write_units": 0.0}
+        totals["requests"] += 1
+        totals["capacity_units"] += capacity.get("CapacityUnits", 0.0)
+        totals["read_units"] += capacity.get("ReadCapacityUnits", 0.0)
+        totals["write_units"] += capacity.get("WriteCapacityUnits", 0.0)
+
+
+class Histogram:
+    """Log-linear histogram of latencies in microseconds, in the style of `HdrHistogram`__.
+
+    Values below ``2 ** significant_bits`` are counted exactly.  Larger values share a bucket with every value
+    that has the same ``significant_bits`` leading bits, so any recorded value is within
+    ``2 ** -(significant_bits - 1)`` of its bucket's bounds: under 2% with the default of 7.
+    Buckets are only allocated once they hold a value.
+
+    __ http://hdrhistogram.org/
+
+    :param int significant_bits: *(Optional)* Bits of precision for each bucket.  Default is 7.
+    """
+    def __init__(self, significant_bits=7):
+        if significant_bits < 1:
+            raise ValueError("significant_bits must be at least 1 but was {}".format(significant_bits))
+        self.significant_bits = significant_bits
+        self.buckets = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def __repr__(self):
+        return "<{}[count={}]>".format(self.__class__.__name__, self.count)
+
+    def record(self, microseconds, count=1):
+        """Add ``count`` occurrences of a value.
+
+        :param int microseconds: The value to record.  Negative values are recorded as 0.
+        """
+        value = max(0, int(microseconds))
+        bucket = self._bucket(value)
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + count
+        self.count += count
+        self.total += value * count
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        """Add every value recorded in ``other``, which must have the same precision."""
+        if other.significant_bits != self.significant_bits:
+            raise ValueError("Can't merge histograms with different precision")
+        for bucket, count in other.buckets.items():
+            self.buckets[bucket] = self.buckets.get(bucket, 0) + count
+        self.count += other.count
+        self.total += other.total
+        for value in (other.min, other.max):
+            if value is not None:
+                self.min = value if self.min is None else min(self.min, value)
+                self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, percentile):
+        """The highest value equivalent to the value at ``percentile``, or None if nothing was recorded.
+
+        :param float percentile: From 0 to 100.
+        """
+        if not self.count:
+            return None
+        target = max(1, -(-self.count * percentile // 100))
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= target:
+                return min(self._highest_equivalent(bucket), self.max)
+        return self.max
+
+    def to_dict(self):
+        """Summary statistics and non-empty buckets, keyed by each bucket's lowest value.
+
+        :rtype: dict
+        """
+        return {
+            "unit": "us",
+            "count": self.count,
+            "min": self.min,
+            "max": self.max,
+            "mean": self.total / self.count if self.count else None,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "p999": self.percentile(99.9),
+            "buckets": {bucket: self.buckets[bucket] for bucket in sorted(self.buckets)},
+        }
+
+    def _bucket(self, value):
+        shift = value.bit_length() - self.significant_bits
+        if shift <= 0:
+            return value
+        return (value >> shift) << shift
+
+    def _highest_equivalent(self, bucket):
+        shift = bucket.bit_length() - self.significant_bits
+        if shift <= 0:
+            return bucket
+        return bucket + (1 << shift) - 1
+
+
+class LatencyRegistry:
+    """Thread-safe latency histograms keyed by phase and operation.
+
+    Phases are "render", "dump_key", "session", "unpack", and "retries" for backoff and resubmitted batch requests,
+    plus "total" for a whole engine operation.
+    Operations are the engine operation that was running, such as "save" or "query", or the name of the
+    instrumented function when it was called outside of one.
+
+    .. code-block:: python
+
+        timings = enable_timing()
+        engine.save(user)
+        timings.snapshot()["session"]["save"]["p99"]
+
+    :param int significant_bits: *(Optional)* Precision of each :class:`~bloop.metrics.Histogram`.  Default is 7.
+    """
+    def __init__(self, significant_bits=7):
+        self.significant_bits = significant_bits
+        self._lock = threading.Lock()
+        self._histograms = {}
+
+    def __repr__(self):
+        return "<{}[{} keys]>".format(self.__class__.__name__, len(self._histograms))
+
+    def record(self, phase, operation, seconds):
+        """Add a single measurement.
+
+        :param str phase: The instrumented phase, such as "render".
+        :param str operation: The engine operation, such as "save".
+        :param float seconds: Elapsed time.
+        """
+        key = (phase, operation)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(self.significant_bits)
+            histogram.record(seconds * 1e6)
+
+    def histogram(self, phase, operation):
+        """The :class:`~bloop.metrics.Histogram` for a phase and operation, or None if nothing was recorded."""
+        with self._lock:
+            return self._histograms.get((phase, operation))
+
+    def snapshot(self, reset=False):
+        """Export every histogram as a dict.
+
+        :param bool reset: Clear the histograms after exporting them.  Default is False.
+        :return: ``{phase: {operation: Histogram.to_dict()}}``
+        :rtype: dict
+        """
+        with self._lock:
+            histograms = self._histograms
+            if reset:
+                self._histograms = {}
+            snapshot = {}
+            for (phase, operation), histogram in histograms.items():
+                snapshot.setdefault(phase, {})[operation] = histogram.to_dict()
+        return snapshot
+
+    def reset(self):
+        """Clear all histograms."""
+        with self._lock:
+            self._histograms = {}
+
+
+def enable_timing(registry=None):
+    """Start timing instrumented phases in every engine.
+
+    Any object with a ``record(phase, operation, seconds)`` method can be used in place of a
+    :class:`~bloop.metrics.LatencyRegistry`, for example to forward measurements to a statsd client.
+
+    :param registry: *(Optional)* Where measurements are recorded.  Defaults to a new LatencyRegistry.
+    :return: The registry measurements are recorded in.
+    """
+    global _timings
+    _timings = registry or LatencyRegistry()
+    return _timings
+
+
+def disable_timing():
+    """Stop timing.  Instrumented functions go back to a single check per call."""
+    global _timings
+    _timings = None
+
+
+def timed(phase):
+    """Decorator that records each call's latency under ``phase`` while timing is enabled."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            timings = _timings
+            if timings is None:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                timings.record(phase, _operation.get() or func.__name__, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def timed_phase(phase, default_operation):
+    """Context manager that records the block's latency under ``phase`` while timing is enabled, for work that
+    isn't a whole function call, such as retrying part of a batch.
+
+    :param str phase: The instrumented phase, such as "retries".
+    :param str default_operation: Operation to record under when the block isn't inside an engine operation.
+    """
+    timings = _timings
+    if timings is None:
+        return _noop
+    return _timed_block(timings, phase, default_operation)
+
+
+@contextlib.contextmanager
+def _timed_block(timings, phase, default_operation):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.record(phase, _operation.get() or default_operation, time.perf_counter() - start)
+
+
+def timed_operation(name):
+    """Decorator for an engine operation: records its total latency and attributes nested phases to ``name``."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            timings = _timings
+            if timings is None:
+                return func(*args, **kwargs)
+            token = _operation.set(name)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                timings.record("total", name, time.perf_counter() - start)
+                _operation.reset(token)
+        return wrapper
+    return decorator
+
+
+def operation_scope(name):
+    """Context manager that attributes nested phases to ``name``, for work that continues after an engine
+    operation returns, such as paging through a query.  Doesn't record a total."""
+    if _timings is None:
+        return _noop
+    return _scope(name)
+
+
+@contextlib.contextmanager
+def _scope(name):
+    token = _operation.set(name)
+    try:
+        yield
+    finally:
+        _operation.reset(token)
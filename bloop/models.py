@@ -9,6 +9,7 @@ from typing import Type as PyType
 from . import util
 from .conditions import ComparisonMixin
 from .exceptions import InvalidModel, InvalidStream
+from .metrics import timed
 from .signals import model_created, object_modified
 from .types import DateTime, Number, Type
 
@@ -582,6 +583,7 @@ def loaded_columns(obj: BaseModel):
             yield column.name, value
 
 
+@timed("unpack")
 def unpack_from_dynamodb(*, attrs, expected, model=None, obj=None, engine=None, context=None, **kwargs):
     """Push values by dynamo_name into an object"""
     context = util.default_context(engine, context)
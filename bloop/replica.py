@@ -0,0 +1,602 @@
+import base64
+import concurrent.futures
+import decimal
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+from .bulk.formats import dump_wire, load_wire
+from .conditions import render
+from .engine import validate_not_abstract
+from .exceptions import InvalidStream, MissingObjects, StaleReplica
+from .expressions import ExpressionParser, evaluate
+from .models import unpack_from_dynamodb
+from .search import Search
+from .signals import object_loaded
+from .stream.coordinator import Coordinator
+from .util import default_context, dump_key
+
+
+__all__ = ["MemoryReplicaStore", "ReplicaStore", "SQLiteReplicaStore", "TableReplica"]
+
+logger = logging.getLogger("bloop.replica")
+
+# Saved positions older than this aren't resumed, since the records after them may have aged out of the stream's
+# 24 hour retention.  The replica scans the table again instead.
+RESUME_WITHIN = 12 * 60 * 60
+# Seconds between saving the position when the stream is quiet, so a replica that restarts can still resume
+SAVE_INTERVAL = 60
+# Seconds between heartbeats while the initial scan runs, so the stream's "latest" iterators don't expire
+HEARTBEAT_INTERVAL = 60
+
+
+def index_value(attr):
+    """A string for a scalar wire value that's equal for equal values, or None for values that can't be indexed.
+
+    .. code-block:: python
+
+        >>> index_value({"N": "1.50"})
+        'N:1.5'
+    """
+    (type_, value), = attr.items()
+    if type_ == "N":
+        value = str(decimal.Decimal(value).normalize())
+    elif type_ == "B":
+        if isinstance(value, str):
+            value = value.encode("utf-8")
+        value = base64.b64encode(value).decode("ascii")
+    elif type_ not in ("S", "BOOL"):
+        return None
+    return "{}:{}".format(type_, value)
+
+
+class ReplicaStore:
+    """Holds a :class:`~bloop.replica.TableReplica`'s items and stream position.
+
+    Items are dicts of DynamoDB wire values, stored under a string built from their key.  Attributes named in
+    :func:`~bloop.replica.ReplicaStore.prepare` are indexed by :func:`~bloop.replica.index_value`.  Subclasses
+    must implement every method, and be safe to call from multiple threads.
+    """
+    def prepare(self, indexes):
+        """Index items by each of these attributes, including items already in the store.
+
+        :param indexes: Dynamo names of the attributes to index.
+        """
+        raise NotImplementedError
+
+    def get(self, key):
+        """The item stored under ``key``, or None.
+
+        :param str key: The item's key string.
+        :rtype: dict
+        """
+        raise NotImplementedError
+
+    def find(self, name, value):
+        """Every item whose indexed attribute ``name`` has the index value ``value``.
+
+        :param str name: Dynamo name of an indexed attribute.
+        :param str value: Index value from :func:`~bloop.replica.index_value`.
+        :rtype: list
+        """
+        raise NotImplementedError
+
+    def all(self):
+        """Every item in the store.
+
+        :rtype: list
+        """
+        raise NotImplementedError
+
+    def count(self):
+        """Number of items in the store.
+
+        :rtype: int
+        """
+        raise NotImplementedError
+
+    def apply(self, puts, deletes, state=None):
+        """Store and delete items together, and save the replica's position with them if given.
+
+        :param dict puts: Items to store, by key string.
+        :param deletes: Key strings of items to delete.
+        :param dict state: *(Optional)* json-friendly position to save with the changes.  Default is None, which
+            keeps the last saved position.
+        """
+        raise NotImplementedError
+
+    def load_state(self):
+        """The last position saved by :func:`~bloop.replica.ReplicaStore.apply`, or None.
+
+        :rtype: dict
+        """
+        raise NotImplementedError
+
+    def clear(self):
+        """Delete every item and the saved position."""
+        raise NotImplementedError
+
+
+class MemoryReplicaStore(ReplicaStore):
+    """Keeps items in a dict, with a dict of keys for each index.  Everything is lost when the process exits."""
+    def __init__(self):
+        self.items = {}
+        # name -> index value -> set of keys
+        self.indexes = {}
+        self.state = None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "<{}[{}]>".format(self.__class__.__name__, len(self.items))
+
+    def prepare(self, indexes):
+        with self._lock:
+            self.indexes = {name: {} for name in indexes}
+            for key, item in self.items.items():
+                self._index(key, item)
+
+    def get(self, key):
+        with self._lock:
+            return self.items.get(key)
+
+    def find(self, name, value):
+        with self._lock:
+            return [self.items[key] for key in self.indexes[name].get(value, ())]
+
+    def all(self):
+        with self._lock:
+            return list(self.items.values())
+
+    def count(self):
+        with self._lock:
+            return len(self.items)
+
+    def apply(self, puts, deletes, state=None):
+        with self._lock:
+            for key in deletes:
+                item = self.items.pop(key, None)
+                if item is not None:
+                    self._unindex(key, item)
+            for key, item in puts.items():
+                previous = self.items.get(key)
+                if previous is not None:
+                    self._unindex(key, previous)
+                self.items[key] = item
+                self._index(key, item)
+            if state is not None:
+                self.state = state
+
+    def load_state(self):
+        with self._lock:
+            return self.state
+
+    def clear(self):
+        with self._lock:
+            self.items.clear()
+            for values in self.indexes.values():
+                values.clear()
+            self.state = None
+
+    def _index(self, key, item):
+        for name, values in self.indexes.items():
+            value = indexed(item, name)
+            if value is not None:
+                values.setdefault(value, set()).add(key)
+
+    def _unindex(self, key, item):
+        for name, values in self.indexes.items():
+            value = indexed(item, name)
+            if value is not None:
+                keys = values[value]
+                keys.discard(key)
+                if not keys:
+                    del values[value]
+
+
+class SQLiteReplicaStore(ReplicaStore):
+    """Keeps items in a SQLite table, so a replica survives restarts without scanning the table again.
+
+    Items are stored as DynamoDB json.  Indexed values go in a second table with a SQLite index on
+    ``(name, value)``, which :func:`~bloop.replica.SQLiteReplicaStore.prepare` rebuilds on startup.  Changes from
+    each batch of stream records are written in one transaction together with the stream position.
+
+    :param path: Location of the database file, or ":memory:".
+    :param str table: *(Optional)* Prefix for the store's tables.  Default is "bloop_replica".
+    """
+    def __init__(self, path, table="bloop_replica"):
+        self.path = str(path)
+        self.table = table
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS {} (key TEXT PRIMARY KEY, item TEXT NOT NULL)".format(table))
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS {}_index "
+                "(name TEXT NOT NULL, value TEXT NOT NULL, key TEXT NOT NULL, PRIMARY KEY (name, value, key))"
+                .format(table))
+            self._conn.execute("CREATE INDEX IF NOT EXISTS {0}_index_key ON {0}_index (key)".format(table))
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS {}_state (id INTEGER PRIMARY KEY, value TEXT NOT NULL)".format(table))
+        self._indexes = []
+
+    def __repr__(self):
+        return "<{}[{}]>".format(self.__class__.__name__, self.path)
+
+    def prepare(self, indexes):
+        with self._lock, self._conn:
+            self._indexes = list(indexes)
+            self._conn.execute("DELETE FROM {}_index".format(self.table))
+            rows = self._conn.execute("SELECT key, item FROM {}".format(self.table)).fetchall()
+            for key, item in rows:
+                self._index(key, load_wire(json.loads(item)))
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT item FROM {} WHERE key = ?".format(self.table), (key,)).fetchone()
+        return None if row is None else load_wire(json.loads(row[0]))
+
+    def find(self, name, value):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT item.item FROM {0}_index AS ix JOIN {0} AS item ON item.key = ix.key "
+                "WHERE ix.name = ? AND ix.value = ?".format(self.table), (name, value)).fetchall()
+        return [load_wire(json.loads(row[0])) for row in rows]
+
+    def all(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT item FROM {}".format(self.table)).fetchall()
+        return [load_wire(json.loads(row[0])) for row in rows]
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM {}".format(self.table)).fetchone()[0]
+
+    def apply(self, puts, deletes, state=None):
+        with self._lock, self._conn:
+            for key in list(deletes) + list(puts):
+                self._conn.execute("DELETE FROM {} WHERE key = ?".format(self.table), (key,))
+                self._conn.execute("DELETE FROM {}_index WHERE key = ?".format(self.table), (key,))
+            for key, item in puts.items():
+                self._conn.execute(
+                    "INSERT INTO {} (key, item) VALUES (?, ?)".format(self.table), (key, json.dumps(dump_wire(item))))
+                self._index(key, item)
+            if state is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO {}_state (id, value) VALUES (0, ?)".format(self.table),
+                    (json.dumps(state),))
+
+    def load_state(self):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM {}_state WHERE id = 0".format(self.table)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def clear(self):
+        with self._lock, self._conn:
+            for suffix in ("", "_index", "_state"):
+                self._conn.execute("DELETE FROM {}{}".format(self.table, suffix))
+
+    def close(self):
+        """Close the underlying connection."""
+        with self._lock:
+            self._conn.close()
+
+    def _index(self, key, item):
+        for name in self._indexes:
+            value = indexed(item, name)
+            if value is not None:
+                self._conn.execute(
+                    "INSERT INTO {}_index (name, value, key) VALUES (?, ?, ?)".format(self.table), (name, value, key))
+
+
+def indexed(item, name):
+    attr = item.get(name)
+    return None if attr is None else index_value(attr)
+
+
+class TableReplica:
+    """A local copy of a table, loaded with a parallel scan and kept up to date from the table's stream.
+
+    Meant for small tables that are read far more often than they change, like feature flags or prices: reads
+    are served from the ``store`` without calling DynamoDB.  The stream's position is taken before the scan
+    starts, so changes made during the scan are applied afterwards.  The model's stream must include new images.
+
+    .. code-block:: python
+
+        replica = TableReplica(engine, Flag, indexes=[Flag.service], max_staleness=30)
+        replica.start()
+
+        flag = Flag(name="new-checkout")
+        replica.load(flag)
+        flags = replica.query(Flag.service, "checkout")
+
+    The replica's staleness is the lag of its slowest shard, plus the time since the stream was last polled.
+    With ``max_staleness``, reads raise :exc:`~bloop.exceptions.StaleReplica` when it's higher, so callers can
+    fall back to the table.
+
+    A :class:`~bloop.replica.SQLiteReplicaStore` also saves the stream position, so a replica that restarts within
+    12 hours resumes from the stream instead of scanning again.
+
+    :param engine: Engine used to scan the table, read its stream, and load objects.
+    :type engine: :class:`~bloop.engine.Engine`
+    :param model: The model to replicate.
+    :param store: *(Optional)* Where items are kept.  Default is a :class:`~bloop.replica.MemoryReplicaStore`.
+    :type store: :class:`~bloop.replica.ReplicaStore`
+    :param indexes: *(Optional)* Columns that :func:`~bloop.replica.TableReplica.query` can look up by value.
+        The hash key is always indexed.
+    :param int segments: *(Optional)* Number of parallel scan segments.  Default is 1.
+    :param float max_staleness: *(Optional)* Seconds of staleness before reads raise.  Default is None, which
+        never raises.
+    :param int batch_size: *(Optional)* Maximum stream records applied at once.  Default is 1000.
+    :param float poll_interval: *(Optional)* Seconds the background thread waits after a poll finds no records.
+        Default is 1.
+    """
+    def __init__(
+            self, engine, model, *, store=None, indexes=(), segments=1, max_staleness=None, batch_size=1000,
+            poll_interval=1.0):
+        validate_not_abstract(model)
+        stream = model.Meta.stream
+        if not stream or not stream.get("arn"):
+            raise InvalidStream("{!r} does not have a stream arn".format(model))
+        if "new" not in stream["include"]:
+            raise InvalidStream("{!r} must include new images in its stream to be replicated".format(model))
+        if segments < 1:
+            raise ValueError("segments must be at least 1 but was {}".format(segments))
+        indexes = [model.Meta.hash_key, *indexes]
+        for column in indexes:
+            if column not in model.Meta.columns:
+                raise ValueError("{!r} is not a column of {!r}".format(column, model))
+
+        self.engine = engine
+        self.model = model
+        self.store = store or MemoryReplicaStore()
+        self.segments = segments
+        self.max_staleness = max_staleness
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.indexes = {column.dynamo_name for column in indexes}
+        self.store.prepare(sorted(self.indexes))
+        self.coordinator = Coordinator(session=engine.session, stream_arn=stream["arn"])
+        #: Stream records applied since the replica was created
+        self.records_applied = 0
+
+        self._key_shape = [column.dynamo_name for column in model.Meta.keys]
+        self._lag = None
+        self._polled_at = None
+        self._saved_at = None
+        self._thread = None
+        self._stopped = threading.Event()
+
+    def __repr__(self):
+        # <TableReplica[Flag]>
+        return "<{}[{}]>".format(self.__class__.__name__, self.model.__name__)
+
+    def __len__(self):
+        return self.store.count()
+
+    @property
+    def running(self):
+        """True while the background thread is running."""
+        return self._thread is not None
+
+    def bootstrap(self):
+        """Resume from the store's saved position, or load the table with a parallel scan.
+
+        Called by :func:`~bloop.replica.TableReplica.start`.
+        """
+        state = self.store.load_state()
+        if state is not None and self._resumable(state):
+            logger.info("{!r} resuming from its saved stream position".format(self))
+            self.coordinator.move_to(state["token"])
+        else:
+            self.coordinator.move_to("latest")
+            self.store.clear()
+            count = self._scan()
+            logger.info("{!r} loaded {} items".format(self, count))
+        self.poll()
+
+    def start(self):
+        """Bootstrap the replica, then apply changes from the stream on a daemon thread.  Does nothing if already
+        running."""
+        if self._thread is not None:
+            return
+        self.bootstrap()
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="bloop-replica", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background thread, waiting for the batch in progress to be applied."""
+        if self._thread is None:
+            return
+        self._stopped.set()
+        self._thread.join()
+        self._thread = None
+
+    def close(self):
+        """Stop the background thread and stop reading the stream.  The store is left open."""
+        self.stop()
+        self.coordinator.close()
+
+    def poll(self):
+        """Apply the next batch of changes from the stream.  Called by the background thread.
+
+        :return: Number of stream records applied.
+        :rtype: int
+        """
+        records = self.coordinator.next_batch(self.batch_size)
+        puts, deletes = {}, set()
+        for record in records:
+            key = self._key_for(record["key"] or record["new"] or record["old"])
+            if record["meta"]["event"]["type"] == "remove":
+                puts.pop(key, None)
+                deletes.add(key)
+            else:
+                deletes.discard(key)
+                puts[key] = record["new"]
+        state = None
+        if records or self._saved_at is None or time.monotonic() - self._saved_at >= SAVE_INTERVAL:
+            state = self._state()
+        if records or state is not None:
+            self.store.apply(puts, deletes, state)
+        self.records_applied += len(records)
+
+        lags = [shard["lag"] for shard in self.coordinator.shard_metrics()]
+        self._lag = None if None in lags else max(lags, default=0.0)
+        self._polled_at = time.monotonic()
+        return len(records)
+
+    def staleness(self):
+        """Seconds of changes the replica may be missing, or None if it doesn't know yet.
+
+        :rtype: float
+        """
+        if self._lag is None:
+            return None
+        return self._lag + time.monotonic() - self._polled_at
+
+    def metrics(self):
+        """Item count, stream records applied, the slowest shard's lag at the last poll, and staleness.
+
+        Per-shard counters are available from
+        :func:`Coordinator.shard_metrics <bloop.stream.coordinator.Coordinator.shard_metrics>`.
+
+        :rtype: dict
+        """
+        return {
+            "items": self.store.count(),
+            "records_applied": self.records_applied,
+            "lag": self._lag,
+            "staleness": self.staleness(),
+        }
+
+    def load(self, *objs):
+        """Populate objects from the replica, like :func:`Engine.load <bloop.engine.Engine.load>`.
+
+        :param objs: Objects to load.
+        :raises bloop.exceptions.MissingKey: if any object doesn't provide a value for a key column.
+        :raises bloop.exceptions.MissingObjects: if one or more objects aren't in the replica.
+        :raises bloop.exceptions.StaleReplica: if the replica is staler than ``max_staleness``.
+        """
+        self._check_staleness()
+        not_loaded = set()
+        for obj in objs:
+            item = self.store.get(self._key_for(dump_key(self.engine, obj)))
+            if item is None:
+                not_loaded.add(obj)
+                continue
+            unpack_from_dynamodb(attrs=item, expected=obj.Meta.columns, engine=self.engine, obj=obj)
+            object_loaded.send(self.engine, engine=self.engine, obj=obj)
+        if not_loaded:
+            raise MissingObjects("Failed to load some objects.", objects=not_loaded)
+
+    def query(self, column, value, filter=None):
+        """Objects whose ``column`` equals ``value``, in no particular order.
+
+        :param column: The hash key, or a column from ``indexes``.
+        :param value: Value to match.
+        :param filter: *(Optional)* Condition the objects must also match.
+        :type filter: :class:`~bloop.conditions.BaseCondition`
+        :rtype: list
+        :raises bloop.exceptions.StaleReplica: if the replica is staler than ``max_staleness``.
+        """
+        if column.dynamo_name not in self.indexes:
+            raise ValueError("{!r} is not indexed by {!r}".format(column, self))
+        # noinspection PyProtectedMember
+        action = column.typedef._dump(value, context=default_context(self.engine))
+        self._check_staleness()
+        return self._unpack(self.store.find(column.dynamo_name, index_value(action.value)), filter)
+
+    def scan(self, filter=None):
+        """Every object in the replica, in no particular order.
+
+        :param filter: *(Optional)* Condition the objects must match.
+        :type filter: :class:`~bloop.conditions.BaseCondition`
+        :rtype: list
+        :raises bloop.exceptions.StaleReplica: if the replica is staler than ``max_staleness``.
+        """
+        self._check_staleness()
+        return self._unpack(self.store.all(), filter)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                applied = self.poll()
+            except Exception:
+                logger.exception("{!r} failed to apply changes from the stream".format(self))
+                applied = 0
+            if not applied:
+                self._stopped.wait(self.poll_interval)
+
+    def _scan(self):
+        base_request = Search(
+            mode="scan", engine=self.engine, model=self.model, index=None, filter=None,
+            projection="all", consistent=True).prepare()._request
+
+        def scan_segment(segment):
+            request = dict(base_request)
+            if self.segments > 1:
+                request["Segment"], request["TotalSegments"] = segment, self.segments
+            count = 0
+            while True:
+                response = self.engine.session.search_items("scan", request)
+                items = response.get("Items", [])
+                self.store.apply({self._key_for(item): item for item in items}, ())
+                count += len(items)
+                token = response.get("LastEvaluatedKey")
+                if not token:
+                    return count
+                request["ExclusiveStartKey"] = token
+
+        total = 0
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.segments) as executor:
+            pending = {executor.submit(scan_segment, segment) for segment in range(self.segments)}
+            while pending:
+                done, pending = concurrent.futures.wait(pending, timeout=HEARTBEAT_INTERVAL)
+                for future in done:
+                    total += future.result()
+                if pending:
+                    self.coordinator.heartbeat()
+        return total
+
+    def _state(self):
+        """The position to save, or None while any shard is still at "latest", which can't be resumed exactly."""
+        with self.coordinator.lock:
+            if any(shard.iterator_type == "latest" for shard in self.coordinator.active):
+                return None
+            token = self.coordinator.token
+        self._saved_at = time.monotonic()
+        return {"token": token, "saved_at": time.time()}
+
+    def _resumable(self, state):
+        return (
+            state["token"].get("stream_arn") == self.model.Meta.stream["arn"] and
+            time.time() - state["saved_at"] < RESUME_WITHIN)
+
+    def _key_for(self, attrs):
+        return json.dumps([index_value(attrs[name]) for name in self._key_shape])
+
+    def _check_staleness(self):
+        if self.max_staleness is None:
+            return
+        staleness = self.staleness()
+        if staleness is None or staleness > self.max_staleness:
+            raise StaleReplica("{!r} is {} seconds stale".format(
+                self, "an unknown number of" if staleness is None else round(staleness, 1)))
+
+    def _unpack(self, items, filter):
+        if filter is not None:
+            rendered = render(self.engine, filter=filter)
+            parser = ExpressionParser(
+                rendered.get("ExpressionAttributeNames"), rendered.get("ExpressionAttributeValues"))
+            node = parser.condition(rendered["FilterExpression"])
+            items = [item for item in items if evaluate(node, item)]
+        objs = []
+        model, engine = self.model, self.engine
+        for item in items:
+            obj = unpack_from_dynamodb(attrs=item, expected=model.Meta.columns, model=model, engine=engine)
+            object_loaded.send(engine, engine=engine, obj=obj)
+            objs.append(obj)
+        return objs
@@ -2,8 +2,10 @@ import collections
 
 from .conditions import BaseCondition, iter_columns, render
 from .exceptions import ConstraintViolation, InvalidSearch
+from .metrics import operation_scope
 from .models import Column, GlobalSecondaryIndex, unpack_from_dynamodb
 from .signals import object_loaded
+from .tracing import span
 
 
 __all__ = ["ScanIterator", "Search", "QueryIterator"]
@@ -306,7 +308,7 @@ class PreparedSearch:
 
         if self.mode == "scan":
             if self.parallel:
-                request["Segments"], request["TotalSegments"] = self.parallel
+                request["Segment"], request["TotalSegments"] = self.parallel
         else:
             request["ScanIndexForward"] = self.forward
 
@@ -323,7 +325,8 @@ class PreparedSearch:
             request["Select"] = "SPECIFIC_ATTRIBUTES"
             projected = self._projected_columns
 
-        request.update(render(self.engine, filter=self.filter, projection=projected, key=self.key))
+        with operation_scope(self.mode):
+            request.update(render(self.engine, filter=self.filter, projection=projected, key=self.key))
 
     def __repr__(self):
         return search_repr(self.__class__, self.model, self.index)
@@ -472,7 +475,9 @@ class SearchIterator:
 
     def __next__(self):
         while (not self._exhausted) and len(self.buffer) == 0:
-            response = self.session.search_items(self.mode, self.request)
+            with operation_scope(self.mode), span("bloop.search.page", request=self.request) as scope:
+                response = self.session.search_items(self.mode, self.request)
+                scope.set_response(response)
             continuation_token = response.get("LastEvaluatedKey", None)
             if continuation_token:
                 self.request["ExclusiveStartKey"] = continuation_token
@@ -513,11 +518,12 @@ class SearchModelIterator(SearchIterator):
 
     def __next__(self):
         attrs = super().__next__()
-        obj = unpack_from_dynamodb(
-            attrs=attrs,
-            expected=self.projected,
-            model=self.model,
-            engine=self.engine)
+        with operation_scope(self.mode):
+            obj = unpack_from_dynamodb(
+                attrs=attrs,
+                expected=self.projected,
+                model=self.model,
+                engine=self.engine)
         object_loaded.send(self.engine, engine=self.engine, obj=obj)
         return obj
 
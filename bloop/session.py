@@ -1,4 +1,5 @@
 import collections
+import contextlib
 import functools
 import logging
 from typing import Iterable  # noqa: F401
@@ -15,8 +16,12 @@ from .exceptions import (
     RecordsExpired,
     ShardIteratorExpired,
     TableMismatch,
+    ThroughputExceeded,
     TransactionCanceled,
 )
+from .metrics import OPERATIONS, current_tag, timed, timed_phase
+from .signals import capacity_consumed
+from .tracing import get_tracer, span
 from .util import Sentinel, ordered
 
 
@@ -27,6 +32,10 @@ ready = Sentinel("ready")
 __all__ = ["SessionWrapper"]
 # https://boto3.readthedocs.io/en/latest/reference/services/dynamodb.html#DynamoDB.Client.batch_get_item
 BATCH_GET_ITEM_CHUNK_SIZE = 100
+# https://boto3.readthedocs.io/en/latest/reference/services/dynamodb.html#DynamoDB.Client.batch_write_item
+BATCH_WRITE_ITEM_CHUNK_SIZE = 25
+
+THROTTLING_ERRORS = {"ProvisionedThroughputExceededException", "RequestLimitExceeded", "ThrottlingException"}
 
 SHARD_ITERATOR_TYPES = {
     "at_sequence": "AT_SEQUENCE_NUMBER",
@@ -43,19 +52,24 @@ class SessionWrapper:
 
     :param dynamodb: A boto3 client for DynamoDB.  Defaults to ``boto3.client("dynamodb")``.
     :param dynamodbstreams: A boto3 client for DynamoDbStreams.  Defaults to ``boto3.client("dynamodbstreams")``.
+    :param capacity: *(Optional)* A :class:`~bloop.metrics.CapacityRegistry`.  When provided, every data-plane call
+        requests "INDEXES" consumed capacity, records it in the registry, and sends
+        :data:`~bloop.signals.capacity_consumed`.
     """
-    def __init__(self, dynamodb=None, dynamodbstreams=None):
+    def __init__(self, dynamodb=None, dynamodbstreams=None, *, capacity=None):
         dynamodb = dynamodb or boto3.client("dynamodb")
         dynamodbstreams = dynamodbstreams or boto3.client("dynamodbstreams")
 
         self._tables = {}
         self.dynamodb_client = dynamodb
         self.stream_client = dynamodbstreams
+        self.capacity = capacity
 
     def clear_cache(self):
         """Clear all cached table descriptions."""
         self._tables.clear()
 
+    @timed("session")
     def save_item(self, item):
         """Save an object to DynamoDB.
 
@@ -65,12 +79,16 @@ class SessionWrapper:
         :param item: Unpacked into kwargs for :func:`boto3.DynamoDB.Client.update_item`.
         :raises bloop.exceptions.ConstraintViolation: if the condition (or atomic) is not met.
         """
-        try:
-            resp = self.dynamodb_client.update_item(**item)
-            return resp.get("Attributes", None)
-        except botocore.exceptions.ClientError as error:
-            handle_constraint_violation(error)
+        with span("bloop.session.save_item", request=item) as scope:
+            try:
+                resp = self.dynamodb_client.update_item(**self._with_capacity(item))
+                self._record_capacity("update_item", resp)
+                scope.set_response(resp)
+                return resp.get("Attributes", None)
+            except botocore.exceptions.ClientError as error:
+                handle_constraint_violation(error)
 
+    @timed("session")
     def delete_item(self, item):
         """Delete an object in DynamoDB.
 
@@ -80,35 +98,78 @@ class SessionWrapper:
         :param item: Unpacked into kwargs for :func:`boto3.DynamoDB.Client.delete_item`.
         :raises bloop.exceptions.ConstraintViolation: if the condition (or atomic) is not met.
         """
-        try:
-            resp = self.dynamodb_client.delete_item(**item)
-            return resp.get("Attributes", None)
-        except botocore.exceptions.ClientError as error:
-            handle_constraint_violation(error)
+        with span("bloop.session.delete_item", request=item) as scope:
+            try:
+                resp = self.dynamodb_client.delete_item(**self._with_capacity(item))
+                self._record_capacity("delete_item", resp)
+                scope.set_response(resp)
+                return resp.get("Attributes", None)
+            except botocore.exceptions.ClientError as error:
+                handle_constraint_violation(error)
 
+    @timed("session")
     def load_items(self, items):
         """Loads any number of items in chunks, handling continuation tokens.
 
         :param items: Unpacked in chunks into "RequestItems" for :func:`boto3.DynamoDB.Client.batch_get_item`.
         """
         loaded_items = {}
-        requests = collections.deque(create_batch_get_chunks(items))
-        while requests:
-            request = requests.pop()
-            try:
-                response = self.dynamodb_client.batch_get_item(RequestItems=request)
-            except botocore.exceptions.ClientError as error:
-                raise BloopException("Unexpected error while loading items.") from error
+        requests = collections.deque((chunk, False) for chunk in create_batch_get_chunks(items))
+        retries = 0
+        with span("bloop.session.load_items", request={"RequestItems": items}) as outer:
+            while requests:
+                request, is_retry = requests.pop()
+                with span("bloop.session.batch_get.chunk", request={"RequestItems": request}) as scope:
+                    if scope.recording:
+                        scope.set_attribute("bloop.keys", sum(len(table["Keys"]) for table in request.values()))
+                        scope.set_attribute("bloop.retry", is_retry)
+                    try:
+                        # Resubmitting unprocessed keys is also timed as "retries"
+                        with timed_phase("retries", "load_items") if is_retry else contextlib.nullcontext():
+                            response = self.dynamodb_client.batch_get_item(
+                                **self._with_capacity({"RequestItems": request}))
+                    except botocore.exceptions.ClientError as error:
+                        raise BloopException("Unexpected error while loading items.") from error
+                    self._record_capacity("batch_get_item", response)
+                    scope.set_response(response)
+
+                # Accumulate results
+                for table_name, table_items in response.get("Responses", {}).items():
+                    loaded_items.setdefault(table_name, []).extend(table_items)
+
+                # Push additional request onto the deque.
+                # "UnprocessedKeys" is {} if this request is done
+                if response["UnprocessedKeys"]:
+                    requests.append((response["UnprocessedKeys"], True))
+                    retries += 1
+            outer.set_attribute("bloop.retries", retries)
+        return loaded_items
 
-            # Accumulate results
-            for table_name, table_items in response.get("Responses", {}).items():
-                loaded_items.setdefault(table_name, []).extend(table_items)
+    @timed("session")
+    def write_items(self, items):
+        """Wraps :func:`boto3.DynamoDB.Client.batch_write_item` for a single chunk of at most 25 requests.
 
-            # Push additional request onto the deque.
-            # "UnprocessedKeys" is {} if this request is done
-            if response["UnprocessedKeys"]:
-                requests.append(response["UnprocessedKeys"])
-        return loaded_items
+        Unlike :func:`~bloop.session.SessionWrapper.load_items` this does not retry unprocessed items, so that
+        callers can apply their own backoff and rate limits.
+
+        :param items: Unpacked into "RequestItems" for :func:`boto3.DynamoDB.Client.batch_write_item`.
+        :return: The "UnprocessedItems" from the response, which is empty when every request was processed.
+        :rtype: dict
+        :raises bloop.exceptions.ThroughputExceeded: if the entire request was throttled.
+        """
+        with span("bloop.session.write_items", request={"RequestItems": items}) as scope:
+            try:
+                response = self.dynamodb_client.batch_write_item(**self._with_capacity({"RequestItems": items}))
+            except botocore.exceptions.ClientError as error:
+                if error.response["Error"]["Code"] in THROTTLING_ERRORS:
+                    raise ThroughputExceeded("Throughput exceeded while writing items.") from error
+                raise BloopException("Unexpected error while writing items.") from error
+            self._record_capacity("batch_write_item", response)
+            unprocessed = response.get("UnprocessedItems", {})
+            if scope.recording:
+                scope.set_response(response)
+                scope.set_attribute("bloop.unprocessed", sum(len(requests) for requests in unprocessed.values()))
+            return unprocessed
 
     def query_items(self, request):
         """Wraps :func:`boto3.DynamoDB.Client.query`.
@@ -128,6 +189,7 @@ class SessionWrapper:
         """
         return self.search_items("scan", request)
 
+    @timed("session")
     def search_items(self, mode, request):
         """Invoke query/scan by name.
 
@@ -138,11 +200,14 @@ class SessionWrapper:
         """
         validate_search_mode(mode)
         method = getattr(self.dynamodb_client, mode)
-        try:
-            response = method(**request)
-        except botocore.exceptions.ClientError as error:
-            raise BloopException("Unexpected error during {}.".format(mode)) from error
-        standardize_query_response(response)
+        with span("bloop.session.search_items", request=request, attributes={"bloop.mode": mode}) as scope:
+            try:
+                response = method(**self._with_capacity(request))
+            except botocore.exceptions.ClientError as error:
+                raise BloopException("Unexpected error during {}.".format(mode)) from error
+            self._record_capacity(mode, response)
+            standardize_query_response(response)
+            scope.set_response(response)
         return response
 
     def create_table(self, table_name, model):
@@ -308,6 +373,7 @@ class SessionWrapper:
         except botocore.exceptions.ClientError as error:
             raise BloopException("Unexpected error while setting Continuous Backups.") from error
 
+    @timed("session")
     def describe_stream(self, stream_arn, first_shard=None):
         """Wraps :func:`boto3.DynamoDBStreams.Client.describe_stream`, handling continuation tokens.
 
@@ -325,7 +391,8 @@ class SessionWrapper:
 
         while request.get("ExclusiveStartShardId") is not missing:
             try:
-                response = self.stream_client.describe_stream(**request)["StreamDescription"]
+                with span("bloop.session.describe_stream"):
+                    response = self.stream_client.describe_stream(**request)["StreamDescription"]
             except botocore.exceptions.ClientError as error:
                 if error.response["Error"]["Code"] == "ResourceNotFoundException":
                     raise InvalidStream(f"The stream arn {stream_arn!r} does not exist.") from error
@@ -338,6 +405,7 @@ class SessionWrapper:
             description.update(response)
         return description
 
+    @timed("session")
     def get_shard_iterator(self, *, stream_arn, shard_id, iterator_type, sequence_number=None):
         """Wraps :func:`boto3.DynamoDBStreams.Client.get_shard_iterator`.
 
@@ -360,12 +428,14 @@ class SessionWrapper:
         if sequence_number is None:
             request.pop("SequenceNumber")
         try:
-            return self.stream_client.get_shard_iterator(**request)["ShardIterator"]
+            with span("bloop.session.get_shard_iterator", attributes={"bloop.shard_id": shard_id}):
+                return self.stream_client.get_shard_iterator(**request)["ShardIterator"]
         except botocore.exceptions.ClientError as error:
             if error.response["Error"]["Code"] == "TrimmedDataAccessException":
                 raise RecordsExpired from error
             raise BloopException("Unexpected error while creating shard iterator") from error
 
+    @timed("session")
     def get_stream_records(self, iterator_id):
         """Wraps :func:`boto3.DynamoDBStreams.Client.get_records`.
 
@@ -376,7 +446,11 @@ class SessionWrapper:
         :raises bloop.exceptions.ShardIteratorExpired: The iterator was created more than 15 minutes ago.
         """
         try:
-            return self.stream_client.get_records(ShardIterator=iterator_id)
+            with span("bloop.session.get_stream_records") as scope:
+                response = self.stream_client.get_records(ShardIterator=iterator_id)
+                if scope.recording:
+                    scope.set_attribute("bloop.records", len(response.get("Records", [])))
+                return response
         except botocore.exceptions.ClientError as error:
             if error.response["Error"]["Code"] == "TrimmedDataAccessException":
                 raise RecordsExpired from error
@@ -384,6 +458,7 @@ class SessionWrapper:
                 raise ShardIteratorExpired from error
             raise BloopException("Unexpected error while getting records.") from error
 
+    @timed("session")
     def transaction_read(self, items):
         """
         Wraps :func:`boto3.DynamoDB.Client.db.transact_get_items`.
@@ -392,13 +467,19 @@ class SessionWrapper:
         :raises bloop.exceptions.TransactionCanceled: if the transaction was canceled.
         :return: Dict with "Records" list
         """
-        try:
-            return self.dynamodb_client.transact_get_items(TransactItems=items)
-        except botocore.exceptions.ClientError as error:
-            if error.response["Error"]["Code"] == "TransactionCanceledException":
-                raise TransactionCanceled from error
-            raise BloopException("Unexpected error during transaction read.") from error
+        request = {"TransactItems": items}
+        with span("bloop.session.transaction_read", request=request) as scope:
+            try:
+                response = self.dynamodb_client.transact_get_items(**self._with_capacity(request))
+            except botocore.exceptions.ClientError as error:
+                if error.response["Error"]["Code"] == "TransactionCanceledException":
+                    raise TransactionCanceled from error
+                raise BloopException("Unexpected error during transaction read.") from error
+            self._record_capacity("transact_get_items", response)
+            scope.set_response(response)
+        return response
 
+    @timed("session")
     def transaction_write(self, items, client_request_token):
         """
         Wraps :func:`boto3.DynamoDB.Client.db.transact_write_items`.
@@ -408,15 +489,34 @@ class SessionWrapper:
             Unpacked into "ClientRequestToken"
         :raises bloop.exceptions.TransactionCanceled: if the transaction was canceled.
         """
-        try:
-            self.dynamodb_client.transact_write_items(
-                TransactItems=items,
-                ClientRequestToken=client_request_token
-            )
-        except botocore.exceptions.ClientError as error:
-            if error.response["Error"]["Code"] == "TransactionCanceledException":
-                raise TransactionCanceled from error
-            raise BloopException("Unexpected error during transaction write.") from error
+        request = {"TransactItems": items, "ClientRequestToken": client_request_token}
+        with span("bloop.session.transaction_write", request=request) as scope:
+            try:
+                response = self.dynamodb_client.transact_write_items(**self._with_capacity(request))
+            except botocore.exceptions.ClientError as error:
+                if error.response["Error"]["Code"] == "TransactionCanceledException":
+                    raise TransactionCanceled from error
+                raise BloopException("Unexpected error during transaction write.") from error
+            self._record_capacity("transact_write_items", response)
+            scope.set_response(response)
+
+    def _with_capacity(self, request):
+        # Traces include consumed capacity, so request it while a tracer is set
+        if self.capacity is None and get_tracer() is None:
+            return request
+        return {**request, "ReturnConsumedCapacity": "INDEXES"}
+
+    def _record_capacity(self, method, response):
+        if self.capacity is None:
+            return
+        consumed = response.get("ConsumedCapacity")
+        if not consumed:
+            return
+        operation, tag = OPERATIONS[method], current_tag()
+        if isinstance(consumed, dict):
+            consumed = [consumed]
+        self.capacity.record(operation, consumed, tag=tag)
+        capacity_consumed.send(self, operation=operation, tag=tag, capacity=consumed)
 
 
 def validate_search_mode(mode):
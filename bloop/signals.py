@@ -3,6 +3,7 @@ import blinker
 
 __all__ = [
     "before_create_table",
+    "capacity_consumed",
     "object_deleted",
     "object_loaded",
     "object_modified",
@@ -10,6 +11,7 @@ __all__ = [
     "model_bound",
     "model_created",
     "model_validated",
+    "shard_polled",
 ]
 
 # Isolate to avoid collisions with other modules.
@@ -33,6 +35,25 @@ before_create_table.__doc__ = """Sent by ``engine`` before a model's backing tab
 :param model: The :class:`~bloop.models.BaseModel` class to create a table for.
 """
 
+capacity_consumed = signal("capacity_consumed")
+capacity_consumed.__doc__ = """Sent by ``session`` after a request that consumed capacity, if tracking is enabled.
+
+.. code-block:: python
+
+    # Log any single request over 100 units
+    @capacity_consumed.connect
+    def log_expensive(_, operation, tag, capacity, **__):
+        for entry in capacity:
+            if entry["CapacityUnits"] > 100:
+                logger.warning("{} on {} ({}) used {}".format(
+                    operation, entry["TableName"], tag, entry["CapacityUnits"]))
+
+:param session: The :class:`~bloop.session.SessionWrapper` that made the call.
+:param str operation: "batch_get", "batch_write", "delete", "query", "scan", "transact", or "update".
+:param str tag: The innermost :func:`~bloop.metrics.tagged` tag when the call was made, or None.
+:param list capacity: The response's "ConsumedCapacity", always as a list of dicts.
+"""
+
 object_loaded = signal("object_loaded")
 object_loaded.__doc__ = """Sent by ``engine`` after an object is loaded from DynamoDB.
 
@@ -149,3 +170,21 @@ This signal is sent before :data:`~bloop.signals.model_bound`.
 :param engine: The :class:`~bloop.engine.Engine` that validated the model.
 :param model: The :class:`~bloop.models.BaseModel` class that was validated.
 """
+
+shard_polled = signal("shard_polled")
+shard_polled.__doc__ = """Sent by ``shard`` after each GetRecords call while reading a stream.
+
+.. code-block:: python
+
+    # Alert when a shard falls more than 5 minutes behind
+    @shard_polled.connect
+    def watch_lag(_, shard, lag, **__):
+        if lag is not None and lag > 300:
+            alert("shard {} is {:.0f} seconds behind".format(shard.shard_id, lag))
+
+:param shard: The :class:`~bloop.stream.shard.Shard` that was polled.
+:param records: Number of records returned.
+:param elapsed: Seconds the call took.
+:param lag: Seconds since the last record consumed from the shard was created, 0 if the call found no new
+    records, or None if nothing was consumed yet.
+"""
@@ -1,4 +1,15 @@
+from .checkpoint import StreamCheckpointer
+from .dispatch import StreamDispatcher
+from .filter import StreamFilter
+from .lease import LeaseCoordinator
+from .maintenance import StreamMaintenance
+from .polling import PollingPolicy
+from .seek import SeekIndex
 from .stream import Stream
+from .tee import StreamTee
 
 
-__all__ = ["Stream"]
+__all__ = [
+    "LeaseCoordinator", "PollingPolicy", "SeekIndex", "Stream", "StreamCheckpointer", "StreamDispatcher",
+    "StreamFilter", "StreamMaintenance", "StreamTee",
+]
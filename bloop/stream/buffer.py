@@ -1,3 +1,5 @@
+import bisect
+import collections
 import heapq
 
 
@@ -21,7 +23,9 @@ def heap_item(clock, record, shard):
 class RecordBuffer:
     """Maintains a total ordering for records across any number of shards.
 
-    Methods are thin wrappers around :mod:`heapq`.  Buffer entries have the form:
+    Records from each shard are kept in their own FIFO queue, since a shard returns records in order.  A small
+    heap holds the first entry of each non-empty queue, so :meth:`pop` costs ``O(log shards)`` and dropping every
+    record from one shard is ``O(1)``.  Buffer entries have the form:
 
     .. code-block: python
 
@@ -31,7 +35,14 @@ class RecordBuffer:
     record as it is inserted.
     """
     def __init__(self):
-        self.heap = []
+        # shard -> deque of entries, oldest first
+        self.queues = {}
+
+        # Heap of the first entry in each queue.  Entries go stale when their shard is dropped or a
+        # record is inserted ahead of them; stale entries are skipped when they reach the top.
+        self.heads = []
+
+        self.size = 0
 
         # Used by the total ordering clock
         self.__monotonic_integer = 0
@@ -43,40 +54,140 @@ class RecordBuffer:
         :param shard: Shard the record came from
         :type shard: :class:`~bloop.stream.shard.Shard`
         """
-        heapq.heappush(self.heap, heap_item(self.clock, record, shard))
+        self._append(heap_item(self.clock, record, shard))
 
     def push_all(self, record_shard_pairs):
-        """Push multiple (record, shard) pairs at once, with only one :meth:`heapq.heapify` call to maintain order.
+        """Push multiple (record, shard) pairs at once.
 
         :param record_shard_pairs: list of ``(record, shard)`` tuples
             (see :func:`~bloop.stream.buffer.RecordBuffer.push`).
         """
-        # Faster than inserting one at a time; the heap is sorted once after all inserts.
+        clock = self.clock
+        grouped = {}
         for record, shard in record_shard_pairs:
-            item = heap_item(self.clock, record, shard)
-            self.heap.append(item)
-        heapq.heapify(self.heap)
+            items = grouped.get(shard)
+            if items is None:
+                items = grouped[shard] = []
+            items.append(heap_item(clock, record, shard))
+
+        queues, changed = self.queues, []
+        for shard, items in grouped.items():
+            queue = queues.get(shard)
+            if queue is None:
+                queue = queues[shard] = collections.deque()
+            head = queue[0] if queue else None
+            # A shard's records are almost always in order already, so sorting is a single pass
+            items.sort()
+            if not queue or queue[-1] < items[0]:
+                queue.extend(items)
+            else:
+                # Out of order with what's buffered; insert each in place.
+                for item in items:
+                    bisect.insort(queue, item)
+            if queue[0] is not head:
+                changed.append(queue[0])
+            self.size += len(items)
+
+        heads = self.heads
+        if len(changed) > len(heads) // 2:
+            # Rebuilding is cheaper than pushing many new heads one at a time
+            heads.extend(changed)
+            heapq.heapify(heads)
+        else:
+            for item in changed:
+                heapq.heappush(heads, item)
 
     def pop(self):
         """Pop the oldest (lowest total ordering) record and the shard it came from.
 
         :return: Oldest ``(record, shard)`` tuple.
         """
-        return heapq.heappop(self.heap)[1:]
+        item = self._head()
+        shard = item[2]
+        queue = self.queues[shard]
+        queue.popleft()
+        if queue:
+            # The shard's next record replaces it in a single sift.
+            heapq.heapreplace(self.heads, queue[0])
+        else:
+            heapq.heappop(self.heads)
+            del self.queues[shard]
+        self.size -= 1
+        return item[1:]
+
+    def pop_many(self, n):
+        """Pop up to ``n`` of the oldest records, in order.
+
+        :param int n: Maximum number of records to pop.
+        :return: List of ``(record, shard)`` tuples, oldest first.  Empty when the buffer is.
+        """
+        pop = self.pop
+        return [pop() for _ in range(min(n, self.size))]
 
     def peek(self):
         """A :func:`~bloop.stream.buffer.RecordBuffer.pop` without removing the (record, shard) from the buffer.
 
         :return: Oldest ``(record, shard)`` tuple.
         """
-        return self.heap[0][1:]
+        return self._head()[1:]
+
+    def count(self, shard):
+        """Number of records buffered from a shard.
+
+        :param shard: Shard the records came from
+        :type shard: :class:`~bloop.stream.shard.Shard`
+        :rtype: int
+        """
+        queue = self.queues.get(shard)
+        return len(queue) if queue else 0
+
+    def drop(self, shard):
+        """Remove every record buffered from a shard.
+
+        :param shard: Shard the records came from
+        :type shard: :class:`~bloop.stream.shard.Shard`
+        :return: Number of records dropped.
+        :rtype: int
+        """
+        queue = self.queues.pop(shard, None)
+        if not queue:
+            return 0
+        self.size -= len(queue)
+        return len(queue)
 
     def clear(self):
         """Drop the entire buffer."""
-        self.heap.clear()
+        self.queues.clear()
+        self.heads.clear()
+        self.size = 0
 
     def __len__(self):
-        return len(self.heap)
+        return self.size
+
+    def _append(self, item):
+        shard = item[2]
+        queue = self.queues.get(shard)
+        if queue is None:
+            queue = self.queues[shard] = collections.deque()
+        if not queue or queue[-1] < item:
+            queue.append(item)
+        else:
+            # Out of order within the shard; insert it in place.
+            bisect.insort(queue, item)
+        if queue[0] is item:
+            heapq.heappush(self.heads, item)
+        self.size += 1
+
+    def _head(self):
+        """The oldest entry, discarding stale heads.  Raises IndexError when the buffer is empty."""
+        heads = self.heads
+        while heads:
+            item = heads[0]
+            queue = self.queues.get(item[2])
+            if queue and queue[0] is item:
+                return item
+            heapq.heappop(heads)
+        raise IndexError("pop from an empty RecordBuffer")
 
     def clock(self):
         """Returns a monotonically increasing integer.
@@ -104,3 +215,122 @@ class RecordBuffer:
         value = self.__monotonic_integer + 1
         self.__monotonic_integer += 2
         return value
+
+
+class ShardBuffer:
+    """Keeps the records from each shard in the order they were read, without ordering records across shards.
+
+    DynamoDB only orders records within a shard, and every change to an item is in the same shard, so consumers
+    that only need per-key ordering can skip the :class:`~bloop.stream.buffer.RecordBuffer`'s heap.  Records
+    aren't wrapped in ordering tuples, and pushing or popping a record is ``O(1)``.
+
+    Shards are drained in the order their records were first buffered.  A child shard is only read after its
+    parent is exhausted, so a parent's buffered records are still returned before its children's.
+    """
+    def __init__(self):
+        # shard -> deque of records, oldest first.  Dicts keep insertion order, so the first queue is always
+        # the shard that's been buffered the longest.
+        self.queues = {}
+        self.size = 0
+
+    def push(self, record, shard):
+        """Push a new record into the buffer
+
+        :param dict record: new record
+        :param shard: Shard the record came from
+        :type shard: :class:`~bloop.stream.shard.Shard`
+        """
+        queue = self.queues.get(shard)
+        if queue is None:
+            queue = self.queues[shard] = collections.deque()
+        queue.append(record)
+        self.size += 1
+
+    def push_all(self, record_shard_pairs):
+        """Push multiple (record, shard) pairs at once.
+
+        :param record_shard_pairs: list of ``(record, shard)`` tuples
+            (see :func:`~bloop.stream.buffer.ShardBuffer.push`).
+        """
+        push = self.push
+        for record, shard in record_shard_pairs:
+            push(record, shard)
+
+    def pop(self):
+        """Pop the next record from the shard that's been buffered the longest, and the shard it came from.
+
+        :return: ``(record, shard)`` tuple.
+        """
+        shard, queue = self._head()
+        record = queue.popleft()
+        if not queue:
+            del self.queues[shard]
+        self.size -= 1
+        return record, shard
+
+    def pop_many(self, n):
+        """Pop up to ``n`` records, draining each shard in turn.
+
+        :param int n: Maximum number of records to pop.
+        :return: List of ``(record, shard)`` tuples.  Empty when the buffer is.
+        """
+        pairs = []
+        queues = self.queues
+        while queues and len(pairs) < n:
+            shard, queue = next(iter(queues.items()))
+            popleft = queue.popleft
+            pairs.extend((popleft(), shard) for _ in range(min(n - len(pairs), len(queue))))
+            if not queue:
+                del queues[shard]
+        self.size -= len(pairs)
+        return pairs
+
+    def peek(self):
+        """A :func:`~bloop.stream.buffer.ShardBuffer.pop` without removing the (record, shard) from the buffer.
+
+        :return: ``(record, shard)`` tuple.
+        """
+        shard, queue = self._head()
+        return queue[0], shard
+
+    def count(self, shard):
+        """Number of records buffered from a shard.
+
+        :param shard: Shard the records came from
+        :type shard: :class:`~bloop.stream.shard.Shard`
+        :rtype: int
+        """
+        queue = self.queues.get(shard)
+        return len(queue) if queue else 0
+
+    def drop(self, shard):
+        """Remove every record buffered from a shard.
+
+        :param shard: Shard the records came from
+        :type shard: :class:`~bloop.stream.shard.Shard`
+        :return: Number of records dropped.
+        :rtype: int
+        """
+        queue = self.queues.pop(shard, None)
+        if not queue:
+            return 0
+        self.size -= len(queue)
+        return len(queue)
+
+    def clear(self):
+        """Drop the entire buffer."""
+        self.queues.clear()
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def _head(self):
+        """The shard buffered the longest and its queue.  Raises IndexError when the buffer is empty."""
+        for item in self.queues.items():
+            return item
+        raise IndexError("pop from an empty ShardBuffer")
+
+
+#: Buffer used for each value of a Coordinator's ``ordering``
+BUFFERS = {"total": RecordBuffer, "shard": ShardBuffer}
@@ -0,0 +1,93 @@
+import logging
+import time
+
+
+logger = logging.getLogger("bloop.stream")
+
+
+class StreamCheckpointer:
+    """Saves a :class:`~bloop.stream.Stream`'s token to a :class:`~bloop.checkpoints.CheckpointStore` as records
+    are consumed, so a new consumer can resume where the last one stopped.
+
+    A checkpoint is taken every ``checkpoint_every`` records or ``checkpoint_interval`` seconds, whichever comes
+    first.  Records are counted as consumed when the next record is requested, so a consumer that crashes while
+    processing a record will see it again after resuming.  The token is only built when a checkpoint is due, and
+    isn't written if it hasn't changed since the last save.
+
+    .. code-block:: python
+
+        store = SQLiteCheckpointStore("stream-state.db")
+        checkpoint = StreamCheckpointer(store, "User-stream", checkpoint_interval=30)
+        # Starts at trim_horizon the first time, and resumes from the last checkpoint afterwards
+        stream = engine.stream(User, "trim_horizon", checkpoint=checkpoint)
+
+    :param store: Where tokens are persisted.
+    :type store: :class:`~bloop.checkpoints.CheckpointStore`
+    :param str name: Checkpoint name for this consumer.
+    :param int checkpoint_every: *(Optional)* Checkpoint after this many records.  Default is 1000.
+    :param float checkpoint_interval: *(Optional)* Checkpoint after this many seconds.
+        Default is None, which only checkpoints by count.
+    """
+    def __init__(self, store, name, *, checkpoint_every=1000, checkpoint_interval=None):
+        if checkpoint_every < 1:
+            raise ValueError("checkpoint_every must be at least 1 but was {}".format(checkpoint_every))
+        self.store = store
+        self.name = name
+        self.checkpoint_every = checkpoint_every
+        self.checkpoint_interval = checkpoint_interval
+
+        # Records consumed since the last checkpoint
+        self.pending = 0
+        self._last_checkpoint = time.monotonic()
+        self._saved_token = None
+
+    def __repr__(self):
+        return "<{}[{}]>".format(self.__class__.__name__, self.name)
+
+    def load(self):
+        """The last saved token, or None if this consumer hasn't checkpointed yet.
+
+        :rtype: dict
+        """
+        token = self.store.load(self.name)
+        self._saved_token = token
+        return token
+
+    def reset(self):
+        """Delete the saved token, so the next stream created with this checkpointer starts from its position."""
+        self.store.delete(self.name)
+        self._saved_token = None
+        self.pending = 0
+
+    def step(self, stream, consumed=1):
+        """Count ``consumed`` records and checkpoint ``stream`` if one is due.
+
+        Called by the :class:`~bloop.stream.Stream` each time a record is requested.
+
+        :param stream: The stream being consumed.
+        :type stream: :class:`~bloop.stream.Stream`
+        :param int consumed: *(Optional)* Number of records consumed since the last call.  Default is 1.
+        """
+        self.pending += consumed
+        if not self.pending:
+            return
+        if self.pending >= self.checkpoint_every or self._interval_elapsed():
+            self.save(stream)
+
+    def save(self, stream):
+        """Checkpoint ``stream`` now, unless its token is unchanged since the last save.
+
+        :param stream: The stream being consumed.
+        :type stream: :class:`~bloop.stream.Stream`
+        """
+        token = stream.token
+        if token != self._saved_token:
+            self.store.save(self.name, token)
+            self._saved_token = token
+            logger.debug("checkpointed {!r} after {} records".format(self.name, self.pending))
+        self.pending, self._last_checkpoint = 0, time.monotonic()
+
+    def _interval_elapsed(self):
+        return (
+            self.checkpoint_interval is not None and
+            time.monotonic() - self._last_checkpoint >= self.checkpoint_interval)
@@ -1,28 +1,79 @@
 import collections
 import collections.abc
+import concurrent.futures
+import contextvars
 import datetime
+import functools
 import logging
-from typing import Dict, List
+import math
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
 
 from ..exceptions import InvalidPosition, InvalidStream, RecordsExpired
-from .buffer import RecordBuffer
+from .buffer import BUFFERS
+from .seek import RETENTION, SHARD_LIFETIME
 from .shard import Shard, unpack_shards
 
 
 logger = logging.getLogger("bloop.stream")
 
 
+def locked(method):
+    """Hold the coordinator's lock for the whole call."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
 class Coordinator:
     """Encapsulates the shard-level management for a whole Stream.
 
     :param session: Used to make DynamoDBStreams calls.
     :type session: :class:`~bloop.session.SessionWrapper`
     :param str stream_arn: Stream arn, usually from the model's ``Meta.stream["arn"]``.
+    :param int max_workers: *(Optional)* Poll up to this many shards at once from a thread pool, so advancing
+        many shards costs about one round trip.  Default is None, which polls shards one at a time.
+    :param seek_index: *(Optional)* Marked with consumed records, and used to start seeks to a time close to
+        the target.  Default is None.
+    :type seek_index: :class:`~bloop.stream.seek.SeekIndex`
+    :param polling: *(Optional)* Backs off polling shards that are caught up.  Default is None, which polls
+        every active shard each time the buffer is empty.
+    :type polling: :class:`~bloop.stream.polling.PollingPolicy`
+    :param leases: *(Optional)* Shares the stream's shards with other workers.  Only shards this worker holds a
+        lease on are polled.  Default is None, which polls every shard.
+    :type leases: :class:`~bloop.stream.lease.LeaseCoordinator`
+    :param str ordering: *(Optional)* "total" returns records from every shard in the order they were created,
+        using a :class:`~bloop.stream.buffer.RecordBuffer`.  "shard" only keeps the order within each shard, using
+        a cheaper :class:`~bloop.stream.buffer.ShardBuffer`.  Default is "total".
     """
-    def __init__(self, *, session, stream_arn):
+    def __init__(self, *, session, stream_arn, max_workers=None, seek_index=None, polling=None, leases=None,
+                 ordering="total"):
+        if ordering not in BUFFERS:
+            raise ValueError("ordering must be one of {} but was {!r}".format(sorted(BUFFERS), ordering))
 
         self.session = session
 
+        # Polling fans out to a thread pool when there's more than one shard to poll.
+        # The pool is created on first use and kept until close().
+        self.max_workers = max_workers
+        self._executor = None
+
+        self.seek_index = seek_index
+
+        # Shards that came back empty aren't polled again until they're due.
+        # shard -> (consecutive empty polls, time.monotonic() when it's next due)
+        self.polling = polling
+        self._schedule: Dict[Shard, Tuple[int, float]] = {}
+
+        self.leases = leases
+
+        # Held while reading or changing shards and the buffer, so a
+        # :class:`~bloop.stream.StreamMaintenance` thread can work alongside the consumer.
+        self.lock = threading.RLock()
+
         # The stream that's being coordinated
         self.stream_arn = stream_arn
 
@@ -36,6 +87,11 @@ class Coordinator:
         # shard -> buffered count
         self.closed: Dict[Shard, int] = {}
 
+        # Token entry for every shard in the roots' trees, in walk order, without the "stream_arn".
+        # Rebuilt when a shard is added or removed, and otherwise only active shards and consumed records can
+        # move a shard's position, so building a token doesn't walk every tree.  None until the next token.
+        self._shard_tokens: Optional[Dict[Shard, dict]] = None
+
         # Single buffer for the lifetime of the Coordinator, but mutates frequently
         # Records in the buffer aren't considered read.  When a Record popped from the buffer is
         # consumed, the Coordinator MUST notify the Shard by updating the sequence_number and iterator_type.
@@ -45,7 +101,8 @@ class Coordinator:
 
         # Holds records from advancing all active shard iterators.
         # Shards aren't advanced again until the buffer drains completely.
-        self.buffer = RecordBuffer()
+        self.ordering = ordering
+        self.buffer = BUFFERS[ordering]()
 
     def __repr__(self):
         # <Coordinator[.../StreamCreation-travis-661.2/stream/2016-10-03T06:17:12.741]>
@@ -54,26 +111,69 @@ class Coordinator:
     def __iter__(self):
         return self
 
+    @locked
     def __next__(self):
+        if self.leases is not None and self.leases.due():
+            self.leases.sync(self)
         if not self.buffer:
             self.advance_shards()
 
         if self.buffer:
             record, shard = self.buffer.pop()
-
-            # Now that the record is "consumed", advance the shard's checkpoint
-            shard.sequence_number = record["meta"]["sequence_number"]
-            shard.iterator_type = "after_sequence"
-
-            if shard in self.closed:
-                self.closed[shard] -= 1
-                if self.closed[shard] == 0:
-                    self.closed.pop(shard)
+            if self.seek_index is not None:
+                self.seek_index.mark(shard.shard_id, record["meta"]["created_at"], record["meta"]["sequence_number"])
+            self._consumed(shard, record)
             return record
 
         # No records :(
         return None
 
+    @locked
+    def next_batch(self, max_records):
+        """Up to ``max_records`` records in total order, polling active shards first if the buffer is empty.
+
+        Like :func:`next() <bloop.stream.coordinator.Coordinator.__next__>` this only polls shards once the
+        buffer has drained, so it may return fewer records than were asked for even if the shards have more.
+        Each shard's position is updated once for the whole batch.
+
+        :param int max_records: Maximum number of records to return.
+        :return: List of records, which is empty when no shard had new records.
+        :rtype: list
+        """
+        if self.leases is not None and self.leases.due():
+            self.leases.sync(self)
+        if not self.buffer:
+            self.advance_shards()
+
+        pairs = self.buffer.pop_many(max_records)
+        last_records = {}
+        seek_index = self.seek_index
+        for record, shard in pairs:
+            last_records[shard] = record
+            if seek_index is not None:
+                seek_index.mark(shard.shard_id, record["meta"]["created_at"], record["meta"]["sequence_number"])
+        for shard, record in last_records.items():
+            self._consumed(shard, record)
+        return [record for record, _ in pairs]
+
+    def _consumed(self, shard, record):
+        """Advance the shard's position past a record that was returned to the caller."""
+        shard.sequence_number = record["meta"]["sequence_number"]
+        shard.iterator_type = "after_sequence"
+        shard.stats.last_created_at = record["meta"]["created_at"]
+        entry = self._shard_tokens.get(shard) if self._shard_tokens is not None else None
+        if entry is not None:
+            entry["iterator_type"] = "after_sequence"
+            entry["sequence_number"] = shard.sequence_number
+
+        # The buffer tracks how many records each shard has left, so a closed shard's count never drifts.
+        if shard in self.closed:
+            remaining = self.buffer.count(shard)
+            if remaining:
+                self.closed[shard] = remaining
+            else:
+                del self.closed[shard]
+
     def advance_shards(self):
         """Poll active shards for records and insert them into the buffer.  Rotate exhausted shards.
 
@@ -83,39 +183,151 @@ class Coordinator:
         if self.buffer:
             return
 
-        # 0) Collect new records from all active shards.
+        # 0) Collect new records from all active shards that are due.
         record_shard_pairs = []
-        for shard in self.active:
-            records = next(shard)
+        for shard, records in self._poll(self._due_shards()):
             if records:
                 record_shard_pairs.extend((record, shard) for record in records)
+            self._reschedule(shard, records)
         self.buffer.push_all(record_shard_pairs)
 
         self.migrate_closed_shards()
 
+    @locked
     def heartbeat(self):
-        """Keep active shards with "trim_horizon", "latest" iterators alive by advancing their iterators."""
-        for shard in self.active:
-            if shard.sequence_number is None:
-                records = next(shard)
-                # Success!  This shard now has an ``at_sequence`` iterator
-                if records:
-                    self.buffer.push_all((record, shard) for record in records)
+        """Keep active shards with "trim_horizon", "latest" iterators alive by advancing their iterators.
+
+        Also renews leases when they're due.
+        """
+        if self.leases is not None and self.leases.due():
+            self.leases.sync(self)
+        shards = [shard for shard in self._leased() if shard.sequence_number is None]
+        for shard, records in self._poll(shards):
+            # Success!  This shard now has an ``at_sequence`` iterator
+            if records:
+                self.buffer.push_all((record, shard) for record in records)
         self.migrate_closed_shards()
 
-    def migrate_closed_shards(self):
-        # 1) Clean up exhausted Shards.  Can't modify the active list while iterating it.
-        to_migrate = {shard for shard in self.active if shard.exhausted}
+    @locked
+    def wait_time(self):
+        """Seconds until polling could find new records.
+
+        Zero when there are buffered records, or when an active shard is due.  Without a polling policy shards
+        are always due, and without any shards to poll this is the time until leases are next synced.
 
-        # Early exit since this method will iterate the entire buffer.
-        if not to_migrate:
+        :rtype: float
+        """
+        if self.buffer:
+            return 0.0
+        shards = self._leased()
+        waits = []
+        if self.leases is not None:
+            waits.append(self.leases.wait_time())
+        if shards:
+            if self.polling is None:
+                return 0.0
+            due = min(self._schedule.get(shard, (0, 0.0))[1] for shard in shards)
+            waits.append(due - time.monotonic())
+        elif self.polling is not None and self.leases is None:
+            waits.append(self.polling.max_interval)
+        return max(0.0, min(waits)) if waits else 0.0
+
+    @locked
+    def shard_metrics(self, reset=False):
+        """Counters, latency, and lag for each shard this coordinator reads, including closed shards with
+        buffered records.
+
+        :param bool reset: Clear each shard's counters and latency histogram after copying them.  Default is False.
+        :return: List of dicts with "shard_id", "records_fetched", "get_records_calls", "empty_responses",
+            "get_records_latency" (a :func:`Histogram.to_dict <bloop.metrics.Histogram.to_dict>`), "iterator_age"
+            and "lag" in seconds, and "buffered".
+        :rtype: list
+        """
+        now, monotonic = time.time(), time.monotonic()
+        rows = []
+        for shard in self._leased() + list(self.closed):
+            stats = shard.stats
+            buffered = self.buffer.count(shard)
+            issued = shard.iterator_issued
+            rows.append({
+                "shard_id": shard.shard_id,
+                "records_fetched": stats.records_fetched,
+                "get_records_calls": stats.get_records_calls,
+                "empty_responses": stats.empty_responses,
+                "get_records_latency": stats.latency.to_dict(),
+                "iterator_age": None if issued is None or shard.exhausted else monotonic - issued,
+                "buffered": buffered,
+                "lag": stats.lag(buffered, now),
+            })
+            if reset:
+                stats.reset()
+        return rows
+
+    def _leased(self):
+        """Active shards this worker may poll."""
+        if self.leases is None:
+            return self.active
+        return [shard for shard in self.active if self.leases.owns(shard)]
+
+    def _due_shards(self):
+        shards = self._leased()
+        if self.polling is None or not self._schedule:
+            return shards
+        now = time.monotonic()
+        return [shard for shard in shards if self._schedule.get(shard, (0, 0.0))[1] <= now]
+
+    def _reschedule(self, shard, records):
+        if self.polling is None:
             return
+        if records:
+            # Busy again, so poll it as soon as the buffer drains.
+            self._schedule.pop(shard, None)
+        else:
+            empty_polls = self._schedule.get(shard, (0, 0.0))[0] + 1
+            self._schedule[shard] = (empty_polls, time.monotonic() + self.polling.interval(empty_polls))
 
-        # Build the count once, rather than look for each shard as we process it below.
-        buffered_count = {}
-        for *_, shard in self.buffer.heap:
-            buffered_count.setdefault(shard, 0)
-            buffered_count[shard] += 1
+    @locked
+    def close(self):
+        """Shut down the polling thread pool, if one was started, save the seek index, and release leases.
+
+        The Coordinator can still be used afterwards, and will claim leases again.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        if self.seek_index is not None:
+            self.seek_index.save()
+        if self.leases is not None:
+            self.leases.close()
+
+    def _poll(self, shards):
+        """List of (shard, records) from calling next() on each shard, in the same order as ``shards``.
+
+        When ``max_workers`` is set the shards are polled concurrently.  Each shard is only touched by one thread,
+        and the buffer is only updated by the caller once every shard returns.  If any shard raises, the first
+        exception (in shard order) is re-raised after all polls finish.
+        """
+        return list(zip(shards, self._map(next, shards)))
+
+    def _map(self, func, items):
+        """``[func(item) for item in items]``, calling ``func`` concurrently when ``max_workers`` is set."""
+        if not self.max_workers or len(items) < 2:
+            return [func(item) for item in items]
+
+        if self._executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="bloop-stream")
+        # Each call runs in a copy of the caller's context, so tracing spans and capacity tags carry over.
+        futures = [
+            self._executor.submit(contextvars.copy_context().run, func, item)
+            for item in items
+        ]
+        concurrent.futures.wait(futures)
+        return [future.result() for future in futures]
+
+    def migrate_closed_shards(self):
+        # 1) Clean up exhausted Shards.  Can't modify the active list while iterating it.
+        to_migrate = {shard for shard in self.active if shard.exhausted}
 
         for shard in to_migrate:
             shard.load_children()
@@ -124,10 +336,12 @@ class Coordinator:
             for child in shard.children:
                 child.jump_to(iterator_type="trim_horizon")
             # May still need to track this shard
-            if shard in buffered_count:
-                self.closed[shard] = buffered_count[shard]
+            buffered_count = self.buffer.count(shard)
+            if buffered_count:
+                self.closed[shard] = buffered_count
 
     @property
+    @locked
     def token(self):
         """JSON-serializable representation of the current Stream state.
 
@@ -137,21 +351,25 @@ class Coordinator:
         :returns: Stream state as a json-friendly dict
         :rtype: dict
         """
-        # 0) Trace roots and active shards
-        active_ids = []
-        shard_tokens = []
-        for root in self.roots:
-            for shard in root.walk_tree():
-                shard_tokens.append(shard.token)
-                # dedupe, stream_arn will be in the root token
-                shard_tokens[-1].pop("stream_arn")
-        active_ids.extend((shard.shard_id for shard in self.active))
+        # 0) Trace roots once after the shard trees change, otherwise refresh the active shards
+        entries = self._shard_tokens
+        if entries is None:
+            entries = self._shard_tokens = {
+                shard: shard_token(shard) for root in self.roots for shard in root.walk_tree()}
+        else:
+            for shard in self.active:
+                entry = entries.get(shard)
+                if entry is not None and (
+                        entry.get("sequence_number") != shard.sequence_number or
+                        entry.get("iterator_type") != shard.iterator_type):
+                    entries[shard] = shard_token(shard)
+        shard_tokens = [entry.copy() for entry in entries.values()]
+        active_ids = [shard.shard_id for shard in self.active]
 
         # 1) Inject closed shards
         for shard in self.closed.keys():
             active_ids.append(shard.shard_id)
-            shard_tokens.append(shard.token)
-            shard_tokens[-1].pop("stream_arn")
+            shard_tokens.append(shard_token(shard))
 
         return {
             "stream_arn": self.stream_arn,
@@ -185,15 +403,15 @@ class Coordinator:
             pass
         else:
             self.active.extend(shard.children)
+        self._schedule.pop(shard, None)
+        self._shard_tokens = None
 
         if drop_buffered_records:
-            # TODO can this be improved?  Gets expensive for high-volume streams with large buffers
-            heap = self.buffer.heap
-            # Clear buffered records from the shard.  Each record is (ordering, record, shard)
-            to_remove = [x for x in heap if x[2] is shard]
-            for x in to_remove:
-                heap.remove(x)
+            self.buffer.drop(shard)
+            # Nothing left to consume, so a closed shard doesn't need to stay in the token.
+            self.closed.pop(shard, None)
 
+    @locked
     def move_to(self, position):
         """Set the Coordinator to a specific endpoint or time, or load state from a token.
 
@@ -208,15 +426,27 @@ class Coordinator:
             move = _move_stream_endpoint
         else:
             raise InvalidPosition("Don't know how to move to position {!r}".format(position))
+        self._schedule.clear()
+        self._shard_tokens = None
+        if self.leases is not None:
+            self.leases.reset()
         move(self, position)
 
 
+def shard_token(shard):
+    """A shard's token without the "stream_arn", which is only included once in the stream's token."""
+    token = shard.token
+    token.pop("stream_arn")
+    return token
+
+
 def _move_stream_endpoint(coordinator, position):
     """Move to the "trim_horizon" or "latest" of the entire stream."""
     # 0) Everything will be rebuilt from DescribeStream.
     stream_arn = coordinator.stream_arn
     coordinator.roots.clear()
     coordinator.active.clear()
+    coordinator.closed.clear()
     coordinator.buffer.clear()
 
     # 1) Build a Dict[str, Shard] of the current Stream from a DescribeStream call
@@ -241,34 +471,118 @@ def _move_stream_endpoint(coordinator, position):
 
 
 def _move_stream_time(coordinator, time):
-    """Scan through the *entire* Stream for the first record after ``time``.
-
-    This is an extremely expensive, naive algorithm that starts at trim_horizon and simply
-    dumps records into the void until the first hit.  General improvements in performance are
-    tough; we can use the fact that Shards have a max life of 24hr to pick a pretty-good starting
-    point for any Shard trees with 6 generations.  Even then we can't know how close the oldest one
-    is to rolling off so we either hit trim_horizon, or iterate an extra Shard more than we need to.
-
-    The corner cases are worse; short trees, recent splits, trees with different branch heights.
+    """Move each shard tree to the first records at or after ``time``.
+
+    Instead of reading every shard from its trim_horizon, each shard tree is searched from its root down:
+
+    * A time older than the stream's 24 hour retention is the stream's trim_horizon, and needs no reads.
+    * Each shard lives about 4 hours, so a deep tree is searched from the generation that was open at
+      ``time`` when that generation's shards all have records from before ``time``.  Their ancestors are
+      skipped without reading them.
+    * A closed shard ended before ``time`` if one of its children has a record from before ``time``.  The
+      shard is skipped without reading it.  Children are checked in the coordinator's seek index, or by
+      reading each child's first page of records (which is reused when the search reaches that child).
+      Children of open shards aren't read.
+    * A shard with a mark in the seek index from before ``time`` starts from that sequence number.
+    * Trees are searched in parallel when the coordinator has ``max_workers``.
     """
-    if time > datetime.datetime.now(datetime.timezone.utc):
+    now = datetime.datetime.now(datetime.timezone.utc)
+    if time > now:
         _move_stream_endpoint(coordinator, "latest")
         return
 
     _move_stream_endpoint(coordinator, "trim_horizon")
-    shard_trees = collections.deque(coordinator.roots)
-    while shard_trees:
-        shard = shard_trees.popleft()
-        records = shard.seek_to(time)
+    if time <= now - RETENTION:
+        return
 
-        # Success!  This section of some Shard tree is at the desired time.
-        if records:
+    seek = functools.partial(_seek_tree, position=time, seek_index=coordinator.seek_index, now=now)
+    # Searches only touch their own tree; the coordinator's state is updated here, on one thread.
+    for passed, found in coordinator._map(seek, list(coordinator.roots)):
+        for shard in passed:
+            coordinator.remove_shard(shard, drop_buffered_records=True)
+        for shard, records in found:
             coordinator.buffer.push_all((record, shard) for record in records)
 
+
+def _seek_tree(root, *, position, seek_index, now):
+    """Search one shard tree for the first records at or after ``position``.
+
+    :return: A list of shards that end before ``position`` in the order they were passed, and a list of
+        ``(shard, records)`` for each shard where records were found.
+    """
+    # child -> first page of records, read while deciding if its parent could be skipped
+    first_pages = {}
+    passed, start = _likely_start(root, position, seek_index, now, first_pages)
+    found = []
+    shards = collections.deque(start)
+    while shards:
+        shard = shards.popleft()
+
+        if _closed_before(shard, position, seek_index, first_pages):
+            passed.append(shard)
+            shards.extend(shard.children)
+            continue
+
+        if shard in first_pages:
+            records = shard.scan_to(position, first_pages.pop(shard))
+        else:
+            start = seek_index.lookup(shard.shard_id, position) if seek_index is not None else None
+            records = shard.seek_to(position, sequence_number=start)
+
+        # Success!  This section of some Shard tree is at the desired time.
+        if records:
+            found.append((shard, records))
         # Closed shard, keep searching its children.
         elif shard.exhausted:
-            coordinator.remove_shard(shard, drop_buffered_records=True)
-            shard_trees.extend(shard.children)
+            passed.append(shard)
+            shards.extend(shard.children)
+    return passed, found
+
+
+def _likely_start(root, position, seek_index, now, first_pages):
+    """Find the generation of the tree that was open at ``position``, using the shards' ~4 hour lifetime.
+
+    The tree is split into generations until one has a shard without children.  Counting back from the
+    deepest of those by the number of shard lifetimes since ``position`` gives the likely generation.
+    When every shard in it has a record from before ``position``, all of their ancestors closed before
+    ``position`` and are passed without reading them.
+
+    :return: A list of shards that end before ``position`` and the shards to start searching from.
+    """
+    generations = [[root]]
+    while all(shard.children for shard in generations[-1]):
+        generations.append([child for shard in generations[-1] for child in shard.children])
+    depth = len(generations) - 1 - math.ceil((now - position) / SHARD_LIFETIME)
+    # The root's children are checked by the search anyway
+    if depth < 2:
+        return [], [root]
+    candidates = generations[depth]
+    if not all(_started_before(shard, position, seek_index, first_pages) for shard in candidates):
+        return [], [root]
+    passed = [shard for generation in generations[:depth] for shard in generation]
+    return passed, candidates
+
+
+def _closed_before(shard, position, seek_index, first_pages):
+    """True if the shard is closed and any of its children has a record from before ``position``.
+
+    When a shard splits it stops taking writes, so every record in the shard is older than its children's.
+    An open shard has no records in its children yet, so they aren't read.
+    """
+    if not shard.closed:
+        return False
+    return any(_started_before(child, position, seek_index, first_pages) for child in shard.children)
+
+
+def _started_before(shard, position, seek_index, first_pages):
+    """True if the shard has a record from before ``position``, from the seek index or its first page."""
+    if seek_index is not None and seek_index.lookup(shard.shard_id, position) is not None:
+        return True
+    if shard not in first_pages:
+        shard.jump_to(iterator_type="trim_horizon")
+        first_pages[shard] = shard.get_records()
+    records = first_pages[shard]
+    return bool(records) and records[0]["meta"]["created_at"].timestamp() < int(position.timestamp())
 
 
 def _move_stream_token(coordinator, token):
@@ -0,0 +1,79 @@
+class StreamDispatcher:
+    """Picks the model each stream record is unpacked as, for tables that hold items of more than one model.
+
+    The model is chosen from a raw attribute of the record, either an exact value or the longest matching prefix.
+    Each record is unpacked with only the chosen model's columns.  Records that don't match any model use
+    ``default``, or are skipped when there is no default.
+
+    .. code-block:: python
+
+        # Every item has a "type" attribute
+        by_type = StreamDispatcher({"user": User, "order": Order}, attribute=User.type)
+        # Or, the hash key starts with the model's prefix
+        by_prefix = StreamDispatcher({"USER#": User, "ORDER#": Order}, key_prefix="pk")
+
+        stream = engine.stream(Table, "latest", dispatch=by_prefix)
+        record = next(stream)
+        if isinstance(record["new"], Order):
+            ...
+
+    :param dict models: Model for each attribute value or key prefix.
+    :param attribute: *(Optional)* Column (or dynamo name) whose value selects the model.  Read from the
+        record's new image, then its old image, then its key.
+    :param key_prefix: *(Optional)* Key column (or dynamo name) whose prefix selects the model.
+    :param default: *(Optional)* Model for records that don't match.  Default is None, which skips them.
+    """
+    def __init__(self, models, *, attribute=None, key_prefix=None, default=None):
+        if (attribute is None) == (key_prefix is None):
+            raise ValueError("StreamDispatcher needs exactly one of attribute or key_prefix")
+        self.models = dict(models)
+        self.default = default
+        if attribute is not None:
+            self.attribute = getattr(attribute, "dynamo_name", attribute)
+            self.key_prefix = None
+        else:
+            self.attribute = None
+            self.key_prefix = getattr(key_prefix, "dynamo_name", key_prefix)
+            # Longest first, so "ORDER#ITEM#" wins over "ORDER#"
+            self._prefixes = sorted(self.models, key=len, reverse=True)
+
+    def __repr__(self):
+        by = "attribute={!r}".format(self.attribute) if self.attribute else "key_prefix={!r}".format(self.key_prefix)
+        return "<{}[{}]>".format(self.__class__.__name__, by)
+
+    @property
+    def all_models(self):
+        """Every model a record may be unpacked as, including the default."""
+        models = list(self.models.values())
+        if self.default is not None and self.default not in models:
+            models.append(self.default)
+        return models
+
+    def model_for(self, record):
+        """The model to unpack a raw record as, or None to skip it.
+
+        :param dict record: A record from the :class:`~bloop.stream.coordinator.Coordinator`, before unpacking.
+        """
+        if self.attribute is not None:
+            for image in ("new", "old", "key"):
+                value = raw_value(record[image], self.attribute)
+                if value is not None:
+                    return self.models.get(value, self.default)
+            return self.default
+
+        value = raw_value(record["key"], self.key_prefix)
+        if isinstance(value, str):
+            for prefix in self._prefixes:
+                if value.startswith(prefix):
+                    return self.models[prefix]
+        return self.default
+
+
+def raw_value(attrs, name):
+    """The scalar value of an attribute in wire format, like "user" from ``{"type": {"S": "user"}}``."""
+    if not attrs:
+        return None
+    attr = attrs.get(name)
+    if not attr:
+        return None
+    return next(iter(attr.values()))
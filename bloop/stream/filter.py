@@ -0,0 +1,102 @@
+from ..conditions import render
+from ..expressions import ExpressionParser, evaluate
+from ..util import default_context
+
+
+EVENT_TYPES = {"insert", "modify", "remove"}
+
+
+class StreamFilter:
+    """Skips stream records before they are unpacked into model instances.
+
+    Every part of the filter is optional, and a record must match all of the parts that are given.  Conditions
+    are bloop conditions on the stream's model, evaluated against the record's raw images, so a record that's
+    filtered out never creates a model instance or sends :data:`~bloop.signals.object_loaded`.
+
+    .. code-block:: python
+
+        only_admins = StreamFilter(
+            events={"modify"},
+            key=lambda key: key["id"].startswith("admin-"),
+            new=User.verified == True)
+        stream = engine.stream(User, "latest", filter=only_admins)
+
+    :param events: *(Optional)* Event types to keep: any of "insert", "modify", and "remove".  Default is all.
+    :param key: *(Optional)* Called with a dict of the record's key column values, by column name.  Records are
+        kept when it returns True.
+    :param new: *(Optional)* Condition the record's new image must match.  Records without a new image, such as
+        removes, don't match.
+    :type new: :class:`~bloop.conditions.BaseCondition`
+    :param old: *(Optional)* Condition the record's old image must match.  Records without an old image, such as
+        inserts, don't match.
+    :type old: :class:`~bloop.conditions.BaseCondition`
+    """
+    def __init__(self, *, events=None, key=None, new=None, old=None):
+        if events is not None:
+            events = frozenset(events)
+            unknown = events - EVENT_TYPES
+            if unknown:
+                raise ValueError("unknown event types {} (expected any of {})".format(
+                    sorted(unknown), sorted(EVENT_TYPES)))
+        self.events = events
+        self.key = key
+        self.new = new
+        self.old = old
+
+    def __repr__(self):
+        parts = []
+        if self.events is not None:
+            parts.append("events={}".format(sorted(self.events)))
+        for name in ("key", "new", "old"):
+            if getattr(self, name) is not None:
+                parts.append(name)
+        return "<{}[{}]>".format(self.__class__.__name__, ", ".join(parts))
+
+    def compile(self, model, engine):
+        """A function that returns True for raw records from ``model``'s stream that match this filter.
+
+        Conditions are rendered and parsed once here, so matching a record only walks the parsed expression.
+
+        :param model: The stream's model.
+        :param engine: Engine used to render conditions and load key values.
+        :type engine: :class:`~bloop.engine.Engine`
+        :rtype: callable
+        """
+        checks = []
+        if self.events is not None:
+            events = self.events
+            checks.append(lambda record: record["meta"]["event"]["type"] in events)
+        if self.key is not None:
+            checks.append(key_check(self.key, model, engine))
+        for image, condition in (("new", self.new), ("old", self.old)):
+            if condition is not None:
+                checks.append(image_check(image, condition, engine))
+
+        def matches(record):
+            for check in checks:
+                if not check(record):
+                    return False
+            return True
+        return matches
+
+
+def key_check(predicate, model, engine):
+    context = default_context(engine)
+    # noinspection PyProtectedMember
+    loaders = [(column.name, column.dynamo_name, column.typedef._load) for column in model.Meta.keys]
+
+    def check(record):
+        attrs = record["key"] or {}
+        return predicate({name: load(attrs.get(dynamo_name), context=context) for name, dynamo_name, load in loaders})
+    return check
+
+
+def image_check(image, condition, engine):
+    rendered = render(engine, filter=condition)
+    parser = ExpressionParser(rendered.get("ExpressionAttributeNames"), rendered.get("ExpressionAttributeValues"))
+    node = parser.condition(rendered["FilterExpression"])
+
+    def check(record):
+        attrs = record[image]
+        return attrs is not None and evaluate(node, attrs)
+    return check
@@ -0,0 +1,281 @@
+import collections
+import datetime
+import functools
+import logging
+import math
+import os
+import socket
+import time
+import uuid
+
+from ..exceptions import ConstraintViolation, RecordsExpired
+from ..models import BaseModel, Column
+from ..types import Boolean, Integer, String, Timestamp
+
+
+logger = logging.getLogger("bloop.stream")
+
+
+@functools.lru_cache(maxsize=None)
+def default_lease_model():
+    """The model used by :class:`~bloop.stream.LeaseCoordinator` when none is provided.
+
+    Created on first use so that ``engine.bind(BaseModel)`` doesn't pick it up for applications that never use it.
+    """
+    class Lease(BaseModel):
+        class Meta:
+            table_name = "bloop-leases"
+            billing = {"mode": "on_demand"}
+        group = Column(String, hash_key=True)
+        shard_id = Column(String, range_key=True)
+        owner = Column(String)
+        counter = Column(Integer)
+        expires = Column(Timestamp)
+        checkpoint = Column(String)
+        finished = Column(Boolean)
+    return Lease
+
+
+def default_worker_id():
+    return "{}-{}-{}".format(socket.gethostname(), os.getpid(), uuid.uuid4().hex[:8])
+
+
+class LeaseCoordinator:
+    """Splits a stream's shards between every worker in a ``group``, using conditional writes to a lease table.
+
+    Each worker creates its own :class:`~bloop.stream.Stream` with the same group.  Workers only poll shards
+    they hold a lease on, and every ``lease_duration / 3`` seconds they:
+
+    * mark shards they finished reading, so another worker can start on the children;
+    * renew their leases, saving each shard's last consumed sequence number;
+    * claim unleased or expired shards, and take one shard from the busiest worker when the others hold more
+      than their share.
+
+    A child shard isn't claimed until its parents are finished, so records for any key are still processed in
+    order.  Records are checkpointed once the consumer asks for more, so a shard that moves to another worker
+    may repeat a few records but never skips any.
+
+    .. code-block:: python
+
+        leases = LeaseCoordinator(engine, "user-indexer")
+        stream = engine.stream(User, "trim_horizon", leases=leases)
+        try:
+            while True:
+                record = stream.next(timeout=5)
+                ...
+        finally:
+            # Hand this worker's shards to the rest of the group right away
+            stream.close()
+
+    Lease expiry uses each worker's wall clock, so hosts should keep their clocks within a few seconds of each
+    other.
+
+    :param engine: Engine used to read and write leases.  The model is bound to it immediately.
+    :type engine: :class:`~bloop.engine.Engine`
+    :param str group: Name shared by every worker consuming the stream together.
+    :param str worker_id: *(Optional)* Unique name for this worker.  Default is the hostname, pid, and a random
+        suffix.
+    :param float lease_duration: *(Optional)* Seconds a lease is held without being renewed.  Default is 30.
+    :param model: *(Optional)* Model with the same columns as :func:`~bloop.stream.lease.default_lease_model`.
+        Default is a model for an on-demand table named "bloop-leases", which is created if it doesn't exist.
+    :param clock: *(Optional)* Returns the current unix time.  Default is :func:`time.time`.
+    """
+    def __init__(self, engine, group, *, worker_id=None, lease_duration=30, model=None, clock=time.time):
+        if lease_duration <= 0:
+            raise ValueError("lease_duration must be positive but was {}".format(lease_duration))
+        self.engine = engine
+        self.group = group
+        self.worker_id = worker_id or default_worker_id()
+        self.lease_duration = lease_duration
+        self.renew_interval = lease_duration / 3
+        self.model = model or default_lease_model()
+        self.clock = clock
+        engine.bind(self.model)
+
+        # shard_id -> Shard for every lease this worker holds
+        self.owned = {}
+        # clock() when the next sync is due; None syncs on the next call to due()
+        self._next_sync = None
+
+    def __repr__(self):
+        return "<{}[{}/{}]>".format(self.__class__.__name__, self.group, self.worker_id)
+
+    def owns(self, shard):
+        """True if this worker holds the shard's lease.
+
+        :param shard: The shard to check.
+        :type shard: :class:`~bloop.stream.shard.Shard`
+        """
+        return shard.shard_id in self.owned
+
+    def due(self):
+        """True when leases should be synced."""
+        return self._next_sync is None or self.clock() >= self._next_sync
+
+    def wait_time(self):
+        """Seconds until leases should be synced.
+
+        :rtype: float
+        """
+        if self._next_sync is None:
+            return 0.0
+        return max(0.0, self._next_sync - self.clock())
+
+    def reset(self):
+        """Forget which shards this worker holds, after the coordinator moved to a new position.
+
+        Leases still held in the table are reclaimed by the next sync.
+        """
+        self.owned.clear()
+        self._next_sync = None
+
+    def sync(self, coordinator):
+        """Finish, renew, and claim leases for the coordinator's shards.
+
+        Called by the :class:`~bloop.stream.coordinator.Coordinator` whenever :func:`due` is True.
+
+        :param coordinator: The coordinator whose shards are being leased.
+        :type coordinator: :class:`~bloop.stream.coordinator.Coordinator`
+        """
+        now = self.clock()
+        leases = self._load()
+        self._finish(coordinator, leases)
+        self._renew(coordinator, leases, now)
+        self._prune(coordinator, leases)
+        self._claim(coordinator, leases, now)
+        self._next_sync = now + self.renew_interval
+
+    def close(self):
+        """Save each held shard's position and release its lease so other workers can claim it immediately."""
+        leases = self._load()
+        for shard_id, shard in self.owned.items():
+            lease = leases.get(shard_id)
+            if lease is not None and lease.owner == self.worker_id:
+                self._update(lease, owner=None, expires=None, checkpoint=checkpoint_of(shard, lease))
+        self.reset()
+
+    def _load(self):
+        query = self.engine.query(self.model, key=self.model.group == self.group, consistent=True)
+        return {lease.shard_id: lease for lease in query}
+
+    def _finish(self, coordinator, leases):
+        """Mark held shards that were exhausted and fully consumed."""
+        tracked = set(coordinator.active) | set(coordinator.closed)
+        for shard_id, shard in list(self.owned.items()):
+            if shard in tracked:
+                continue
+            del self.owned[shard_id]
+            lease = leases.get(shard_id)
+            if lease is not None and lease.owner == self.worker_id:
+                self._update(lease, owner=None, expires=None, finished=True, checkpoint=checkpoint_of(shard, lease))
+                logger.debug("{!r} finished shard {}".format(self, shard_id))
+
+    def _renew(self, coordinator, leases, now):
+        for shard_id, shard in list(self.owned.items()):
+            lease = leases.get(shard_id)
+            renewed = (
+                lease is not None and lease.owner == self.worker_id and
+                self._update(lease, expires=self._expiry(now), checkpoint=checkpoint_of(shard, lease)))
+            if not renewed:
+                self._lost(coordinator, shard)
+
+    def _lost(self, coordinator, shard):
+        """Another worker took the shard, so its buffered records are theirs to process."""
+        logger.info("{!r} lost the lease for shard {}".format(self, shard.shard_id))
+        del self.owned[shard.shard_id]
+        coordinator.buffer.drop(shard)
+        coordinator.closed.pop(shard, None)
+
+    def _prune(self, coordinator, leases):
+        """Stop tracking shards that other workers finished, so their children can be claimed."""
+        unchecked = collections.deque(coordinator.active)
+        while unchecked:
+            shard = unchecked.popleft()
+            lease = leases.get(shard.shard_id)
+            if shard.shard_id in self.owned or lease is None or not lease.finished:
+                continue
+            shard.load_children()
+            coordinator.remove_shard(shard, drop_buffered_records=True)
+            unchecked.extend(shard.children)
+
+    def _claim(self, coordinator, leases, now):
+        now_dt = to_datetime(now)
+        live = [
+            lease for lease in leases.values()
+            if lease.owner and not lease.finished and lease.expires and lease.expires > now_dt]
+        held = collections.Counter(lease.owner for lease in live if lease.owner != self.worker_id)
+        target = math.ceil(len(coordinator.active) / (len(held) + 1))
+
+        claimable = [
+            shard for shard in coordinator.active
+            if shard.shard_id not in self.owned and parents_finished(shard, coordinator)]
+        owners = {lease.shard_id: lease.owner for lease in live}
+        for shard in claimable:
+            if len(self.owned) >= target:
+                return
+            if owners.get(shard.shard_id, self.worker_id) == self.worker_id:
+                self._take(shard, leases.get(shard.shard_id), now)
+
+        # Still short, so take one shard from the worker holding the most, if they hold more than their share
+        if len(self.owned) < target and held:
+            busiest, count = held.most_common(1)[0]
+            if count > target:
+                for shard in claimable:
+                    if owners.get(shard.shard_id) == busiest:
+                        logger.info("{!r} taking shard {} from {}".format(self, shard.shard_id, busiest))
+                        self._take(shard, leases[shard.shard_id], now)
+                        return
+
+    def _take(self, shard, lease, now):
+        if lease is None:
+            lease = self.model(group=self.group, shard_id=shard.shard_id, counter=None, checkpoint=None)
+        if not self._update(lease, owner=self.worker_id, expires=self._expiry(now)):
+            return
+        self.owned[shard.shard_id] = shard
+        # Start from the lease's checkpoint, or refresh the shard's own position since its iterator may be stale
+        if lease.checkpoint:
+            try:
+                shard.jump_to(iterator_type="after_sequence", sequence_number=lease.checkpoint)
+                return
+            except RecordsExpired:
+                logger.info("checkpoint for shard {} expired, starting at trim_horizon".format(shard.shard_id))
+                shard.jump_to(iterator_type="trim_horizon")
+                return
+        shard.jump_to(iterator_type=shard.iterator_type or "trim_horizon", sequence_number=shard.sequence_number)
+
+    def _update(self, lease, **changes):
+        """Write changes unless another worker changed the lease first.  Returns False if they did."""
+        expected = lease.counter
+        for name, value in changes.items():
+            setattr(lease, name, value)
+        lease.counter = (expected or 0) + 1
+        try:
+            self.engine.save(lease, condition=self.model.counter == expected)
+        except ConstraintViolation:
+            return False
+        return True
+
+    def _expiry(self, now):
+        return to_datetime(now + self.lease_duration)
+
+
+def checkpoint_of(shard, lease):
+    """The last consumed sequence number in the shard, or the lease's checkpoint if nothing was consumed."""
+    if shard.iterator_type == "after_sequence" and shard.sequence_number:
+        return shard.sequence_number
+    return lease.checkpoint
+
+
+def parents_finished(shard, coordinator):
+    """True if no ancestor of the shard still has records to process."""
+    unfinished = set(coordinator.active) | set(coordinator.closed)
+    parent = shard.parent
+    while parent is not None:
+        if parent in unfinished:
+            return False
+        parent = parent.parent
+    return True
+
+
+def to_datetime(timestamp):
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc)
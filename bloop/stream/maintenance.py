@@ -0,0 +1,145 @@
+import logging
+import threading
+import time
+
+from ..exceptions import RecordsExpired
+
+
+logger = logging.getLogger("bloop.stream")
+
+# Seconds until a shard iterator expires
+ITERATOR_LIFETIME = 15 * 60
+
+
+class StreamMaintenance:
+    """Keeps a stream's shards ready from a background thread, so reading records never waits on control-plane
+    calls.
+
+    Every ``interval`` seconds the thread:
+
+    * replaces iterators that are older than ``refresh_after`` before they expire, at the same position;
+    * polls shards that are still at a "trim_horizon" or "latest" iterator when those are about to expire, like
+      :func:`Stream.heartbeat <bloop.stream.Stream.heartbeat>` (which no longer needs to be called);
+    * looks up the children of shards that have been read for ``discover_after`` seconds, so they're known
+      before the shard closes.
+
+    The thread is started when the stream moves to a position, and stopped by
+    :func:`Stream.close <bloop.stream.Stream.close>`.
+
+    .. code-block:: python
+
+        stream = engine.stream(User, "latest", maintenance=StreamMaintenance())
+        try:
+            for record in stream:
+                ...
+        finally:
+            stream.close()
+
+    To run maintenance from your own scheduler instead of a thread, call :func:`maintain` with the stream's
+    coordinator.
+
+    :param float interval: *(Optional)* Seconds between maintenance passes.  Default is 60.
+    :param float refresh_after: *(Optional)* Age in seconds when an iterator is replaced.  Must be less than the
+        15 minute iterator lifetime, with room for ``interval``.  Default is 600.
+    :param float discover_after: *(Optional)* Seconds a shard is read before looking for its children.  Shards
+        usually close after about 4 hours.  Default is 3 hours.
+    """
+    def __init__(self, *, interval=60, refresh_after=10 * 60, discover_after=3 * 60 * 60):
+        if interval <= 0:
+            raise ValueError("interval must be positive but was {}".format(interval))
+        if not 0 < refresh_after < ITERATOR_LIFETIME:
+            raise ValueError("refresh_after must be between 0 and {} seconds but was {}".format(
+                ITERATOR_LIFETIME, refresh_after))
+        self.interval = interval
+        self.refresh_after = refresh_after
+        self.discover_after = discover_after
+
+        # shard -> time.monotonic() when maintenance first saw it active
+        self._seen = {}
+        self._thread = None
+        self._stopped = threading.Event()
+
+    def __repr__(self):
+        return "<{}[interval={}]>".format(self.__class__.__name__, self.interval)
+
+    @property
+    def running(self):
+        """True while the background thread is running."""
+        return self._thread is not None
+
+    def start(self, coordinator):
+        """Start maintaining the coordinator's shards from a daemon thread.  Does nothing if already running.
+
+        :param coordinator: The coordinator to maintain.
+        :type coordinator: :class:`~bloop.stream.coordinator.Coordinator`
+        """
+        if self._thread is not None:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(
+            target=self._run, args=(coordinator,), name="bloop-stream-maintenance", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background thread, waiting for any pass in progress to finish."""
+        if self._thread is None:
+            return
+        self._stopped.set()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self, coordinator):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.maintain(coordinator)
+            except Exception:
+                # Keep going; the consumer still refreshes expired iterators itself.
+                logger.exception("stream maintenance failed for {!r}".format(coordinator))
+
+    def maintain(self, coordinator):
+        """Run one maintenance pass over the coordinator's shards.
+
+        New iterators and child shards are fetched without holding the coordinator's lock, and only applied if
+        the consumer didn't move the shard in the meantime.
+
+        :param coordinator: The coordinator to maintain.
+        :type coordinator: :class:`~bloop.stream.coordinator.Coordinator`
+        """
+        now = time.monotonic()
+        with coordinator.lock:
+            # noinspection PyProtectedMember
+            shards = [shard for shard in coordinator._leased() if shard.iterator_id and not shard.exhausted]
+            self._seen = {shard: self._seen.get(shard, now) for shard in shards}
+            stale = [
+                (shard, shard.iterator_id, shard.resume_position()) for shard in shards
+                if shard.iterator_issued is not None and now - shard.iterator_issued >= self.refresh_after]
+            undiscovered = [
+                shard for shard in shards
+                if not shard.children and now - self._seen[shard] >= self.discover_after]
+            # A new relative iterator could skip records, so these are polled instead
+            if any(position is None for _, _, position in stale):
+                coordinator.heartbeat()
+
+        for shard, iterator_id, position in stale:
+            if position is not None:
+                self._refresh(coordinator, shard, iterator_id, position)
+        for shard in undiscovered:
+            shards = shard.session.describe_stream(stream_arn=shard.stream_arn, first_shard=shard.shard_id)["Shards"]
+            with coordinator.lock:
+                if not shard.children:
+                    shard.add_children(shards)
+                    # The shard trees changed, so the next token walks them again
+                    coordinator._shard_tokens = None
+
+    def _refresh(self, coordinator, shard, iterator_id, position):
+        try:
+            fresh = shard.session.get_shard_iterator(
+                stream_arn=shard.stream_arn, shard_id=shard.shard_id, **position)
+        except RecordsExpired:
+            # Keep the old iterator, which still works until it expires
+            logger.info("can't refresh iterator for shard {}: records expired".format(shard.shard_id))
+            return
+        with coordinator.lock:
+            if shard.iterator_id == iterator_id:
+                shard.iterator_id = fresh
+                shard.iterator_issued = time.monotonic()
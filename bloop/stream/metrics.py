@@ -0,0 +1,65 @@
+import time
+
+from ..metrics import Histogram
+
+
+class ShardStats:
+    """Counters for a single shard, updated by the :class:`~bloop.stream.shard.Shard` as it polls and by the
+    :class:`~bloop.stream.coordinator.Coordinator` as its records are consumed.
+
+    Exported through :func:`Stream.shard_metrics <bloop.stream.Stream.shard_metrics>`.
+    """
+    def __init__(self):
+        #: Records returned by GetRecords
+        self.records_fetched = 0
+        #: GetRecords calls made
+        self.get_records_calls = 0
+        #: GetRecords calls that returned no records
+        self.empty_responses = 0
+        #: Latency of each GetRecords call
+        self.latency = Histogram()
+        #: ``meta.created_at`` of the last record consumed from the shard
+        self.last_created_at = None
+        #: True when the last GetRecords call returned no records
+        self.caught_up = False
+
+    def __repr__(self):
+        return "<{}[fetched={}, calls={}]>".format(
+            self.__class__.__name__, self.records_fetched, self.get_records_calls)
+
+    def polled(self, records, seconds):
+        """Count one GetRecords call.
+
+        :param int records: Number of records returned.
+        :param float seconds: Latency of the call.
+        """
+        self.get_records_calls += 1
+        self.records_fetched += records
+        if not records:
+            self.empty_responses += 1
+        self.caught_up = not records
+        self.latency.record(seconds * 1e6)
+
+    def lag(self, buffered=0, now=None):
+        """Seconds between the last consumed record's creation and ``now``.
+
+        A shard that's caught up to its HEAD and has nothing buffered isn't behind at all, so its lag is 0.
+
+        :param int buffered: *(Optional)* Records from the shard that are still buffered.  Default is 0.
+        :param float now: *(Optional)* Unix time to measure against.  Default is :func:`time.time`.
+        :return: Lag in seconds, or None if nothing has been consumed from a shard that isn't caught up.
+        """
+        if self.caught_up and not buffered:
+            return 0.0
+        if self.last_created_at is None:
+            return None
+        if now is None:
+            now = time.time()
+        return max(0.0, now - self.last_created_at.timestamp())
+
+    def reset(self):
+        """Clear the counters and latency histogram.  The position used to measure lag is kept."""
+        self.records_fetched = 0
+        self.get_records_calls = 0
+        self.empty_responses = 0
+        self.latency = Histogram()
@@ -0,0 +1,41 @@
+class PollingPolicy:
+    """Backs off polling shards that have caught up to their HEAD, so an idle stream doesn't spin on empty
+    GetRecords calls.
+
+    After a shard returns no records it isn't polled again for ``min_interval`` seconds.  Each consecutive
+    empty poll multiplies the wait by ``multiplier``, up to ``max_interval``.  As soon as the shard returns
+    records it's polled again immediately.
+
+    .. code-block:: python
+
+        stream = engine.stream(User, "latest", polling=PollingPolicy(max_interval=2))
+        while True:
+            # Sleeps until a shard is due instead of spinning
+            record = stream.next(timeout=30)
+
+    :param float min_interval: *(Optional)* Seconds to wait after the first empty poll.  Default is 0.25.
+    :param float max_interval: *(Optional)* Longest wait between polls of an idle shard.  Default is 5.
+    :param float multiplier: *(Optional)* Growth of the wait after each consecutive empty poll.  Default is 2.
+    """
+    def __init__(self, *, min_interval=0.25, max_interval=5.0, multiplier=2.0):
+        if min_interval < 0 or max_interval < min_interval:
+            raise ValueError("intervals must satisfy 0 <= min_interval <= max_interval but were {} and {}".format(
+                min_interval, max_interval))
+        if multiplier < 1:
+            raise ValueError("multiplier must be at least 1 but was {}".format(multiplier))
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.multiplier = multiplier
+
+    def __repr__(self):
+        return "<{}[min={}, max={}]>".format(self.__class__.__name__, self.min_interval, self.max_interval)
+
+    def interval(self, empty_polls):
+        """Seconds to wait before polling a shard again.
+
+        :param int empty_polls: Consecutive polls of the shard that returned no records.
+        :rtype: float
+        """
+        if empty_polls <= 0:
+            return 0.0
+        return min(self.max_interval, self.min_interval * self.multiplier ** (empty_polls - 1))
@@ -0,0 +1,115 @@
+import bisect
+import datetime
+import threading
+
+
+#: DynamoDB Streams keeps records for 24 hours
+RETENTION = datetime.timedelta(hours=24)
+#: DynamoDB closes each shard and starts its children about every 4 hours
+SHARD_LIFETIME = datetime.timedelta(hours=4)
+
+
+class SeekIndex:
+    """Remembers a sequence number in each shard every ``resolution`` seconds, so seeking to a recent time
+    can start close to the target instead of at each shard's trim_horizon.
+
+    The index is filled in as records are consumed from a :class:`~bloop.stream.Stream` created with
+    ``seek_index=``, and is saved to a :class:`~bloop.checkpoints.CheckpointStore` at most once every
+    ``resolution`` seconds of stream time.  Marks older than the stream's 24 hour retention are discarded.
+
+    .. code-block:: python
+
+        store = SQLiteCheckpointStore("stream-state.db")
+        index = SeekIndex(store, "User-stream")
+        stream = engine.stream(User, "trim_horizon", seek_index=index)
+        ...
+        # Later, or in another process
+        stream = engine.stream(User, datetime.now(timezone.utc) - timedelta(minutes=5), seek_index=index)
+
+    :param store: Where the index is persisted.
+    :type store: :class:`~bloop.checkpoints.CheckpointStore`
+    :param str name: Checkpoint name for this stream's index.
+    :param int resolution: *(Optional)* Minimum seconds between marks in a shard.  Default is 60.
+    """
+    def __init__(self, store, name, *, resolution=60):
+        self.store = store
+        self.name = name
+        self.resolution = resolution
+        self._lock = threading.Lock()
+        # shard_id -> ([timestamp, ...], [sequence_number, ...]) in ascending order
+        self._marks = None
+        # Stream time of the last save
+        self._saved_at = None
+
+    def __repr__(self):
+        return "<{}[{}]>".format(self.__class__.__name__, self.name)
+
+    def mark(self, shard_id, created_at, sequence_number):
+        """Record that ``sequence_number`` in ``shard_id`` was created at ``created_at``.
+
+        Only adds a mark when the shard's last mark is at least ``resolution`` seconds older, so this is cheap
+        to call for every record.
+
+        :param str shard_id: Shard the record came from.
+        :param created_at: The record's creation time.
+        :type created_at: :class:`~datetime.datetime`
+        :param str sequence_number: The record's sequence number.
+        """
+        timestamp = int(created_at.timestamp())
+        with self._lock:
+            marks = self._load()
+            times, sequence_numbers = marks.setdefault(shard_id, ([], []))
+            if times and timestamp - times[-1] < self.resolution:
+                return
+            times.append(timestamp)
+            sequence_numbers.append(sequence_number)
+            if self._saved_at is None or timestamp - self._saved_at >= self.resolution:
+                self._expire(timestamp - int(RETENTION.total_seconds()))
+                self._save()
+                self._saved_at = timestamp
+
+    def save(self):
+        """Persist every mark now, including any added since the last automatic save."""
+        with self._lock:
+            if self._marks is not None:
+                self._save()
+
+    def lookup(self, shard_id, position):
+        """The sequence number of the latest mark in ``shard_id`` from strictly before ``position``.
+
+        :param str shard_id: Shard to look in.
+        :param position: The time being seeked to.
+        :type position: :class:`~datetime.datetime`
+        :return: A sequence number, or None if the shard has no marks before ``position``.
+        """
+        with self._lock:
+            shard_marks = self._load().get(shard_id)
+            if not shard_marks:
+                return None
+            times, sequence_numbers = shard_marks
+            index = bisect.bisect_left(times, int(position.timestamp()))
+            return sequence_numbers[index - 1] if index else None
+
+    def _load(self):
+        if self._marks is None:
+            saved = self.store.load(self.name) or {}
+            self._marks = {
+                shard_id: tuple(map(list, zip(*pairs)))
+                for shard_id, pairs in saved.items() if pairs
+            }
+        return self._marks
+
+    def _save(self):
+        self.store.save(self.name, {
+            shard_id: [list(pair) for pair in zip(*shard_marks)]
+            for shard_id, shard_marks in self._marks.items()
+        })
+
+    def _expire(self, cutoff):
+        for shard_id, (times, sequence_numbers) in list(self._marks.items()):
+            index = bisect.bisect_left(times, cutoff)
+            if index:
+                del times[:index]
+                del sequence_numbers[:index]
+            if not times:
+                del self._marks[shard_id]
@@ -1,8 +1,11 @@
 import collections
 import logging
+import time
 
-from ..exceptions import ShardIteratorExpired
+from ..exceptions import RecordsExpired, ShardIteratorExpired
+from ..signals import shard_polled
 from ..util import Sentinel
+from .metrics import ShardStats
 
 
 # Approximate number of calls to fully traverse an empty shard
@@ -30,9 +33,11 @@ class Shard:
     :type parent: :class:`~bloop.stream.shard.Shard`
     :param session: Used to make DynamoDBStreams calls.
     :type session: :class:`~bloop.session.SessionWrapper`
+    :param str ending_sequence_number: *(Optional)* SequenceNumber of the shard's last record, which
+        DescribeStream lists once the shard is closed.  Default is None.
     """
     def __init__(self, *, stream_arn, shard_id, iterator_id=None,
-                 iterator_type=None, sequence_number=None, parent=None, session=None):
+                 iterator_type=None, sequence_number=None, parent=None, session=None, ending_sequence_number=None):
 
         #: The stream arn is set once on creation and never changes
         self.stream_arn = stream_arn
@@ -52,6 +57,17 @@ class Shard:
         # Changes when records are consumed.  Used with :attr:`~.iterator_type`.
         self.sequence_number = sequence_number
 
+        # Set from DescribeStream when the shard is closed.  Not part of the token, so it's None for shards
+        # rebuilt from one.
+        self.ending_sequence_number = ending_sequence_number
+
+        # SequenceNumber of the last record returned by GetRecords since the last jump.  The current iterator
+        # continues after it, which is ahead of :attr:`~.sequence_number` while those records are still buffered.
+        self.last_read = None
+
+        # time.monotonic() when the current iterator was issued.  Iterators expire after 15 minutes.
+        self.iterator_issued = None
+
         # The :class:`Shard` that this one spawned off of.  This will become None
         # if a Coordinator is pruning expired parents.  It is usually set as part
         # of rebuilding a shard tree, soon after the shard is instantiated.
@@ -67,6 +83,10 @@ class Shard:
         # This dictates how hard the shard works to "catch up" a new iterator.
         self.empty_responses = 0
 
+        # Totals for monitoring, which survive jumps.  See :func:`Coordinator.shard_metrics
+        # <bloop.stream.coordinator.Coordinator.shard_metrics>`.
+        self.stats = ShardStats()
+
         self.session = session
 
     def __repr__(self):
@@ -123,6 +143,11 @@ class Shard:
         """True if the shard is closed and there are no additional records to get."""
         return self.iterator_id is last_iterator
 
+    @property
+    def closed(self):
+        """True if the shard won't take new records: it's exhausted, or DescribeStream listed its last record."""
+        return self.exhausted or self.ending_sequence_number is not None
+
     @property
     def token(self):
         """JSON-serializable representation of the current Shard state.
@@ -170,9 +195,26 @@ class Shard:
             sequence_number=sequence_number)
         self.iterator_type = iterator_type
         self.sequence_number = sequence_number
+        self.last_read = None
+        self.iterator_issued = time.monotonic()
         self.empty_responses = 0
 
-    def seek_to(self, position):
+    def resume_position(self):
+        """The GetShardIterator parameters for a new iterator at the same place as the current iterator.
+
+        Returns None when the shard is still at a "trim_horizon" or "latest" iterator, since a new iterator
+        could skip records.  Those shards are kept alive by polling them instead.
+
+        :returns: Dict with "iterator_type" and "sequence_number", or None.
+        :rtype: dict
+        """
+        if self.last_read is not None:
+            return {"iterator_type": "after_sequence", "sequence_number": self.last_read}
+        if self.iterator_type in EXACT_ITERATORS:
+            return {"iterator_type": self.iterator_type, "sequence_number": self.sequence_number}
+        return None
+
+    def seek_to(self, position, sequence_number=None):
         """Move the Shard's iterator to the earliest record after the :class:`~datetime.datetime` time.
 
         Returns the first records at or past ``position``.  If the list is empty,
@@ -181,16 +223,34 @@ class Shard:
 
         :param position: The position in time to move to.
         :type position: :class:`~datetime.datetime`
+        :param str sequence_number: *(Optional)* A sequence number known to be before ``position``, such as
+            one from a :class:`~bloop.stream.seek.SeekIndex`.  The search starts here instead of at the
+            trim_horizon.  If the sequence number has expired, the search starts at the trim_horizon.
         :returns: A list of the first records found after ``position``.  May be empty.
         """
-        # 0) We have no way to associate the date with a position,
+        # 0) Without a known starting point we have no way to associate the date with a position,
         #    so we have to scan the shard from the beginning.
-        self.jump_to(iterator_type="trim_horizon")
+        if sequence_number is None:
+            self.jump_to(iterator_type="trim_horizon")
+        else:
+            try:
+                self.jump_to(iterator_type="at_sequence", sequence_number=sequence_number)
+            except RecordsExpired:
+                self.jump_to(iterator_type="trim_horizon")
+        return self.scan_to(position)
+
+    def scan_to(self, position, records=None):
+        """Read forward from the current iterator until finding records at or past ``position``.
 
+        :param position: The position in time to move to.
+        :type position: :class:`~datetime.datetime`
+        :param list records: *(Optional)* Records already read from the current iterator, which are checked
+            before reading any more.
+        :returns: A list of the first records found after ``position``.  May be empty.
+        """
         position = int(position.timestamp())
 
-        while (not self.exhausted) and (self.empty_responses < CALLS_TO_REACH_HEAD):
-            records = self.get_records()
+        while True:
             # We can skip the whole record set if the newest (last) record isn't new enough.
             if records and records[-1]["meta"]["created_at"].timestamp() >= position:
                 # Looking for the first number *below* the position.
@@ -199,9 +259,10 @@ class Shard:
                         index = len(records) - offset
                         return records[index:]
                 return records
-
-        # Either exhausted the Shard or caught up to HEAD.
-        return []
+            if self.exhausted or self.empty_responses >= CALLS_TO_REACH_HEAD:
+                # Either exhausted the Shard or caught up to HEAD.
+                return []
+            records = self.get_records()
 
     def load_children(self):
         """If the Shard doesn't have any children, tries to find some from DescribeStream.
@@ -216,21 +277,29 @@ class Shard:
 
         if self.children:
             return self.children
+        return self.add_children(self.session.describe_stream(
+            stream_arn=self.stream_arn,
+            first_shard=self.shard_id)["Shards"])
+
+    def add_children(self, shards):
+        """Hook up this Shard's descendants from a DescribeStream response that starts at this Shard.
 
+        :param list shards: The "Shards" from a DescribeStream call with ``first_shard`` set to this Shard's id.
+        :returns: This Shard's children.  May be empty.
+        """
         # ParentShardId -> [Shard, ...]
         by_parent = collections.defaultdict(list)
         # ShardId -> Shard
         by_id = {}
 
-        for shard in self.session.describe_stream(
-                stream_arn=self.stream_arn,
-                first_shard=self.shard_id)["Shards"]:
+        for shard in shards:
             parent_list = by_parent[shard.get("ParentShardId")]
             shard = Shard(
                 stream_arn=self.stream_arn,
                 shard_id=shard["ShardId"],
                 parent=shard.get("ParentShardId"),
-                session=self.session)
+                session=self.session,
+                ending_sequence_number=shard.get("SequenceNumberRange", {}).get("EndingSequenceNumber"))
             parent_list.append(shard)
             by_id[shard.shard_id] = shard
 
@@ -260,20 +329,34 @@ class Shard:
 
         # Already caught up, just the one call please.
         if self.empty_responses >= CALLS_TO_REACH_HEAD:
-            return self._apply_get_records_response(self.session.get_stream_records(self.iterator_id))
+            return self._get_stream_records()
 
         # Up to 5 calls to try and find a result
         while self.empty_responses < CALLS_TO_REACH_HEAD and not self.exhausted:
-            records = self._apply_get_records_response(self.session.get_stream_records(self.iterator_id))
+            records = self._get_stream_records()
             if records:
                 return records
 
         return []
 
+    def _get_stream_records(self):
+        """One GetRecords call from the current iterator, counted in :attr:`stats`."""
+        start = time.perf_counter()
+        response = self.session.get_stream_records(self.iterator_id)
+        elapsed = time.perf_counter() - start
+        records = self._apply_get_records_response(response)
+        self.stats.polled(len(records), elapsed)
+        if shard_polled.receivers:
+            shard_polled.send(self, shard=self, records=len(records), elapsed=elapsed, lag=self.stats.lag())
+        return records
+
     def _apply_get_records_response(self, response):
         records = response.get("Records", [])
         records = [reformat_record(record) for record in records]
         self.iterator_id = response.get("NextShardIterator", last_iterator)
+        self.iterator_issued = time.monotonic()
+        if records:
+            self.last_read = records[-1]["meta"]["sequence_number"]
 
         if records and self.sequence_number is None:
             # ONLY update these if there's no sequence_number.  Overwriting risks data loss.
@@ -319,7 +402,8 @@ def unpack_shards(shards, stream_arn, session):
     by_id = {shard_token["shard_id"]:
              Shard(stream_arn=stream_arn, shard_id=shard_token["shard_id"],
                    iterator_type=shard_token.get("iterator_type"), sequence_number=shard_token.get("sequence_number"),
-                   parent=shard_token.get("parent"), session=session)
+                   parent=shard_token.get("parent"), session=session,
+                   ending_sequence_number=shard_token.get("ending_sequence_number"))
              for shard_token in shards}
 
     for shard in by_id.values():
@@ -337,5 +421,6 @@ def _translate_shards(shards):
             "iterator_type": None,
             "sequence_number": None,
             "iterator_id": None,
-            "parent": shard.get("ParentShardId")
+            "parent": shard.get("ParentShardId"),
+            "ending_sequence_number": shard.get("SequenceNumberRange", {}).get("EndingSequenceNumber"),
         }
@@ -1,3 +1,6 @@
+import time
+
+from ..metrics import operation_scope, timed_phase
 from ..models import unpack_from_dynamodb
 from ..signals import object_loaded
 from .coordinator import Coordinator
@@ -9,14 +12,49 @@ class Stream:
     :param model: The model to stream records from.
     :param engine: The engine to load model objects through.
     :type engine: :class:`~bloop.engine.Engine`
+    :param int max_workers: *(Optional)* Number of threads used to poll shards concurrently.
+        Default is None, which polls shards one at a time.
+    :param seek_index: *(Optional)* Remembers where each shard was at past times, so moving to a recent time is
+        fast.  Default is None.
+    :type seek_index: :class:`~bloop.stream.SeekIndex`
+    :param checkpoint: *(Optional)* Saves the stream's token as records are consumed.  Default is None.
+    :type checkpoint: :class:`~bloop.stream.StreamCheckpointer`
+    :param polling: *(Optional)* Backs off polling shards that are caught up.  Default is None.
+    :type polling: :class:`~bloop.stream.PollingPolicy`
+    :param leases: *(Optional)* Shares the stream's shards with other workers in the same group.  Default is None.
+    :type leases: :class:`~bloop.stream.LeaseCoordinator`
+    :param filter: *(Optional)* Skips records before they're unpacked.  Default is None.
+    :type filter: :class:`~bloop.stream.StreamFilter`
+    :param dispatch: *(Optional)* Unpacks each record as one of several models that share the table.
+        Default is None, which unpacks every record as ``model``.
+    :type dispatch: :class:`~bloop.stream.StreamDispatcher`
+    :param maintenance: *(Optional)* Refreshes iterators and finds child shards from a background thread.
+        Default is None.
+    :type maintenance: :class:`~bloop.stream.StreamMaintenance`
+    :param str ordering: *(Optional)* "total" orders records across every shard, and "shard" only within each
+        shard.  Default is "total".
     """
-    def __init__(self, *, model, engine):
+    def __init__(self, *, model, engine, max_workers=None, seek_index=None, checkpoint=None, polling=None,
+                 leases=None, filter=None, dispatch=None, maintenance=None, ordering="total"):
 
         self.model = model
         self.engine = engine
+        self.filter = filter
+        self._matches = None if filter is None else filter.compile(model, engine)
+        self.dispatch = dispatch
+        self.maintenance = maintenance
+        self.checkpoint = checkpoint
+        # Number of records last returned that the checkpointer hasn't counted yet.  They're only counted
+        # once more records are requested, so a checkpoint never skips a record that wasn't processed.
+        self._uncounted = 0
         self.coordinator = Coordinator(
             session=engine.session,
-            stream_arn=model.Meta.stream["arn"])
+            stream_arn=model.Meta.stream["arn"],
+            max_workers=max_workers,
+            seek_index=seek_index,
+            polling=polling,
+            leases=leases,
+            ordering=ordering)
 
     def __repr__(self):
         # <Stream[User]>
@@ -26,37 +64,130 @@ class Stream:
         return self
 
     def __next__(self):
+        self._step_checkpoint()
         record = next(self.coordinator)
+        model = record and self._model_for(record)
+        # Skip filtered records that are already buffered, but don't poll the shards again until the next call
+        while record and model is None:
+            record = next(self.coordinator) if self.coordinator.buffer else None
+            model = record and self._model_for(record)
         if record:
-            meta = self.model.Meta
-            for key, expected in [("new", meta.columns), ("old", meta.columns), ("key", meta.keys)]:
-                if key not in meta.stream["include"]:
+            self._uncounted = 1
+            include = self.model.Meta.stream["include"]
+            for key, expected in [("new", model.Meta.columns), ("old", model.Meta.columns), ("key", model.Meta.keys)]:
+                if key not in include:
                     record[key] = None
                 else:
-                    self._unpack(record, key, expected)
+                    self._unpack(record, key, expected, model)
         return record
 
+    def next(self, timeout=None):
+        """The next record, waiting up to ``timeout`` seconds for one to arrive.
+
+        Between polls this sleeps until the earliest shard is due under the stream's
+        :class:`~bloop.stream.PollingPolicy`.  Without a policy, shards are polled again immediately.
+
+        :param float timeout: *(Optional)* Seconds to wait for a record.  Default is None, which waits forever.
+        :return: The next record, or None if the timeout passed first.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            record = next(self)
+            if record or not self._wait(deadline):
+                return record
+
+    def next_batch(self, max_records=1000, max_wait=None):
+        """Up to ``max_records`` records at once, in the same order as calling ``next`` repeatedly.
+
+        Shard positions are updated once per batch, and every record in the batch is unpacked in one pass, so
+        this is much cheaper per record than ``next`` for high throughput streams.
+
+        .. code-block:: python
+
+            while True:
+                batch = stream.next_batch(500, max_wait=2)
+                write_somewhere([record["new"] for record in batch])
+
+        :param int max_records: *(Optional)* Maximum number of records to return.  Default is 1000.
+        :param float max_wait: *(Optional)* Keep polling for up to this many seconds to fill the batch, sleeping
+            between polls as :func:`~bloop.stream.Stream.next` does.  Default is None, which polls the shards at
+            most once.
+        :return: List of records.  May be empty.
+        :rtype: list
+        """
+        if max_records < 1:
+            raise ValueError("max_records must be at least 1 but was {}".format(max_records))
+        self._step_checkpoint()
+        deadline = None if max_wait is None else time.monotonic() + max_wait
+
+        pairs = self._next_matching(max_records)
+        while len(pairs) < max_records and deadline is not None and self._wait(deadline):
+            pairs.extend(self._next_matching(max_records - len(pairs)))
+
+        self._uncounted = len(pairs)
+        return self._unpack_batch(pairs)
+
+    def iter_batches(self, max_records=1000, max_wait=None):
+        """Yield batches from :func:`~bloop.stream.Stream.next_batch` forever.
+
+        Batches may be empty when there are no new records, so the consumer still gets a chance to call
+        :func:`~bloop.stream.Stream.heartbeat`.
+
+        :param int max_records: *(Optional)* Maximum number of records in each batch.  Default is 1000.
+        :param float max_wait: *(Optional)* Seconds to spend filling each batch.  Default is None.
+        """
+        while True:
+            yield self.next_batch(max_records, max_wait)
+
     def heartbeat(self):
         """Refresh iterators without sequence numbers so they don't expire.
 
-        Call this at least every 14 minutes.
+        Call this at least every 14 minutes, unless the stream has a :class:`~bloop.stream.StreamMaintenance`.
         """
         self.coordinator.heartbeat()
 
+    def shard_metrics(self, reset=False):
+        """Counters, GetRecords latency, iterator age, buffered count, and consumer lag for each shard.
+
+        See :func:`Coordinator.shard_metrics <bloop.stream.coordinator.Coordinator.shard_metrics>`.
+
+        :param bool reset: Clear each shard's counters and latency histogram after copying them.  Default is False.
+        :rtype: list
+        """
+        return self.coordinator.shard_metrics(reset=reset)
+
+    def close(self):
+        """Stop any threads used to poll shards or maintain them, save the seek index and checkpoint, and release
+        leases.
+
+        The last record returned is treated as consumed.  The Stream can still be used afterwards, and
+        maintenance starts again on the next :func:`~bloop.stream.Stream.move_to`.
+        """
+        if self.maintenance is not None:
+            self.maintenance.stop()
+        self.coordinator.close()
+        if self.checkpoint is not None:
+            self._step_checkpoint()
+            self.checkpoint.save(self)
+
     def move_to(self, position):
         """Move the Stream to a specific endpoint or time, or load state from a token.
 
         Moving to an endpoint with "trim_horizon" or "latest" and loading from a previous token are both
         very efficient.
 
-        In contrast, seeking to a specific time requires iterating **all records in the stream up to that time**.
-        This can be **very expensive**.  Once you have moved a stream to a time, you should save the
-        :attr:`Stream.token <bloop.stream.stream.Stream.token>` so reloading will be extremely fast.
+        In contrast, seeking to a specific time may need to read every record in a shard up to that time.
+        Shards that closed before the time are skipped, and a :class:`~bloop.stream.SeekIndex` lets most shards
+        start close to the time, but a seek can still be **expensive**.  Once you have moved a stream to a time,
+        you should save the :attr:`Stream.token <bloop.stream.stream.Stream.token>` so reloading will be
+        extremely fast.
 
         :param position: "trim_horizon", "latest", :class:`~datetime.datetime`, or a
             :attr:`Stream.token <bloop.stream.stream.Stream.token>`
         """
         self.coordinator.move_to(position)
+        if self.maintenance is not None:
+            self.maintenance.start(self.coordinator)
 
     @property
     def token(self):
@@ -70,16 +201,101 @@ class Stream:
         """
         return self.coordinator.token
 
-    def _unpack(self, record, key, expected):
+    def _model_for(self, record):
+        """The model to unpack a raw record as, or None if it's filtered out."""
+        if self._matches is not None and not self._matches(record):
+            return None
+        if self.dispatch is None:
+            return self.model
+        return self.dispatch.model_for(record)
+
+    def _next_matching(self, max_records):
+        """(record, model) pairs for the next records that aren't filtered out."""
+        if self._matches is None and self.dispatch is None:
+            model = self.model
+            return [(record, model) for record in self.coordinator.next_batch(max_records)]
+        pairs = []
+        for record in self.coordinator.next_batch(max_records):
+            model = self._model_for(record)
+            if model is not None:
+                pairs.append((record, model))
+        return pairs
+
+    def _wait(self, deadline):
+        """Sleep until a shard is due or the deadline passes.  Returns False once the deadline has passed."""
+        wait = self.coordinator.wait_time()
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            wait = min(wait, remaining)
+        if wait > 0:
+            time.sleep(wait)
+        return True
+
+    def _step_checkpoint(self):
+        if self.checkpoint is not None:
+            self.checkpoint.step(self, consumed=self._uncounted)
+        self._uncounted = 0
+
+    def _unpack_batch(self, pairs):
+        """Replaces the attr dicts in every record with instances of its model, and returns the records.
+
+        Each model's column names and loaders are looked up once for the whole batch instead of once per record.
+        The whole batch is timed as one "unpack" phase of the "stream" operation.
+        """
+        engine = self.engine
+        context = {"engine": engine}
+        include = self.model.Meta.stream["include"]
+        excluded = [key for key in ("new", "old", "key") if key not in include]
+        # model -> (init, [(key, [(name, dynamo_name, load), ...]), ...])
+        unpackers = {}
+        loaded = []
+        records = []
+        with operation_scope("stream"), timed_phase("unpack", "stream"):
+            for record, model in pairs:
+                unpacker = unpackers.get(model)
+                if unpacker is None:
+                    unpacker = unpackers[model] = batch_unpacker(model, include)
+                init, keys = unpacker
+                for key in excluded:
+                    record[key] = None
+                for key, loaders in keys:
+                    attrs = record.get(key)
+                    if attrs is None:
+                        continue
+                    obj = init()
+                    for name, dynamo_name, load in loaders:
+                        setattr(obj, name, load(attrs.get(dynamo_name), context=context))
+                    record[key] = obj
+                    loaded.append(obj)
+                records.append(record)
+        for obj in loaded:
+            object_loaded.send(engine, engine=engine, obj=obj)
+        return records
+
+    def _unpack(self, record, key, expected, model):
         """Replaces the attr dict at the given key with an instance of a Model"""
         attrs = record.get(key)
         if attrs is None:
             return
-        obj = unpack_from_dynamodb(
-            attrs=attrs,
-            expected=expected,
-            model=self.model,
-            engine=self.engine
-        )
+        with operation_scope("stream"):
+            obj = unpack_from_dynamodb(
+                attrs=attrs,
+                expected=expected,
+                model=model,
+                engine=self.engine
+            )
         object_loaded.send(self.engine, engine=self.engine, obj=obj)
         record[key] = obj
+
+
+def batch_unpacker(model, include):
+    """The model's init and, for each included image, the name, dynamo name, and loader of every column."""
+    meta = model.Meta
+    keys = []
+    for key, expected in [("new", meta.columns), ("old", meta.columns), ("key", meta.keys)]:
+        if key in include:
+            # noinspection PyProtectedMember
+            keys.append((key, [(column.name, column.dynamo_name, column.typedef._load) for column in expected]))
+    return meta.init, keys
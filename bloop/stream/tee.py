@@ -0,0 +1,333 @@
+import collections
+import logging
+import queue
+import threading
+
+
+logger = logging.getLogger("bloop.stream")
+
+OVERFLOW_POLICIES = {"block", "resync"}
+
+
+class StreamTee:
+    """Reads a :class:`~bloop.stream.Stream` once and hands every batch to several in-process subscribers.
+
+    Each subscriber has a bounded queue of batches, its own position, and optionally its own
+    :class:`~bloop.stream.StreamCheckpointer`.  Records are unpacked once and shared, so subscribers must not
+    modify them.  When a subscriber's queue is full, ``overflow`` decides what happens:
+
+    * "block" waits for the subscriber to catch up, which holds back every other subscriber too;
+    * "resync" stops sending batches to the subscriber, which reads the missed records from its own stream
+      starting at its last position, and rejoins the shared batches once that stream is caught up.
+
+    A subscriber whose checkpointer has a saved token also starts on its own stream from that token.  Reading its
+    own stream makes extra GetRecords calls against the same shards, and DynamoDB throttles more than two readers
+    on a shard at once.
+
+    .. code-block:: python
+
+        stream = engine.stream(User, "latest")
+        tee = StreamTee(stream, overflow="resync")
+        search = tee.subscribe("search", checkpoint=StreamCheckpointer(store, "search"))
+        audit = tee.subscribe("audit")
+        tee.start()
+
+        # in each consumer's thread
+        while True:
+            record = search.next(timeout=5)
+            if record:
+                index(record)
+
+    :param stream: The stream to read.  It can't have its own checkpoint, since records it has read may not have
+        been consumed by every subscriber.
+    :type stream: :class:`~bloop.stream.Stream`
+    :param int max_batches: *(Optional)* Batches queued for each subscriber before ``overflow`` applies.
+        Default is 10.
+    :param int batch_size: *(Optional)* Maximum records read from the stream at once.  Default is 1000.
+    :param str overflow: *(Optional)* "block" or "resync".  Default is "block".
+    :param float poll_wait: *(Optional)* Seconds the background thread spends filling each batch.  Default is 1.
+    """
+    def __init__(self, stream, *, max_batches=10, batch_size=1000, overflow="block", poll_wait=1.0):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError("overflow must be one of {} but was {!r}".format(sorted(OVERFLOW_POLICIES), overflow))
+        if max_batches < 1:
+            raise ValueError("max_batches must be at least 1 but was {}".format(max_batches))
+        if stream.checkpoint is not None:
+            raise ValueError("a teed stream can't have a checkpoint; give each subscriber its own instead")
+        self.stream = stream
+        self.max_batches = max_batches
+        self.batch_size = batch_size
+        self.overflow = overflow
+        self.poll_wait = poll_wait
+        #: Current subscribers by name
+        self.subscribers = {}
+        self.lock = threading.Lock()
+
+        self._thread = None
+        self._stopped = threading.Event()
+
+    def __repr__(self):
+        # <StreamTee[User]>
+        return "<{}[{}]>".format(self.__class__.__name__, self.stream.model.__name__)
+
+    @property
+    def running(self):
+        """True while the background thread is running."""
+        return self._thread is not None
+
+    def subscribe(self, name, *, checkpoint=None):
+        """Add a subscriber that receives every batch read after this call.
+
+        :param str name: Unique name for the subscriber.
+        :param checkpoint: *(Optional)* Saves the subscriber's position as it consumes records.  When it has a
+            saved token, the subscriber starts from that token instead.  Default is None.
+        :type checkpoint: :class:`~bloop.stream.StreamCheckpointer`
+        :rtype: :class:`~bloop.stream.tee.TeeSubscriber`
+        """
+        with self.lock:
+            if name in self.subscribers:
+                raise ValueError("already have a subscriber named {!r}".format(name))
+            subscriber = self.subscribers[name] = TeeSubscriber(self, name, checkpoint=checkpoint)
+        return subscriber
+
+    def poll(self, max_wait=None):
+        """Read one batch from the stream and queue it for every subscriber.
+
+        Called by the background thread.  To poll from your own loop instead, don't call :func:`start`.
+
+        :param float max_wait: *(Optional)* Seconds to spend filling the batch, like
+            :func:`Stream.next_batch <bloop.stream.Stream.next_batch>`.  Default is None.
+        :return: Number of records in the batch.
+        :rtype: int
+        """
+        batch = self.stream.next_batch(self.batch_size, max_wait=max_wait)
+        if not batch:
+            return 0
+        token = self.stream.token
+        with self.lock:
+            subscribers = [subscriber for subscriber in self.subscribers.values() if subscriber.attached]
+        for subscriber in subscribers:
+            subscriber._offer(batch, token)
+        return len(batch)
+
+    def start(self):
+        """Poll the stream from a daemon thread.  Does nothing if already running."""
+        if self._thread is not None:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="bloop-stream-tee", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background thread after the batch in progress.
+
+        A subscriber that the thread was blocked on resyncs from its own stream, so it doesn't miss that batch.
+        """
+        if self._thread is None:
+            return
+        self._stopped.set()
+        self._thread.join()
+        self._thread = None
+
+    def close(self):
+        """Stop the background thread, close every remaining subscriber, and close the stream.
+
+        Call this once consumers have stopped reading.
+        """
+        self.stop()
+        with self.lock:
+            subscribers = list(self.subscribers.values())
+        for subscriber in subscribers:
+            subscriber.close()
+        self.stream.close()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                self.poll(max_wait=self.poll_wait)
+            except Exception:
+                logger.exception("stream tee failed to poll {!r}".format(self.stream))
+                self._stopped.wait(self.poll_wait)
+
+    def _remove(self, subscriber):
+        with self.lock:
+            if self.subscribers.get(subscriber.name) is subscriber:
+                del self.subscribers[subscriber.name]
+
+
+class TeeSubscriber:
+    """One consumer of a :class:`~bloop.stream.StreamTee`, created by
+    :func:`StreamTee.subscribe <bloop.stream.StreamTee.subscribe>`.
+
+    Iterate it like a :class:`~bloop.stream.Stream` from the consumer's own thread.  As with a Stream, a record is
+    counted as consumed when the next one is requested.
+    """
+    def __init__(self, tee, name, *, checkpoint=None):
+        self.tee = tee
+        self.name = name
+        self.checkpoint = checkpoint
+        #: True while the tee is queueing batches for this subscriber
+        self.attached = True
+
+        self._queue = queue.Queue(maxsize=tee.max_batches)
+        self._lock = threading.Lock()
+        # Set by the tee's thread when it stopped queueing batches; the subscriber reads its own stream from
+        # the last queued position once the queue is drained.
+        self._resync = False
+        self._last_queued = None
+        # The subscriber's own stream while it's catching up
+        self._stream = None
+
+        self._pending = collections.deque()
+        self._pending_token = None
+        self._uncounted = 0
+
+        saved = checkpoint.load() if checkpoint is not None else None
+        if saved is not None:
+            self.attached, self._resync, self._last_queued = False, True, saved
+        else:
+            self._last_queued = tee.stream.token
+        self._token = self._last_queued
+
+    def __repr__(self):
+        return "<{}[{}]>".format(self.__class__.__name__, self.name)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return self.next(timeout=0)
+
+    @property
+    def token(self):
+        """Position after the last batch this subscriber finished, in the same format as
+        :attr:`Stream.token <bloop.stream.stream.Stream.token>`.
+
+        :rtype: dict
+        """
+        return self._token
+
+    @property
+    def resyncing(self):
+        """True while the subscriber reads from its own stream instead of the tee's batches."""
+        return self._stream is not None or self._resync
+
+    def next(self, timeout=None):
+        """The next record, waiting up to ``timeout`` seconds for one to arrive.
+
+        :param float timeout: *(Optional)* Seconds to wait for a record.  Default is None, which waits forever.
+        :return: The next record, or None if the timeout passed first.
+        """
+        if not self._pending:
+            self._finish_batch()
+        self._step_checkpoint()
+        if not self._pending and not self._fill(timeout):
+            return None
+        self._uncounted = 1
+        return self._pending.popleft()
+
+    def close(self):
+        """Stop receiving batches, save the checkpoint, and close the subscriber's own stream if it has one.
+
+        The last record returned is treated as consumed.
+        """
+        self.tee._remove(self)
+        with self._lock:
+            self.attached = False
+        if not self._pending:
+            self._finish_batch()
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+        if self.checkpoint is not None:
+            self._step_checkpoint()
+            self.checkpoint.save(self)
+
+    def _fill(self, timeout):
+        """Load the next batch into ``_pending``.  Returns False if there wasn't one before the timeout."""
+        # A resync is only flagged while the queue is full, so waiting on an empty queue can't miss one.
+        if self._stream is None and self._resync and self._queue.empty():
+            self._start_resync()
+        if self._stream is not None:
+            return self._fill_from_stream()
+        try:
+            if timeout is not None and timeout <= 0:
+                batch, token = self._queue.get_nowait()
+            else:
+                batch, token = self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return False
+        self._pending.extend(batch)
+        self._pending_token = token
+        return True
+
+    def _fill_from_stream(self):
+        batch = self._stream.next_batch(self.tee.batch_size)
+        if batch:
+            self._pending.extend(batch)
+            self._pending_token = self._stream.token
+            return True
+        if not self.attached:
+            # Caught up.  Start receiving the tee's batches, then read once more so records the tee read before
+            # rejoining aren't missed.  Some may arrive twice.
+            self._rejoin()
+            return self._fill_from_stream()
+        self._stream.close()
+        self._stream = None
+        logger.info("subscriber {!r} caught up and rejoined the tee".format(self.name))
+        return False
+
+    def _start_resync(self):
+        stream = self.tee.stream
+        logger.info("subscriber {!r} is reading its own stream to catch up".format(self.name))
+        self._stream = stream.engine.stream(
+            stream.model, self._last_queued,
+            filter=stream.filter, dispatch=stream.dispatch, ordering=stream.coordinator.ordering)
+
+    def _rejoin(self):
+        with self._lock:
+            # Anything queued before falling behind again was already read from the subscriber's own stream
+            while not self._queue.empty():
+                self._queue.get_nowait()
+            self.attached, self._resync = True, False
+            self._last_queued = self._stream.token
+
+    def _offer(self, batch, token):
+        """Called from the tee's thread to queue a batch, or to fall behind when the queue is full."""
+        item = batch, token
+        if self.tee.overflow == "resync":
+            try:
+                self._queue.put_nowait(item)
+            except queue.Full:
+                self._fall_behind()
+            else:
+                self._last_queued = token
+            return
+        while self.attached:
+            try:
+                self._queue.put(item, timeout=0.1)
+            except queue.Full:
+                if self.tee._stopped.is_set():
+                    self._fall_behind()
+                    return
+            else:
+                self._last_queued = token
+                return
+
+    def _fall_behind(self):
+        with self._lock:
+            if not self.attached:
+                return
+            self.attached = False
+            if self._stream is None:
+                self._resync = True
+        logger.info("subscriber {!r} fell {} batches behind".format(self.name, self.tee.max_batches))
+
+    def _finish_batch(self):
+        if self._pending_token is not None:
+            self._token, self._pending_token = self._pending_token, None
+
+    def _step_checkpoint(self):
+        if self.checkpoint is not None:
+            self.checkpoint.step(self, consumed=self._uncounted)
+        self._uncounted = 0
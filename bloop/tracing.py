@@ -0,0 +1,187 @@
+import contextvars
+
+
+__all__ = ["Span", "Tracer", "current_span", "get_tracer", "set_tracer"]
+
+# The active tracer, or None when tracing is disabled.  Checked before any span or attribute is built.
+_tracer = None
+_current = contextvars.ContextVar("bloop_span", default=None)
+
+
+class Span:
+    """A single unit of work reported to a :class:`~bloop.tracing.Tracer`.
+
+    Subclass this to adapt an existing tracing library's spans.  The base class discards everything.
+    """
+    def set_attribute(self, key, value):
+        """Attach an attribute, such as ``"aws.dynamodb.table_names"``, to the span."""
+
+    def record_exception(self, exception):
+        """Called with the exception that ended the span, if any."""
+
+    def end(self):
+        """Called once when the work is done."""
+
+
+class Tracer:
+    """Creates :class:`~bloop.tracing.Span` instances for bloop's operations.
+
+    Every span that starts while another is open receives the open span as its ``parent``, so the spans form a
+    tree per :func:`~bloop.engine.Engine` operation:
+
+    * ``bloop.engine.<operation>`` for save, delete, and load, ``bloop.transaction.commit``, and
+      ``bloop.search.page`` for each page a query or scan fetches
+    * ``bloop.session.<method>`` for each :class:`~bloop.session.SessionWrapper` call
+    * ``bloop.session.batch_get.chunk`` and ``bloop.bulk.batch_write`` for each batch chunk, and
+      ``bloop.bulk.batch_write.attempt`` for each attempt to write a chunk
+
+    Attributes follow OpenTelemetry's `DynamoDB conventions`__ where one exists.  Consumed capacity is only
+    reported by DynamoDB when it's requested, which bloop does while a tracer is set.
+
+    __ https://opentelemetry.io/docs/specs/semconv/database/dynamodb/
+
+    .. code-block:: python
+
+        from opentelemetry import trace
+
+        class OtelSpan(Span):
+            def __init__(self, span):
+                self.span = span
+            def set_attribute(self, key, value):
+                self.span.set_attribute(key, value)
+            def record_exception(self, exception):
+                self.span.record_exception(exception)
+            def end(self):
+                self.span.end()
+
+        class OtelTracer(Tracer):
+            def __init__(self):
+                self.tracer = trace.get_tracer("bloop")
+            def start_span(self, name, attributes, parent):
+                context = trace.set_span_in_context(parent.span) if parent else None
+                return OtelSpan(self.tracer.start_span(name, context=context, attributes=attributes))
+
+        set_tracer(OtelTracer())
+    """
+    def start_span(self, name, attributes, parent):
+        """Start a span.
+
+        :param str name: For example ``"bloop.session.search_items"``.
+        :param dict attributes: Attributes known when the span starts.
+        :param parent: The innermost open :class:`~bloop.tracing.Span` in this context, or None.
+        :rtype: :class:`~bloop.tracing.Span`
+        """
+        return Span()
+
+
+def set_tracer(tracer):
+    """Send spans for every engine to ``tracer``, or stop tracing if ``tracer`` is None."""
+    global _tracer
+    _tracer = tracer
+
+
+def get_tracer():
+    """The active :class:`~bloop.tracing.Tracer`, or None."""
+    return _tracer
+
+
+def current_span():
+    """The innermost open :class:`~bloop.tracing.Span` in this context, or None."""
+    return _current.get()
+
+
+class _NoopScope:
+    recording = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        return False
+
+    def set_attribute(self, key, value):
+        pass
+
+    def set_response(self, response):
+        pass
+
+
+_noop = _NoopScope()
+
+
+class _Scope:
+    recording = True
+
+    def __init__(self, tracer, name, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+        self.span = None
+        self._token = None
+
+    def __enter__(self):
+        self.span = self.tracer.start_span(self.name, self.attributes, _current.get())
+        self._token = _current.set(self.span)
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        _current.reset(self._token)
+        if exc_value is not None:
+            self.span.record_exception(exc_value)
+        self.span.end()
+        return False
+
+    def set_attribute(self, key, value):
+        self.span.set_attribute(key, value)
+
+    def set_response(self, response):
+        for key, value in response_attributes(response).items():
+            self.span.set_attribute(key, value)
+
+
+def span(name, request=None, attributes=None):
+    """Context manager for a span, or a shared no-op when tracing is disabled.
+
+    Attributes for a DynamoDB ``request`` are only computed while a tracer is set.  Use ``scope.recording``
+    to skip computing any other expensive attributes.
+    """
+    tracer = _tracer
+    if tracer is None:
+        return _noop
+    attributes = dict(attributes) if attributes else {}
+    if request is not None:
+        attributes.update(request_attributes(request))
+    return _Scope(tracer, name, attributes)
+
+
+def request_attributes(request):
+    """Span attributes describing a DynamoDB request"""
+    attributes = {"db.system": "dynamodb"}
+    if "TableName" in request:
+        attributes["aws.dynamodb.table_names"] = [request["TableName"]]
+    elif "RequestItems" in request:
+        attributes["aws.dynamodb.table_names"] = sorted(request["RequestItems"])
+    elif "TransactItems" in request:
+        attributes["aws.dynamodb.table_names"] = sorted({
+            action["TableName"] for item in request["TransactItems"] for action in item.values()})
+    if "IndexName" in request:
+        attributes["aws.dynamodb.index_name"] = request["IndexName"]
+    if "Segment" in request:
+        attributes["aws.dynamodb.segment"] = request["Segment"]
+        attributes["aws.dynamodb.total_segments"] = request["TotalSegments"]
+    return attributes
+
+
+def response_attributes(response):
+    """Span attributes describing a DynamoDB response"""
+    attributes = {}
+    if "Count" in response:
+        attributes["aws.dynamodb.count"] = response["Count"]
+    if "ScannedCount" in response:
+        attributes["aws.dynamodb.scanned_count"] = response["ScannedCount"]
+    consumed = response.get("ConsumedCapacity")
+    if consumed:
+        if isinstance(consumed, dict):
+            consumed = [consumed]
+        attributes["bloop.consumed_capacity"] = sum(entry.get("CapacityUnits", 0.0) for entry in consumed)
+    return attributes
@@ -6,8 +6,10 @@ from typing import Any, List, NamedTuple, Optional
 
 from .conditions import render
 from .exceptions import MissingObjects, TransactionTokenExpired
+from .metrics import operation_scope, timed_operation
 from .models import unpack_from_dynamodb
 from .signals import object_deleted, object_loaded, object_saved
+from .tracing import span
 from .util import dump_key, get_table_name
 
 
@@ -28,7 +30,7 @@ MAX_TOKEN_LIFETIME = timedelta(minutes=9, seconds=30)
 class TxType(enum.Enum):
     """Enum whose value is the wire format of its name"""
     Get = "Get"
-    Check = "CheckCondition"
+    Check = "ConditionCheck"
     Delete = "Delete"
     Update = "Update"
 
@@ -190,6 +192,10 @@ class PreparedTransaction:
         self._prepare_request()
 
     def _prepare_request(self):
+        with operation_scope("transact"):
+            self._render_request()
+
+    def _render_request(self):
         self._request = [
             {
                 item.type.value: {
@@ -205,6 +211,7 @@ class PreparedTransaction:
             for item in self.items
         ]
 
+    @timed_operation("transact")
     def commit(self) -> None:
         """
         Commit the transaction with a fixed transaction id.
@@ -216,16 +223,18 @@ class PreparedTransaction:
         if self.first_commit_at is None:
             self.first_commit_at = now
 
-        if self.mode == "r":
-            response = self.engine.session.transaction_read(self._request)
-        elif self.mode == "w":
-            if now - self.first_commit_at > MAX_TOKEN_LIFETIME:
-                raise TransactionTokenExpired
-            response = self.engine.session.transaction_write(self._request, self.tx_id)
-        else:
-            raise ValueError(f"unrecognized mode {self.mode}")
-
-        self._handle_response(response)
+        attributes = {"bloop.mode": self.mode, "bloop.items": len(self.items)}
+        with span("bloop.transaction.commit", request={"TransactItems": self._request}, attributes=attributes):
+            if self.mode == "r":
+                response = self.engine.session.transaction_read(self._request)
+            elif self.mode == "w":
+                if now - self.first_commit_at > MAX_TOKEN_LIFETIME:
+                    raise TransactionTokenExpired
+                response = self.engine.session.transaction_write(self._request, self.tx_id)
+            else:
+                raise ValueError(f"unrecognized mode {self.mode}")
+
+            self._handle_response(response)
 
     def _handle_response(self, response: dict) -> None:
         if self.mode == "w":
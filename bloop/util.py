@@ -2,6 +2,7 @@ import collections.abc
 
 from .actions import ActionType
 from .exceptions import MissingKey
+from .metrics import timed
 
 
 __all__ = [
@@ -116,6 +117,7 @@ def extract_key(key_shape, item):
     return {field: item[field] for field in key_shape}
 
 
+@timed("dump_key")
 def dump_key(engine, obj):
     """dump the hash (and range, if there is one) key(s) of an object into
     a dynamo-friendly format.
@@ -140,6 +142,27 @@ def dump_key(engine, obj):
     return key
 
 
+def dump_item(engine, obj):
+    """dump every column of an object into a dynamo-friendly format, for a PutRequest.
+
+    columns without a value are omitted.
+    returns {dynamo_name: {type: value} for dynamo_name in columns}
+    """
+    # raises MissingKey if the object is missing a key column
+    dump_key(engine, obj)
+    item = {}
+    context = default_context(engine)
+    for column in obj.Meta.columns:
+        # noinspection PyProtectedMember
+        action = column.typedef._dump(getattr(obj, column.name, None), context=context)
+        if action.type is ActionType.Remove:
+            continue
+        if action.type is not ActionType.Set:
+            raise ValueError(f"value for column {column} must be a SET action but was {action}")
+        item[column.dynamo_name] = action.value
+    return item
+
+
 def get_table_name(engine, obj):
     """return the table name for an object as seen by a given engine"""
     # noinspection PyProtectedMember
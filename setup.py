@@ -39,6 +39,6 @@ if __name__ == "__main__":
         keywords="aws dynamo dynamodb dynamodbstreams orm",
         platforms="any",
         include_package_data=True,
-        packages=find_packages(exclude=("docs", "examples", "scripts", "tests")),
+        packages=find_packages(exclude=("benchmarks", "docs", "examples", "scripts", "tests")),
         install_requires=REQUIREMENTS,
     )
@@ -0,0 +1,154 @@
+import concurrent.futures
+import gzip
+import json
+
+import pytest
+
+from bloop.bulk import export
+from bloop.bulk.export import MANIFEST_NAME, export_table
+from bloop.exceptions import InvalidModel
+
+from ...helpers.models import User
+
+
+def page(*ids, last=None):
+    response = {"Count": len(ids), "ScannedCount": len(ids), "Items": [{"id": {"S": str(id)}} for id in ids]}
+    if last is not None:
+        response["LastEvaluatedKey"] = {"id": {"S": str(last)}}
+    return response
+
+
+def serve(pages, fail_on=None):
+    """session.search_items side_effect serving pages by (segment, ExclusiveStartKey)"""
+    def search_items(mode, request):
+        assert mode == "scan"
+        esk = request.get("ExclusiveStartKey")
+        esk = None if esk is None else esk["id"]["S"]
+        if fail_on == (request.get("Segment", 0), esk):
+            raise RuntimeError("connection reset")
+        return pages[request.get("Segment", 0)][esk]
+    return search_items
+
+
+def read_part(path, compressed=True):
+    opener = gzip.open if compressed else open
+    with opener(str(path), "rb") as f:
+        return [json.loads(line) for line in f.read().splitlines()]
+
+
+def test_export_single_segment(engine, session, tmp_path):
+    session.search_items.side_effect = serve({0: {None: page(1, 2, last=2), "2": page(3)}})
+
+    manifest = engine.export(User, tmp_path / "users")
+
+    assert manifest["count"] == 3
+    assert manifest["exhausted"]
+    assert manifest["table"] == "User"
+    assert manifest["index"] is None
+    assert manifest["parts"] == [{
+        "segment": 0, "file": "part-00000.jsonl.gz", "count": 3,
+        "offset": (tmp_path / "users" / "part-00000.jsonl.gz").stat().st_size,
+        "token": None, "exhausted": True,
+    }]
+    assert json.loads((tmp_path / "users" / MANIFEST_NAME).read_text()) == manifest
+    assert read_part(tmp_path / "users" / "part-00000.jsonl.gz") == [
+        {"Item": {"id": {"S": "1"}}}, {"Item": {"id": {"S": "2"}}}, {"Item": {"id": {"S": "3"}}}]
+
+    # items are never hydrated, only the scan request is rendered through the model
+    request = session.search_items.call_args_list[0][0][1]
+    assert request["TableName"] == "User"
+    assert "Segment" not in request
+
+
+def test_export_parallel_plain(engine, session, tmp_path):
+    session.search_items.side_effect = serve({
+        0: {None: page(1, 2)},
+        1: {None: page(last=None)},
+        2: {None: page(3, last=3), "3": page(4)},
+    })
+    manifest = export_table(engine, User, tmp_path, segments=3, format="json", compress=False)
+
+    assert manifest["count"] == 4
+    assert [part["count"] for part in manifest["parts"]] == [2, 0, 2]
+    assert [part["file"] for part in manifest["parts"]] == ["part-00000.jsonl", "part-00001.jsonl", "part-00002.jsonl"]
+    assert read_part(tmp_path / "part-00002.jsonl", compressed=False) == [{"id": "3"}, {"id": "4"}]
+    assert (tmp_path / "part-00001.jsonl").read_bytes() == b""
+    totals = {call[0][1]["TotalSegments"] for call in session.search_items.call_args_list}
+    assert totals == {3}
+
+
+def test_engine_export_max_workers(engine, session, tmp_path, monkeypatch):
+    session.search_items.side_effect = serve({segment: {None: page(segment)} for segment in range(3)})
+    pools = []
+
+    class ThreadPoolExecutor(concurrent.futures.ThreadPoolExecutor):
+        def __init__(self, max_workers=None, **kwargs):
+            pools.append(max_workers)
+            super().__init__(max_workers=max_workers, **kwargs)
+    monkeypatch.setattr(export.concurrent.futures, "ThreadPoolExecutor", ThreadPoolExecutor)
+
+    manifest = engine.export(User, tmp_path, segments=3, max_workers=2)
+
+    assert manifest["count"] == 3
+    assert pools == [2]
+
+
+def test_export_resume(engine, session, tmp_path):
+    pages = {0: {None: page(1, 2, last=2), "2": page(3, 4, last=4), "4": page(5)}}
+    session.search_items.side_effect = serve(pages, fail_on=(0, "4"))
+    with pytest.raises(RuntimeError):
+        engine.export(User, tmp_path)
+
+    manifest = json.loads((tmp_path / MANIFEST_NAME).read_text())
+    assert manifest["count"] == 4
+    assert manifest["parts"][0]["token"] == {"id": {"S": "4"}}
+    assert not manifest["exhausted"]
+
+    # Simulate a partial write after the last checkpoint; resuming truncates it
+    with open(str(tmp_path / "part-00000.jsonl.gz"), "ab") as f:
+        f.write(b"garbage")
+
+    session.search_items.side_effect = serve(pages)
+    manifest = engine.export(User, tmp_path)
+    assert manifest["count"] == 5
+    assert [item["Item"]["id"]["S"] for item in read_part(tmp_path / "part-00000.jsonl.gz")] == [
+        "1", "2", "3", "4", "5"]
+    # resumed from the checkpoint instead of the start of the table
+    assert session.search_items.call_args[0][1]["ExclusiveStartKey"] == {"id": {"S": "4"}}
+
+
+def test_export_no_resume(engine, session, tmp_path):
+    session.search_items.side_effect = serve({0: {None: page(1)}})
+    engine.export(User, tmp_path)
+    session.search_items.side_effect = serve({0: {None: page(2)}})
+    # finished export is reused
+    assert engine.export(User, tmp_path)["count"] == 1
+    # unless resume is False
+    assert engine.export(User, tmp_path, resume=False)["count"] == 1
+    assert read_part(tmp_path / "part-00000.jsonl.gz") == [{"Item": {"id": {"S": "2"}}}]
+
+
+def test_export_resume_mismatch(engine, session, tmp_path):
+    session.search_items.side_effect = serve({0: {None: page(1)}})
+    engine.export(User, tmp_path)
+    with pytest.raises(ValueError):
+        engine.export(User, tmp_path, segments=2)
+
+
+def test_export_index(engine, session, tmp_path):
+    session.search_items.return_value = page(1)
+    manifest = engine.export(User.by_email, tmp_path)
+    assert manifest["index"] == "by_email"
+    assert session.search_items.call_args[0][1]["IndexName"] == "by_email"
+
+
+@pytest.mark.parametrize("kwargs", [{"format": "csv"}, {"segments": 0}])
+def test_export_invalid(engine, tmp_path, kwargs):
+    with pytest.raises(ValueError):
+        engine.export(User, tmp_path, **kwargs)
+
+
+def test_export_abstract(engine, tmp_path):
+    from bloop import BaseModel
+    with pytest.raises(InvalidModel):
+        engine.export(BaseModel, tmp_path)
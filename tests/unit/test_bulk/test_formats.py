@@ -0,0 +1,84 @@
+import json
+
+import pytest
+
+from bloop.bulk.formats import (
+    dump_line,
+    dump_wire,
+    load_wire,
+    validate_format,
+    wire_to_plain,
+)
+
+
+wire = {
+    "id": {"S": "user-1"},
+    "age": {"N": "31"},
+    "score": {"N": "2.5"},
+    "blob": {"B": b"\x00\x01"},
+    "blobs": {"BS": [b"\x01", b"\x00"]},
+    "tags": {"SS": ["b", "a"]},
+    "lucky": {"NS": ["7", "3"]},
+    "active": {"BOOL": True},
+    "nothing": {"NULL": True},
+    "data": {"M": {"nested": {"B": b"\x02"}, "list": {"L": [{"S": "x"}, {"B": b"\x03"}]}}},
+}
+
+
+def test_dump_wire_round_trip():
+    dumped = dump_wire(wire)
+    assert dumped["blob"] == {"B": "AAE="}
+    assert dumped["blobs"] == {"BS": ["AQ==", "AA=="]}
+    assert dumped["data"]["M"]["list"]["L"][1] == {"B": "Aw=="}
+    # json-friendly
+    json.dumps(dumped)
+    assert load_wire(dumped) == wire
+
+
+def test_dump_wire_none():
+    assert dump_wire(None) is None
+    assert load_wire(None) is None
+
+
+def test_wire_to_plain():
+    assert wire_to_plain(wire) == {
+        "id": "user-1",
+        "age": 31,
+        "score": 2.5,
+        "blob": "AAE=",
+        "blobs": ["AA==", "AQ=="],
+        "tags": ["a", "b"],
+        "lucky": [3, 7],
+        "active": True,
+        "nothing": None,
+        "data": {"nested": "Ag==", "list": ["x", "Aw=="]},
+    }
+
+
+def test_wire_to_plain_unknown_type():
+    with pytest.raises(ValueError):
+        wire_to_plain({"id": {"X": "?"}})
+
+
+@pytest.mark.parametrize("format, expected", [
+    ("dynamodb", {"Item": {"id": {"S": "user-1"}, "blob": {"B": "AAE="}}}),
+    ("json", {"id": "user-1", "blob": "AAE="}),
+])
+def test_dump_line(format, expected):
+    line = dump_line({"id": {"S": "user-1"}, "blob": {"B": b"\x00\x01"}}, format)
+    assert line.endswith(b"\n")
+    assert line.count(b"\n") == 1
+    assert json.loads(line) == expected
+
+
+def test_validate_format():
+    validate_format("json")
+    validate_format("dynamodb")
+    with pytest.raises(ValueError):
+        validate_format("csv")
+
+
+def test_dump_wire_str_binary():
+    """bloop.types.Binary renders str values; they're encoded like bytes"""
+    assert dump_wire({"id": {"B": "AA=="}}) == {"id": {"B": "QUE9PQ=="}}
+    assert load_wire({"id": {"B": "QUE9PQ=="}}) == {"id": {"B": b"AA=="}}
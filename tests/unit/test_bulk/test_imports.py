@@ -0,0 +1,211 @@
+import gzip
+import json
+import threading
+
+import pytest
+
+from bloop.bulk.export import MANIFEST_NAME
+from bloop.bulk.imports import import_table, plain_to_wire, validate_record
+from bloop.exceptions import ThroughputExceeded
+
+from ...helpers.models import ComplexModel, User, VectorModel
+
+
+def write_lines(path, lines, compress=False):
+    data = "".join(json.dumps(line) + "\n" for line in lines).encode("utf-8")
+    if compress:
+        data = gzip.compress(data)
+    path.write_bytes(data)
+    return path
+
+
+def item(id, **attrs):
+    attrs["id"] = {"S": str(id)}
+    return {"Item": attrs}
+
+
+class Recorder:
+    """session.write_items side_effect that records every item written"""
+    def __init__(self, responses=None):
+        self.lock = threading.Lock()
+        self.calls = []
+        self.responses = list(responses or [])
+
+    def __call__(self, items):
+        with self.lock:
+            self.calls.append(items)
+            if self.responses:
+                response = self.responses.pop(0)
+                if isinstance(response, Exception):
+                    raise response
+                return response
+        return {}
+
+    @property
+    def written(self):
+        return sorted(
+            request["PutRequest"]["Item"]["id"]["S"]
+            for call in self.calls for requests in call.values() for request in requests)
+
+
+def test_import_file(engine, session, tmp_path):
+    session.write_items.side_effect = recorder = Recorder()
+    path = write_lines(tmp_path / "users.jsonl", [item(i, age={"N": str(i)}) for i in range(60)])
+
+    report = engine.import_(User, path, workers=2)
+
+    assert report["count"] == 60
+    assert report["batches"] == 3
+    assert report["invalid"] == 0
+    assert report["write_units"] == 60
+    assert report["items_per_second"] > 0
+    assert sorted(len(call["User"]) for call in recorder.calls) == [10, 25, 25]
+    assert recorder.written == sorted(str(i) for i in range(60))
+
+
+def test_import_export_directory(engine, session, tmp_path):
+    """Part files are read in manifest order, using the manifest's format"""
+    session.write_items.side_effect = recorder = Recorder()
+    write_lines(tmp_path / "part-00000.jsonl.gz", [item(1), item(2)], compress=True)
+    write_lines(tmp_path / "part-00001.jsonl.gz", [{"id": "3", "age": 4}], compress=True)
+    write_lines(tmp_path / "ignored.jsonl", [item(5)])
+    (tmp_path / MANIFEST_NAME).write_text(json.dumps({
+        "format": "json",
+        "parts": [{"file": "part-00001.jsonl.gz"}],
+    }))
+
+    report = engine.import_(User, tmp_path)
+
+    assert report["count"] == 1
+    assert recorder.calls == [{"User": [{"PutRequest": {"Item": {"id": {"S": "3"}, "age": {"N": "4"}}}}]}]
+
+
+def test_import_directory_without_manifest(engine, session, tmp_path):
+    session.write_items.side_effect = recorder = Recorder()
+    write_lines(tmp_path / "b.jsonl", [item(2)])
+    write_lines(tmp_path / "a.jsonl.gz", [item(1)], compress=True)
+    (tmp_path / "notes.txt").write_text("not an item")
+
+    assert engine.import_(User, tmp_path, workers=1)["count"] == 2
+    assert recorder.written == ["1", "2"]
+
+
+def test_import_binary_round_trip(engine, session, tmp_path):
+    """DynamoDB JSON lines hold base64 binary values, which are decoded before writing"""
+    session.write_items.side_effect = recorder = Recorder()
+    write_lines(tmp_path / "vectors.jsonl", [{"Item": {"name": {"S": "n"}, "some_bytes": {"B": "AAE="}}}])
+
+    engine.import_(VectorModel, tmp_path / "vectors.jsonl")
+
+    (request,), = recorder.calls[0].values()
+    assert request["PutRequest"]["Item"]["some_bytes"] == {"B": b"\x00\x01"}
+
+
+def test_duplicate_keys_split_batches(engine, session, tmp_path):
+    """BatchWriteItem rejects a batch with two requests for the same key"""
+    session.write_items.side_effect = recorder = Recorder()
+    path = write_lines(tmp_path / "users.jsonl", [item(1), item(2), item(1, age={"N": "3"})])
+
+    report = engine.import_(User, path, workers=1)
+
+    assert report["count"] == 3
+    assert [len(call["User"]) for call in recorder.calls] == [2, 1]
+
+
+def test_invalid_record_raises(engine, session, tmp_path):
+    session.write_items.side_effect = Recorder()
+    path = write_lines(tmp_path / "users.jsonl", [item(1), item(2, age={"S": "old"})])
+
+    with pytest.raises(ValueError) as excinfo:
+        engine.import_(User, path)
+    assert "users.jsonl:2" in str(excinfo.value)
+
+
+def test_skip_invalid(engine, session, tmp_path):
+    session.write_items.side_effect = recorder = Recorder()
+    path = write_lines(tmp_path / "users.jsonl", [item(1), {"Item": {"age": {"N": "3"}}}, {"not": "an item"}])
+
+    report = engine.import_(User, path, skip_invalid=True)
+
+    assert report["count"] == 1
+    assert report["invalid"] == 2
+    assert recorder.written == ["1"]
+
+
+def test_unprocessed_items_retried(engine, session, tmp_path):
+    unprocessed = {"User": [{"PutRequest": {"Item": {"id": {"S": "2"}}}}]}
+    session.write_items.side_effect = recorder = Recorder([unprocessed, ThroughputExceeded()])
+    path = write_lines(tmp_path / "users.jsonl", [item(1), item(2)])
+
+    report = import_table(engine, User, path, workers=1, backoff=0)
+
+    assert report["count"] == 2
+    assert report["retries"] == 1
+    assert report["throttled"] == 1
+    assert recorder.calls[1:] == [unprocessed, unprocessed]
+
+
+def test_retries_exhausted(engine, session, tmp_path):
+    unprocessed = {"User": [{"PutRequest": {"Item": {"id": {"S": "1"}}}}]}
+    session.write_items.side_effect = Recorder([unprocessed] * 3)
+    path = write_lines(tmp_path / "users.jsonl", [item(1)])
+
+    with pytest.raises(ThroughputExceeded):
+        import_table(engine, User, path, workers=1, backoff=0, max_attempts=3)
+
+
+def test_writer_error_stops_import(engine, session, tmp_path):
+    session.write_items.side_effect = RuntimeError("connection reset")
+    path = write_lines(tmp_path / "users.jsonl", [item(i) for i in range(200)])
+
+    with pytest.raises(RuntimeError):
+        engine.import_(User, path, workers=2)
+    assert session.write_items.call_count < 8
+
+
+def test_write_units_limited(engine, session, tmp_path, monkeypatch):
+    acquired = []
+    monkeypatch.setattr("bloop.bulk.limits.RateLimiter.acquire", lambda self, units: acquired.append(units))
+    session.write_items.side_effect = Recorder()
+    path = write_lines(tmp_path / "users.jsonl", [item(i, name={"S": "x" * 1500}) for i in range(30)])
+
+    report = engine.import_(User, path, workers=1, write_units=100)
+
+    assert sorted(acquired) == [10, 50]
+    assert report["write_units"] == 60
+
+
+@pytest.mark.parametrize("kwargs", [{"format": "csv"}, {"workers": 0}])
+def test_invalid_arguments(kwargs, engine, tmp_path):
+    path = write_lines(tmp_path / "users.jsonl", [])
+    with pytest.raises(ValueError):
+        engine.import_(User, path, **kwargs)
+
+
+def test_plain_to_wire_uses_typedefs():
+    columns = VectorModel.Meta.columns_by_dynamo_name
+    assert plain_to_wire("AAE=", columns["some_bytes"].typedef) == {"B": b"\x00\x01"}
+    assert plain_to_wire(["a"], columns["set_str"].typedef) == {"SS": ["a"]}
+    assert plain_to_wire(["a", "b"], columns["list_str"].typedef) == {"L": [{"S": "a"}, {"S": "b"}]}
+    assert plain_to_wire({"bytes": "AA==", "map": {"int": 3}, "extra": True}, columns["map_nested"].typedef) == {
+        "M": {
+            "bytes": {"B": b"\x00"},
+            "map": {"M": {"int": {"N": "3"}}},
+            "extra": {"BOOL": True},
+        }
+    }
+
+
+def test_plain_to_wire_infers_types():
+    assert plain_to_wire(None) == {"NULL": True}
+    assert plain_to_wire(True) == {"BOOL": True}
+    assert plain_to_wire(1.5) == {"N": "1.5"}
+    assert plain_to_wire({"a": [1, "b"]}) == {"M": {"a": {"L": [{"N": "1"}, {"S": "b"}]}}}
+
+
+def test_validate_record():
+    validate_record({"name": {"S": "n"}, "date": {"S": "d"}, "unknown": {"N": "1"}}, ComplexModel)
+    with pytest.raises(ValueError):
+        validate_record({"name": {"S": "n"}}, ComplexModel)
+    with pytest.raises(ValueError):
+        validate_record({"name": {"S": "n"}, "date": {"N": "1"}}, ComplexModel)
@@ -0,0 +1,136 @@
+import threading
+import time
+
+import pytest
+
+from bloop.bulk.limits import RateLimiter, item_size, write_units
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.mark.parametrize("rate", [0, -1])
+def test_invalid_rate(rate):
+    with pytest.raises(ValueError):
+        RateLimiter(rate)
+
+
+def test_unlimited_never_waits():
+    clock = FakeClock()
+    limiter = RateLimiter(clock=clock, sleep=clock.sleep)
+    for _ in range(100):
+        assert limiter.acquire(1000) == 0.0
+    assert not clock.sleeps
+
+
+def test_burst_then_wait():
+    clock = FakeClock()
+    limiter = RateLimiter(10, clock=clock, sleep=clock.sleep)
+    # a full second of units is available immediately
+    assert limiter.acquire(10) == 0.0
+    # the bucket is empty, so 5 more units take half a second to refill
+    assert limiter.acquire(5) == pytest.approx(0.5)
+    assert clock.now == pytest.approx(0.5)
+
+
+def test_refill_capped():
+    clock = FakeClock()
+    limiter = RateLimiter(10, clock=clock, sleep=clock.sleep)
+    limiter.acquire(10)
+    # idle for a long time, but the bucket never holds more than one second
+    clock.now += 60
+    assert limiter.acquire(10) == 0.0
+    assert limiter.acquire(1) == pytest.approx(0.1)
+
+
+def test_oversized_request_waits_for_every_unit():
+    clock = FakeClock()
+    limiter = RateLimiter(10, clock=clock, sleep=clock.sleep)
+    # the first 10 units are in the bucket, the other 20 take two seconds to refill
+    assert limiter.acquire(30) == pytest.approx(2.0)
+    assert limiter.acquire(1) == pytest.approx(0.1)
+
+
+def test_threads_share_rate():
+    """Threads sleep outside the lock, and together never take more than the rate allows"""
+    rate, threads, calls, units = 100, 4, 25, 2
+    # whether the sleeping thread held the lock, for each sleep
+    held = []
+    owner = threading.local()
+
+    class OwnedLock:
+        def __init__(self):
+            self.lock = threading.Lock()
+
+        def __enter__(self):
+            self.lock.acquire()
+            owner.held = True
+
+        def __exit__(self, *exc_info):
+            owner.held = False
+            self.lock.release()
+
+    def sleep(seconds):
+        held.append(getattr(owner, "held", False))
+        time.sleep(seconds)
+    limiter = RateLimiter(rate, sleep=sleep)
+    limiter._lock = OwnedLock()
+
+    def worker():
+        for _ in range(calls):
+            limiter.acquire(units)
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.monotonic()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.monotonic() - start
+
+    # the first second of units is in the bucket, the rest arrive at the rate
+    expected = (threads * calls * units - rate) / rate
+    assert expected * 0.95 <= elapsed < expected + 1
+    assert held and not any(held)
+
+
+def test_repr():
+    assert repr(RateLimiter(25)) == "<RateLimiter[25/s]>"
+
+
+def test_item_size():
+    attrs = {
+        "id": {"S": "abc"},
+        "n": {"N": "1234"},
+        "b": {"B": b"\x00\x01"},
+        "ok": {"BOOL": True},
+        "none": {"NULL": True},
+        "tags": {"SS": ["a", "bb"]},
+        "m": {"M": {"k": {"S": "v"}}},
+        "l": {"L": [{"S": "v"}]},
+    }
+    assert item_size(attrs) == sum([
+        2 + 3,
+        1 + 3,
+        1 + 2,
+        2 + 1,
+        4 + 1,
+        4 + 3,
+        1 + 3 + 1 + 1 + 1,
+        1 + 3 + 1 + 1,
+    ])
+
+
+@pytest.mark.parametrize("length, units", [(0, 1), (1000, 1), (1022, 1), (1023, 2), (3000, 3)])
+def test_write_units(length, units):
+    # "id" is 2 bytes
+    assert write_units({"id": {"S": "x" * length}}) == units
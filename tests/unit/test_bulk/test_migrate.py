@@ -0,0 +1,188 @@
+from unittest.mock import Mock
+
+import pytest
+
+from bloop import Engine
+from bloop.bulk import Migration, migrate
+from bloop.bulk.limits import read_units
+from bloop.bulk.migrate import migration_name
+from bloop.checkpoints import MemoryCheckpointStore
+from bloop.session import SessionWrapper
+
+from ...helpers.models import SimpleModel, User
+from .test_imports import Recorder
+from .test_scan import page
+
+
+def users(count, per_page=25):
+    """session.search_items side_effect that pages through users with ids 0 through count - 1
+
+    Any id can be used as the ExclusiveStartKey, so scans can resume from the middle of a page.
+    """
+    def search_items(mode, request):
+        esk = request.get("ExclusiveStartKey")
+        start = 0 if esk is None else int(esk["id"]["S"]) + 1
+        ids = range(start, min(count, start + per_page))
+        return page(*ids, last=ids[-1] if ids and ids[-1] < count - 1 else None)
+    return search_items
+
+
+def rename(user):
+    """Module level so it can be pickled into a process pool"""
+    if user.id.endswith("3"):
+        return None
+    return SimpleModel(id="user-" + user.id)
+
+
+@pytest.fixture
+def target_engine():
+    engine = Engine(dynamodb=Mock(), dynamodbstreams=Mock(), table_name_template="v2-{table_name}")
+    engine.session = Mock(spec=SessionWrapper)
+    engine.session.write_items.side_effect = Recorder()
+    return engine
+
+
+def test_migration_name(engine, target_engine):
+    assert migration_name(engine, User, target_engine, User, 4) == "migrate:User:v2-User:4"
+
+
+@pytest.mark.parametrize("kwargs", [{"segments": 0}, {"checkpoint_every": 0}, {"processes": 0}])
+def test_invalid_args(engine, kwargs):
+    with pytest.raises(ValueError):
+        Migration(engine, User, **kwargs)
+
+
+def test_repr(engine):
+    assert repr(Migration(engine, User, name="my-migration")) == "<Migration[my-migration]>"
+
+
+def test_copy_to_new_table(engine, session, target_engine):
+    session.search_items.side_effect = users(60)
+    migration = Migration(engine, User, target_engine=target_engine)
+
+    report = migration.run()
+
+    assert report["scanned"] == report["written"] == 60
+    assert report["batches"] == 3
+    assert report["skipped"] == 0
+    assert not report["dry_run"]
+    assert migration.done
+    recorder = target_engine.session.write_items.side_effect
+    assert recorder.written == sorted(str(i) for i in range(60))
+    assert all(list(call) == ["v2-User"] for call in recorder.calls)
+    session.write_items.assert_not_called()
+
+
+def test_transform(engine, session):
+    session.search_items.side_effect = users(30)
+    session.write_items.side_effect = recorder = Recorder()
+
+    report = Migration(engine, User, rename, target=SimpleModel).run()
+
+    assert report["scanned"] == 30
+    assert report["skipped"] == 3
+    assert report["written"] == 27
+    assert all(list(call) == ["Simple"] for call in recorder.calls)
+    assert "user-0" in recorder.written
+    assert "user-3" not in recorder.written
+
+
+def test_transform_process_pool(engine, session):
+    session.search_items.side_effect = users(10)
+    session.write_items.side_effect = recorder = Recorder()
+
+    report = Migration(engine, User, rename, target=SimpleModel, processes=1).run()
+
+    assert report["written"] == 9
+    assert recorder.written == sorted("user-{}".format(i) for i in range(10) if i != 3)
+
+
+def test_transform_wrong_type(engine, session):
+    session.search_items.side_effect = users(1)
+    session.write_items.side_effect = Recorder()
+    migration = Migration(engine, User, lambda user: user, target=SimpleModel)
+
+    with pytest.raises(ValueError):
+        migration.run()
+    assert not migration.done
+
+
+def test_dry_run(engine, session):
+    session.search_items.side_effect = users(60)
+    store = MemoryCheckpointStore()
+    migration = Migration(engine, User, rename, target=SimpleModel, store=store)
+
+    report = migration.run(dry_run=True)
+
+    assert report["dry_run"]
+    assert report["scanned"] == 60
+    assert report["skipped"] == 6
+    assert report["written"] == 54
+    assert report["batches"] == 3
+    assert report["write_units"] == 54
+    assert report["read_units"] > 0
+    session.write_items.assert_not_called()
+    assert not migration.done
+
+
+def test_read_units_from_scanned_items(engine, session, monkeypatch):
+    """Read units are estimated from the scanned items, so only the objects being written are dumped"""
+    session.search_items.side_effect = users(60)
+    dumped = []
+    dump_item = migrate.dump_item
+    monkeypatch.setattr(migrate, "dump_item", lambda engine, obj: dumped.append(obj) or dump_item(engine, obj))
+    migration = Migration(engine, User, rename, target=SimpleModel)
+
+    report = migration.run(dry_run=True)
+
+    assert len(dumped) == report["written"] == 54
+    expected = sum(read_units({"id": {"S": str(i)}}) for i in range(60))
+    assert report["read_units"] == pytest.approx(expected)
+
+
+def test_resume_after_failed_write(engine, session):
+    """Checkpoints never get ahead of the writes"""
+    session.search_items.side_effect = users(60)
+    session.write_items.side_effect = Recorder([{}, RuntimeError("connection reset")])
+    store = MemoryCheckpointStore()
+
+    migration = Migration(engine, User, store=store, checkpoint_every=10)
+    with pytest.raises(RuntimeError):
+        migration.run()
+    status = migration.job(store).status()[0]
+    # the first batch was written before the checkpoint at 10 objects, the second batch failed
+    assert status["count"] == 10
+    assert not status["exhausted"]
+
+    session.write_items.side_effect = recorder = Recorder()
+    report = Migration(engine, User, store=store, checkpoint_every=10).run()
+    assert report["scanned"] == 50
+    assert recorder.written == sorted(str(i) for i in range(10, 60))
+
+
+def test_reset(engine, session):
+    session.search_items.side_effect = users(5)
+    session.write_items.side_effect = Recorder()
+    migration = Migration(engine, User)
+    migration.run()
+    assert migration.done
+
+    migration.reset()
+    assert not migration.done
+    assert migration.run()["written"] == 5
+
+
+def test_rate_limits(engine, session, monkeypatch):
+    acquired = []
+    monkeypatch.setattr(
+        "bloop.bulk.limits.RateLimiter.acquire", lambda self, units: acquired.append((self.rate, units)))
+    session.search_items.side_effect = users(30)
+    session.write_items.side_effect = Recorder()
+
+    Migration(engine, User, read_units=5, write_units=10).run()
+
+    reads = [units for rate, units in acquired if rate == 5]
+    writes = [units for rate, units in acquired if rate == 10]
+    assert len(reads) == 30
+    assert all(0 < units < 1 for units in reads)
+    assert sorted(writes) == [5, 25]
@@ -0,0 +1,197 @@
+import pytest
+
+from bloop.bulk.scan import ScanJob, job_name
+from bloop.checkpoints import MemoryCheckpointStore
+
+from ...helpers.models import User
+
+
+def page(*ids, last=None):
+    response = {
+        "Count": len(ids),
+        "ScannedCount": len(ids),
+        "Items": [{"id": {"S": str(id)}} for id in ids],
+    }
+    if last is not None:
+        response["LastEvaluatedKey"] = {"id": {"S": str(last)}}
+    return response
+
+
+def pages_by_segment(pages):
+    """session.search_items side_effect that serves pages from a list per (segment, ExclusiveStartKey)"""
+    calls = []
+
+    def search_items(mode, request):
+        assert mode == "scan"
+        segment = request.get("Segment", 0)
+        esk = request.get("ExclusiveStartKey")
+        calls.append((segment, esk))
+        return pages[segment][None if esk is None else esk["id"]["S"]]
+    search_items.calls = calls
+    return search_items
+
+
+def test_job_name(engine):
+    assert job_name(engine, User, 4) == "scan:User:4"
+    assert job_name(engine, User.by_email, 1) == "scan:User.by_email:1"
+
+
+@pytest.mark.parametrize("kwargs", [{"segments": 0}, {"checkpoint_every": 0}])
+def test_invalid_args(engine, kwargs):
+    with pytest.raises(ValueError):
+        ScanJob(engine, User, **kwargs)
+
+
+def test_repr(engine):
+    assert repr(ScanJob(engine, User, name="my-job")) == "<ScanJob[my-job]>"
+
+
+def test_single_segment(engine, session):
+    session.search_items.side_effect = pages_by_segment({0: {None: page(1, 2, last=2), "2": page(3)}})
+    job = ScanJob(engine, User)
+
+    assert [user.id for user in job] == ["1", "2", "3"]
+    request = session.search_items.call_args[0][1]
+    assert "Segment" not in request
+    assert "TotalSegments" not in request
+
+    assert job.done
+    assert job.status() == {0: {"token": {"ExclusiveStartKey": {"id": {"S": "3"}}}, "count": 3, "exhausted": True}}
+    # a finished job doesn't scan again
+    assert list(job) == []
+    assert session.search_items.call_count == 2
+
+
+def test_resume_from_checkpoint(engine, session):
+    search_items = pages_by_segment({0: {None: page(1, 2, last=2), "2": page(3, 4, last=4), "4": page(5)}})
+    session.search_items.side_effect = search_items
+    store = MemoryCheckpointStore()
+
+    job = ScanJob(engine, User, store=store, checkpoint_every=2)
+    seen = []
+    for user in job:
+        seen.append(user.id)
+        if user.id == "4":
+            # crash while processing the 4th item
+            break
+    assert not job.done
+    assert job.status()[0]["count"] == 2
+
+    # new job with the same name picks up after the last checkpoint
+    resumed = ScanJob(engine, User, store=store, checkpoint_every=2)
+    assert [user.id for user in resumed] == ["3", "4", "5"]
+    assert resumed.status()[0] == {"token": {"ExclusiveStartKey": {"id": {"S": "5"}}}, "count": 5, "exhausted": True}
+    assert search_items.calls[-2:] == [(0, {"id": {"S": "2"}}), (0, {"id": {"S": "4"}})]
+
+
+def test_checkpoint_interval(engine, session):
+    session.search_items.side_effect = pages_by_segment({0: {None: page(1, 2, last=2), "2": page(3)}})
+    store = MemoryCheckpointStore()
+    job = ScanJob(engine, User, store=store, checkpoint_every=100, checkpoint_interval=0)
+
+    iterator = iter(job)
+    next(iterator)
+    next(iterator)
+    # the first object was consumed when the second was requested
+    assert job.status()[0]["count"] == 1
+
+
+def test_segment_with_attrs(engine, session):
+    session.search_items.side_effect = pages_by_segment({0: {None: page(1, 2, last=2), "2": page(3)}})
+    job = ScanJob(engine, User)
+
+    pairs = list(job.segment(0, with_attrs=True))
+
+    assert [obj.id for obj, _ in pairs] == ["1", "2", "3"]
+    assert [attrs for _, attrs in pairs] == [{"id": {"S": "1"}}, {"id": {"S": "2"}}, {"id": {"S": "3"}}]
+
+
+def test_before_checkpoint(engine, session):
+    """The hook runs before every checkpoint, including the final one"""
+    session.search_items.side_effect = pages_by_segment({0: {None: page(1, 2, last=2), "2": page(3)}})
+    store = MemoryCheckpointStore()
+    job = ScanJob(engine, User, store=store, checkpoint_every=2)
+    counts = []
+
+    def before_checkpoint():
+        state = job.status()[0]
+        counts.append((state["count"], state["exhausted"]))
+
+    assert len(list(job.segment(0, before_checkpoint=before_checkpoint))) == 3
+    # the store still holds the previous checkpoint when the hook runs
+    assert counts == [(0, False), (2, False)]
+
+
+def test_parallel_segments(engine, session):
+    session.search_items.side_effect = pages_by_segment({
+        0: {None: page(1, 2)},
+        1: {None: page(3, last=3), "3": page(4)},
+        2: {None: page()},
+    })
+    job = ScanJob(engine, User, segments=3)
+    seen = []
+    assert job.run(lambda user: seen.append(user.id)) == 4
+    assert sorted(seen) == ["1", "2", "3", "4"]
+    assert job.done
+
+    segments = {call[0][1]["Segment"] for call in session.search_items.call_args_list}
+    assert segments == {0, 1, 2}
+    assert all(call[0][1]["TotalSegments"] == 3 for call in session.search_items.call_args_list)
+
+
+def test_run_failure_keeps_checkpoints(engine, session):
+    session.search_items.side_effect = pages_by_segment({0: {None: page(1, 2, 3)}})
+    job = ScanJob(engine, User, checkpoint_every=1)
+
+    def process(user):
+        if user.id == "3":
+            raise RuntimeError("failed on 3")
+
+    with pytest.raises(RuntimeError):
+        job.run(process)
+    assert job.status()[0]["count"] == 2
+    assert not job.done
+
+
+def test_reset(engine, session):
+    session.search_items.side_effect = pages_by_segment({0: {None: page(1)}, 1: {None: page(2)}})
+    job = ScanJob(engine, User, segments=2)
+    job.run(lambda _: None)
+    assert job.done
+
+    job.reset()
+    assert job.status() == {
+        0: {"token": None, "count": 0, "exhausted": False},
+        1: {"token": None, "count": 0, "exhausted": False},
+    }
+
+
+def test_invalid_segment(engine):
+    job = ScanJob(engine, User, segments=2)
+    with pytest.raises(ValueError):
+        next(job.segment(2))
+
+
+def test_binary_key_checkpoint(engine, session):
+    """Binary keys are base64 encoded in checkpoints and decoded when resuming"""
+    from bloop import BaseModel, Binary, Column
+
+    class Blob(BaseModel):
+        id = Column(Binary, hash_key=True)
+
+    # boto3 returns the base64 text that bloop.types.Binary sent as the binary value
+    responses = [
+        {"Count": 1, "ScannedCount": 1, "Items": [{"id": {"B": b"AA=="}}], "LastEvaluatedKey": {"id": {"B": b"AA=="}}},
+        {"Count": 1, "ScannedCount": 1, "Items": [{"id": {"B": b"AQ=="}}]},
+    ]
+    session.search_items.side_effect = responses
+    store = MemoryCheckpointStore()
+    job = ScanJob(engine, Blob, store=store, checkpoint_every=1)
+    iterator = iter(job)
+    next(iterator)
+    next(iterator)
+    assert job.status()[0]["token"] == {"ExclusiveStartKey": {"id": {"B": "QUE9PQ=="}}}
+
+    session.search_items.side_effect = [responses[1]]
+    assert [obj.id for obj in ScanJob(engine, Blob, store=store)] == [b"\x01"]
+    assert session.search_items.call_args[0][1]["ExclusiveStartKey"] == {"id": {"B": b"AA=="}}
@@ -0,0 +1,123 @@
+import json
+
+import pytest
+
+from bloop import BaseModel, Column, Engine, String
+from bloop.checkpoints import (
+    CheckpointStore,
+    DynamoDBCheckpointStore,
+    FileCheckpointStore,
+    MemoryCheckpointStore,
+    SQLiteCheckpointStore,
+    default_checkpoint_model,
+)
+from bloop.memory import MemoryDynamoDB
+
+
+def memory_engine():
+    dynamodb = MemoryDynamoDB()
+    return Engine(dynamodb=dynamodb, dynamodbstreams=dynamodb.streams)
+
+
+@pytest.fixture(params=["memory", "file", "sqlite", "dynamodb"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return MemoryCheckpointStore()
+    elif request.param == "file":
+        return FileCheckpointStore(tmp_path / "checkpoints.json")
+    elif request.param == "dynamodb":
+        return DynamoDBCheckpointStore(memory_engine())
+    return SQLiteCheckpointStore(tmp_path / "checkpoints.db")
+
+
+def test_base_store_abstract():
+    store = CheckpointStore()
+    with pytest.raises(NotImplementedError):
+        store.load("name")
+    with pytest.raises(NotImplementedError):
+        store.save("name", {})
+    with pytest.raises(NotImplementedError):
+        store.delete("name")
+
+
+def test_load_missing(store):
+    assert store.load("unknown") is None
+
+
+def test_save_load_delete(store):
+    value = {"token": {"ExclusiveStartKey": {"id": {"S": "foo"}}}, "count": 3, "exhausted": False}
+    store.save("name", value)
+    assert store.load("name") == value
+
+    store.save("name", {"count": 4})
+    assert store.load("name") == {"count": 4}
+
+    store.delete("name")
+    assert store.load("name") is None
+    # deleting again doesn't raise
+    store.delete("name")
+
+
+def test_names_are_independent(store):
+    store.save("first", {"value": 1})
+    store.save("second", {"value": 2})
+    store.delete("first")
+    assert store.load("first") is None
+    assert store.load("second") == {"value": 2}
+
+
+def test_memory_store_copies_values():
+    """Mutating a value after saving doesn't change the checkpoint"""
+    store = MemoryCheckpointStore()
+    value = {"count": 1}
+    store.save("name", value)
+    value["count"] = 2
+    assert store.load("name") == {"count": 1}
+
+
+def test_file_store_persists(tmp_path):
+    path = tmp_path / "checkpoints.json"
+    FileCheckpointStore(path).save("name", {"count": 1})
+    assert json.loads(path.read_text()) == {"name": {"count": 1}}
+    assert FileCheckpointStore(path).load("name") == {"count": 1}
+    # no temporary files left behind
+    assert [p.name for p in tmp_path.iterdir()] == ["checkpoints.json"]
+
+
+def test_sqlite_store_persists(tmp_path):
+    path = tmp_path / "checkpoints.db"
+    store = SQLiteCheckpointStore(path, table="custom")
+    store.save("name", {"count": 1})
+    store.close()
+    assert SQLiteCheckpointStore(path, table="custom").load("name") == {"count": 1}
+
+
+@pytest.mark.parametrize("cls", [FileCheckpointStore, SQLiteCheckpointStore])
+def test_repr(cls, tmp_path):
+    store = cls(tmp_path / "path")
+    assert repr(store) == "<{}[{}]>".format(cls.__name__, tmp_path / "path")
+
+
+def test_dynamodb_store_default_model():
+    """The default model is created once, and its table is created when the store is"""
+    engine = memory_engine()
+    store = DynamoDBCheckpointStore(engine)
+    assert store.model is default_checkpoint_model()
+    assert repr(store) == "<DynamoDBCheckpointStore[Checkpoint]>"
+
+    store.save("name", {"count": 1})
+    item = engine.session.dynamodb_client.get_item(
+        TableName="bloop-checkpoints", Key={"name": {"S": "name"}})["Item"]
+    assert json.loads(item["value"]["S"]) == {"count": 1}
+
+
+def test_dynamodb_store_custom_model():
+    class ConsumerState(BaseModel):
+        class Meta:
+            table_name = "consumer-state"
+        name = Column(String, hash_key=True)
+        value = Column(String)
+    store = DynamoDBCheckpointStore(memory_engine(), model=ConsumerState)
+    store.save("name", {"count": 1})
+    assert store.load("name") == {"count": 1}
+    assert repr(store) == "<DynamoDBCheckpointStore[ConsumerState]>"
@@ -6,6 +6,7 @@ from unittest.mock import Mock
 import pytest
 from tests.helpers.models import ComplexModel, User, VectorModel
 
+from bloop.checkpoints import MemoryCheckpointStore
 from bloop.engine import Engine
 from bloop.exceptions import (
     InvalidModel,
@@ -14,8 +15,18 @@ from bloop.exceptions import (
     MissingKey,
     MissingObjects,
 )
+from bloop.metrics import CapacityRegistry
 from bloop.models import BaseModel, Column, GlobalSecondaryIndex
 from bloop.session import SessionWrapper
+from bloop.stream import (
+    LeaseCoordinator,
+    PollingPolicy,
+    SeekIndex,
+    StreamCheckpointer,
+    StreamDispatcher,
+    StreamFilter,
+    StreamMaintenance,
+)
 from bloop.transactions import ReadTransaction, WriteTransaction
 from bloop.types import DateTime, Integer, String, Timestamp
 from bloop.util import ordered
@@ -89,6 +100,22 @@ def test_func_table_name_template(dynamodb, dynamodbstreams, session):
     session.validate_table.assert_called_once_with(expected, LocalModel)
 
 
+def test_capacity_disabled_by_default(dynamodb, dynamodbstreams):
+    engine = Engine(dynamodb=dynamodb, dynamodbstreams=dynamodbstreams)
+    assert engine.capacity is None
+    assert engine.session.capacity is None
+
+
+def test_capacity_registry(dynamodb, dynamodbstreams):
+    engine = Engine(dynamodb=dynamodb, dynamodbstreams=dynamodbstreams, capacity=True)
+    assert isinstance(engine.capacity, CapacityRegistry)
+    assert engine.session.capacity is engine.capacity
+
+    # share a registry between engines
+    other = Engine(dynamodb=dynamodb, dynamodbstreams=dynamodbstreams, capacity=engine.capacity)
+    assert other.capacity is engine.capacity
+
+
 def test_missing_objects(engine, session, caplog):
     """When objects aren't loaded, MissingObjects is raised with a list of missing objects"""
     # Patch batch_get_items to return no results
@@ -518,6 +545,84 @@ def test_stream(engine, session):
 
     stream = engine.stream(StreamModel, "latest")
     assert stream.model is StreamModel
+    assert stream.coordinator.max_workers is None
+
+    index = SeekIndex(MemoryCheckpointStore(), "index")
+    stream = engine.stream(StreamModel, "latest", max_workers=8, seek_index=index)
+    assert stream.coordinator.max_workers == 8
+    assert stream.coordinator.seek_index is index
+
+    polling = PollingPolicy()
+    stream = engine.stream(StreamModel, "latest", polling=polling)
+    assert stream.coordinator.polling is polling
+
+    leases = Mock(spec=LeaseCoordinator)
+    stream = engine.stream(StreamModel, "latest", leases=leases)
+    assert stream.coordinator.leases is leases
+    leases.reset.assert_called_once_with()
+
+    spec = StreamFilter(events={"insert"})
+    stream = engine.stream(StreamModel, "latest", filter=spec)
+    assert stream.filter is spec
+
+    dispatch = StreamDispatcher({"user": User}, attribute="type")
+    stream = engine.stream(StreamModel, "latest", dispatch=dispatch)
+    assert stream.dispatch is dispatch
+
+    maintenance = Mock(spec=StreamMaintenance)
+    stream = engine.stream(StreamModel, "latest", maintenance=maintenance)
+    assert stream.maintenance is maintenance
+    maintenance.start.assert_called_once_with(stream.coordinator)
+
+    stream = engine.stream(StreamModel, "latest", ordering="shard")
+    assert stream.coordinator.ordering == "shard"
+
+
+def test_stream_dispatch_abstract(engine):
+    class Abstract(BaseModel):
+        class Meta:
+            abstract = True
+        id = Column(Integer, hash_key=True)
+
+    class StreamModel(BaseModel):
+        class Meta:
+            stream = {"include": {"new"}, "arn": "test-arn-manually-set"}
+        id = Column(Integer, hash_key=True)
+    engine.bind(StreamModel)
+
+    with pytest.raises(InvalidModel):
+        engine.stream(StreamModel, "latest", dispatch=StreamDispatcher({"a": Abstract}, attribute="type"))
+
+
+@pytest.mark.parametrize("stream_arn, resumed", [
+    ("test-arn-manually-set", True),
+    ("some-other-stream", False),
+])
+def test_stream_resumes_from_checkpoint(engine, session, stream_arn, resumed):
+    """A saved token is used in place of the position, unless it's from another stream"""
+    class StreamModel(BaseModel):
+        class Meta:
+            stream = {
+                "include": {"new"},
+                "arn": "test-arn-manually-set"
+            }
+        id = Column(String, hash_key=True)
+    engine.bind(StreamModel)
+    session.describe_stream.return_value = {"Shards": [{"ShardId": "shard-id"}]}
+    session.get_shard_iterator.return_value = "iterator-id"
+
+    store = MemoryCheckpointStore()
+    store.save("consumer", {
+        "stream_arn": stream_arn,
+        "active": ["shard-id"],
+        "shards": [{"shard_id": "shard-id", "iterator_type": "after_sequence", "sequence_number": "123"}]
+    })
+    checkpoint = StreamCheckpointer(store, "consumer")
+
+    stream = engine.stream(StreamModel, "latest", checkpoint=checkpoint)
+    assert stream.checkpoint is checkpoint
+    [shard] = stream.coordinator.active
+    assert shard.iterator_type == ("after_sequence" if resumed else "latest")
 
 
 def test_invalid_stream(engine, session):
@@ -0,0 +1,173 @@
+import pytest
+
+from bloop.expressions import (
+    ExpressionParser,
+    ValidationError,
+    apply_update,
+    evaluate,
+    project,
+    resolve,
+    values_equal,
+)
+
+
+ITEM = {
+    "id": {"S": "user-1"},
+    "age": {"N": "30"},
+    "tags": {"SS": ["a", "b"]},
+    "scores": {"NS": ["1", "2.5"]},
+    "profile": {"M": {
+        "name": {"S": "Ada"},
+        "langs": {"L": [{"S": "en"}, {"S": "fr"}]},
+    }},
+}
+
+
+def condition(expression, names=None, values=None):
+    return ExpressionParser(names, values).condition(expression)
+
+
+def update(expression, names=None, values=None, item=ITEM):
+    return apply_update(ExpressionParser(names, values).update(expression), item)
+
+
+@pytest.mark.parametrize("expression, values, expected", [
+    ("age = :v", {":v": {"N": "30.0"}}, True),
+    ("age <> :v", {":v": {"N": "30"}}, False),
+    ("age < :v", {":v": {"N": "31"}}, True),
+    ("age >= :v", {":v": {"N": "31"}}, False),
+    ("age BETWEEN :lo AND :hi", {":lo": {"N": "1"}, ":hi": {"N": "30"}}, True),
+    ("age IN (:a, :b)", {":a": {"N": "1"}, ":b": {"N": "30"}}, True),
+    ("id < :v", {":v": {"N": "1"}}, False),
+    ("missing = :v", {":v": {"N": "1"}}, False),
+    ("missing <> :v", {":v": {"N": "1"}}, True),
+    ("begins_with(id, :v)", {":v": {"S": "user"}}, True),
+    ("contains(tags, :v)", {":v": {"S": "b"}}, True),
+    ("contains(scores, :v)", {":v": {"N": "2.50"}}, True),
+    ("contains(profile.langs, :v)", {":v": {"S": "fr"}}, True),
+    ("contains(id, :v)", {":v": {"S": "-1"}}, True),
+    ("attribute_type(age, :v)", {":v": {"S": "N"}}, True),
+    ("size(tags) = :v", {":v": {"N": "2"}}, True),
+    ("profile.langs[1] = :v", {":v": {"S": "fr"}}, True),
+    ("profile.langs[5] = :v", {":v": {"S": "fr"}}, False),
+    ("tags = :v", {":v": {"SS": ["b", "a"]}}, True),
+])
+def test_comparisons(expression, values, expected):
+    assert evaluate(condition(expression, values=values), ITEM) is expected
+
+
+def test_precedence():
+    """NOT binds tighter than AND, which binds tighter than OR"""
+    true, false = "attribute_exists(id)", "attribute_exists(missing)"
+    assert evaluate(condition("{} OR {} AND {}".format(true, false, false)), ITEM)
+    assert not evaluate(condition("({} OR {}) AND {}".format(true, false, false)), ITEM)
+    assert evaluate(condition("NOT {} AND {}".format(false, true)), ITEM)
+    assert not evaluate(condition("not {} and not {}".format(false, true)), ITEM)
+
+
+def test_placeholders():
+    parser = ExpressionParser({"#a": "age", "#u": "unused"}, {":v": {"N": "30"}})
+    node = parser.condition("#a = :v")
+    assert evaluate(node, ITEM)
+    with pytest.raises(ValidationError):
+        parser.check_unused()
+
+    with pytest.raises(ValidationError):
+        condition("#missing = :v", values={":v": {"N": "1"}})
+    with pytest.raises(ValidationError):
+        condition("age = :missing")
+
+
+@pytest.mark.parametrize("expression", [
+    "", "age", "age = ", "age = :v AND", "(age = :v", "age BETWEEN :v", "age IN :v", "age $ :v",
+])
+def test_syntax_errors(expression):
+    with pytest.raises(ValidationError):
+        condition(expression, values={":v": {"N": "1"}})
+
+
+def test_update_set_and_arithmetic():
+    updated = update(
+        "SET age = age + :one, profile.name = :name, profile.langs[9] = :lang, created = if_not_exists(created, :now)",
+        values={":one": {"N": "1"}, ":name": {"S": "Grace"}, ":lang": {"S": "de"}, ":now": {"N": "5"}})
+    assert updated["age"] == {"N": "31"}
+    assert updated["profile"]["M"]["name"] == {"S": "Grace"}
+    assert updated["profile"]["M"]["langs"]["L"][-1] == {"S": "de"}
+    assert updated["created"] == {"N": "5"}
+    # The original isn't modified
+    assert ITEM["age"] == {"N": "30"}
+
+
+def test_update_reads_original_item():
+    updated = update("SET a = b, b = a", item={"a": {"S": "1"}, "b": {"S": "2"}})
+    assert updated == {"a": {"S": "2"}, "b": {"S": "1"}}
+
+
+def test_update_remove_add_delete():
+    updated = update(
+        "REMOVE profile.langs[0], age ADD tags :t, counter :one DELETE scores :s",
+        values={":t": {"SS": ["b", "c"]}, ":one": {"N": "1"}, ":s": {"NS": ["1", "2.5"]}})
+    assert "age" not in updated
+    assert updated["profile"]["M"]["langs"] == {"L": [{"S": "fr"}]}
+    assert updated["tags"] == {"SS": ["a", "b", "c"]}
+    assert updated["counter"] == {"N": "1"}
+    assert "scores" not in updated
+
+
+def test_list_append():
+    updated = update("SET profile.langs = list_append(profile.langs, :more)", values={":more": {"L": [{"S": "es"}]}})
+    assert [value["S"] for value in updated["profile"]["M"]["langs"]["L"]] == ["en", "fr", "es"]
+
+
+@pytest.mark.parametrize("expression, values", [
+    ("SET age = age, age = :v", {":v": {"N": "1"}}),
+    ("SET profile = :v, profile.name = :v", {":v": {"S": "x"}}),
+    ("SET id = missing", None),
+    ("SET age = id + :v", {":v": {"N": "1"}}),
+    ("SET nothing.here = :v", {":v": {"N": "1"}}),
+    ("ADD id :v", {":v": {"N": "1"}}),
+    ("DELETE tags :v", {":v": {"S": "a"}}),
+    ("SET age = :v SET id = :v", {":v": {"N": "1"}}),
+    ("UPSERT age = :v", {":v": {"N": "1"}}),
+])
+def test_invalid_updates(expression, values):
+    with pytest.raises(ValidationError):
+        update(expression, values=values)
+
+
+def test_project():
+    paths = ExpressionParser({"#p": "profile"}).projection("id, #p.langs[1], #p.name, missing")
+    assert project(ITEM, paths) == {
+        "id": {"S": "user-1"},
+        "profile": {"M": {"langs": {"L": [{"S": "fr"}]}, "name": {"S": "Ada"}}},
+    }
+    with pytest.raises(ValidationError):
+        ExpressionParser().projection("profile, profile.name")
+
+
+def test_resolve_and_equality():
+    assert resolve(ITEM, ("profile", "langs", 0)) == {"S": "en"}
+    assert resolve(ITEM, ("age", "nested")) is None
+    assert resolve(ITEM, ("profile", 0)) is None
+    assert values_equal({"M": {"a": {"N": "1"}}}, {"M": {"a": {"N": "1.00"}}})
+    assert not values_equal({"L": [{"N": "1"}]}, {"L": [{"N": "1"}, {"N": "2"}]})
+    assert not values_equal({"S": "1"}, {"N": "1"})
+
+
+@pytest.mark.parametrize("expression, value, expected", [
+    ("data = :v", {"B": "AP8="}, True),
+    ("data = :v", {"B": b"AP8="}, True),
+    ("data = :v", {"B": "AA=="}, False),
+    ("data < :v", {"B": "AQ=="}, True),
+    ("begins_with(data, :v)", {"B": "AP"}, True),
+    ("size(data) = :v", {"N": "4"}, True),
+    ("contains(blobs, :v)", {"B": "AQ=="}, True),
+    ("blobs = :v", {"BS": [b"Ag==", "AQ=="]}, True),
+])
+@pytest.mark.parametrize("item", [
+    {"data": {"B": b"AP8="}, "blobs": {"BS": [b"AQ==", b"Ag=="]}},
+    {"data": {"B": "AP8="}, "blobs": {"BS": ["AQ==", "Ag=="]}},
+], ids=["bytes", "str"])
+def test_binary_encodings(expression, value, expected, item):
+    """Binary values compare the same whether they're str, as bloop renders them, or bytes from a response"""
+    assert evaluate(condition(expression, values={":v": value}), item) is expected
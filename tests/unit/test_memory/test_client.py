@@ -0,0 +1,454 @@
+import uuid
+
+import botocore.exceptions
+import pytest
+
+from bloop import (
+    UUID,
+    BaseModel,
+    Binary,
+    Column,
+    ConstraintViolation,
+    Engine,
+    GlobalSecondaryIndex,
+    Integer,
+    List,
+    LocalSecondaryIndex,
+    Map,
+    Number,
+    Set,
+    String,
+    TransactionCanceled,
+)
+from bloop.exceptions import ThroughputExceeded
+from bloop.memory import MemoryDynamoDB
+
+
+# Binding validates against a real table description, which fills in Meta.  These models are local so that
+# doesn't leak into the shared helper models.
+class User(BaseModel):
+    id = Column(String, hash_key=True)
+    age = Column(Integer)
+    name = Column(String)
+    email = Column(String)
+    by_email = GlobalSecondaryIndex(hash_key="email", projection="all")
+
+
+class Dated(BaseModel):
+    name = Column(UUID, hash_key=True)
+    date = Column(String, range_key=True)
+    email = Column(String)
+    joined = Column(String)
+    by_email = GlobalSecondaryIndex(hash_key="email", projection="keys")
+    by_joined = LocalSecondaryIndex(range_key="joined", projection=["email"])
+
+
+class Document(BaseModel):
+    id = Column(Integer, hash_key=True)
+    data = Column(Map(Rating=Number(), Stock=Integer(), Label=String))
+    numbers = Column(List(Integer))
+    tags = Column(Set(String))
+    blob = Column(Binary)
+
+
+class Event(BaseModel):
+    class Meta:
+        stream = {"include": ["new", "old"]}
+    id = Column(String, hash_key=True)
+    count = Column(Integer)
+
+
+@pytest.fixture
+def dynamodb():
+    return MemoryDynamoDB()
+
+
+@pytest.fixture
+def engine(dynamodb):
+    engine = Engine(dynamodb=dynamodb, dynamodbstreams=dynamodb.streams)
+    engine.bind(User)
+    return engine
+
+
+def error_code(excinfo):
+    return excinfo.value.response["Error"]["Code"]
+
+
+def users_table(dynamodb, name="Users"):
+    dynamodb.create_table(
+        TableName=name,
+        KeySchema=[{"AttributeName": "h", "KeyType": "HASH"}, {"AttributeName": "r", "KeyType": "RANGE"}],
+        AttributeDefinitions=[
+            {"AttributeName": "h", "AttributeType": "S"},
+            {"AttributeName": "r", "AttributeType": "N"},
+            {"AttributeName": "g", "AttributeType": "S"},
+        ],
+        GlobalSecondaryIndexes=[{
+            "IndexName": "by_g",
+            "KeySchema": [{"AttributeName": "g", "KeyType": "HASH"}],
+            "Projection": {"ProjectionType": "KEYS_ONLY"},
+            "ProvisionedThroughput": {"ReadCapacityUnits": 1, "WriteCapacityUnits": 1},
+        }],
+        ProvisionedThroughput={"ReadCapacityUnits": 1, "WriteCapacityUnits": 1},
+    )
+    for h in ("a", "b"):
+        for r in range(10):
+            item = {"h": {"S": h}, "r": {"N": str(r)}, "v": {"N": str(r * 10)}}
+            if r % 2:
+                item["g"] = {"S": "odd"}
+            dynamodb.put_item(TableName=name, Item=item)
+
+
+def query(dynamodb, condition, values, **kwargs):
+    return dynamodb.query(
+        TableName="Users", KeyConditionExpression=condition, ExpressionAttributeValues=values, **kwargs)
+
+
+# TABLES ============================================================================================== TABLES
+
+
+def test_bind_creates_and_validates(dynamodb):
+    engine = Engine(dynamodb=dynamodb, dynamodbstreams=dynamodb.streams)
+    engine.bind(Dated)
+    engine.bind(Dated)
+    description = dynamodb.describe_table(TableName="Dated")["Table"]
+    assert description["TableStatus"] == "ACTIVE"
+    assert [index["IndexName"] for index in description["GlobalSecondaryIndexes"]] == ["by_email"]
+    assert [index["IndexName"] for index in description["LocalSecondaryIndexes"]] == ["by_joined"]
+
+
+def test_table_errors(dynamodb):
+    users_table(dynamodb)
+    with pytest.raises(botocore.exceptions.ClientError) as excinfo:
+        users_table(dynamodb)
+    assert error_code(excinfo) == "ResourceInUseException"
+    with pytest.raises(botocore.exceptions.ClientError) as excinfo:
+        dynamodb.describe_table(TableName="Missing")
+    assert error_code(excinfo) == "ResourceNotFoundException"
+    dynamodb.delete_table(TableName="Users")
+    assert dynamodb.list_tables()["TableNames"] == []
+
+
+def test_ttl_and_backups(dynamodb):
+    users_table(dynamodb)
+    dynamodb.update_time_to_live(
+        TableName="Users", TimeToLiveSpecification={"AttributeName": "expiry", "Enabled": True})
+    dynamodb.update_continuous_backups(
+        TableName="Users", PointInTimeRecoverySpecification={"PointInTimeRecoveryEnabled": True})
+    assert dynamodb.describe_time_to_live(TableName="Users")["TimeToLiveDescription"] == {
+        "AttributeName": "expiry", "TimeToLiveStatus": "ENABLED"}
+    status = dynamodb.describe_continuous_backups(TableName="Users")
+    assert status["ContinuousBackupsDescription"]["ContinuousBackupsStatus"] == "ENABLED"
+
+
+# ITEMS ================================================================================================ ITEMS
+
+
+def test_engine_round_trip(engine):
+    user = User(id="a", age=3, name="n", email="e@x")
+    engine.save(user)
+    loaded = User(id="a")
+    engine.load(loaded)
+    assert (loaded.age, loaded.name, loaded.email) == (3, "n", "e@x")
+
+    user.age = 4
+    engine.save(user, condition=User.age == 3)
+    with pytest.raises(ConstraintViolation):
+        engine.save(user, condition=User.age == 3)
+    engine.delete(user, condition=User.age == 4)
+    assert list(engine.scan(User)) == []
+
+
+def test_documents_and_sets(dynamodb):
+    engine = Engine(dynamodb=dynamodb, dynamodbstreams=dynamodb.streams)
+    engine.bind(Document)
+    document = Document(id=1, data={"Rating": 0.5, "Stock": 2}, numbers=[1, 2], tags={"a", "b"}, blob=b"\x00\x01")
+    engine.save(document)
+    document.data["Stock"] = 3
+    document.numbers = None
+    engine.save(document)
+    loaded = Document(id=1)
+    engine.load(loaded)
+    assert loaded.data["Stock"] == 3
+    assert loaded.numbers == []
+    assert (loaded.tags, loaded.blob) == ({"a", "b"}, b"\x00\x01")
+
+
+def test_update_return_values(dynamodb):
+    users_table(dynamodb)
+    key = {"h": {"S": "a"}, "r": {"N": "1"}}
+    response = dynamodb.update_item(
+        TableName="Users", Key=key, UpdateExpression="SET v = v + :one",
+        ExpressionAttributeValues={":one": {"N": "1"}}, ReturnValues="UPDATED_NEW")
+    assert response["Attributes"] == {"v": {"N": "11"}}
+    response = dynamodb.update_item(
+        TableName="Users", Key=key, UpdateExpression="REMOVE v", ReturnValues="ALL_OLD")
+    assert response["Attributes"]["v"] == {"N": "11"}
+    assert "v" not in dynamodb.get_item(TableName="Users", Key=key)["Item"]
+
+
+def test_update_creates_item(dynamodb):
+    users_table(dynamodb)
+    key = {"h": {"S": "new"}, "r": {"N": "0"}}
+    dynamodb.update_item(TableName="Users", Key=key)
+    assert dynamodb.get_item(TableName="Users", Key=key)["Item"] == key
+
+
+@pytest.mark.parametrize("request_", [
+    # key attribute can't be updated
+    {"Key": {"h": {"S": "a"}, "r": {"N": "1"}}, "UpdateExpression": "SET r = :v",
+     "ExpressionAttributeValues": {":v": {"N": "2"}}},
+    # key doesn't match the schema
+    {"Key": {"h": {"S": "a"}}},
+    {"Key": {"h": {"N": "1"}, "r": {"N": "1"}}},
+    {"Key": {"h": {"S": ""}, "r": {"N": "1"}}},
+    # index key has the wrong type
+    {"Key": {"h": {"S": "a"}, "r": {"N": "1"}}, "UpdateExpression": "SET g = :v",
+     "ExpressionAttributeValues": {":v": {"N": "2"}}},
+    # unused placeholder
+    {"Key": {"h": {"S": "a"}, "r": {"N": "1"}}, "UpdateExpression": "SET v = :v",
+     "ExpressionAttributeValues": {":v": {"N": "2"}, ":unused": {"N": "3"}}},
+    # empty set
+    {"Key": {"h": {"S": "a"}, "r": {"N": "1"}}, "UpdateExpression": "SET v = :v",
+     "ExpressionAttributeValues": {":v": {"SS": []}}},
+])
+def test_update_validation(dynamodb, request_):
+    users_table(dynamodb)
+    with pytest.raises(botocore.exceptions.ClientError) as excinfo:
+        dynamodb.update_item(TableName="Users", **request_)
+    assert error_code(excinfo) == "ValidationException"
+
+
+def test_batch_get_and_write(dynamodb):
+    users_table(dynamodb)
+    keys = [{"h": {"S": "a"}, "r": {"N": str(r)}} for r in (1, 2, 99)]
+    response = dynamodb.batch_get_item(RequestItems={"Users": {"Keys": keys, "ProjectionExpression": "v"}})
+    assert response["Responses"]["Users"] == [{"v": {"N": "10"}}, {"v": {"N": "20"}}]
+    assert response["UnprocessedKeys"] == {}
+
+    response = dynamodb.batch_write_item(RequestItems={"Users": [
+        {"DeleteRequest": {"Key": keys[0]}},
+        {"PutRequest": {"Item": {**keys[2], "v": {"N": "990"}}}},
+    ]})
+    assert response["UnprocessedItems"] == {}
+    assert "Item" not in dynamodb.get_item(TableName="Users", Key=keys[0])
+    assert dynamodb.get_item(TableName="Users", Key=keys[2])["Item"]["v"] == {"N": "990"}
+
+    with pytest.raises(botocore.exceptions.ClientError) as excinfo:
+        dynamodb.batch_write_item(RequestItems={"Users": [
+            {"DeleteRequest": {"Key": keys[1]}}, {"DeleteRequest": {"Key": keys[1]}}]})
+    assert error_code(excinfo) == "ValidationException"
+
+
+def test_batch_limit():
+    dynamodb = MemoryDynamoDB(batch_limit=2)
+    users_table(dynamodb)
+    keys = [{"h": {"S": "a"}, "r": {"N": str(r)}} for r in range(5)]
+    response = dynamodb.batch_get_item(RequestItems={"Users": {"Keys": keys, "ConsistentRead": True}})
+    assert len(response["Responses"]["Users"]) == 2
+    assert response["UnprocessedKeys"] == {"Users": {"Keys": keys[2:], "ConsistentRead": True}}
+
+    response = dynamodb.batch_write_item(RequestItems={"Users": [{"DeleteRequest": {"Key": key}} for key in keys]})
+    assert response["UnprocessedItems"] == {"Users": [{"DeleteRequest": {"Key": key}} for key in keys[2:]]}
+
+
+def test_throttle(engine, dynamodb):
+    calls = []
+
+    def throttle(operation, request):
+        calls.append(operation)
+        return operation == "BatchWriteItem"
+
+    dynamodb.throttle = throttle
+    engine.save(User(id="a"))
+    with pytest.raises(ThroughputExceeded):
+        engine.session.write_items({"User": [{"PutRequest": {"Item": {"id": {"S": "b"}}}}]})
+    assert calls == ["UpdateItem", "BatchWriteItem"]
+    assert [user.id for user in engine.scan(User)] == ["a"]
+
+
+# SEARCH ============================================================================================== SEARCH
+
+
+@pytest.mark.parametrize("condition, values, expected", [
+    ("h = :h", {}, list(range(10))),
+    ("h = :h AND r = :r", {":r": {"N": "3"}}, [3]),
+    ("h = :h AND r < :r", {":r": {"N": "3"}}, [0, 1, 2]),
+    ("h = :h AND r <= :r", {":r": {"N": "3"}}, [0, 1, 2, 3]),
+    ("h = :h AND r > :r", {":r": {"N": "7"}}, [8, 9]),
+    ("h = :h AND r >= :r", {":r": {"N": "7"}}, [7, 8, 9]),
+    ("h = :h AND r BETWEEN :lo AND :hi", {":lo": {"N": "2"}, ":hi": {"N": "4"}}, [2, 3, 4]),
+    ("r >= :r AND h = :h", {":r": {"N": "8.0"}}, [8, 9]),
+])
+def test_query_key_conditions(dynamodb, condition, values, expected):
+    users_table(dynamodb)
+    response = query(dynamodb, condition, {":h": {"S": "a"}, **values})
+    assert [int(item["r"]["N"]) for item in response["Items"]] == expected
+    assert response["ScannedCount"] == len(expected)
+
+
+def test_query_begins_with(dynamodb):
+    engine = Engine(dynamodb=dynamodb, dynamodbstreams=dynamodb.streams)
+    engine.bind(Dated)
+    name = uuid.uuid4()
+    for date in ("2019-12-31", "2020-01-01", "2020-06-30", "2021-01-01"):
+        engine.save(Dated(name=name, date=date, joined=date[::-1]))
+    results = engine.query(Dated, key=(Dated.name == name) & Dated.date.begins_with("2020"))
+    assert [obj.date for obj in results] == ["2020-01-01", "2020-06-30"]
+    results = engine.query(Dated.by_joined, key=Dated.name == name, forward=False)
+    assert [obj.joined for obj in results] == ["13-21-9102", "10-10-1202", "10-10-0202", "03-60-0202"]
+
+
+def test_query_pagination_and_order(dynamodb):
+    users_table(dynamodb)
+    pages, start = [], None
+    while True:
+        kwargs = {"Limit": 4, "ScanIndexForward": False, "FilterExpression": "v <> :skip"}
+        if start:
+            kwargs["ExclusiveStartKey"] = start
+        response = query(dynamodb, "h = :h", {":h": {"S": "b"}, ":skip": {"N": "50"}}, **kwargs)
+        pages.append([int(item["r"]["N"]) for item in response["Items"]])
+        start = response.get("LastEvaluatedKey")
+        if start is None:
+            break
+    assert pages == [[9, 8, 7, 6], [4, 3, 2], [1, 0]]
+
+
+def test_query_index_projection(dynamodb):
+    users_table(dynamodb)
+    response = query(dynamodb, "g = :g", {":g": {"S": "odd"}}, IndexName="by_g")
+    assert response["Count"] == 10
+    assert all(set(item) == {"h", "r", "g"} for item in response["Items"])
+
+    with pytest.raises(botocore.exceptions.ClientError):
+        query(dynamodb, "g = :g", {":g": {"S": "odd"}}, IndexName="by_g", Select="ALL_ATTRIBUTES")
+    with pytest.raises(botocore.exceptions.ClientError):
+        query(dynamodb, "g = :g", {":g": {"S": "odd"}}, IndexName="by_g", ConsistentRead=True)
+
+
+def test_query_select_count(dynamodb):
+    users_table(dynamodb)
+    response = query(dynamodb, "h = :h", {":h": {"S": "a"}}, Select="COUNT")
+    assert response == {"Count": 10, "ScannedCount": 10}
+
+
+@pytest.mark.parametrize("condition", ["r = :h", "h = :h OR h = :h", "h = :h AND v = :h", "h < :h"])
+def test_query_invalid_key_condition(dynamodb, condition):
+    users_table(dynamodb)
+    with pytest.raises(botocore.exceptions.ClientError):
+        query(dynamodb, condition, {":h": {"S": "a"}})
+
+
+def test_scan_segments(dynamodb):
+    users_table(dynamodb)
+    seen = []
+    for segment in range(3):
+        start = None
+        while True:
+            kwargs = {"Segment": segment, "TotalSegments": 3, "Limit": 3}
+            if start:
+                kwargs["ExclusiveStartKey"] = start
+            response = dynamodb.scan(TableName="Users", **kwargs)
+            seen.extend((item["h"]["S"], item["r"]["N"]) for item in response["Items"])
+            start = response.get("LastEvaluatedKey")
+            if start is None:
+                break
+    assert len(seen) == len(set(seen)) == 20
+
+
+def test_scan_index_skips_sparse_items(engine):
+    engine.save(User(id="a", email="a@x"), User(id="b"))
+    assert [user.id for user in engine.scan(User.by_email)] == ["a"]
+
+
+def test_consumed_capacity(dynamodb):
+    users_table(dynamodb)
+    response = dynamodb.put_item(
+        TableName="Users", Item={"h": {"S": "c"}, "r": {"N": "1"}, "g": {"S": "x"}},
+        ReturnConsumedCapacity="INDEXES")
+    assert response["ConsumedCapacity"] == {
+        "TableName": "Users", "CapacityUnits": 2.0,
+        "Table": {"CapacityUnits": 1.0, "WriteCapacityUnits": 1.0},
+        "GlobalSecondaryIndexes": {"by_g": {"CapacityUnits": 1.0, "WriteCapacityUnits": 1.0}},
+    }
+    response = query(dynamodb, "h = :h", {":h": {"S": "a"}}, ReturnConsumedCapacity="TOTAL")
+    assert response["ConsumedCapacity"] == {"TableName": "Users", "CapacityUnits": 0.5}
+
+
+# TRANSACTIONS ================================================================================== TRANSACTIONS
+
+
+def test_transactions(engine):
+    engine.save(User(id="a", age=1), User(id="b", age=2))
+    with engine.transaction() as tx:
+        tx.save(User(id="c", age=3))
+        tx.delete(User(id="a"))
+        tx.check(User(id="b"), condition=User.age == 2)
+    assert sorted(user.id for user in engine.scan(User)) == ["b", "c"]
+
+    with pytest.raises(TransactionCanceled):
+        with engine.transaction() as tx:
+            tx.save(User(id="d"))
+            tx.check(User(id="b"), condition=User.age == 99)
+    assert sorted(user.id for user in engine.scan(User)) == ["b", "c"]
+
+    loaded = [User(id="b"), User(id="c")]
+    with engine.transaction(mode="r") as tx:
+        tx.load(*loaded)
+    assert [user.age for user in loaded] == [2, 3]
+
+
+def test_transaction_cancellation_reasons(dynamodb):
+    users_table(dynamodb)
+    key = {"h": {"S": "a"}, "r": {"N": "1"}}
+    with pytest.raises(botocore.exceptions.ClientError) as excinfo:
+        dynamodb.transact_write_items(TransactItems=[
+            {"Delete": {"TableName": "Users", "Key": {"h": {"S": "a"}, "r": {"N": "2"}}}},
+            {"ConditionCheck": {
+                "TableName": "Users", "Key": key, "ConditionExpression": "attribute_not_exists(h)",
+                "ReturnValuesOnConditionCheckFailure": "ALL_OLD"}},
+        ])
+    assert error_code(excinfo) == "TransactionCanceledException"
+    reasons = excinfo.value.response["CancellationReasons"]
+    assert reasons[0] == {"Code": "None"}
+    assert reasons[1]["Code"] == "ConditionalCheckFailed"
+    assert reasons[1]["Item"]["v"] == {"N": "10"}
+
+
+def test_transaction_idempotency(dynamodb):
+    users_table(dynamodb)
+    request = {
+        "TransactItems": [{"Update": {
+            "TableName": "Users", "Key": {"h": {"S": "a"}, "r": {"N": "1"}},
+            "UpdateExpression": "ADD v :one", "ExpressionAttributeValues": {":one": {"N": "1"}}}}],
+        "ClientRequestToken": "token",
+    }
+    dynamodb.transact_write_items(**request)
+    dynamodb.transact_write_items(**request)
+    item = dynamodb.get_item(TableName="Users", Key={"h": {"S": "a"}, "r": {"N": "1"}})["Item"]
+    assert item["v"] == {"N": "11"}
+
+
+# STREAMS ============================================================================================ STREAMS
+
+
+def test_stream(dynamodb):
+    engine = Engine(dynamodb=dynamodb, dynamodbstreams=dynamodb.streams)
+    engine.bind(Event)
+    stream = engine.stream(Event, "trim_horizon")
+    event = Event(id="a", count=1)
+    engine.save(event)
+    event.count = 2
+    engine.save(event)
+    engine.delete(event)
+
+    records = [next(stream) for _ in range(3)]
+    assert [record["meta"]["event"]["type"] for record in records] == ["insert", "modify", "remove"]
+    assert records[1]["old"].count == 1
+    assert records[1]["new"].count == 2
+    assert next(stream) is None
+
+    token = stream.token
+    engine.save(Event(id="b"))
+    resumed = engine.stream(Event, token)
+    assert next(resumed)["new"].id == "b"
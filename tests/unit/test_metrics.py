@@ -0,0 +1,291 @@
+import threading
+from unittest.mock import Mock
+
+import pytest
+
+from bloop import Engine
+from bloop.bulk.writes import BatchWriter
+from bloop.metrics import (
+    CapacityRegistry,
+    Histogram,
+    LatencyRegistry,
+    current_tag,
+    disable_timing,
+    enable_timing,
+    operation_scope,
+    tagged,
+    timed,
+    timed_operation,
+    timed_phase,
+)
+
+from ..helpers.models import User
+
+
+def test_tagged_nesting():
+    assert current_tag() is None
+    with tagged("outer"):
+        assert current_tag() == "outer"
+        with tagged("inner"):
+            assert current_tag() == "inner"
+        assert current_tag() == "outer"
+    assert current_tag() is None
+
+
+def test_tag_not_shared_with_threads():
+    seen = []
+    with tagged("main"):
+        thread = threading.Thread(target=lambda: seen.append(current_tag()))
+        thread.start()
+        thread.join()
+    assert seen == [None]
+
+
+def test_record_splits_indexes():
+    registry = CapacityRegistry()
+    registry.record("query", {
+        "TableName": "User",
+        "CapacityUnits": 3.0,
+        "Table": {"CapacityUnits": 1.0, "ReadCapacityUnits": 1.0},
+        "GlobalSecondaryIndexes": {"by_email": {"CapacityUnits": 1.5, "ReadCapacityUnits": 1.5}},
+        "LocalSecondaryIndexes": {"by_joined": {"CapacityUnits": 0.5, "ReadCapacityUnits": 0.5}},
+    }, tag="search")
+
+    assert registry.snapshot() == [
+        {"table": "User", "index": "by_email", "operation": "query", "tag": "search",
+         "requests": 1, "capacity_units": 1.5, "read_units": 1.5, "write_units": 0.0},
+        {"table": "User", "index": None, "operation": "query", "tag": "search",
+         "requests": 1, "capacity_units": 1.0, "read_units": 1.0, "write_units": 0.0},
+        {"table": "User", "index": "by_joined", "operation": "query", "tag": "search",
+         "requests": 1, "capacity_units": 0.5, "read_units": 0.5, "write_units": 0.0},
+    ]
+
+
+def test_record_totals_only():
+    """Without per-index details the entry's totals are attributed to the table"""
+    registry = CapacityRegistry()
+    registry.record("batch_get", [
+        {"TableName": "User", "CapacityUnits": 2.0},
+        {"TableName": "Simple", "CapacityUnits": 1.0},
+    ])
+    registry.record("batch_get", [{"TableName": "User", "CapacityUnits": 0.5}])
+
+    rows = {row["table"]: row for row in registry.snapshot()}
+    assert rows["User"]["requests"] == 2
+    assert rows["User"]["capacity_units"] == 2.5
+    assert rows["User"]["index"] is None
+    assert rows["Simple"]["capacity_units"] == 1.0
+
+
+def test_keys_include_operation_and_tag():
+    registry = CapacityRegistry()
+    registry.record("update", {"TableName": "User", "CapacityUnits": 1.0, "WriteCapacityUnits": 1.0})
+    registry.record("update", {"TableName": "User", "CapacityUnits": 1.0}, tag="signup")
+    registry.record("delete", {"TableName": "User", "CapacityUnits": 1.0})
+    assert {(row["operation"], row["tag"]) for row in registry.snapshot()} == {
+        ("update", None), ("update", "signup"), ("delete", None)}
+    assert repr(registry) == "<CapacityRegistry[3 keys]>"
+
+
+def test_snapshot_reset():
+    registry = CapacityRegistry()
+    registry.record("scan", {"TableName": "User", "CapacityUnits": 1.0})
+
+    assert len(registry.snapshot(reset=True)) == 1
+    assert registry.snapshot() == []
+
+    registry.record("scan", {"TableName": "User", "CapacityUnits": 1.0})
+    registry.reset()
+    assert registry.snapshot() == []
+
+
+# TIMING ====================================================================================================== TIMING
+
+
+@pytest.fixture
+def timings():
+    registry = enable_timing()
+    yield registry
+    disable_timing()
+
+
+def test_histogram_exact_small_values():
+    histogram = Histogram()
+    for value in [0, 1, 1, 127]:
+        histogram.record(value)
+    assert histogram.buckets == {0: 1, 1: 2, 127: 1}
+    assert (histogram.min, histogram.max, histogram.count) == (0, 127, 4)
+    assert histogram.percentile(50) == 1
+    assert histogram.percentile(100) == 127
+
+
+def test_histogram_precision():
+    histogram = Histogram(significant_bits=7)
+    for value in range(1, 100001, 7):
+        histogram.record(value)
+        bucket = max(b for b in histogram.buckets if b <= value)
+        assert (value - bucket) / value < 2 ** -6
+    # log-linear buckets stay small
+    assert len(histogram.buckets) < 800
+
+
+def test_histogram_percentiles():
+    histogram = Histogram()
+    for value in range(1, 10001):
+        histogram.record(value)
+    exported = histogram.to_dict()
+    assert exported["unit"] == "us"
+    assert exported["count"] == 10000
+    assert exported["mean"] == 5000.5
+    for name, expected in [("p50", 5000), ("p90", 9000), ("p99", 9900), ("p999", 9990)]:
+        assert expected <= exported[name] <= expected * 1.016
+    assert sum(exported["buckets"].values()) == 10000
+    assert list(exported["buckets"]) == sorted(exported["buckets"])
+
+
+def test_histogram_empty():
+    exported = Histogram().to_dict()
+    assert exported["count"] == 0
+    assert exported["mean"] is None
+    assert exported["p99"] is None
+    assert exported["buckets"] == {}
+
+
+def test_histogram_merge():
+    first, second = Histogram(), Histogram()
+    first.record(10)
+    second.record(5000, count=3)
+    second.record(2)
+    first.merge(second)
+    assert (first.count, first.min, first.max, first.total) == (5, 2, 5000, 15012)
+    with pytest.raises(ValueError):
+        first.merge(Histogram(significant_bits=3))
+
+
+def test_invalid_precision():
+    with pytest.raises(ValueError):
+        Histogram(significant_bits=0)
+
+
+def test_latency_registry():
+    registry = LatencyRegistry()
+    registry.record("render", "save", 0.000250)
+    registry.record("render", "save", 0.000750)
+    registry.record("session", "query", 0.010)
+
+    snapshot = registry.snapshot(reset=True)
+    assert snapshot["render"]["save"]["count"] == 2
+    assert snapshot["render"]["save"]["mean"] == 500
+    assert snapshot["session"]["query"]["min"] == 10000
+    assert registry.snapshot() == {}
+    assert repr(registry) == "<LatencyRegistry[0 keys]>"
+
+
+def test_disabled_records_nothing():
+    sink = Mock()
+    enable_timing(sink)
+    disable_timing()
+
+    @timed("render")
+    def render():
+        return "rendered"
+    assert render() == "rendered"
+    assert render.__name__ == "render"
+    sink.record.assert_not_called()
+
+
+def test_custom_sink():
+    sink = Mock()
+    enable_timing(sink)
+    try:
+        @timed("render")
+        def render():
+            pass
+        render()
+    finally:
+        disable_timing()
+    (phase, operation, seconds), _ = sink.record.call_args
+    assert (phase, operation) == ("render", "render")
+    assert seconds >= 0
+
+
+def test_timed_operation_attributes_phases(timings):
+    @timed("render")
+    def render():
+        pass
+
+    @timed_operation("save")
+    def save():
+        render()
+        with operation_scope("query"):
+            render()
+        raise RuntimeError
+
+    with pytest.raises(RuntimeError):
+        save()
+    render()
+    snapshot = timings.snapshot()
+    assert snapshot["total"]["save"]["count"] == 1
+    assert snapshot["render"]["save"]["count"] == 1
+    assert snapshot["render"]["query"]["count"] == 1
+    # outside an operation, the function name is used
+    assert snapshot["render"]["render"]["count"] == 1
+
+
+def test_engine_phases(dynamodb, dynamodbstreams, timings):
+    engine = Engine(dynamodb=dynamodb, dynamodbstreams=dynamodbstreams)
+    dynamodb.update_item.return_value = {}
+    dynamodb.query.return_value = {"Count": 1, "Items": [{"id": {"S": "user_id"}, "age": {"N": "3"}}]}
+
+    engine.save(User(id="user_id", age=3))
+    assert [user.age for user in engine.query(User, key=User.id == "user_id")] == [3]
+
+    snapshot = timings.snapshot()
+    assert set(snapshot["total"]) == {"save"}
+    assert set(snapshot["render"]) == {"save", "query"}
+    assert set(snapshot["dump_key"]) == {"save"}
+    assert set(snapshot["session"]) == {"save", "query"}
+    assert set(snapshot["unpack"]) == {"query"}
+
+
+def test_timed_phase(timings):
+    with timed_phase("retries", "load_items"):
+        pass
+    with operation_scope("query"):
+        with timed_phase("retries", "load_items"):
+            pass
+    snapshot = timings.snapshot()
+    assert snapshot["retries"]["load_items"]["count"] == 1
+    assert snapshot["retries"]["query"]["count"] == 1
+
+    disable_timing()
+    with timed_phase("retries", "load_items"):
+        pass
+    assert timings.snapshot()["retries"]["load_items"]["count"] == 1
+
+
+def test_load_retries_phase(dynamodb, dynamodbstreams, timings):
+    engine = Engine(dynamodb=dynamodb, dynamodbstreams=dynamodbstreams)
+    keys = {"Keys": [{"id": {"S": "user_id"}}], "ConsistentRead": False}
+    dynamodb.batch_get_item.side_effect = [
+        {"UnprocessedKeys": {"User": keys}},
+        {"Responses": {"User": [{"id": {"S": "user_id"}, "age": {"N": "3"}}]}, "UnprocessedKeys": {}},
+    ]
+    user = User(id="user_id")
+    engine.load(user)
+    assert user.age == 3
+
+    snapshot = timings.snapshot()
+    # only the resubmitted request
+    assert snapshot["retries"]["load"]["count"] == 1
+    assert snapshot["session"]["load"]["count"] == 1
+
+
+def test_batch_write_retries_phase(engine, session, timings):
+    unprocessed = {"User": [{"PutRequest": {"Item": {"id": {"S": "2"}}}}]}
+    session.write_items.side_effect = [unprocessed, {}]
+    writer = BatchWriter(engine, User, backoff=0)
+    writer.write([{"id": {"S": "1"}}, {"id": {"S": "2"}}])
+
+    # one backoff sleep and one resubmission
+    assert timings.snapshot()["retries"]["batch_write"]["count"] == 2
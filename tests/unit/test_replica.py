@@ -0,0 +1,256 @@
+import time
+
+import pytest
+
+from bloop import BaseModel, Binary, Boolean, Column, Engine, Integer, String
+from bloop.exceptions import InvalidStream, MissingObjects, StaleReplica
+from bloop.memory import MemoryDynamoDB
+from bloop.replica import (
+    MemoryReplicaStore,
+    ReplicaStore,
+    SQLiteReplicaStore,
+    TableReplica,
+    index_value,
+)
+
+
+class Flag(BaseModel):
+    class Meta:
+        stream = {"include": ["new", "old"]}
+    name = Column(String, hash_key=True)
+    service = Column(String)
+    enabled = Column(Boolean)
+    rollout = Column(Integer)
+
+
+class Blob(BaseModel):
+    class Meta:
+        stream = {"include": ["new", "old"]}
+    name = Column(String, hash_key=True)
+    kind = Column(String)
+    data = Column(Binary)
+
+
+class KeysOnly(BaseModel):
+    class Meta:
+        stream = {"include": ["keys"]}
+    id = Column(String, hash_key=True)
+
+
+class NoStream(BaseModel):
+    id = Column(String, hash_key=True)
+
+
+@pytest.fixture
+def memory_engine():
+    dynamodb = MemoryDynamoDB()
+    engine = Engine(dynamodb=dynamodb, dynamodbstreams=dynamodb.streams)
+    engine.bind(Flag)
+    return engine
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request):
+    if request.param == "memory":
+        return MemoryReplicaStore()
+    return SQLiteReplicaStore(":memory:")
+
+
+def item(name, service):
+    return {"name": {"S": name}, "service": {"S": service}, "data": {"B": b"\x00"}}
+
+
+def names(objs):
+    return sorted(obj.name for obj in objs)
+
+
+@pytest.mark.parametrize("attr, expected", [
+    ({"S": "a"}, "S:a"),
+    ({"N": "1.50"}, "N:1.5"),
+    ({"N": "10"}, "N:1E+1"),
+    ({"B": b"\x00"}, "B:AA=="),
+    ({"BOOL": True}, "BOOL:True"),
+    ({"SS": ["a"]}, None),
+])
+def test_index_value(attr, expected):
+    assert index_value(attr) == expected
+
+
+def test_base_store_abstract():
+    store = ReplicaStore()
+    calls = [
+        (store.prepare, ([],)), (store.get, ("key",)), (store.find, ("name", "value")), (store.all, ()),
+        (store.count, ()), (store.apply, ({}, ())), (store.load_state, ()), (store.clear, ()),
+    ]
+    for method, args in calls:
+        with pytest.raises(NotImplementedError):
+            method(*args)
+
+
+def test_store_apply(store):
+    store.prepare(["service"])
+    store.apply({"a": item("a", "x"), "b": item("b", "x")}, (), state={"token": 1})
+    assert store.get("a") == item("a", "x")
+    assert store.get("missing") is None
+    assert store.count() == 2
+    assert store.load_state() == {"token": 1}
+
+    # Moving an item between index values, and deleting one, keeps the index in sync
+    store.apply({"a": item("a", "y")}, {"b", "missing"})
+    assert store.find("service", "S:x") == []
+    assert store.find("service", "S:y") == [item("a", "y")]
+    assert store.all() == [item("a", "y")]
+    assert store.load_state() == {"token": 1}
+
+    store.clear()
+    assert store.count() == 0
+    assert store.find("service", "S:y") == []
+    assert store.load_state() is None
+
+
+def test_store_prepare_indexes_existing(store):
+    store.prepare([])
+    store.apply({"a": item("a", "x")}, ())
+    store.prepare(["service"])
+    assert store.find("service", "S:x") == [item("a", "x")]
+
+
+def test_sqlite_store_persists(tmp_path):
+    path = tmp_path / "replica.db"
+    store = SQLiteReplicaStore(path)
+    store.prepare(["service"])
+    store.apply({"a": item("a", "x")}, (), state={"token": 1})
+    store.close()
+
+    store = SQLiteReplicaStore(path)
+    store.prepare(["service"])
+    assert store.find("service", "S:x") == [item("a", "x")]
+    assert store.load_state() == {"token": 1}
+    assert repr(store) == "<SQLiteReplicaStore[{}]>".format(path)
+
+
+def test_invalid_replica(memory_engine):
+    memory_engine.bind(KeysOnly)
+    memory_engine.bind(NoStream)
+    with pytest.raises(InvalidStream):
+        TableReplica(memory_engine, NoStream)
+    with pytest.raises(InvalidStream):
+        TableReplica(memory_engine, KeysOnly)
+    with pytest.raises(ValueError):
+        TableReplica(memory_engine, Flag, segments=0)
+    with pytest.raises(ValueError):
+        TableReplica(memory_engine, Flag, indexes=[KeysOnly.id])
+
+
+@pytest.mark.parametrize("segments", [1, 3])
+def test_bootstrap_and_follow(memory_engine, store, segments):
+    """Existing items are scanned, then inserts, modifies and removes are applied from the stream"""
+    for name in ("a", "b", "c"):
+        memory_engine.save(Flag(name=name, service="checkout", enabled=True))
+    replica = TableReplica(memory_engine, Flag, store=store, indexes=[Flag.service], segments=segments)
+    assert repr(replica) == "<TableReplica[Flag]>"
+    replica.bootstrap()
+    assert len(replica) == 3
+
+    memory_engine.save(Flag(name="d", service="search"))
+    memory_engine.save(Flag(name="a", service="search", rollout=50))
+    memory_engine.delete(Flag(name="b"))
+    assert replica.poll() == 3
+    assert replica.records_applied == 3
+
+    assert names(replica.query(Flag.service, "checkout")) == ["c"]
+    assert names(replica.query(Flag.service, "search")) == ["a", "d"]
+    assert names(replica.query(Flag.service, "search", filter=Flag.rollout >= 10)) == ["a"]
+    assert names(replica.query(Flag.name, "d")) == ["d"]
+    assert names(replica.scan()) == ["a", "c", "d"]
+    # Saving "a" again only updated the columns that were set
+    assert names(replica.scan(filter=Flag.enabled == True)) == ["a", "c"]  # noqa: E712
+
+    flag = Flag(name="a")
+    replica.load(flag)
+    assert flag.rollout == 50
+    with pytest.raises(MissingObjects) as excinfo:
+        replica.load(Flag(name="a"), Flag(name="b"))
+    assert [obj.name for obj in excinfo.value.objects] == ["b"]
+
+
+def test_binary_filter(memory_engine, store):
+    """Binary conditions and indexes match whether the store holds binary values as str or as bytes"""
+    memory_engine.bind(Blob)
+    memory_engine.save(Blob(name="a", kind="x", data=b"\x00\xff"))
+    replica = TableReplica(memory_engine, Blob, store=store, indexes=[Blob.kind, Blob.data])
+    replica.bootstrap()
+    memory_engine.save(Blob(name="b", kind="x", data=b"\x00"))
+    replica.poll()
+
+    assert names(replica.scan(filter=Blob.data == b"\x00\xff")) == ["a"]
+    assert names(replica.query(Blob.kind, "x", filter=Blob.data == b"\x00")) == ["b"]
+    assert [obj.data for obj in replica.query(Blob.data, b"\x00\xff")] == [b"\x00\xff"]
+
+
+def test_query_unindexed(memory_engine):
+    replica = TableReplica(memory_engine, Flag)
+    with pytest.raises(ValueError):
+        replica.query(Flag.service, "checkout")
+
+
+def test_staleness(memory_engine):
+    replica = TableReplica(memory_engine, Flag, max_staleness=30)
+    assert replica.staleness() is None
+    with pytest.raises(StaleReplica):
+        replica.scan()
+
+    replica.bootstrap()
+    # Caught up to every shard's HEAD
+    assert 0 <= replica.staleness() < 1
+    assert replica.scan() == []
+    metrics = replica.metrics()
+    assert metrics.pop("staleness") < 1
+    assert metrics == {"items": 0, "records_applied": 0, "lag": 0.0}
+
+    # Nothing has been polled for a while
+    replica._polled_at = time.monotonic() - 31
+    with pytest.raises(StaleReplica):
+        replica.load(Flag(name="a"))
+
+
+def test_resume_from_saved_position(memory_engine, tmp_path, monkeypatch):
+    """A replica with a saved position follows the stream without scanning the table again"""
+    path = tmp_path / "replica.db"
+    memory_engine.save(Flag(name="a", service="checkout"))
+    replica = TableReplica(memory_engine, Flag, store=SQLiteReplicaStore(path))
+    replica.bootstrap()
+    # Shards at "latest" can't be resumed exactly, so nothing is saved until they find a record
+    assert replica.store.load_state() is None
+
+    memory_engine.save(Flag(name="b", service="checkout"))
+    replica.poll()
+    assert replica.store.load_state() is not None
+    replica.close()
+
+    memory_engine.save(Flag(name="c", service="checkout"))
+    monkeypatch.setattr(TableReplica, "_scan", lambda self: pytest.fail("scanned the table"))
+    resumed = TableReplica(memory_engine, Flag, store=SQLiteReplicaStore(path))
+    resumed.bootstrap()
+    assert names(resumed.scan()) == ["a", "b", "c"]
+
+    # Too old to resume
+    state = resumed.store.load_state()
+    state["saved_at"] -= 13 * 60 * 60
+    assert not resumed._resumable(state)
+
+
+def test_background_thread(memory_engine):
+    replica = TableReplica(memory_engine, Flag, poll_interval=0.01)
+    replica.start()
+    replica.start()
+    assert replica.running
+    try:
+        memory_engine.save(Flag(name="a"))
+        deadline = time.monotonic() + 5
+        while not len(replica) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert len(replica) == 1
+    finally:
+        replica.close()
+    assert not replica.running
@@ -630,10 +630,10 @@ def test_prepare_request_parallel(valid_search, mode, parallel):
     valid_search.parallel = parallel
     prepared = valid_search.prepare()
     if parallel and (mode == "scan"):
-        actual = prepared._request["Segments"], prepared._request["TotalSegments"]
+        actual = prepared._request["Segment"], prepared._request["TotalSegments"]
         assert actual == parallel
     else:
-        assert "Segments" not in prepared._request
+        assert "Segment" not in prepared._request
         assert "TotalSegments" not in prepared._request
 
 
@@ -13,8 +13,10 @@ from bloop.exceptions import (
     RecordsExpired,
     ShardIteratorExpired,
     TableMismatch,
+    ThroughputExceeded,
     TransactionCanceled,
 )
+from bloop.metrics import CapacityRegistry, tagged
 from bloop.models import (
     BaseModel,
     Column,
@@ -30,6 +32,7 @@ from bloop.session import (
     sanitize_table_description,
     simple_table_status,
 )
+from bloop.signals import capacity_consumed
 from bloop.types import String, Timestamp
 from bloop.util import Sentinel, ordered
 
@@ -415,6 +418,43 @@ def test_batch_get_unprocessed(session, dynamodb):
 # END LOAD ITEMS ====================================================================================== END LOAD ITEMS
 
 
+# WRITE ITEMS ============================================================================================ WRITE ITEMS
+
+
+def test_write_items(session, dynamodb):
+    request = {"User": [{"PutRequest": {"Item": {"id": {"S": "a"}}}}]}
+    dynamodb.batch_write_item.return_value = {"UnprocessedItems": {}}
+    assert session.write_items(request) == {}
+    dynamodb.batch_write_item.assert_called_once_with(RequestItems=request)
+
+
+def test_write_items_unprocessed(session, dynamodb):
+    """Unprocessed items are returned to the caller instead of retried"""
+    request = {"User": [{"PutRequest": {"Item": {"id": {"S": "a"}}}}]}
+    dynamodb.batch_write_item.return_value = {"UnprocessedItems": request}
+    assert session.write_items(request) == request
+    dynamodb.batch_write_item.assert_called_once_with(RequestItems=request)
+
+
+@pytest.mark.parametrize("code", ["ProvisionedThroughputExceededException", "ThrottlingException"])
+def test_write_items_throttled(code, session, dynamodb):
+    cause = dynamodb.batch_write_item.side_effect = client_error(code)
+    with pytest.raises(ThroughputExceeded) as excinfo:
+        session.write_items({})
+    assert excinfo.value.__cause__ is cause
+
+
+def test_write_items_unknown_error(session, dynamodb):
+    cause = dynamodb.batch_write_item.side_effect = client_error("FooError")
+    with pytest.raises(BloopException) as excinfo:
+        session.write_items({})
+    assert not isinstance(excinfo.value, ThroughputExceeded)
+    assert excinfo.value.__cause__ is cause
+
+
+# END WRITE ITEMS ==================================================================================== END WRITE ITEMS
+
+
 # QUERY SCAN SEARCH ================================================================================ QUERY SCAN SEARCH
 
 
@@ -1107,6 +1147,92 @@ def test_transaction_write_unknown_error(dynamodb, session):
 # END TRANSACTION WRITE ======================================================================== END TRANSACTION WRITE
 
 
+# CONSUMED CAPACITY ================================================================================ CONSUMED CAPACITY
+
+
+@pytest.fixture
+def tracked(dynamodb, dynamodbstreams):
+    return SessionWrapper(dynamodb=dynamodb, dynamodbstreams=dynamodbstreams, capacity=CapacityRegistry())
+
+
+@pytest.fixture
+def consumed():
+    calls = []
+
+    def on_consumed(session, **kwargs):
+        calls.append(kwargs)
+    capacity_consumed.connect(on_consumed)
+    yield calls
+    capacity_consumed.disconnect(on_consumed)
+
+
+def capacity(table="User", units=1.0):
+    return {"TableName": table, "CapacityUnits": units}
+
+
+@pytest.mark.parametrize("method, client_method, operation, args", [
+    ("save_item", "update_item", "update", [{"TableName": "User"}]),
+    ("delete_item", "delete_item", "delete", [{"TableName": "User"}]),
+    ("write_items", "batch_write_item", "batch_write", [{"User": []}]),
+    ("search_items", "query", "query", ["query", {"TableName": "User"}]),
+    ("search_items", "scan", "scan", ["scan", {"TableName": "User"}]),
+    ("transaction_read", "transact_get_items", "transact", [[]]),
+    ("transaction_write", "transact_write_items", "transact", [[], "token"]),
+])
+def test_capacity_recorded(method, client_method, operation, args, tracked, dynamodb, consumed):
+    client = getattr(dynamodb, client_method)
+    client.return_value = {"ConsumedCapacity": capacity()}
+
+    with tagged("my-tag"):
+        getattr(tracked, method)(*args)
+
+    assert client.call_args[1]["ReturnConsumedCapacity"] == "INDEXES"
+    assert consumed == [{"operation": operation, "tag": "my-tag", "capacity": [capacity()]}]
+    (row,) = tracked.capacity.snapshot()
+    assert (row["table"], row["operation"], row["tag"], row["capacity_units"]) == ("User", operation, "my-tag", 1.0)
+
+
+def test_capacity_batch_get_chunks(tracked, dynamodb):
+    """Each chunk's response is recorded"""
+    dynamodb.batch_get_item.side_effect = [
+        {"UnprocessedKeys": {"User": {"Keys": [{"id": {"S": "a"}}], "ConsistentRead": False}},
+         "ConsumedCapacity": [capacity(units=0.5)]},
+        {"Responses": {"User": [{"id": {"S": "a"}}]}, "UnprocessedKeys": {},
+         "ConsumedCapacity": [capacity(units=0.5)]},
+    ]
+    tracked.load_items({"User": {"Keys": [{"id": {"S": "a"}}], "ConsistentRead": False}})
+
+    (row,) = tracked.capacity.snapshot()
+    assert row["operation"] == "batch_get"
+    assert row["requests"] == 2
+    assert row["capacity_units"] == 1.0
+
+
+def test_capacity_request_not_mutated(tracked, dynamodb):
+    """The caller's request is reused for the next page, so the session can't modify it"""
+    dynamodb.scan.return_value = {"Count": 0, "ConsumedCapacity": capacity()}
+    request = {"TableName": "User"}
+    tracked.search_items("scan", request)
+    assert request == {"TableName": "User"}
+
+
+def test_capacity_missing_from_response(tracked, dynamodb, consumed):
+    dynamodb.update_item.return_value = {}
+    tracked.save_item({"TableName": "User"})
+    assert consumed == []
+    assert tracked.capacity.snapshot() == []
+
+
+def test_capacity_untracked(session, dynamodb, consumed):
+    dynamodb.update_item.return_value = {"ConsumedCapacity": capacity()}
+    session.save_item({"TableName": "User"})
+    dynamodb.update_item.assert_called_once_with(TableName="User")
+    assert consumed == []
+
+
+# END CONSUMED CAPACITY ======================================================================== END CONSUMED CAPACITY
+
+
 # COMPARE TABLES ====================================================================================== COMPARE TABLES
 
 
@@ -3,7 +3,7 @@ from unittest.mock import Mock
 
 import pytest
 
-from bloop.stream.buffer import RecordBuffer, heap_item
+from bloop.stream.buffer import RecordBuffer, ShardBuffer, heap_item
 from bloop.stream.shard import Shard
 
 from . import local_record
@@ -61,9 +61,10 @@ def test_heap_item_broken_clock(created_at, sequence_number):
     assert first_item == second_item
 
 
-def test_empty_buffer():
+@pytest.mark.parametrize("buffer_cls", [RecordBuffer, ShardBuffer])
+def test_empty_buffer(buffer_cls):
     """Trying to access an empty buffer raises IndexError"""
-    buffer = RecordBuffer()
+    buffer = buffer_cls()
 
     assert not buffer
     with pytest.raises(IndexError):
@@ -128,6 +129,37 @@ def test_push_all():
     assert records == same_records
 
 
+def test_push_all_into_buffered_shards():
+    """Bulk pushes merge with records already buffered, including ones older than a shard's head"""
+    now_ = now()
+    shards = [new_shard() for _ in range(4)]
+    buffer = RecordBuffer()
+    buffer.push_all((local_record(now_, str(n)), shards[n % 4]) for n in range(8, 16))
+    # Only one head changes, and one record lands between buffered records
+    buffer.push_all([(local_record(now_, "1"), shards[1]), (local_record(now_, "10"), shards[1])])
+    # Every head changes
+    buffer.push_all((local_record(now_, str(n)), shards[n % 4]) for n in (0, 2, 3, 4))
+
+    assert len(buffer) == 14
+    sequence_numbers = [int(buffer.pop()[0]["meta"]["sequence_number"]) for _ in range(14)]
+    assert sequence_numbers == [0, 1, 2, 3, 4, 8, 9, 10, 10, 11, 12, 13, 14, 15]
+
+
+def test_pop_many():
+    now_ = now()
+    shard, other = new_shard(), new_shard()
+    buffer = RecordBuffer()
+    buffer.push_all((local_record(now_, str(i)), shard) for i in range(0, 6, 2))
+    buffer.push_all((local_record(now_, str(i)), other) for i in range(1, 6, 2))
+
+    pairs = buffer.pop_many(4)
+    assert [record["meta"]["sequence_number"] for record, _ in pairs] == ["0", "1", "2", "3"]
+    assert [s for _, s in pairs] == [shard, other, shard, other]
+
+    assert len(buffer.pop_many(10)) == 2
+    assert buffer.pop_many(10) == []
+
+
 def test_clear():
     record = local_record(now(), "1")
     shard = new_shard()
@@ -140,13 +172,111 @@ def test_clear():
     assert not buffer
 
 
-def test_buffer_heap():
-    """RecordBuffer directly exposes its heap"""
-    record = local_record(now(), "1")
-    shard = new_shard()
+def test_merge_shards():
+    """Records from many shards come out in total order."""
+    now_ = now()
+    shards = [new_shard() for _ in range(3)]
     buffer = RecordBuffer()
+    # shard i holds sequence numbers i, i+3, i+6, ...
+    for i, shard in enumerate(shards):
+        buffer.push_all((local_record(now_, str(n)), shard) for n in range(i, 30, 3))
+
+    assert len(buffer) == 30
+    popped = [buffer.pop() for _ in range(30)]
+    assert [int(record["meta"]["sequence_number"]) for record, _ in popped] == list(range(30))
+    assert [shard for _, shard in popped] == shards * 10
+    assert not buffer
 
-    buffer.push(record, shard)
 
-    # [(sort, record, shard)]
-    assert buffer.heap[0][2] is shard
+def test_insert_ahead_of_head():
+    """A record older than everything buffered for its shard is returned first."""
+    now_ = now()
+    shard, other = new_shard(), new_shard()
+    buffer = RecordBuffer()
+    buffer.push(local_record(now_, "5"), shard)
+    buffer.push(local_record(now_, "3"), other)
+    buffer.push(local_record(now_, "1"), shard)
+    buffer.push(local_record(now_, "4"), shard)
+
+    assert len(buffer) == 4
+    sequence_numbers = [buffer.pop()[0]["meta"]["sequence_number"] for _ in range(4)]
+    assert sequence_numbers == ["1", "3", "4", "5"]
+    with pytest.raises(IndexError):
+        buffer.peek()
+
+
+def test_count_and_drop():
+    """Per-shard counts are tracked, and dropping a shard's records leaves the rest in order."""
+    now_ = now()
+    shard, other = new_shard(), new_shard()
+    buffer = RecordBuffer()
+    buffer.push_all((local_record(now_, str(i)), shard) for i in range(0, 10, 2))
+    buffer.push_all((local_record(now_, str(i)), other) for i in range(1, 10, 2))
+
+    assert buffer.count(shard) == 5
+    assert buffer.count(other) == 5
+    assert buffer.count(new_shard()) == 0
+
+    assert buffer.drop(shard) == 5
+    assert buffer.drop(shard) == 0
+    assert buffer.count(shard) == 0
+    assert len(buffer) == 5
+
+    assert buffer.peek()[1] is other
+    sequence_numbers = [buffer.pop()[0]["meta"]["sequence_number"] for _ in range(5)]
+    assert sequence_numbers == ["1", "3", "5", "7", "9"]
+    assert not buffer
+
+
+def test_shard_buffer_order():
+    """Records keep their order within a shard, and shards drain in the order they were first buffered"""
+    first, second = new_shard(), new_shard()
+    buffer = ShardBuffer()
+    # The second shard's records are older, but aren't ordered across shards
+    buffer.push(local_record(now(), "5"), first)
+    buffer.push_all((local_record(now() - datetime.timedelta(hours=1), str(i)), second) for i in range(3))
+    buffer.push(local_record(now(), "6"), first)
+
+    assert len(buffer) == 5
+    assert buffer.peek() == (buffer.queues[first][0], first)
+    popped = [(record["meta"]["sequence_number"], shard) for record, shard in [buffer.pop() for _ in range(3)]]
+    assert popped == [("5", first), ("6", first), ("0", second)]
+
+    # A shard that was drained goes to the back of the line
+    buffer.push(local_record(now(), "7"), first)
+    assert [record["meta"]["sequence_number"] for record, _ in buffer.pop_many(10)] == ["1", "2", "7"]
+    assert not buffer
+    assert not buffer.queues
+
+
+def test_shard_buffer_pop_many():
+    first, second = new_shard(), new_shard()
+    buffer = ShardBuffer()
+    buffer.push_all((local_record(now(), str(i)), first) for i in range(3))
+    buffer.push_all((local_record(now(), str(i)), second) for i in range(3, 6))
+
+    assert buffer.pop_many(0) == []
+    pairs = buffer.pop_many(4)
+    assert [(record["meta"]["sequence_number"], shard) for record, shard in pairs] == [
+        ("0", first), ("1", first), ("2", first), ("3", second)]
+    assert len(buffer) == 2
+    assert first not in buffer.queues
+
+
+def test_shard_buffer_count_drop_clear():
+    shard, other = new_shard(), new_shard()
+    buffer = ShardBuffer()
+    buffer.push_all((local_record(now(), str(i)), shard) for i in range(3))
+    buffer.push(local_record(now(), "9"), other)
+
+    assert buffer.count(shard) == 3
+    assert buffer.count(new_shard()) == 0
+    assert buffer.drop(shard) == 3
+    assert buffer.drop(shard) == 0
+    assert len(buffer) == 1
+    assert buffer.pop()[1] is other
+
+    buffer.push(local_record(now(), "10"), shard)
+    buffer.clear()
+    assert not buffer
+    assert buffer.count(shard) == 0
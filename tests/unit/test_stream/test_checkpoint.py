@@ -0,0 +1,98 @@
+from unittest.mock import Mock
+
+import pytest
+
+from bloop.checkpoints import MemoryCheckpointStore
+from bloop.stream.checkpoint import StreamCheckpointer
+from bloop.stream.stream import Stream
+
+
+@pytest.fixture
+def store():
+    return MemoryCheckpointStore()
+
+
+@pytest.fixture
+def stream():
+    stream = Mock(spec=Stream)
+    stream.token = {"stream_arn": "stream-arn", "active": [], "shards": []}
+    return stream
+
+
+def test_repr(store):
+    assert repr(StreamCheckpointer(store, "consumer")) == "<StreamCheckpointer[consumer]>"
+
+
+def test_invalid_checkpoint_every(store):
+    with pytest.raises(ValueError):
+        StreamCheckpointer(store, "consumer", checkpoint_every=0)
+
+
+def test_load_and_reset(store, stream):
+    checkpoint = StreamCheckpointer(store, "consumer")
+    assert checkpoint.load() is None
+
+    checkpoint.save(stream)
+    assert checkpoint.load() == stream.token
+
+    checkpoint.reset()
+    assert checkpoint.load() is None
+    assert store.load("consumer") is None
+
+
+def test_checkpoint_every(store, stream):
+    store.save = Mock(wraps=store.save)
+    checkpoint = StreamCheckpointer(store, "consumer", checkpoint_every=3)
+
+    checkpoint.step(stream)
+    checkpoint.step(stream, consumed=0)
+    checkpoint.step(stream)
+    store.save.assert_not_called()
+    assert checkpoint.pending == 2
+
+    checkpoint.step(stream)
+    store.save.assert_called_once_with("consumer", stream.token)
+    assert checkpoint.pending == 0
+
+
+def test_checkpoint_interval(store, stream, monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("bloop.stream.checkpoint.time.monotonic", lambda: now[0])
+    checkpoint = StreamCheckpointer(store, "consumer", checkpoint_interval=10)
+
+    checkpoint.step(stream)
+    assert store.load("consumer") is None
+
+    # Nothing pending, so an idle stream isn't checkpointed
+    now[0] = 200.0
+    checkpoint.pending = 0
+    checkpoint.step(stream, consumed=0)
+    assert store.load("consumer") is None
+
+    checkpoint.step(stream)
+    assert store.load("consumer") == stream.token
+
+
+def test_unchanged_token_not_saved(store, stream):
+    """Saving the same token twice only writes once"""
+    store.save = Mock(wraps=store.save)
+    checkpoint = StreamCheckpointer(store, "consumer", checkpoint_every=1)
+
+    checkpoint.step(stream)
+    checkpoint.step(stream)
+    assert store.save.call_count == 1
+
+    stream.token = {"stream_arn": "stream-arn", "active": ["shard-id"], "shards": [{"shard_id": "shard-id"}]}
+    checkpoint.step(stream)
+    assert store.save.call_count == 2
+
+
+def test_loaded_token_not_saved(store, stream):
+    """A token that was just loaded isn't written back"""
+    store.save("consumer", stream.token)
+    store.save = Mock(wraps=store.save)
+    checkpoint = StreamCheckpointer(store, "consumer")
+    checkpoint.load()
+
+    checkpoint.save(stream)
+    store.save.assert_not_called()
@@ -2,11 +2,17 @@ import collections
 import datetime
 import functools
 import logging
+import threading
 from unittest.mock import call
 
 import pytest
 
+from bloop.checkpoints import MemoryCheckpointStore
 from bloop.exceptions import InvalidPosition, InvalidStream, RecordsExpired
+from bloop.stream.buffer import RecordBuffer, ShardBuffer
+from bloop.stream.coordinator import Coordinator
+from bloop.stream.polling import PollingPolicy
+from bloop.stream.seek import SeekIndex
 from bloop.stream.shard import CALLS_TO_REACH_HEAD, Shard, last_iterator
 from bloop.util import ordered
 
@@ -121,6 +127,69 @@ def test_advance_pulls_from_all_active_shards(coordinator, session):
     assert [has_records, no_records] == coordinator.active
 
 
+def test_advance_polls_shards_concurrently(coordinator, session):
+    """With max_workers, every active shard is polled at the same time and all records are buffered."""
+    coordinator.max_workers = 3
+    shards = build_shards(3, session=session, stream_arn=coordinator.stream_arn)
+    for i, shard in enumerate(shards):
+        shard.iterator_id = "iterator-{}".format(i)
+    coordinator.active = list(shards)
+
+    # Each call blocks until all 3 shards are being polled at once; sequential polling would time out.
+    barrier = threading.Barrier(3, timeout=5)
+
+    def mock_get_stream_records(iterator_id):
+        barrier.wait()
+        return {"Records": [dynamodb_record_with(key=True, sequence_number=int(iterator_id[-1]))],
+                "NextShardIterator": iterator_id}
+    session.get_stream_records.side_effect = mock_get_stream_records
+
+    try:
+        coordinator.advance_shards()
+    finally:
+        coordinator.close()
+
+    assert len(coordinator.buffer) == 3
+    polled = {shard for _, shard in (coordinator.buffer.pop() for _ in range(3))}
+    assert polled == set(shards)
+    assert coordinator.active == shards
+    assert coordinator._executor is None
+
+
+def test_advance_concurrent_failure(coordinator, session):
+    """An exception from one shard is raised after the other shards finish, and nothing is buffered."""
+    coordinator.max_workers = 2
+    [fails, succeeds] = build_shards(2, session=session, stream_arn=coordinator.stream_arn)
+    fails.iterator_id = "fails"
+    succeeds.iterator_id = "succeeds"
+    coordinator.active = [fails, succeeds]
+
+    def mock_get_stream_records(iterator_id):
+        if iterator_id == "fails":
+            raise RecordsExpired
+        return {"Records": [dynamodb_record_with(key=True)], "NextShardIterator": "next"}
+    session.get_stream_records.side_effect = mock_get_stream_records
+
+    with pytest.raises(RecordsExpired):
+        coordinator.advance_shards()
+    coordinator.close()
+    assert succeeds.iterator_id == "next"
+    assert not coordinator.buffer
+
+
+def test_single_shard_polls_inline(coordinator, shard, session):
+    """No thread pool is started when there's only one shard to poll."""
+    coordinator.max_workers = 4
+    shard.iterator_id = "iterator-id"
+    coordinator.active.append(shard)
+    session.get_stream_records.return_value = {
+        "Records": [dynamodb_record_with(key=True)], "NextShardIterator": "next"}
+
+    coordinator.advance_shards()
+    assert coordinator.buffer
+    assert coordinator._executor is None
+
+
 def test_buffer_closed_records(coordinator, session):
     """
     When a shard is closed, the last set of records is still buffered even though the shard is no longer tracked.
@@ -165,6 +234,123 @@ def test_buffer_closed_records(coordinator, session):
     assert not coordinator.closed
 
 
+def test_next_batch(coordinator, session):
+    """next_batch pops records from every shard in order, and updates each shard's position once"""
+    [first, second] = build_shards(2, session=session, stream_arn=coordinator.stream_arn)
+    coordinator.active = [first, second]
+    now = datetime.datetime.now(datetime.timezone.utc)
+    coordinator.buffer.push_all((local_record(now, str(i)), first) for i in range(0, 6, 2))
+    coordinator.buffer.push_all((local_record(now, str(i)), second) for i in range(1, 6, 2))
+
+    batch = coordinator.next_batch(4)
+    assert [record["meta"]["sequence_number"] for record in batch] == ["0", "1", "2", "3"]
+    assert (first.iterator_type, first.sequence_number) == ("after_sequence", "2")
+    assert (second.iterator_type, second.sequence_number) == ("after_sequence", "3")
+
+    # Only what's left in the buffer; shards aren't polled until it drains
+    batch = coordinator.next_batch(4)
+    assert [record["meta"]["sequence_number"] for record in batch] == ["4", "5"]
+    session.get_stream_records.assert_not_called()
+
+
+def test_next_batch_closed_records(coordinator, session):
+    """Closed shards are tracked until the batch that drains them"""
+    closed_shard = Shard(
+        stream_arn=coordinator.stream_arn,
+        shard_id="closed-shard-id",
+        iterator_id="closed-iter-id",
+        session=session)
+    coordinator.active = [closed_shard]
+    session.get_stream_records.return_value = {
+        "Records": [dynamodb_record_with(sequence_number=i, key=True) for i in range(3)]
+    }
+    session.describe_stream.return_value = {"Shards": [], "StreamArn": coordinator.stream_arn}
+
+    assert len(coordinator.next_batch(2)) == 2
+    assert coordinator.closed[closed_shard] == 1
+    assert len(coordinator.next_batch(2)) == 1
+    assert not coordinator.closed
+    assert coordinator.next_batch(2) == []
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("bloop.stream.coordinator.time.monotonic", lambda: now[0])
+    return now
+
+
+def test_polling_backs_off_idle_shards(coordinator, session, clock):
+    """A shard that returns nothing isn't polled again until it's due, and is polled right away after records"""
+    coordinator.polling = PollingPolicy(min_interval=1, max_interval=4)
+    [idle, busy] = build_shards(2, session=session, stream_arn=coordinator.stream_arn)
+    coordinator.active = [idle, busy]
+    idle.iterator_id, busy.iterator_id = "idle", "busy"
+    # Both shards are at HEAD, so each poll is a single call
+    idle.empty_responses = busy.empty_responses = CALLS_TO_REACH_HEAD
+    responses = {"idle": [], "busy": []}
+
+    def get_stream_records(iterator_id):
+        records = responses[iterator_id]
+        responses[iterator_id] = []
+        return {"Records": records, "NextShardIterator": iterator_id}
+    session.get_stream_records.side_effect = get_stream_records
+    polled = lambda: [c[0][0] for c in session.get_stream_records.call_args_list]
+
+    assert coordinator.wait_time() == 0
+    assert next(coordinator) is None
+    assert polled() == ["idle", "busy"]
+    assert coordinator.wait_time() == 1
+
+    # Not due yet
+    clock[0] += 0.5
+    assert next(coordinator) is None
+    assert len(polled()) == 2
+    assert coordinator.wait_time() == 0.5
+
+    # Both due; the busy shard finds records
+    clock[0] += 0.5
+    responses["busy"] = [dynamodb_record_with(key=True, sequence_number=1)]
+    assert next(coordinator)["meta"]["sequence_number"] == "1"
+    assert len(polled()) == 4
+
+    # Idle shard backed off to 2s, busy shard is due immediately
+    assert next(coordinator) is None
+    assert polled()[4:] == ["busy"]
+    assert coordinator.wait_time() == 1
+
+
+def test_wait_time(coordinator, shard, clock):
+    """No waiting without a policy or when records are buffered"""
+    coordinator.active.append(shard)
+    coordinator._schedule[shard] = (1, clock[0] + 5)
+    assert coordinator.wait_time() == 0
+
+    coordinator.polling = PollingPolicy(max_interval=3)
+    assert coordinator.wait_time() == 5
+
+    coordinator.buffer.push(local_record(sequence_number="1"), shard)
+    assert coordinator.wait_time() == 0
+
+    coordinator.buffer.clear()
+    coordinator.active.clear()
+    assert coordinator.wait_time() == 3
+
+
+def test_schedule_cleared(coordinator, shard, session):
+    """Removing a shard or moving the stream forgets when shards are due"""
+    coordinator.polling = PollingPolicy()
+    coordinator.active.append(shard)
+    coordinator._schedule[shard] = (1, 0.0)
+    coordinator.remove_shard(shard)
+    assert not coordinator._schedule
+
+    coordinator._schedule[shard] = (1, 0.0)
+    session.describe_stream.return_value = {"Shards": []}
+    coordinator.move_to("latest")
+    assert not coordinator._schedule
+
+
 @pytest.mark.parametrize("has_children, loads_children", [(True, False), (False, False), (False, True)])
 def test_advance_removes_exhausted(has_children, loads_children, coordinator, shard, session):
     """Exhausted shards are removed; any children are promoted, and reset to trim_horizon"""
@@ -273,6 +459,95 @@ def test_heartbeat(coordinator, session):
     assert sequence_numbers == ["0", "1", "2"]
 
 
+@pytest.mark.parametrize("ordering, buffer_cls", [("total", RecordBuffer), ("shard", ShardBuffer)])
+def test_ordering_buffer(session, ordering, buffer_cls):
+    coordinator = Coordinator(session=session, stream_arn="stream-arn", ordering=ordering)
+    assert coordinator.ordering == ordering
+    assert isinstance(coordinator.buffer, buffer_cls)
+
+
+def test_unknown_ordering(session):
+    with pytest.raises(ValueError):
+        Coordinator(session=session, stream_arn="stream-arn", ordering="key")
+
+
+def test_shard_ordering_parent_before_child(session):
+    """Per-shard ordering still returns every record from a closed parent before any from its children"""
+    coordinator = Coordinator(session=session, stream_arn="stream-arn", ordering="shard")
+    parent, child = build_shards(2, {0: 1}, session=session, stream_arn="stream-arn")
+    parent.iterator_id = "parent-iterator"
+    coordinator.roots.append(parent)
+    coordinator.active.append(parent)
+    session.get_shard_iterator.return_value = "child-iterator"
+    old = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(hours=1)
+    responses = {
+        # The parent's last page closes the shard
+        "parent-iterator": {"Records": [
+            dynamodb_record_with(key=True, sequence_number=i, creation_time=old) for i in range(3)]},
+        "child-iterator": {
+            "Records": [dynamodb_record_with(key=True, sequence_number=10)], "NextShardIterator": "child-next"},
+    }
+    session.get_stream_records.side_effect = lambda iterator_id: responses[iterator_id]
+
+    first = next(coordinator)
+    assert coordinator.active == [child]
+    assert coordinator.closed == {parent: 2}
+    # Polling the child's trim_horizon iterator before the parent's records are consumed
+    coordinator.heartbeat()
+    assert len(coordinator.buffer) == 3
+
+    records = [first] + coordinator.next_batch(10)
+    assert [record["meta"]["sequence_number"] for record in records] == ["0", "1", "2", "10"]
+    assert not coordinator.closed
+    assert (parent.sequence_number, child.sequence_number) == ("2", "10")
+
+
+def test_shard_metrics(coordinator, session):
+    active, closed = build_shards(2, session=session, stream_arn=coordinator.stream_arn)
+    active.iterator_id = "iterator-id"
+    coordinator.active.append(active)
+    closed.iterator_id = last_iterator
+    coordinator.buffer.push(local_record(created_at=datetime.datetime.now(datetime.timezone.utc)), closed)
+    coordinator.closed[closed] = 1
+    [page] = build_get_records_responses(2)
+    page["NextShardIterator"] = "more"
+    responses = iter([page])
+    session.get_stream_records.side_effect = lambda _: next(responses, {"NextShardIterator": "more"})
+
+    active_metrics, closed_metrics = coordinator.shard_metrics()
+    assert closed_metrics["shard_id"] == "shard-id-1"
+    assert closed_metrics["iterator_age"] is None
+    assert closed_metrics["buffered"] == 1
+    assert closed_metrics["lag"] is None
+    # Nothing polled or consumed yet
+    assert active_metrics["get_records_calls"] == 0
+    assert active_metrics["lag"] is None
+
+    # The closed shard's record is consumed first, then one poll of the active shard finds two records
+    next(coordinator), next(coordinator)
+    [active_metrics] = coordinator.shard_metrics()
+    assert active_metrics["shard_id"] == "shard-id-0"
+    assert active_metrics["records_fetched"] == 2
+    assert active_metrics["get_records_calls"] == 1
+    assert active_metrics["empty_responses"] == 0
+    assert active_metrics["get_records_latency"]["count"] == 1
+    assert 0 <= active_metrics["iterator_age"] < 60
+    assert active_metrics["buffered"] == 1
+    # The consumed record was created in 2016
+    assert active_metrics["lag"] > 300 * 24 * 60 * 60
+
+    # Draining the shard and finding nothing new means it's caught up
+    next(coordinator)
+    assert next(coordinator) is None
+    [active_metrics] = coordinator.shard_metrics(reset=True)
+    assert active_metrics["get_records_calls"] == 1 + CALLS_TO_REACH_HEAD
+    assert active_metrics["empty_responses"] == CALLS_TO_REACH_HEAD
+    assert active_metrics["lag"] == 0.0
+    [active_metrics] = coordinator.shard_metrics()
+    assert active_metrics["get_records_calls"] == 0
+    assert active_metrics["get_records_latency"]["count"] == 0
+
+
 def test_heartbeat_until_sequence_number(coordinator, session):
     """After heartbeat() finds records for a shard, the shard doesn't check during the next heartbeat."""
     shard = Shard(stream_arn=coordinator.stream_arn, shard_id="shard-id", session=session,
@@ -368,6 +643,37 @@ def test_token_closed_records(coordinator, session):
     }
 
 
+def test_token_reuses_shard_trees(coordinator, session, monkeypatch):
+    """Shard trees are only walked again after they change, and consumed records still move the token"""
+    shards = build_shards(3, {0: [1, 2]}, session=session, stream_arn=coordinator.stream_arn)
+    coordinator.roots = [shards[0]]
+    coordinator.active = [shards[1], shards[2]]
+    walks = 0
+    walk_tree = Shard.walk_tree
+
+    def counting_walk(shard):
+        nonlocal walks
+        walks += 1
+        return walk_tree(shard)
+    monkeypatch.setattr(Shard, "walk_tree", counting_walk)
+
+    coordinator.token
+    coordinator.buffer.push_all((local_record(sequence_number=str(i)), shards[1]) for i in range(3))
+    coordinator.next_batch(2)
+    shards[2].jump_to(iterator_type="at_sequence", sequence_number="7")
+    token = coordinator.token
+    assert walks == 1
+    assert token["shards"] == [
+        {"shard_id": "shard-id-0"},
+        {"shard_id": "shard-id-1", "parent": "shard-id-0", "iterator_type": "after_sequence", "sequence_number": "1"},
+        {"shard_id": "shard-id-2", "parent": "shard-id-0", "iterator_type": "at_sequence", "sequence_number": "7"},
+    ]
+
+    coordinator.remove_shard(shards[0])
+    assert [shard["shard_id"] for shard in coordinator.token["shards"]] == ["shard-id-1", "shard-id-2"]
+    assert walks == 3
+
+
 @pytest.mark.parametrize("is_active", [True, False])
 @pytest.mark.parametrize("is_root", [True, False])
 @pytest.mark.parametrize("has_buffered", [True, False])
@@ -402,6 +708,22 @@ def test_remove_shard(is_active, is_root, has_buffered, coordinator):
         assert record_shard is not shard
 
 
+def test_remove_closed_shard(coordinator):
+    """Dropping a closed shard's buffered records stops tracking it, so it leaves the token."""
+    shard = Shard(stream_arn=coordinator.stream_arn, shard_id="closed-shard-id",
+                  iterator_type="at_sequence", sequence_number="13")
+    coordinator.buffer.push_all((local_record(sequence_number=str(i)), shard) for i in range(3))
+    coordinator.closed[shard] = 3
+
+    coordinator.remove_shard(shard)
+    assert coordinator.closed[shard] == 3
+
+    coordinator.remove_shard(shard, drop_buffered_records=True)
+    assert not coordinator.closed
+    assert not coordinator.buffer
+    assert coordinator.token["active"] == []
+
+
 def test_move_to_old_token(coordinator, shard, session, caplog):
     """Can't rebuild from a token with shards that have no connection to the current generation"""
     root = Shard(stream_arn=coordinator.stream_arn, shard_id="parent-shard")
@@ -537,7 +859,7 @@ def test_move_to_datetime(coordinator, session):
 
     # 0 -> 1
     #   -> 2 -> 3
-    #           ^ Never searched for a record, since record is found in 2
+    #           ^ Only the first page is read, to see if 2 closed before the position
     description = stream_description(4, {0: [1, 2], 2: 3}, stream_arn=coordinator.stream_arn)
     # No shards in the root, and it's exhausted
     root_id = "shard-id-0"
@@ -545,6 +867,8 @@ def test_move_to_datetime(coordinator, session):
     fail_to_seek = "shard-id-1"
     # Shards in the other child, and it's still open
     find_records = "shard-id-2"
+    # Child of find_records, whose first record is after the position
+    grandchild = "shard-id-3"
 
     # Hand back the same iterator id for fail_to_seek to simplify responses table
     continue_response = {"Records": [], "NextShardIterator": fail_to_seek}
@@ -552,6 +876,10 @@ def test_move_to_datetime(coordinator, session):
         key=True,
         sequence_number="345",
         creation_time=position + datetime.timedelta(hours=1))
+    later_record = dynamodb_record_with(
+        key=True,
+        sequence_number="678",
+        creation_time=position + datetime.timedelta(hours=2))
 
     responses = {
         # Shard 0 will immediately exhaust without finding records
@@ -560,6 +888,8 @@ def test_move_to_datetime(coordinator, session):
         fail_to_seek: [continue_response] * CALLS_TO_REACH_HEAD,
         # Shard 2 will find a record, and stay open.
         find_records: [{"Records": [record], "NextShardIterator": "not-followed-iterator-id"}],
+        # Shard 3 starts after the position, so shard 2 has to be searched.
+        grandchild: [{"Records": [later_record], "NextShardIterator": "not-followed-iterator-id"}],
     }
 
     # Fixed description, should be called once
@@ -583,15 +913,17 @@ def test_move_to_datetime(coordinator, session):
     assert {shard.shard_id for shard in coordinator.roots} == {fail_to_seek, find_records}
 
     # Remote calls: 1 DescribeStream at the beginning: stream moves to trim_horizon
-    #               4 GetShardIterator: 2 for root shard (stream jump to trim_horizon, shard jump to trim_horizon)
-    #                                   1 for find_records (seek_to jumps to trim_horizon)
-    #                                   1 for fail_to_seek (seek_to jumps to trim_horizon)
-    #               7 GetRecords: 1 for exhausted root (when the stream moves to trim_horizon)
+    #               5 GetShardIterator: 2 for root shard (stream jump to trim_horizon, shard jump to trim_horizon)
+    #                                   1 for find_records (first page while checking the root)
+    #                                   1 for fail_to_seek (first page while checking the root)
+    #                                   1 for grandchild (first page while checking find_records)
+    #               8 GetRecords: 1 for exhausted root (when the stream moves to trim_horizon)
     #                             1 for find_records shard
     #                             5 for fail_to_seek, which is still open
+    #                             1 for grandchild
     session.describe_stream.assert_called_once_with(stream_arn=coordinator.stream_arn)
-    assert session.get_shard_iterator.call_count == 4
-    for shard_id in {root_id, fail_to_seek, find_records}:
+    assert session.get_shard_iterator.call_count == 5
+    for shard_id in {root_id, fail_to_seek, find_records, grandchild}:
         session.get_shard_iterator.assert_any_call(
             stream_arn=coordinator.stream_arn,
             shard_id=shard_id,
@@ -605,14 +937,165 @@ def test_move_to_datetime(coordinator, session):
     # We don't need to check the length of call args or call kwargs, because the side_effect only takes one arg.
     args = [c[0][0] for c in session.get_stream_records.call_args_list]
     calls_with_counts = collections.Counter(args)
-    # Doesn't contain the child shard of find_records, because it was never searched.
+    # The child shard of find_records is only read once, to check when it starts.
     assert calls_with_counts == {
         root_id: 1,
         find_records: 1,
-        fail_to_seek: CALLS_TO_REACH_HEAD
+        fail_to_seek: CALLS_TO_REACH_HEAD,
+        grandchild: 1,
     }
 
 
+def test_move_to_datetime_skips_closed_shards(coordinator, session):
+    """A shard whose child has records from before the position is never read"""
+    position = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(hours=2)
+    # 0 -> 1
+    session.describe_stream.return_value = stream_description(2, {0: 1}, stream_arn=coordinator.stream_arn)
+    session.get_shard_iterator.side_effect = lambda shard_id, **kwargs: shard_id
+    before = dynamodb_record_with(key=True, sequence_number="1", creation_time=position - datetime.timedelta(hours=1))
+    after = dynamodb_record_with(key=True, sequence_number="2", creation_time=position + datetime.timedelta(hours=1))
+    session.get_stream_records.return_value = {"Records": [before, after], "NextShardIterator": "next-iterator-id"}
+
+    coordinator.move_to(position)
+
+    # The child's first page is read once, and reused to find the record after the position
+    session.get_stream_records.assert_called_once_with("shard-id-1")
+    assert session.get_shard_iterator.call_count == 2
+    record, shard = coordinator.buffer.pop()
+    assert record["meta"]["sequence_number"] == "2"
+    assert not coordinator.buffer
+    assert [shard.shard_id for shard in coordinator.active] == ["shard-id-1"]
+    assert [shard.shard_id for shard in coordinator.roots] == ["shard-id-1"]
+
+
+def test_move_to_datetime_starts_deep_trees_late(coordinator, session):
+    """The shards of a deep tree that closed long before the position are never read"""
+    position = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(hours=5)
+    # 0 -> 1 -> 2 -> 3 -> 4
+    session.describe_stream.return_value = stream_description(
+        5, {0: 1, 1: 2, 2: 3, 3: 4}, stream_arn=coordinator.stream_arn)
+    session.get_shard_iterator.side_effect = lambda shard_id, **kwargs: shard_id
+    before = dynamodb_record_with(key=True, sequence_number="1", creation_time=position - datetime.timedelta(hours=1))
+    after = dynamodb_record_with(key=True, sequence_number="2", creation_time=position + datetime.timedelta(hours=1))
+    session.get_stream_records.return_value = {"Records": [before, after], "NextShardIterator": "next-iterator-id"}
+
+    coordinator.move_to(position)
+
+    # Two shard lifetimes back from the leaf is shard 2, which has a record before the position
+    read = [call[0][0] for call in session.get_stream_records.call_args_list]
+    assert read == ["shard-id-2", "shard-id-3", "shard-id-4"]
+    record, shard = coordinator.buffer.pop()
+    assert record["meta"]["sequence_number"] == "2"
+    assert [shard.shard_id for shard in coordinator.active] == ["shard-id-4"]
+    assert [shard.shard_id for shard in coordinator.roots] == ["shard-id-4"]
+
+
+def test_move_to_datetime_open_shard_children(coordinator, session):
+    """The children of a shard that isn't closed aren't read to check if it can be skipped"""
+    position = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(hours=2)
+    # 0 -> 1, but 0 has no ending sequence number
+    description = stream_description(2, {0: 1}, stream_arn=coordinator.stream_arn)
+    del description["Shards"][0]["SequenceNumberRange"]["EndingSequenceNumber"]
+    session.describe_stream.return_value = description
+    session.get_shard_iterator.side_effect = lambda shard_id, **kwargs: shard_id
+    after = dynamodb_record_with(key=True, sequence_number="2", creation_time=position + datetime.timedelta(hours=1))
+    session.get_stream_records.return_value = {"Records": [after], "NextShardIterator": "next-iterator-id"}
+
+    coordinator.move_to(position)
+
+    session.get_stream_records.assert_called_once_with("shard-id-0")
+    record, shard = coordinator.buffer.pop()
+    assert shard.shard_id == "shard-id-0"
+
+
+def test_move_to_datetime_past_retention(coordinator, session):
+    """Every record in the stream is after a position older than the retention period"""
+    session.describe_stream.return_value = stream_description(2, {0: 1}, stream_arn=coordinator.stream_arn)
+
+    coordinator.move_to(datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(hours=25))
+
+    session.get_stream_records.assert_not_called()
+    session.get_shard_iterator.assert_called_once_with(
+        stream_arn=coordinator.stream_arn, shard_id="shard-id-0", iterator_type="trim_horizon", sequence_number=None)
+    assert [shard.shard_id for shard in coordinator.active] == ["shard-id-0"]
+
+
+def test_move_to_datetime_seek_index(coordinator, session):
+    """The seek index skips closed shards without reading children, and starts shards close to the position"""
+    position = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(hours=2)
+    index = SeekIndex(MemoryCheckpointStore(), "index")
+    index.mark("shard-id-1", position - datetime.timedelta(hours=1), "1")
+    index.mark("shard-id-1", position - datetime.timedelta(minutes=5), "100")
+    coordinator.seek_index = index
+
+    # 0 -> 1
+    session.describe_stream.return_value = stream_description(2, {0: 1}, stream_arn=coordinator.stream_arn)
+    session.get_shard_iterator.side_effect = lambda shard_id, **kwargs: shard_id
+    after = dynamodb_record_with(
+        key=True, sequence_number="101", creation_time=position + datetime.timedelta(minutes=1))
+    session.get_stream_records.return_value = {"Records": [after], "NextShardIterator": "next-iterator-id"}
+
+    coordinator.move_to(position)
+
+    session.get_stream_records.assert_called_once_with("shard-id-1")
+    session.get_shard_iterator.assert_called_with(
+        stream_arn=coordinator.stream_arn, shard_id="shard-id-1", iterator_type="at_sequence", sequence_number="100")
+    record, _ = coordinator.buffer.pop()
+    assert record["meta"]["sequence_number"] == "101"
+
+
+def test_move_to_datetime_parallel(coordinator, session):
+    """Shard trees are searched concurrently"""
+    coordinator.max_workers = 2
+    position = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(hours=2)
+    session.describe_stream.return_value = stream_description(2, stream_arn=coordinator.stream_arn)
+    session.get_shard_iterator.side_effect = lambda shard_id, **kwargs: shard_id
+    barrier = threading.Barrier(2, timeout=5)
+
+    def mock_get_stream_records(iterator_id):
+        barrier.wait()
+        record = dynamodb_record_with(
+            key=True, sequence_number=iterator_id[-1], creation_time=position + datetime.timedelta(minutes=1))
+        return {"Records": [record], "NextShardIterator": "next-iterator-id"}
+    session.get_stream_records.side_effect = mock_get_stream_records
+
+    try:
+        coordinator.move_to(position)
+    finally:
+        coordinator.close()
+    found = {shard.shard_id for _, shard in (coordinator.buffer.pop() for _ in range(2))}
+    assert found == {"shard-id-0", "shard-id-1"}
+
+
+def test_next_marks_seek_index(coordinator, shard):
+    """Consumed records are marked in the seek index, which is saved when the coordinator closes"""
+    store = MemoryCheckpointStore()
+    coordinator.seek_index = SeekIndex(store, "index")
+    coordinator.active.append(shard)
+    created_at = datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
+    coordinator.buffer.push(local_record(created_at, sequence_number="25"), shard)
+
+    next(coordinator)
+    assert coordinator.seek_index.lookup(shard.shard_id, created_at + datetime.timedelta(seconds=1)) == "25"
+
+    store.checkpoints.clear()
+    coordinator.close()
+    assert store.load("index") == {shard.shard_id: [[int(created_at.timestamp()), "25"]]}
+
+
+def test_next_batch_marks_seek_index(coordinator, shard):
+    store = MemoryCheckpointStore()
+    coordinator.seek_index = SeekIndex(store, "index", resolution=1)
+    coordinator.active.append(shard)
+    created_at = datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
+    for i in range(3):
+        coordinator.buffer.push(local_record(created_at + datetime.timedelta(seconds=i), str(i)), shard)
+
+    coordinator.next_batch(3)
+    # Every record is marked, not just the last in each shard
+    assert coordinator.seek_index.lookup(shard.shard_id, created_at + datetime.timedelta(seconds=2)) == "1"
+
+
 def test_move_to_trim_horizon(coordinator, session):
     """Moving to the trim_horizon clears existing state and adds new shards"""
     # All of these should be cleaned up entirely
@@ -623,6 +1106,8 @@ def test_move_to_trim_horizon(coordinator, session):
     coordinator.roots.extend((previous_shards[0], previous_shards[2]))
     coordinator.active.append(previous_shards[1])
     coordinator.buffer.push(local_record(), previous_shards[1])
+    coordinator.buffer.push(local_record(), previous_shards[0])
+    coordinator.closed[previous_shards[0]] = 1
 
     # -----------
     # 0 -> 1 -> 2
@@ -656,6 +1141,7 @@ def test_move_to_trim_horizon(coordinator, session):
     assert all(shard not in coordinator.active for shard in previous_shards)
     assert all(shard not in coordinator.roots for shard in previous_shards)
     assert not coordinator.buffer
+    assert not coordinator.closed
 
     # Current local state; trim_horizon sets roots to active
     assert set(s.shard_id for s in coordinator.active) == set(expected_active_ids)
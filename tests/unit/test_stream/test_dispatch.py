@@ -0,0 +1,78 @@
+import pytest
+
+from bloop.models import BaseModel, Column
+from bloop.stream.dispatch import StreamDispatcher, raw_value
+from bloop.types import String
+
+
+class Customer(BaseModel):
+    pk = Column(String, hash_key=True)
+    kind = Column(String, dynamo_name="type")
+
+
+class Order(BaseModel):
+    pk = Column(String, hash_key=True)
+
+
+class LineItem(BaseModel):
+    pk = Column(String, hash_key=True)
+
+
+def record(new=None, old=None, key=None):
+    return {"new": new, "old": old, "key": key, "meta": {}}
+
+
+@pytest.mark.parametrize("kwargs", [{}, {"attribute": "type", "key_prefix": "pk"}])
+def test_requires_one_selector(kwargs):
+    with pytest.raises(ValueError):
+        StreamDispatcher({}, **kwargs)
+
+
+def test_repr():
+    assert repr(StreamDispatcher({}, attribute=Customer.kind)) == "<StreamDispatcher[attribute='type']>"
+    assert repr(StreamDispatcher({}, key_prefix="pk")) == "<StreamDispatcher[key_prefix='pk']>"
+
+
+def test_all_models():
+    dispatch = StreamDispatcher({"a": Customer, "b": Order, "c": Customer}, attribute="type", default=LineItem)
+    assert dispatch.all_models == [Customer, Order, Customer, LineItem]
+
+
+def test_attribute():
+    """The attribute is read from the new image, then the old image, then the key"""
+    dispatch = StreamDispatcher({"customer": Customer, "order": Order}, attribute=Customer.kind)
+
+    assert dispatch.model_for(record(new={"type": {"S": "customer"}}, old={"type": {"S": "order"}})) is Customer
+    assert dispatch.model_for(record(old={"type": {"S": "order"}})) is Order
+    assert dispatch.model_for(record(key={"type": {"S": "order"}})) is Order
+    assert dispatch.model_for(record(new={"type": {"S": "unknown"}})) is None
+    assert dispatch.model_for(record(new={"pk": {"S": "order"}})) is None
+
+
+def test_key_prefix_longest_match():
+    dispatch = StreamDispatcher({"ORDER#": Order, "ORDER#ITEM#": LineItem}, key_prefix=Order.pk)
+
+    assert dispatch.model_for(record(key={"pk": {"S": "ORDER#1"}})) is Order
+    assert dispatch.model_for(record(key={"pk": {"S": "ORDER#ITEM#1"}})) is LineItem
+    assert dispatch.model_for(record(key={"pk": {"S": "CUSTOMER#1"}})) is None
+    # Non-string keys never match a prefix
+    assert dispatch.model_for(record(key={"pk": {"N": "3"}})) is None
+
+
+def test_default():
+    dispatch = StreamDispatcher({"ORDER#": Order}, key_prefix="pk", default=Customer)
+    assert dispatch.model_for(record(key={"pk": {"S": "CUSTOMER#1"}})) is Customer
+    assert dispatch.model_for(record(key=None)) is Customer
+
+    dispatch = StreamDispatcher({"order": Order}, attribute="type", default=Customer)
+    assert dispatch.model_for(record()) is Customer
+
+
+@pytest.mark.parametrize("attrs, expected", [
+    (None, None),
+    ({}, None),
+    ({"type": {"S": "user"}}, "user"),
+    ({"type": {"N": "3"}}, "3"),
+])
+def test_raw_value(attrs, expected):
+    assert raw_value(attrs, "type") == expected
@@ -0,0 +1,96 @@
+import pytest
+
+from bloop.models import BaseModel, Column
+from bloop.stream.filter import StreamFilter
+from bloop.types import Binary, Integer, String
+
+
+class Email(BaseModel):
+    class Meta:
+        stream = {
+            "include": {"new", "old"},
+            "arn": "stream-arn"
+        }
+    id = Column(Integer, hash_key=True)
+    data = Column(String, dynamo_name="d")
+    attachment = Column(Binary)
+
+
+def raw_record(event="modify", id=1, new=None, old=None):
+    return {
+        "key": {"id": {"N": str(id)}},
+        "new": None if new is None else {"id": {"N": str(id)}, "d": {"S": new}},
+        "old": None if old is None else {"id": {"N": str(id)}, "d": {"S": old}},
+        "meta": {"event": {"type": event}},
+    }
+
+
+@pytest.fixture
+def compile(engine):
+    engine.bind(Email)
+    return lambda spec: spec.compile(Email, engine)
+
+
+def test_unknown_event():
+    with pytest.raises(ValueError):
+        StreamFilter(events={"insert", "update"})
+
+
+def test_repr():
+    assert repr(StreamFilter()) == "<StreamFilter[]>"
+    spec = StreamFilter(events=["remove", "insert"], new=Email.data == "x")
+    assert repr(spec) == "<StreamFilter[events=['insert', 'remove'], new]>"
+
+
+def test_empty_filter_matches_everything(compile):
+    matches = compile(StreamFilter())
+    assert matches(raw_record("insert")) and matches(raw_record("remove"))
+
+
+def test_events(compile):
+    matches = compile(StreamFilter(events={"modify"}))
+    assert matches(raw_record("modify"))
+    assert not matches(raw_record("insert"))
+
+
+def test_key_predicate(compile):
+    """The predicate gets loaded key values by column name"""
+    seen = []
+
+    def predicate(key):
+        seen.append(key)
+        return key["id"] > 10
+    matches = compile(StreamFilter(key=predicate))
+
+    assert not matches(raw_record(id=3))
+    assert matches(raw_record(id=11))
+    assert seen == [{"id": 3}, {"id": 11}]
+
+
+def test_image_conditions(compile):
+    """Conditions use the model's dynamo names against the raw images"""
+    matches = compile(StreamFilter(new=Email.data.begins_with("admin"), old=Email.data != "admin-x"))
+
+    assert matches(raw_record(new="admin-y", old="user"))
+    assert not matches(raw_record(new="user", old="user"))
+    assert not matches(raw_record(new="admin-y", old="admin-x"))
+    # Missing images don't match
+    assert not matches(raw_record(new="admin-y"))
+    assert not matches(raw_record(old="user"))
+
+
+def test_all_parts_must_match(compile):
+    matches = compile(StreamFilter(events={"insert"}, new=Email.data == "x"))
+    assert matches(raw_record("insert", new="x"))
+    assert not matches(raw_record("modify", new="x"))
+    assert not matches(raw_record("insert", new="y"))
+
+
+def test_binary_condition(compile):
+    """Rendered binary values are str, but the record's images from botocore hold bytes"""
+    matches = compile(StreamFilter(new=Email.attachment == b"\x00\xff"))
+    record = raw_record(new="x")
+    record["new"]["attachment"] = {"B": b"AP8="}
+    assert matches(record)
+    record["new"]["attachment"] = {"B": b"AA=="}
+    assert not matches(record)
@@ -0,0 +1,210 @@
+import pytest
+
+from bloop import Engine
+from bloop.memory import MemoryDynamoDB
+from bloop.stream.coordinator import Coordinator
+from bloop.stream.lease import LeaseCoordinator, default_lease_model, to_datetime
+from bloop.stream.polling import PollingPolicy
+
+from . import build_shards, dynamodb_record_with, local_record
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1577836800.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def lease_engine():
+    dynamodb = MemoryDynamoDB()
+    return Engine(dynamodb=dynamodb, dynamodbstreams=dynamodb.streams)
+
+
+@pytest.fixture
+def session(session):
+    session.get_shard_iterator.side_effect = lambda *, shard_id, **_: shard_id + "-iterator"
+    return session
+
+
+@pytest.fixture
+def new_worker(lease_engine, session, clock):
+    """Each worker has its own coordinator and copy of the shard tree, like separate processes would"""
+    def new_worker(worker_id, n=4, shape=None):
+        leases = LeaseCoordinator(lease_engine, "group", worker_id=worker_id, clock=clock)
+        coordinator = Coordinator(session=session, stream_arn="stream-arn", leases=leases)
+        shards = build_shards(n, shape, session=session, stream_arn="stream-arn")
+        coordinator.roots.extend(shard for shard in shards if not shard.parent)
+        coordinator.active.extend(coordinator.roots)
+        return coordinator
+    return new_worker
+
+
+def owned(coordinator):
+    return sorted(coordinator.leases.owned)
+
+
+def lease_rows(engine):
+    model = default_lease_model()
+    return {lease.shard_id: lease for lease in engine.query(model, key=model.group == "group", consistent=True)}
+
+
+def test_invalid_duration(lease_engine):
+    with pytest.raises(ValueError):
+        LeaseCoordinator(lease_engine, "group", lease_duration=0)
+
+
+def test_repr(lease_engine):
+    leases = LeaseCoordinator(lease_engine, "group", worker_id="worker")
+    assert repr(leases) == "<LeaseCoordinator[group/worker]>"
+    # default ids are unique
+    assert LeaseCoordinator(lease_engine, "group").worker_id != LeaseCoordinator(lease_engine, "group").worker_id
+
+
+def test_single_worker_claims_everything(new_worker, lease_engine, session, clock):
+    a = new_worker("a")
+    assert a.leases.due()
+    a.leases.sync(a)
+
+    assert owned(a) == ["shard-id-0", "shard-id-1", "shard-id-2", "shard-id-3"]
+    assert {lease.owner for lease in lease_rows(lease_engine).values()} == {"a"}
+    # Each claimed shard starts from a fresh iterator
+    assert session.get_shard_iterator.call_count == 4
+    assert a.active[0].iterator_type == "trim_horizon"
+
+    assert not a.leases.due()
+    assert a.leases.wait_time() == 10
+    clock.now += 10
+    assert a.leases.due()
+
+
+def test_rebalance_when_worker_joins(new_worker, lease_engine):
+    """A new worker takes one shard at a time from the busiest worker until they're balanced"""
+    a, b = new_worker("a"), new_worker("b")
+    a.leases.sync(a)
+
+    b.leases.sync(b)
+    assert len(owned(b)) == 1
+    b.leases.sync(b)
+    assert len(owned(b)) == 2
+    # Balanced, nothing more to take
+    b.leases.sync(b)
+    assert len(owned(b)) == 2
+
+    # a notices the leases it lost on the next renewal
+    stolen = owned(b)
+    a.buffer.push(local_record(sequence_number="1"), next(shard for shard in a.active if shard.shard_id == stolen[0]))
+    a.leases.sync(a)
+    assert not set(owned(a)) & set(stolen)
+    assert len(owned(a)) == 2
+    assert not a.buffer
+    assert {shard_id: lease.owner for shard_id, lease in lease_rows(lease_engine).items()} == {
+        **{shard_id: "a" for shard_id in owned(a)},
+        **{shard_id: "b" for shard_id in owned(b)},
+    }
+
+
+def test_expired_leases_claimed(new_worker, clock):
+    a, b = new_worker("a"), new_worker("b")
+    a.leases.sync(a)
+
+    clock.now += 31
+    b.leases.sync(b)
+    assert len(owned(b)) == 4
+
+    # a can't renew leases that were taken, and starts rebalancing like a new worker
+    a.leases.sync(a)
+    assert len(owned(a)) == 1
+    assert len(owned(b)) == 4
+
+
+def test_close_releases_with_checkpoint(new_worker, session):
+    """Closing saves each shard's position, and the next owner resumes after it"""
+    a, b = new_worker("a", n=1), new_worker("b", n=1)
+    a.leases.sync(a)
+    [shard] = a.active
+    shard.iterator_type, shard.sequence_number = "after_sequence", "5"
+
+    a.close()
+    assert not owned(a)
+
+    b.leases.sync(b)
+    assert owned(b) == ["shard-id-0"]
+    session.get_shard_iterator.assert_called_with(
+        stream_arn="stream-arn", shard_id="shard-id-0", iterator_type="after_sequence", sequence_number="5")
+
+
+def test_parent_before_child(new_worker, lease_engine):
+    """Children aren't claimed until their parent is finished, by any worker"""
+    a, b = new_worker("a", n=2, shape={0: 1}), new_worker("b", n=2, shape={0: 1})
+    a.leases.sync(a)
+    b.leases.sync(b)
+    assert owned(a) == ["shard-id-0"]
+    assert not owned(b)
+
+    # a reaches the end of the parent, but still has records buffered
+    [parent] = a.active
+    a.remove_shard(parent)
+    a.closed[parent] = 1
+    a.leases.sync(a)
+    assert owned(a) == ["shard-id-0"]
+    assert not lease_rows(lease_engine)["shard-id-0"].finished
+
+    # Once they're consumed, the parent is finished and the child can be claimed
+    del a.closed[parent]
+    a.leases.sync(a)
+    assert owned(a) == ["shard-id-1"]
+    assert lease_rows(lease_engine)["shard-id-0"].finished
+
+    # b stops tracking the finished parent, and leaves the child to a
+    b.leases.sync(b)
+    assert [shard.shard_id for shard in b.active] == ["shard-id-1"]
+    assert not owned(b)
+
+
+def test_coordinator_polls_owned_shards(new_worker, lease_engine, session, clock):
+    """The coordinator syncs leases when they're due, and only polls shards it holds"""
+    Lease = default_lease_model()
+    lease_engine.bind(Lease)
+    held_by_b = Lease(group="group", shard_id="shard-id-1", owner="b", counter=1, expires=to_datetime(clock.now + 30))
+    lease_engine.save(held_by_b)
+    a = new_worker("a", n=2)
+    session.get_stream_records.return_value = {
+        "Records": [dynamodb_record_with(key=True)], "NextShardIterator": "next-iterator"}
+
+    assert next(a)
+    assert owned(a) == ["shard-id-0"]
+    session.get_stream_records.assert_called_once_with("shard-id-0-iterator")
+
+
+def test_wait_time_for_leases(new_worker, clock):
+    """Without any shards to poll, the coordinator waits for the next lease sync"""
+    a, b = new_worker("a", n=1), new_worker("b", n=1)
+    a.polling = b.polling = PollingPolicy()
+    a.leases.sync(a)
+    b.leases.sync(b)
+    assert not owned(b)
+    assert b.wait_time() == 10
+
+    clock.now += 4
+    assert b.wait_time() == 6
+
+
+def test_move_to_resets_leases(new_worker, session):
+    a = new_worker("a", n=1)
+    a.leases.sync(a)
+    session.describe_stream.return_value = {"Shards": [{"ShardId": "shard-id-0"}]}
+
+    a.move_to("latest")
+    assert not owned(a)
+    assert a.leases.due()
+    # Reclaims its own lease
+    a.leases.sync(a)
+    assert owned(a) == ["shard-id-0"]
@@ -0,0 +1,168 @@
+import logging
+import time
+from unittest.mock import Mock
+
+import pytest
+
+from bloop.exceptions import RecordsExpired
+from bloop.stream.maintenance import StreamMaintenance
+from bloop.stream.shard import last_iterator
+
+from . import build_shards, dynamodb_record_with, stream_description
+
+
+@pytest.fixture
+def maintenance():
+    return StreamMaintenance()
+
+
+@pytest.fixture
+def shard(coordinator, session):
+    [shard] = build_shards(1, session=session, stream_arn="stream-arn")
+    shard.iterator_id = "old-iterator"
+    shard.iterator_type = "after_sequence"
+    shard.sequence_number = "5"
+    shard.iterator_issued = time.monotonic()
+    coordinator.roots.append(shard)
+    coordinator.active.append(shard)
+    return shard
+
+
+def age(shard, seconds):
+    shard.iterator_issued = time.monotonic() - seconds
+
+
+@pytest.mark.parametrize("kwargs", [{"interval": 0}, {"refresh_after": 0}, {"refresh_after": 15 * 60}])
+def test_invalid(kwargs):
+    with pytest.raises(ValueError):
+        StreamMaintenance(**kwargs)
+
+
+def test_repr(maintenance):
+    assert repr(maintenance) == "<StreamMaintenance[interval=60]>"
+
+
+def test_fresh_iterators_untouched(maintenance, coordinator, shard, session):
+    maintenance.maintain(coordinator)
+    session.get_shard_iterator.assert_not_called()
+    session.get_stream_records.assert_not_called()
+    session.describe_stream.assert_not_called()
+
+
+def test_refresh_continues_after_last_read(maintenance, coordinator, shard, session):
+    """The new iterator starts after the last record read, even if that record is still buffered"""
+    age(shard, 601)
+    shard.last_read = "7"
+    session.get_shard_iterator.return_value = "new-iterator"
+
+    maintenance.maintain(coordinator)
+    session.get_shard_iterator.assert_called_once_with(
+        stream_arn="stream-arn", shard_id="shard-id-0", iterator_type="after_sequence", sequence_number="7")
+    assert shard.iterator_id == "new-iterator"
+    assert time.monotonic() - shard.iterator_issued < 1
+    # The consumed position is unchanged
+    assert (shard.iterator_type, shard.sequence_number) == ("after_sequence", "5")
+
+
+def test_refresh_discarded_if_shard_moved(maintenance, coordinator, shard, session):
+    """The consumer polled the shard while the new iterator was being fetched"""
+    age(shard, 601)
+
+    def consumer_polled(**_):
+        shard.iterator_id = "polled-iterator"
+        return "new-iterator"
+    session.get_shard_iterator.side_effect = consumer_polled
+
+    maintenance.maintain(coordinator)
+    assert shard.iterator_id == "polled-iterator"
+
+
+def test_refresh_records_expired(maintenance, coordinator, shard, session, caplog):
+    age(shard, 601)
+    session.get_shard_iterator.side_effect = RecordsExpired
+
+    maintenance.maintain(coordinator)
+    assert shard.iterator_id == "old-iterator"
+    assert caplog.record_tuples == [
+        ("bloop.stream", logging.INFO, "can't refresh iterator for shard shard-id-0: records expired")]
+
+
+def test_relative_iterators_polled(maintenance, coordinator, shard, session):
+    """Getting a new "latest" iterator could skip records, so the shard is polled instead"""
+    shard.iterator_type, shard.sequence_number = "latest", None
+    age(shard, 601)
+    session.get_stream_records.return_value = {
+        "Records": [dynamodb_record_with(key=True, sequence_number=9)],
+        "NextShardIterator": "next-iterator"}
+
+    maintenance.maintain(coordinator)
+    session.get_shard_iterator.assert_not_called()
+    session.get_stream_records.assert_called_once_with("old-iterator")
+    assert shard.iterator_id == "next-iterator"
+    assert len(coordinator.buffer) == 1
+
+
+def test_exhausted_shards_skipped(maintenance, coordinator, shard, session):
+    shard.iterator_id = last_iterator
+    age(shard, 601)
+    maintenance.maintain(coordinator)
+    session.get_shard_iterator.assert_not_called()
+
+
+def test_discover_children(coordinator, shard, session):
+    maintenance = StreamMaintenance(discover_after=60)
+    session.describe_stream.return_value = stream_description(3, {0: [1, 2]}, stream_arn="stream-arn")
+
+    # Not active long enough
+    maintenance.maintain(coordinator)
+    session.describe_stream.assert_not_called()
+
+    maintenance._seen[shard] -= 60
+    maintenance.maintain(coordinator)
+    session.describe_stream.assert_called_once_with(stream_arn="stream-arn", first_shard="shard-id-0")
+    assert [child.shard_id for child in shard.children] == ["shard-id-1", "shard-id-2"]
+
+    # Children are already known, so they aren't loaded again
+    maintenance.maintain(coordinator)
+    assert session.describe_stream.call_count == 1
+
+
+def test_discovered_children_in_token(coordinator, shard, session):
+    """Children found by maintenance are part of the next token, even after a token was already built"""
+    maintenance = StreamMaintenance(discover_after=60)
+    session.describe_stream.return_value = stream_description(3, {0: [1, 2]}, stream_arn="stream-arn")
+    before = coordinator.token
+    assert [shard["shard_id"] for shard in before["shards"]] == ["shard-id-0"]
+
+    maintenance._seen[shard] = time.monotonic() - 60
+    maintenance.maintain(coordinator)
+    after = coordinator.token
+    assert [shard["shard_id"] for shard in after["shards"]] == ["shard-id-0", "shard-id-1", "shard-id-2"]
+    assert after["shards"][1]["parent"] == "shard-id-0"
+    assert after["active"] == before["active"] == ["shard-id-0"]
+
+
+def test_thread_keeps_running_after_errors(coordinator, caplog):
+    maintenance = StreamMaintenance(interval=0.001)
+    calls = []
+
+    def maintain(target):
+        calls.append(target)
+        if len(calls) == 1:
+            raise RuntimeError("first pass failed")
+    maintenance.maintain = maintain
+
+    maintenance.start(coordinator)
+    # Starting again doesn't start a second thread
+    maintenance.start(Mock())
+    assert maintenance.running
+    deadline = time.monotonic() + 5
+    while len(calls) < 2 and time.monotonic() < deadline:
+        time.sleep(0.001)
+    maintenance.stop()
+    maintenance.stop()
+
+    assert not maintenance.running
+    assert len(calls) >= 2
+    assert all(target is coordinator for target in calls)
+    assert "stream maintenance failed" in caplog.text
@@ -0,0 +1,48 @@
+import datetime
+
+from bloop.stream.metrics import ShardStats
+
+
+def at(timestamp):
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc)
+
+
+def test_polled():
+    stats = ShardStats()
+    stats.polled(3, 0.002)
+    stats.polled(0, 0.001)
+
+    assert (stats.records_fetched, stats.get_records_calls, stats.empty_responses) == (3, 2, 1)
+    assert stats.caught_up
+    assert stats.latency.count == 2
+    assert stats.latency.max == 2000
+    assert repr(stats) == "<ShardStats[fetched=3, calls=2]>"
+
+
+def test_lag():
+    stats = ShardStats()
+    # Nothing consumed yet
+    assert stats.lag(now=100.0) is None
+
+    stats.last_created_at = at(40)
+    assert stats.lag(now=100.0) == 60.0
+
+    # Caught up to HEAD, unless records from the last poll are still buffered
+    stats.polled(0, 0.001)
+    assert stats.lag(now=100.0) == 0.0
+    assert stats.lag(buffered=2, now=100.0) == 60.0
+
+    # Clock skew never reports a negative lag
+    stats.polled(1, 0.001)
+    assert stats.lag(now=30.0) == 0.0
+
+
+def test_reset_keeps_position():
+    stats = ShardStats()
+    stats.polled(2, 0.001)
+    stats.last_created_at = at(40)
+
+    stats.reset()
+    assert (stats.records_fetched, stats.get_records_calls, stats.empty_responses) == (0, 0, 0)
+    assert stats.latency.count == 0
+    assert stats.lag(now=100.0) == 60.0
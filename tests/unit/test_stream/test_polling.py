@@ -0,0 +1,27 @@
+import pytest
+
+from bloop.stream.polling import PollingPolicy
+
+
+def test_repr():
+    assert repr(PollingPolicy(min_interval=1, max_interval=3)) == "<PollingPolicy[min=1, max=3]>"
+
+
+@pytest.mark.parametrize("kwargs", [
+    {"min_interval": -1},
+    {"min_interval": 2, "max_interval": 1},
+    {"multiplier": 0.5},
+])
+def test_invalid(kwargs):
+    with pytest.raises(ValueError):
+        PollingPolicy(**kwargs)
+
+
+def test_interval_backs_off():
+    policy = PollingPolicy(min_interval=0.5, max_interval=3, multiplier=2)
+    assert [policy.interval(n) for n in range(6)] == [0, 0.5, 1, 2, 3, 3]
+
+
+def test_constant_interval():
+    policy = PollingPolicy(min_interval=1, max_interval=1, multiplier=1)
+    assert [policy.interval(n) for n in range(4)] == [0, 1, 1, 1]
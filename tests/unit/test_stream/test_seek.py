@@ -0,0 +1,78 @@
+import datetime
+
+import pytest
+
+from bloop.checkpoints import MemoryCheckpointStore
+from bloop.stream.seek import RETENTION, SeekIndex
+
+
+START = datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def at(seconds):
+    return START + datetime.timedelta(seconds=seconds)
+
+
+@pytest.fixture
+def store():
+    return MemoryCheckpointStore()
+
+
+@pytest.fixture
+def index(store):
+    return SeekIndex(store, "stream-index")
+
+
+def test_repr(index):
+    assert repr(index) == "<SeekIndex[stream-index]>"
+
+
+def test_empty_lookup(index):
+    assert index.lookup("shard-id", at(0)) is None
+
+
+def test_mark_resolution(index):
+    """Only one mark is kept per shard every resolution seconds"""
+    index.mark("shard-id", at(0), "1")
+    index.mark("shard-id", at(30), "2")
+    index.mark("shard-id", at(60), "3")
+    index.mark("other-shard-id", at(30), "4")
+
+    assert index.lookup("shard-id", at(0)) is None
+    assert index.lookup("shard-id", at(1)) == "1"
+    assert index.lookup("shard-id", at(60)) == "1"
+    assert index.lookup("shard-id", at(61)) == "3"
+    assert index.lookup("other-shard-id", at(3600)) == "4"
+
+
+def test_persisted(index, store):
+    """Marks are saved to the store and loaded by a new index"""
+    index.mark("shard-id", at(0), "1")
+    index.mark("shard-id", at(60), "2")
+    start = int(START.timestamp())
+    assert store.load("stream-index") == {"shard-id": [[start, "1"], [start + 60, "2"]]}
+
+    reloaded = SeekIndex(store, "stream-index")
+    assert reloaded.lookup("shard-id", at(120)) == "2"
+
+
+def test_save_throttled(store):
+    """Marks in other shards within the same resolution window aren't saved until the window passes or save()"""
+    index = SeekIndex(store, "stream-index", resolution=10)
+    index.mark("a", at(0), "1")
+    index.mark("b", at(5), "2")
+    assert set(store.load("stream-index")) == {"a"}
+
+    index.save()
+    assert set(store.load("stream-index")) == {"a", "b"}
+
+
+def test_expired_marks_dropped(index, store):
+    index.mark("old-shard-id", at(0), "1")
+    index.mark("shard-id", at(60), "2")
+    index.mark("shard-id", at(60) + RETENTION, "3")
+
+    assert index.lookup("old-shard-id", at(30)) is None
+    assert set(store.load("stream-index")) == {"shard-id"}
+    # Exactly 24 hours old is still inside the retention window
+    assert index.lookup("shard-id", at(120)) == "2"
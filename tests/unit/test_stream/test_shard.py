@@ -5,7 +5,8 @@ from unittest.mock import call
 
 import pytest
 
-from bloop.exceptions import ShardIteratorExpired
+from bloop.exceptions import RecordsExpired, ShardIteratorExpired
+from bloop.signals import shard_polled
 from bloop.stream.shard import (
     CALLS_TO_REACH_HEAD,
     Shard,
@@ -243,6 +244,8 @@ def test_jump_to(shard, session):
     assert shard.iterator_type == "latest"
     assert shard.sequence_number == "different-sequence-number"
     assert shard.empty_responses == 0
+    assert shard.last_read is None
+    assert shard.iterator_issued is not None
 
     session.get_shard_iterator.assert_called_once_with(
         stream_arn="stream-arn",
@@ -251,6 +254,51 @@ def test_jump_to(shard, session):
         sequence_number="different-sequence-number")
 
 
+@pytest.mark.parametrize("iterator_type, sequence_number, last_read, expected", [
+    ("latest", None, None, None),
+    ("trim_horizon", None, None, None),
+    ("at_sequence", "3", None, {"iterator_type": "at_sequence", "sequence_number": "3"}),
+    ("after_sequence", "3", None, {"iterator_type": "after_sequence", "sequence_number": "3"}),
+    ("at_sequence", "3", "5", {"iterator_type": "after_sequence", "sequence_number": "5"}),
+])
+def test_resume_position(shard, iterator_type, sequence_number, last_read, expected):
+    shard.iterator_type = iterator_type
+    shard.sequence_number = sequence_number
+    shard.last_read = last_read
+    assert shard.resume_position() == expected
+
+
+def test_get_records_tracks_last_read(shard, session):
+    shard.iterator_id = "iterator-id"
+    session.get_stream_records.return_value = {
+        "Records": [dynamodb_record_with(key=True, sequence_number=i) for i in (1, 2)],
+        "NextShardIterator": "next-iterator-id"}
+
+    shard.get_records()
+    assert shard.last_read == "2"
+    assert shard.sequence_number == "1"
+    assert shard.iterator_issued is not None
+
+
+def test_get_records_sends_shard_polled(shard, session):
+    polls = []
+
+    @shard_polled.connect
+    def on_polled(sender, **kwargs):
+        polls.append((sender, kwargs))
+    try:
+        shard.iterator_id = "iterator-id"
+        session.get_stream_records.side_effect = build_get_records_responses(0, 2)
+        shard.get_records()
+    finally:
+        shard_polled.disconnect(on_polled)
+
+    assert [(sender, kwargs["records"], kwargs["lag"]) for sender, kwargs in polls] == [
+        (shard, 0, 0.0), (shard, 2, None)]
+    assert all(kwargs["shard"] is shard and kwargs["elapsed"] >= 0 for _, kwargs in polls)
+    assert (shard.stats.get_records_calls, shard.stats.records_fetched, shard.stats.empty_responses) == (2, 2, 1)
+
+
 def test_seek_exhausted(shard, session):
     """Shard is exhausted before finding the target time"""
     position = now_with_offset(-120)
@@ -314,6 +362,42 @@ def test_seek_finds_position(time_offset, record_index, shard, session):
     session.get_stream_records.assert_called_once_with("new-iterator-id")
 
 
+def test_seek_from_sequence_number(shard, session):
+    """A known sequence number replaces the trim_horizon as the starting point"""
+    session.get_shard_iterator.return_value = "new-iterator-id"
+    session.get_stream_records.side_effect = build_get_records_responses(0)
+
+    shard.seek_to(now_with_offset(-120), sequence_number="sequence-number")
+
+    session.get_shard_iterator.assert_called_once_with(
+        stream_arn=shard.stream_arn, shard_id=shard.shard_id,
+        iterator_type="at_sequence", sequence_number="sequence-number")
+
+
+def test_seek_expired_sequence_number(shard, session):
+    """An expired sequence number falls back to the trim_horizon"""
+    session.get_shard_iterator.side_effect = [RecordsExpired, "new-iterator-id"]
+    session.get_stream_records.side_effect = build_get_records_responses(0)
+
+    shard.seek_to(now_with_offset(-120), sequence_number="sequence-number")
+
+    session.get_shard_iterator.assert_called_with(
+        stream_arn=shard.stream_arn, shard_id=shard.shard_id,
+        iterator_type="trim_horizon", sequence_number=None)
+    session.get_stream_records.assert_called_once_with("new-iterator-id")
+
+
+def test_scan_to_existing_records(shard, session):
+    """Records that were already read are checked before reading more"""
+    [response] = build_get_records_responses(3)
+    records = [reformat_record(record) for record in response["Records"]]
+    for record in records:
+        record["meta"]["created_at"] = now_with_offset(-3600)
+
+    assert shard.scan_to(now_with_offset(), records) == records
+    session.get_stream_records.assert_not_called()
+
+
 def test_load_existing_children(session):
     shards = build_shards(3, {0: [1, 2]}, session=session)
     root = shards[0]
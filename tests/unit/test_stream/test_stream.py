@@ -1,10 +1,16 @@
 import datetime
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, Mock
 
 import pytest
 
+from bloop.metrics import disable_timing, enable_timing
 from bloop.models import BaseModel, Column
+from bloop.signals import object_loaded
+from bloop.stream.checkpoint import StreamCheckpointer
 from bloop.stream.coordinator import Coordinator
+from bloop.stream.dispatch import StreamDispatcher
+from bloop.stream.filter import StreamFilter
+from bloop.stream.maintenance import StreamMaintenance
 from bloop.stream.stream import Stream
 from bloop.types import Integer, String
 from bloop.util import ordered
@@ -72,11 +78,32 @@ def test_heartbeat(stream, coordinator):
     coordinator.heartbeat.assert_called_once_with()
 
 
+def test_shard_metrics(stream, coordinator):
+    coordinator.shard_metrics.return_value = [{"shard_id": "shard-id"}]
+    assert stream.shard_metrics(reset=True) == [{"shard_id": "shard-id"}]
+    coordinator.shard_metrics.assert_called_once_with(reset=True)
+
+
+def test_close(stream, coordinator):
+    stream.close()
+    coordinator.close.assert_called_once_with()
+
+
 def test_move_to(stream, coordinator):
     stream.move_to("latest")
     coordinator.move_to.assert_called_once_with("latest")
 
 
+def test_maintenance_lifecycle(stream, coordinator):
+    """Maintenance starts when the stream moves and stops when it closes"""
+    maintenance = stream.maintenance = Mock(spec=StreamMaintenance)
+    stream.move_to("latest")
+    maintenance.start.assert_called_once_with(coordinator)
+
+    stream.close()
+    maintenance.stop.assert_called_once_with()
+
+
 def test_next_no_record(stream, coordinator):
     coordinator.__next__.return_value = None
     # Explicit marker so we don't get next's default value
@@ -121,3 +148,265 @@ def test_next_unpacks(stream, coordinator):
 
     assert record["key"] is None
     assert not hasattr(record["key"], "data")
+
+
+@pytest.fixture
+def fake_time(monkeypatch):
+    """Controls time.monotonic and records calls to time.sleep in bloop.stream.stream"""
+    clock = MagicMock(now=0.0, sleeps=[])
+
+    def sleep(seconds):
+        clock.sleeps.append(seconds)
+        clock.now += seconds
+    monkeypatch.setattr("bloop.stream.stream.time.monotonic", lambda: clock.now)
+    monkeypatch.setattr("bloop.stream.stream.time.sleep", sleep)
+    return clock
+
+
+def email_record(id, data):
+    return {
+        "old": None,
+        "key": {"id": {"N": str(id)}},
+        "new": {"id": {"N": str(id)}, "data": {"S": data}},
+        "meta": {"sequence_number": str(id)}
+    }
+
+
+def test_next_batch_unpacks(stream, coordinator, engine):
+    loaded = []
+    engine.bind(Email)
+
+    @object_loaded.connect
+    def on_loaded(_, *, obj, **kwargs):
+        loaded.append(obj)
+    try:
+        coordinator.next_batch.return_value = [email_record(i, "data-{}".format(i)) for i in range(3)]
+        batch = stream.next_batch(10)
+    finally:
+        object_loaded.disconnect(on_loaded)
+
+    coordinator.next_batch.assert_called_once_with(10)
+    assert [record["new"].data for record in batch] == ["data-0", "data-1", "data-2"]
+    assert all(record["old"] is None and record["key"] is None for record in batch)
+    assert loaded == [record["new"] for record in batch]
+
+
+def test_next_batch_unpack_timing(stream, coordinator, engine):
+    engine.bind(Email)
+    coordinator.next_batch.return_value = [email_record(i, "data-{}".format(i)) for i in range(3)]
+    timings = enable_timing()
+    try:
+        stream.next_batch(10)
+    finally:
+        disable_timing()
+    # One measurement for the whole batch
+    assert timings.snapshot()["unpack"]["stream"]["count"] == 1
+
+
+def test_next_batch_invalid_size(stream):
+    with pytest.raises(ValueError):
+        stream.next_batch(0)
+
+
+def test_next_batch_max_wait(stream, coordinator, monkeypatch):
+    """Keeps polling to fill the batch until max_wait passes"""
+    now = [0]
+
+    def monotonic():
+        now[0] += 1
+        return now[0]
+    monkeypatch.setattr("bloop.stream.stream.time.monotonic", monotonic)
+    coordinator.wait_time.return_value = 0
+    coordinator.next_batch.side_effect = lambda n: [email_record(0, "data")] if n > 2 else []
+
+    # deadline is 1 + 4; polls at 2, 3, 4 and stops at 5
+    batch = stream.next_batch(4, max_wait=4)
+    assert len(batch) == 2
+    assert [c[0][0] for c in coordinator.next_batch.call_args_list] == [4, 3, 2, 2]
+
+
+def test_next_batch_sleeps_until_due(stream, coordinator, fake_time):
+    """Between polls the stream sleeps until a shard is due, but never past max_wait"""
+    coordinator.wait_time.return_value = 2
+    coordinator.next_batch.return_value = []
+
+    assert stream.next_batch(10, max_wait=5) == []
+    assert fake_time.sleeps == [2, 2, 1]
+
+
+def test_next_batch_stops_when_full(stream, coordinator):
+    coordinator.next_batch.side_effect = lambda n: [email_record(i, "data") for i in range(n)]
+    assert len(stream.next_batch(3, max_wait=60)) == 3
+    coordinator.next_batch.assert_called_once_with(3)
+
+
+def test_iter_batches(stream, coordinator):
+    coordinator.next_batch.side_effect = [[email_record(0, "data")], []]
+    batches = stream.iter_batches(5)
+    assert len(next(batches)) == 1
+    assert next(batches) == []
+
+
+def test_next_batch_checkpoints(stream, coordinator):
+    """Every record in a batch is counted once the next batch is requested"""
+    checkpoint = stream.checkpoint = Mock(spec=StreamCheckpointer)
+    coordinator.next_batch.side_effect = lambda n: [email_record(i, "data") for i in range(3)]
+
+    stream.next_batch()
+    checkpoint.step.assert_called_with(stream, consumed=0)
+    stream.next_batch()
+    checkpoint.step.assert_called_with(stream, consumed=3)
+
+
+def test_next_timeout_returns_record(stream, coordinator, fake_time):
+    coordinator.wait_time.return_value = 0.5
+    coordinator.__next__.side_effect = [None, None, {"meta": {}}]
+
+    assert stream.next(timeout=10)["meta"] == {}
+    assert fake_time.sleeps == [0.5, 0.5]
+
+
+def test_next_timeout_expires(stream, coordinator, fake_time):
+    coordinator.wait_time.return_value = 4
+    coordinator.__next__.return_value = None
+
+    assert stream.next(timeout=10) is None
+    assert fake_time.sleeps == [4, 4, 2]
+    assert coordinator.__next__.call_count == 4
+
+
+def test_next_without_timeout_waits(stream, coordinator, fake_time):
+    """Without a timeout, keeps polling until a record arrives"""
+    coordinator.wait_time.return_value = 5
+    coordinator.__next__.side_effect = [None] * 20 + [{"meta": {}}]
+
+    assert stream.next()["meta"] == {}
+    assert fake_time.now == 100
+
+
+def test_checkpoint_counts_consumed_records(stream, coordinator):
+    """A record is only counted once the next record is requested"""
+    checkpoint = stream.checkpoint = Mock(spec=StreamCheckpointer)
+    coordinator.__next__.side_effect = [None, {"meta": {}}, None]
+
+    next(stream)
+    next(stream)
+    checkpoint.step.assert_called_with(stream, consumed=0)
+    next(stream)
+    checkpoint.step.assert_called_with(stream, consumed=1)
+    assert checkpoint.step.call_count == 3
+
+
+def test_close_saves_checkpoint(stream, coordinator):
+    """Closing counts the last record returned and saves a final checkpoint"""
+    checkpoint = stream.checkpoint = Mock(spec=StreamCheckpointer)
+    coordinator.__next__.return_value = {"meta": {}}
+
+    next(stream)
+    stream.close()
+    checkpoint.step.assert_called_with(stream, consumed=1)
+    checkpoint.save.assert_called_once_with(stream)
+
+
+def test_filter_skips_before_unpacking(stream, coordinator, engine):
+    """Filtered records are never unpacked, and next doesn't poll again to replace them"""
+    engine.bind(Email)
+    stream._matches = StreamFilter(new=Email.data == "keep").compile(Email, engine)
+    records = [email_record(1, "drop"), email_record(2, "keep"), email_record(3, "drop")]
+    coordinator.__next__.side_effect = records + [email_record(4, "keep")]
+    coordinator.buffer = [None] * 2
+    loaded = []
+
+    @object_loaded.connect
+    def on_loaded(_, *, obj, **kwargs):
+        loaded.append(obj)
+    try:
+        record = next(stream)
+        assert record["new"].id == 2
+        coordinator.buffer = []
+        assert next(stream) is None
+    finally:
+        object_loaded.disconnect(on_loaded)
+    assert [obj.id for obj in loaded] == [2]
+    assert coordinator.__next__.call_count == 3
+
+
+def test_filter_batches(stream, coordinator, engine):
+    engine.bind(Email)
+    stream._matches = StreamFilter(key=lambda key: key["id"] % 2 == 0).compile(Email, engine)
+    coordinator.next_batch.return_value = [email_record(i, "data") for i in range(5)]
+
+    assert [record["new"].id for record in stream.next_batch(5)] == [0, 2, 4]
+
+
+class Item(BaseModel):
+    """Every model in the single table"""
+    class Meta:
+        stream = {
+            "include": {"new", "old"},
+            "arn": "stream-arn"
+        }
+    pk = Column(String, hash_key=True)
+
+
+class Customer(Item):
+    name = Column(String)
+
+
+class Order(Item):
+    total = Column(Integer)
+
+
+def item_record(pk, **attrs):
+    new = {"pk": {"S": pk}}
+    for name, value in attrs.items():
+        new[name] = {"N": str(value)} if isinstance(value, int) else {"S": value}
+    return {"old": None, "key": {"pk": {"S": pk}}, "new": new, "meta": {"sequence_number": pk}}
+
+
+@pytest.fixture
+def dispatched(coordinator, engine):
+    engine.bind(Item)
+    stream = Stream(model=Item, engine=engine, dispatch=StreamDispatcher(
+        {"CUSTOMER#": Customer, "ORDER#": Order}, key_prefix="pk"))
+    stream.coordinator = coordinator
+    return stream
+
+
+def test_dispatch_unpacks_each_model(dispatched, coordinator):
+    """Each record is unpacked with only its own model's columns, and unknown records are skipped"""
+    coordinator.__next__.side_effect = [
+        item_record("SHIPMENT#1"),
+        item_record("CUSTOMER#1", name="alice", total=3),
+        item_record("ORDER#1", total=3),
+    ]
+    coordinator.buffer = [None] * 2
+
+    customer = next(dispatched)["new"]
+    assert isinstance(customer, Customer)
+    assert customer.name == "alice"
+    assert not hasattr(customer, "total")
+
+    order = next(dispatched)
+    assert isinstance(order["new"], Order)
+    assert order["new"].total == 3
+    assert order["key"] is None
+
+
+def test_dispatch_batches(dispatched, coordinator, engine):
+    dispatched._matches = StreamFilter(events={"insert"}).compile(dispatched.model, engine)
+    records = [
+        item_record("ORDER#1", total=1),
+        item_record("CUSTOMER#1", name="alice"),
+        item_record("SHIPMENT#1"),
+        item_record("ORDER#2", total=2),
+    ]
+    for record in records:
+        record["meta"]["event"] = {"type": "insert"}
+    records[3]["meta"]["event"] = {"type": "remove"}
+    coordinator.next_batch.return_value = records
+
+    batch = dispatched.next_batch(4)
+    assert [type(record["new"]) for record in batch] == [Order, Customer]
+    assert batch[0]["new"].total == 1
+    assert batch[1]["new"].name == "alice"
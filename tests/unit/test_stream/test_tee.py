@@ -0,0 +1,174 @@
+import pytest
+
+from bloop import BaseModel, Column, Engine, Integer, String
+from bloop.checkpoints import MemoryCheckpointStore
+from bloop.memory import MemoryDynamoDB
+from bloop.stream.checkpoint import StreamCheckpointer
+from bloop.stream.tee import StreamTee
+
+
+class Event(BaseModel):
+    class Meta:
+        stream = {"include": ["new", "old"]}
+    id = Column(String, hash_key=True)
+    count = Column(Integer)
+
+
+@pytest.fixture
+def memory_engine():
+    dynamodb = MemoryDynamoDB()
+    engine = Engine(dynamodb=dynamodb, dynamodbstreams=dynamodb.streams)
+    engine.bind(Event)
+    return engine
+
+
+@pytest.fixture
+def new_tee(memory_engine):
+    def new_tee(**kwargs):
+        return StreamTee(memory_engine.stream(Event, "trim_horizon"), **kwargs)
+    return new_tee
+
+
+def save_events(engine, *ids):
+    for id in ids:
+        engine.save(Event(id=id, count=1))
+
+
+def drain(subscriber):
+    ids = []
+    record = next(subscriber)
+    while record:
+        ids.append(record["new"].id)
+        record = next(subscriber)
+    return ids
+
+
+@pytest.mark.parametrize("kwargs", [{"overflow": "drop"}, {"max_batches": 0}])
+def test_invalid_args(new_tee, kwargs):
+    with pytest.raises(ValueError):
+        new_tee(**kwargs)
+
+
+def test_stream_with_checkpoint(memory_engine):
+    checkpoint = StreamCheckpointer(MemoryCheckpointStore(), "shared")
+    with pytest.raises(ValueError):
+        StreamTee(memory_engine.stream(Event, "trim_horizon", checkpoint=checkpoint))
+
+
+def test_repr(new_tee):
+    tee = new_tee()
+    assert repr(tee) == "<StreamTee[Event]>"
+    assert repr(tee.subscribe("search")) == "<TeeSubscriber[search]>"
+
+
+def test_duplicate_name(new_tee):
+    tee = new_tee()
+    tee.subscribe("search")
+    with pytest.raises(ValueError):
+        tee.subscribe("search")
+
+
+def test_fan_out(new_tee, memory_engine):
+    """Every subscriber gets each batch, read and unpacked once"""
+    tee = new_tee()
+    search, audit = tee.subscribe("search"), tee.subscribe("audit")
+    save_events(memory_engine, "a", "b", "c")
+
+    assert tee.poll() == 3
+    assert tee.poll() == 0
+    first = next(search)
+    assert next(audit) is first
+    assert drain(search) == ["b", "c"]
+    assert drain(audit) == ["b", "c"]
+
+
+def test_token_per_batch(new_tee, memory_engine):
+    """A subscriber's token moves once every record in a batch has been consumed"""
+    tee = new_tee()
+    search, audit = tee.subscribe("search"), tee.subscribe("audit")
+    start = search.token
+    save_events(memory_engine, "a", "b")
+    tee.poll()
+
+    next(search)
+    next(search)
+    assert search.token == start
+    assert next(search) is None
+    assert search.token == tee.stream.token
+    # Each subscriber tracks its own position
+    assert audit.token == start
+
+
+def test_checkpoint_resume(new_tee, memory_engine):
+    """A subscriber with a saved token catches up on its own stream, then rejoins the tee"""
+    store = MemoryCheckpointStore()
+    tee = new_tee()
+    search = tee.subscribe("search", checkpoint=StreamCheckpointer(store, "search"))
+    save_events(memory_engine, "a", "b")
+    tee.poll()
+    assert drain(search) == ["a", "b"]
+    search.close()
+    assert not tee.subscribers
+
+    save_events(memory_engine, "c")
+    tee = new_tee()
+    tee.poll()
+    search = tee.subscribe("search", checkpoint=StreamCheckpointer(store, "search"))
+    assert search.resyncing
+    assert drain(search) == ["c"]
+    assert not search.resyncing
+
+    save_events(memory_engine, "d")
+    tee.poll()
+    assert drain(search) == ["d"]
+
+
+def test_resync_when_full(new_tee, memory_engine):
+    """With overflow="resync", a full subscriber reads what it missed from its own stream"""
+    tee = new_tee(max_batches=1, overflow="resync")
+    slow, fast = tee.subscribe("slow"), tee.subscribe("fast")
+    for id in ("a", "b"):
+        save_events(memory_engine, id)
+        tee.poll()
+        assert drain(fast) == [id]
+    assert not slow.attached
+    assert slow.resyncing
+
+    # The queued batch first, then the rest from its own stream
+    assert drain(slow) == ["a", "b"]
+    assert slow.attached
+    assert not slow.resyncing
+
+    save_events(memory_engine, "c")
+    tee.poll()
+    assert drain(slow) == ["c"]
+    assert drain(fast) == ["c"]
+
+
+def test_block_resyncs_when_stopped(new_tee, memory_engine):
+    """A subscriber the tee was blocked on when stopping resyncs instead of missing the batch"""
+    tee = new_tee(max_batches=1)
+    slow = tee.subscribe("slow")
+    save_events(memory_engine, "a")
+    tee.poll()
+    tee._stopped.set()
+    save_events(memory_engine, "b")
+    tee.poll()
+
+    assert slow.resyncing
+    assert drain(slow) == ["a", "b"]
+
+
+def test_background_thread(new_tee, memory_engine):
+    tee = new_tee(poll_wait=0.01)
+    search = tee.subscribe("search")
+    tee.start()
+    tee.start()
+    assert tee.running
+    try:
+        save_events(memory_engine, "a")
+        assert search.next(timeout=5)["new"].id == "a"
+    finally:
+        tee.close()
+    assert not tee.running
+    assert not tee.subscribers
@@ -0,0 +1,205 @@
+from unittest.mock import Mock
+
+import pytest
+
+from bloop import Engine
+from bloop.bulk.writes import BatchWriter
+from bloop.exceptions import ThroughputExceeded
+from bloop.session import SessionWrapper
+from bloop.tracing import (
+    Span,
+    Tracer,
+    current_span,
+    get_tracer,
+    request_attributes,
+    response_attributes,
+    set_tracer,
+    span,
+)
+
+from ..helpers.models import SimpleModel, User
+
+
+class RecordingSpan(Span):
+    def __init__(self, name, attributes, parent):
+        self.name = name
+        self.attributes = dict(attributes)
+        self.parent = parent
+        self.exceptions = []
+        self.ended = False
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def record_exception(self, exception):
+        self.exceptions.append(exception)
+
+    def end(self):
+        self.ended = True
+
+
+class RecordingTracer(Tracer):
+    def __init__(self):
+        self.spans = []
+
+    def start_span(self, name, attributes, parent):
+        created = RecordingSpan(name, attributes, parent)
+        self.spans.append(created)
+        return created
+
+    def named(self, name):
+        return [s for s in self.spans if s.name == name]
+
+
+@pytest.fixture
+def tracer():
+    tracer = RecordingTracer()
+    set_tracer(tracer)
+    yield tracer
+    set_tracer(None)
+
+
+@pytest.fixture
+def dynamodb_client():
+    client = Mock()
+    client.update_item.return_value = {
+        "ConsumedCapacity": {"TableName": "User", "CapacityUnits": 1.0}}
+    client.query.return_value = {
+        "Items": [], "Count": 0, "ScannedCount": 3,
+        "ConsumedCapacity": {"TableName": "User", "CapacityUnits": 0.5}}
+    return client
+
+
+@pytest.fixture
+def traced_engine(dynamodb_client):
+    engine = Engine(dynamodb=dynamodb_client, dynamodbstreams=Mock())
+    engine.bind(User, skip_table_setup=True)
+    return engine
+
+
+def test_disabled_by_default():
+    assert get_tracer() is None
+    with span("bloop.test", request={"TableName": "User"}) as scope:
+        assert not scope.recording
+        scope.set_attribute("ignored", 1)
+        scope.set_response({"Count": 1})
+    assert current_span() is None
+
+
+def test_nesting_and_context(tracer):
+    with span("outer", attributes={"a": 1}) as outer:
+        assert current_span() is outer.span
+        with span("inner") as inner:
+            assert current_span() is inner.span
+        assert current_span() is outer.span
+    assert current_span() is None
+
+    outer, inner = tracer.spans
+    assert outer.parent is None
+    assert inner.parent is outer
+    assert outer.attributes == {"a": 1}
+    assert outer.ended and inner.ended
+
+
+def test_exception_recorded(tracer):
+    error = ValueError("boom")
+    with pytest.raises(ValueError):
+        with span("failing"):
+            raise error
+    failing, = tracer.spans
+    assert failing.exceptions == [error]
+    assert failing.ended
+    assert current_span() is None
+
+
+def test_request_attributes():
+    assert request_attributes({"TableName": "User", "IndexName": "by_email", "Segment": 1, "TotalSegments": 4}) == {
+        "db.system": "dynamodb",
+        "aws.dynamodb.table_names": ["User"],
+        "aws.dynamodb.index_name": "by_email",
+        "aws.dynamodb.segment": 1,
+        "aws.dynamodb.total_segments": 4,
+    }
+    assert request_attributes({"RequestItems": {"b": {}, "a": {}}})["aws.dynamodb.table_names"] == ["a", "b"]
+    assert request_attributes({"TransactItems": [
+        {"Put": {"TableName": "b"}}, {"Delete": {"TableName": "a"}}, {"Update": {"TableName": "b"}},
+    ]})["aws.dynamodb.table_names"] == ["a", "b"]
+
+
+def test_response_attributes():
+    assert response_attributes({}) == {}
+    assert response_attributes({
+        "Count": 2, "ScannedCount": 5,
+        "ConsumedCapacity": [{"TableName": "a", "CapacityUnits": 1.5}, {"TableName": "b", "CapacityUnits": 2.0}],
+    }) == {"aws.dynamodb.count": 2, "aws.dynamodb.scanned_count": 5, "bloop.consumed_capacity": 3.5}
+
+
+def test_capacity_requested_while_tracing(tracer, dynamodb_client):
+    session = SessionWrapper(dynamodb=dynamodb_client, dynamodbstreams=Mock())
+    session.save_item({"TableName": "User", "Key": {"id": {"S": "a"}}})
+    _, kwargs = dynamodb_client.update_item.call_args
+    assert kwargs["ReturnConsumedCapacity"] == "INDEXES"
+
+    saved, = tracer.named("bloop.session.save_item")
+    assert saved.attributes["aws.dynamodb.table_names"] == ["User"]
+    assert saved.attributes["bloop.consumed_capacity"] == 1.0
+
+
+def test_capacity_not_requested_without_tracer(dynamodb_client):
+    session = SessionWrapper(dynamodb=dynamodb_client, dynamodbstreams=Mock())
+    session.save_item({"TableName": "User", "Key": {"id": {"S": "a"}}})
+    _, kwargs = dynamodb_client.update_item.call_args
+    assert "ReturnConsumedCapacity" not in kwargs
+
+
+def test_engine_save_span(tracer, traced_engine):
+    traced_engine.save(User(id="a", age=3), User(id="b"))
+
+    root, = tracer.named("bloop.engine.save")
+    assert root.parent is None
+    assert root.attributes["aws.dynamodb.table_names"] == ["User"]
+    assert root.attributes["bloop.items"] == 2
+
+    children = tracer.named("bloop.session.save_item")
+    assert len(children) == 2
+    assert all(child.parent is root for child in children)
+
+
+def test_engine_failure_recorded(tracer, traced_engine, dynamodb_client):
+    dynamodb_client.update_item.side_effect = RuntimeError("network")
+    with pytest.raises(RuntimeError):
+        traced_engine.save(User(id="a"))
+
+    root, = tracer.named("bloop.engine.save")
+    child, = tracer.named("bloop.session.save_item")
+    assert isinstance(root.exceptions[0], RuntimeError)
+    assert isinstance(child.exceptions[0], RuntimeError)
+    assert root.ended and child.ended
+
+
+def test_search_page_span(tracer, traced_engine):
+    list(traced_engine.query(User.by_email, key=User.email == "a@b.c"))
+
+    page, = tracer.named("bloop.search.page")
+    assert page.attributes["aws.dynamodb.index_name"] == "by_email"
+    assert page.attributes["aws.dynamodb.scanned_count"] == 3
+    call, = tracer.named("bloop.session.search_items")
+    assert call.parent is page
+    assert call.attributes["bloop.mode"] == "query"
+    assert call.attributes["bloop.consumed_capacity"] == 0.5
+
+
+def test_batch_write_attempts(tracer, engine, session, monkeypatch):
+    monkeypatch.setattr("time.sleep", lambda seconds: None)
+    item = {"id": {"S": "a"}}
+    session.write_items.side_effect = [ThroughputExceeded(), {"Simple": [{"PutRequest": {"Item": item}}]}, {}]
+    BatchWriter(engine, SimpleModel).write([item])
+
+    batch, = tracer.named("bloop.bulk.batch_write")
+    attempts = tracer.named("bloop.bulk.batch_write.attempt")
+    assert [a.attributes["bloop.attempt"] for a in attempts] == [1, 2, 3]
+    assert all(a.parent is batch for a in attempts)
+    assert [a.attributes.get("bloop.throttled") for a in attempts] == [True, None, None]
+    assert batch.attributes["bloop.items"] == 1
+    assert batch.attributes["bloop.attempts"] == 3
+    assert batch.attributes["bloop.throttled"] == 1
@@ -132,7 +132,7 @@ def test_check_complex_item(engine):
     assert p.items == expected_items
     assert p.first_commit_at is None
     assert len(p._request) == 1
-    entry = p._request[0]["CheckCondition"]
+    entry = p._request[0]["ConditionCheck"]
     expected_fields = {
         "Key", "TableName",
         "ConditionExpression",
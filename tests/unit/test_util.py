@@ -11,6 +11,7 @@ from bloop.types import Integer
 from bloop.util import (
     Sentinel,
     default_context,
+    dump_item,
     dump_key,
     extract_key,
     get_table_name,
@@ -53,6 +54,23 @@ def test_dump_key(engine):
     assert dump_key(engine, obj) == obj_key
 
 
+def test_dump_item(engine):
+    user = User(id="foo", age=3, name=None)
+    assert dump_item(engine, user) == {"id": {"S": "foo"}, "age": {"N": "3"}}
+
+
+def test_dump_item_missing_key(engine):
+    with pytest.raises(MissingKey):
+        dump_item(engine, User(age=3))
+
+
+@pytest.mark.parametrize("action_type", [ActionType.Add, ActionType.Delete])
+def test_dump_item_invalid_action(engine, action_type):
+    user = User(id="foo", age=action_type.new_action(2))
+    with pytest.raises(ValueError):
+        dump_item(engine, user)
+
+
 def test_dump_key_missing(engine):
     obj = HashAndRange()
     with pytest.raises(MissingKey):